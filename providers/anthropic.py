@@ -2,8 +2,9 @@
 Anthropic provider implementation.
 """
 import os
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
 from .base import BaseProvider
+from .pool import Endpoint, EndpointPool
 
 class AnthropicProvider(BaseProvider):
     """Anthropic API provider."""
@@ -16,10 +17,11 @@ class AnthropicProvider(BaseProvider):
             "claude-3-5-haiku-20241022",
             "claude-3-opus-20240229"
         ]
+        self.endpoint_pool = EndpointPool.from_env(self.name, self.api_key)
     
     def is_available(self) -> bool:
         """Check if Anthropic API key is available."""
-        return bool(self.api_key)
+        return bool(self.api_key) or self.endpoint_pool is not None
     
     def get_default_models(self) -> Dict[str, str]:
         """Get default Anthropic models."""
@@ -32,9 +34,19 @@ class AnthropicProvider(BaseProvider):
         """Get list of supported Anthropic models."""
         return self.supported_models
     
-    def configure_request(self, request: Dict[str, Any]) -> Dict[str, Any]:
-        """Configure request for Anthropic."""
+    def configure_request(self, request: Dict[str, Any], endpoint: Optional[Endpoint] = None) -> Dict[str, Any]:
+        """Configure request for Anthropic, or for one endpoint of the endpoint pool."""
         request["api_key"] = self.api_key
+        if endpoint is not None:
+            endpoint.apply(request)
         
-        self.logger.debug(f"Configured Anthropic request for model: {request.get('model')}")
-        return request
\ No newline at end of file
+        self.logger.debug("Configured Anthropic request for model: %s", request.get('model'))
+        return request
+    
+    def get_direct_endpoint(self, model: str, endpoint: Optional[Endpoint] = None) -> Tuple[str, Dict[str, str]]:
+        """Get Anthropic's OpenAI-compatible chat completions endpoint."""
+        base = os.getenv("ANTHROPIC_API_BASE", "https://api.anthropic.com/v1")
+        api_key = self.api_key
+        if endpoint is not None:
+            base, api_key = endpoint.api_base, endpoint.api_key or api_key
+        return f"{base.rstrip('/')}/chat/completions", {"Authorization": f"Bearer {api_key}"}
\ No newline at end of file
@@ -2,8 +2,9 @@
 Azure OpenAI provider implementation.
 """
 import os
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
 from .base import BaseProvider
+from .pool import Endpoint, EndpointPool
 
 class AzureOpenAIProvider(BaseProvider):
     """Azure OpenAI API provider."""
@@ -19,10 +20,11 @@ class AzureOpenAIProvider(BaseProvider):
             "gpt-4",
             "gpt-35-turbo"
         ]
+        self.endpoint_pool = EndpointPool.from_env(self.name, self.api_key, self.api_version)
     
     def is_available(self) -> bool:
         """Check if Azure OpenAI configuration is available."""
-        return bool(self.api_key and self.endpoint)
+        return bool(self.api_key and self.endpoint) or self.endpoint_pool is not None
     
     def get_default_models(self) -> Dict[str, str]:
         """Get default Azure OpenAI models (deployment names)."""
@@ -35,11 +37,26 @@ class AzureOpenAIProvider(BaseProvider):
         """Get list of supported Azure OpenAI models."""
         return self.supported_models
     
-    def configure_request(self, request: Dict[str, Any]) -> Dict[str, Any]:
-        """Configure request for Azure OpenAI."""
+    def configure_request(self, request: Dict[str, Any], endpoint: Optional[Endpoint] = None) -> Dict[str, Any]:
+        """Configure request for Azure OpenAI, or for one resource of the endpoint pool."""
         request["api_key"] = self.api_key
         request["api_base"] = self.endpoint
         request["api_version"] = self.api_version
+        if endpoint is not None:
+            endpoint.apply(request)
         
-        self.logger.debug(f"Configured Azure OpenAI request for model: {request.get('model')}")
-        return request
\ No newline at end of file
+        self.logger.debug("Configured Azure OpenAI request for model: %s", request.get('model'))
+        return request
+    
+    def get_direct_endpoint(self, model: str, endpoint: Optional[Endpoint] = None) -> Tuple[str, Dict[str, str]]:
+        """Get the chat completions endpoint for an Azure deployment."""
+        base, api_key, api_version = self.endpoint, self.api_key, self.api_version
+        if endpoint is not None:
+            base = endpoint.api_base
+            api_key = endpoint.api_key or api_key
+            api_version = endpoint.api_version or api_version
+        url = (
+            f"{base.rstrip('/')}/openai/deployments/{model}/chat/completions"
+            f"?api-version={api_version}"
+        )
+        return url, {"api-key": api_key}
\ No newline at end of file
@@ -4,15 +4,36 @@ Base provider interface for AI model providers.
 import os
 import logging
 from abc import ABC, abstractmethod
-from typing import Dict, Any, List
+from typing import Dict, Any, List, NamedTuple, Optional, Tuple
+from .pool import Endpoint, EndpointPool
+
+class Capabilities(NamedTuple):
+    """What a provider's API accepts, used when compiling requests for it."""
+    flatten_content: bool = False  # Content must be a plain string, not a list of blocks
+    max_tokens_limit: Optional[int] = None  # Upper bound for max_tokens
+    clean_tool_schemas: bool = False  # Strip JSON schema fields the API rejects
 
 class BaseProvider(ABC):
     """Base class for AI model providers."""
     
+    # Whether LiteLLM has an async client for this provider. Providers that set
+    # this to False are called on the server's bounded fallback executor.
+    supports_async: bool = True
+    
+    capabilities: Capabilities = Capabilities()
+    
     def __init__(self, name: str, prefix: str):
         self.name = name
         self.prefix = prefix
         self.logger = logging.getLogger(f"providers.{name}")
+        # "litellm" (default) or "httpx" for the direct pooled engine
+        self.upstream_engine = os.getenv(
+            f"{name.upper()}_UPSTREAM_ENGINE", os.getenv("UPSTREAM_ENGINE", "litellm")
+        ).lower()
+        self._engine = None
+        # Optional pool of endpoints from {NAME}_ENDPOINTS, loaded by subclasses
+        # once their default credentials are known
+        self.endpoint_pool: Optional[EndpointPool] = None
     
     @abstractmethod
     def is_available(self) -> bool:
@@ -30,10 +51,30 @@ class BaseProvider(ABC):
         pass
     
     @abstractmethod
-    def configure_request(self, request: Dict[str, Any]) -> Dict[str, Any]:
-        """Configure a LiteLLM request for this provider."""
+    def configure_request(self, request: Dict[str, Any], endpoint: Optional[Endpoint] = None) -> Dict[str, Any]:
+        """Configure a LiteLLM request for this provider, or for one endpoint of its pool."""
         pass
     
+    def get_direct_endpoint(self, model: str, endpoint: Optional[Endpoint] = None) -> Tuple[str, Dict[str, str]]:
+        """Get the chat completions URL and headers for the direct httpx engine."""
+        raise NotImplementedError(f"{self.name} does not support the direct httpx engine")
+    
+    def uses_direct_engine(self) -> bool:
+        """Check if requests for this provider should bypass LiteLLM."""
+        return self.upstream_engine == "httpx"
+    
+    def get_engine(self):
+        """Get this provider's pooled httpx engine, creating it on first use."""
+        if self._engine is None:
+            from .engine import HttpxEngine
+            self._engine = HttpxEngine(self)
+        return self._engine
+    
+    async def aclose(self):
+        """Close any pooled upstream connections."""
+        if self._engine is not None:
+            await self._engine.aclose()
+    
     def map_model(self, model_name: str, model_type: str = "auto") -> str:
         """
         Map a model name to this provider's format.
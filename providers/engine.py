@@ -0,0 +1,213 @@
+"""
+Direct httpx upstream engine with pooled keep-alive connections.
+
+Every provider we support speaks the OpenAI chat completions protocol (Gemini and
+Anthropic through their OpenAI-compatible endpoints), so the request dicts that
+convert_anthropic_to_litellm produces can be posted as-is without going through
+LiteLLM. Each provider owns one long-lived httpx.AsyncClient, so repeated
+requests reuse TLS connections instead of handshaking every time.
+"""
+import logging
+import os
+from types import SimpleNamespace
+from typing import Any, Dict, Optional
+
+import httpx
+
+from proxy import json_backend
+
+logger = logging.getLogger("providers.engine")
+
+# Keys LiteLLM understands that are not part of the OpenAI request body
+_LITELLM_ONLY_KEYS = {"api_key", "api_base", "api_version", "top_k"}
+
+
+class UpstreamError(Exception):
+    """Raised when the upstream returns an error status.
+
+    Carries the same attributes as LiteLLM exceptions so create_message can
+    report it the same way.
+    """
+
+    def __init__(self, status_code: int, message: str, llm_provider: str = ""):
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+        self.llm_provider = llm_provider
+
+
+class EngineConfig:
+    """Connection pool settings, read from HTTPX_* env vars.
+
+    Each setting can be overridden per provider, e.g. AZURE_HTTPX_MAX_CONNECTIONS.
+    """
+
+    def __init__(self, max_connections: int = 100, max_keepalive_connections: int = 20,
+                 keepalive_expiry: float = 30.0, http2: bool = False, timeout: float = 600.0):
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.http2 = http2
+        self.timeout = timeout
+
+    @classmethod
+    def from_env(cls, provider_name: str) -> "EngineConfig":
+        def setting(name, default):
+            return os.getenv(f"{provider_name.upper()}_HTTPX_{name}", os.getenv(f"HTTPX_{name}", default))
+
+        return cls(
+            max_connections=int(setting("MAX_CONNECTIONS", "100")),
+            max_keepalive_connections=int(setting("MAX_KEEPALIVE", "20")),
+            keepalive_expiry=float(setting("KEEPALIVE_EXPIRY", "30")),
+            http2=setting("HTTP2", "false").lower() in ("1", "true", "yes"),
+            timeout=float(setting("TIMEOUT", "600")),
+        )
+
+
+def _to_namespace(value: Any) -> Any:
+    """Give parsed JSON chunks the attribute access handle_streaming expects."""
+    if isinstance(value, dict):
+        return SimpleNamespace(**{key: _to_namespace(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return [_to_namespace(item) for item in value]
+    return value
+
+
+def _to_openai_content(blocks):
+    """Convert Anthropic-style content blocks to OpenAI content parts."""
+    parts = []
+    for block in blocks:
+        if not isinstance(block, dict):
+            parts.append({"type": "text", "text": str(block)})
+            continue
+        block_type = block.get("type")
+        if block_type == "text":
+            parts.append({"type": "text", "text": block.get("text", "")})
+        elif block_type == "image":
+            source = block.get("source", {})
+            if source.get("type") == "base64":
+                url = f"data:{source.get('media_type', 'image/png')};base64,{source.get('data', '')}"
+            else:
+                url = source.get("url", "")
+            parts.append({"type": "image_url", "image_url": {"url": url}})
+        elif block_type == "tool_use":
+            parts.append({
+                "type": "text",
+                "text": f"[Tool: {block.get('name', 'unknown')} (ID: {block.get('id', 'unknown')})]\n"
+                        f"Input: {json_backend.dumps(block.get('input', {}))}"
+            })
+        elif block_type == "tool_result":
+            content = block.get("content", "")
+            if isinstance(content, list):
+                text = "\n".join(
+                    item.get("text", json_backend.dumps(item)) if isinstance(item, dict) else str(item)
+                    for item in content
+                )
+            else:
+                text = content if isinstance(content, str) else json_backend.dumps(content)
+            parts.append({"type": "text", "text": f"[Tool Result ID: {block.get('tool_use_id', 'unknown')}]\n{text}"})
+    return parts
+
+
+def build_openai_body(litellm_request: Dict[str, Any]) -> Dict[str, Any]:
+    """Turn a LiteLLM request dict into an OpenAI chat completions body."""
+    body = {key: value for key, value in litellm_request.items() if key not in _LITELLM_ONLY_KEYS}
+    model = body.get("model", "")
+    if "/" in model:
+        body["model"] = model.split("/", 1)[1]
+
+    messages = []
+    for msg in body.get("messages", []):
+        content = msg.get("content")
+        if isinstance(content, list):
+            msg = {**msg, "content": _to_openai_content(content) or "..."}
+        messages.append(msg)
+    body["messages"] = messages
+
+    # Anthropic's "any" maps to OpenAI's "required"
+    if body.get("tool_choice") == "any":
+        body["tool_choice"] = "required"
+    if body.get("stream"):
+        body["stream_options"] = {"include_usage": True}
+    return body
+
+
+class HttpxEngine:
+    """Sends OpenAI-format requests to one provider over a pooled httpx.AsyncClient."""
+
+    def __init__(self, provider, config: Optional[EngineConfig] = None):
+        self.provider = provider
+        self.config = config or EngineConfig.from_env(provider.name)
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """The provider's long-lived client, created on first use."""
+        if self._client is None or self._client.is_closed:
+            http2 = self.config.http2
+            if http2:
+                try:
+                    import h2  # noqa: F401
+                except ImportError:
+                    logger.warning("HTTP/2 requested but the 'h2' package is not installed, using HTTP/1.1")
+                    http2 = False
+            self._client = httpx.AsyncClient(
+                http2=http2,
+                timeout=httpx.Timeout(self.config.timeout, connect=10.0),
+                limits=httpx.Limits(
+                    max_connections=self.config.max_connections,
+                    max_keepalive_connections=self.config.max_keepalive_connections,
+                    keepalive_expiry=self.config.keepalive_expiry,
+                ),
+            )
+        return self._client
+
+    async def acompletion(self, litellm_request: Dict[str, Any], endpoint=None):
+        """Send the request, to one endpoint of the provider's pool if given.
+
+        Returns a dict, or an async iterator of chunks when streaming.
+        """
+        body = build_openai_body(litellm_request)
+        url, headers = self.provider.get_direct_endpoint(body["model"], endpoint)
+        headers = {**headers, "Content-Type": "application/json"}
+        request = self.client.build_request("POST", url, headers=headers, content=json_backend.dumpb(body))
+        response = await self.client.send(request, stream=bool(body.get("stream")))
+
+        if response.status_code >= 400:
+            await response.aread()
+            await response.aclose()
+            raise UpstreamError(response.status_code, response.text, self.provider.name)
+
+        if not body.get("stream"):
+            return json_backend.loads(response.content)
+        return self._iter_chunks(response)
+
+    async def _iter_chunks(self, response: httpx.Response):
+        lines = response.aiter_lines()
+        finished = False
+        try:
+            async for line in lines:
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    continue
+                chunk = json_backend.loads(data)
+                if any(choice.get("finish_reason") for choice in chunk.get("choices") or []):
+                    finished = True
+                yield _to_namespace(chunk)
+        finally:
+            # Consumers stop at finish_reason; read the short tail (usage chunk,
+            # [DONE]) so the connection goes back to the pool instead of closing.
+            if finished:
+                try:
+                    async for _ in lines:
+                        pass
+                except httpx.HTTPError:
+                    pass
+            await response.aclose()
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
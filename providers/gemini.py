@@ -2,12 +2,15 @@
 Google Gemini provider implementation.
 """
 import os
-from typing import Dict, Any, List
-from .base import BaseProvider
+from typing import Dict, Any, List, Optional, Tuple
+from .base import BaseProvider, Capabilities
+from .pool import Endpoint, EndpointPool
 
 class GeminiProvider(BaseProvider):
     """Google Gemini API provider."""
     
+    capabilities = Capabilities(max_tokens_limit=16384, clean_tool_schemas=True)
+    
     def __init__(self):
         super().__init__("gemini", "gemini")
         self.api_key = os.getenv("GEMINI_API_KEY")
@@ -15,10 +18,11 @@ class GeminiProvider(BaseProvider):
             "gemini-2.5-pro-preview-03-25",
             "gemini-2.0-flash"
         ]
+        self.endpoint_pool = EndpointPool.from_env(self.name, self.api_key)
     
     def is_available(self) -> bool:
         """Check if Gemini API key is available."""
-        return bool(self.api_key)
+        return bool(self.api_key) or self.endpoint_pool is not None
     
     def get_default_models(self) -> Dict[str, str]:
         """Get default Gemini models."""
@@ -31,9 +35,19 @@ class GeminiProvider(BaseProvider):
         """Get list of supported Gemini models."""
         return self.supported_models
     
-    def configure_request(self, request: Dict[str, Any]) -> Dict[str, Any]:
-        """Configure request for Gemini."""
+    def configure_request(self, request: Dict[str, Any], endpoint: Optional[Endpoint] = None) -> Dict[str, Any]:
+        """Configure request for Gemini, or for one endpoint of the endpoint pool."""
         request["api_key"] = self.api_key
+        if endpoint is not None:
+            endpoint.apply(request)
         
-        self.logger.debug(f"Configured Gemini request for model: {request.get('model')}")
-        return request
\ No newline at end of file
+        self.logger.debug("Configured Gemini request for model: %s", request.get('model'))
+        return request
+    
+    def get_direct_endpoint(self, model: str, endpoint: Optional[Endpoint] = None) -> Tuple[str, Dict[str, str]]:
+        """Get Gemini's OpenAI-compatible chat completions endpoint."""
+        base = os.getenv("GEMINI_API_BASE", "https://generativelanguage.googleapis.com/v1beta/openai")
+        api_key = self.api_key
+        if endpoint is not None:
+            base, api_key = endpoint.api_base, endpoint.api_key or api_key
+        return f"{base.rstrip('/')}/chat/completions", {"Authorization": f"Bearer {api_key}"}
\ No newline at end of file
@@ -0,0 +1,388 @@
+"""
+Health scoring and circuit breakers for providers and pool endpoints.
+
+Every upstream call is recorded against its provider and, with an endpoint
+pool, against the endpoint it went to. A tracker keeps the outcomes of a
+rolling window (error rate, latency percentiles) and runs a circuit breaker:
+
+  closed     requests flow; too many failures open the breaker, either
+             consecutive_failures in a row or error_rate over the window
+             once it holds at least min_requests calls
+  open       requests are refused immediately, for cooldown seconds
+  half_open  one probe request is let through; success closes the breaker,
+             failure opens it again
+
+Only failures that say something about the backend count: timeouts,
+connection errors, 429 and 5xx. Client errors (other 4xx) and cancelled
+requests are neutral.
+
+With several workers, SharedHealthTracker keeps the breaker and its window in
+the shared state file (proxy/shared_state.py), so they trip and recover once
+for all workers.
+"""
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, NamedTuple, Optional, Tuple
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class BreakerConfig(NamedTuple):
+    """Circuit breaker thresholds, read from CIRCUIT_BREAKER_* env vars."""
+    enabled: bool = True
+    window: float = 60.0  # Seconds of outcomes kept for the error rate and latency
+    min_requests: int = 10  # Calls in the window before the error rate can trip the breaker
+    error_rate: float = 0.5
+    consecutive_failures: int = 5
+    cooldown: float = 30.0  # Seconds open before a probe is let through
+    max_samples: int = 1000
+
+    @classmethod
+    def from_env(cls) -> "BreakerConfig":
+        return cls(
+            enabled=os.getenv("CIRCUIT_BREAKER", "true").lower() in ("1", "true", "yes"),
+            window=float(os.getenv("CIRCUIT_BREAKER_WINDOW", "60")),
+            min_requests=int(os.getenv("CIRCUIT_BREAKER_MIN_REQUESTS", "10")),
+            error_rate=float(os.getenv("CIRCUIT_BREAKER_ERROR_RATE", "0.5")),
+            consecutive_failures=int(os.getenv("CIRCUIT_BREAKER_CONSECUTIVE_FAILURES", "5")),
+            cooldown=float(os.getenv("CIRCUIT_BREAKER_COOLDOWN", "30")),
+        )
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a backend whose circuit breaker is open.
+
+    Carries the same attributes as LiteLLM exceptions so create_message
+    reports it as a 503.
+    """
+
+    def __init__(self, name: str, retry_in: float):
+        self.status_code = 503
+        self.llm_provider = name
+        self.message = f"{name} is unhealthy (circuit breaker open), retry in {retry_in:.0f}s"
+        super().__init__(self.message)
+
+
+def is_backend_failure(error: BaseException) -> bool:
+    """Whether an error counts against the backend's health."""
+    if not isinstance(error, Exception):
+        # Cancellation: the client went away
+        return False
+    status_code = getattr(error, "status_code", None)
+    if isinstance(status_code, int):
+        return status_code in (408, 429) or status_code >= 500
+    return not isinstance(error, (ValueError, TypeError))
+
+
+class HealthTracker:
+    """Rolling health figures and circuit breaker for one backend."""
+
+    def __init__(self, name: str, config: BreakerConfig = BreakerConfig()):
+        self.name = name
+        self.config = config
+        self._samples: Deque[Tuple[float, bool, Optional[float]]] = deque(maxlen=config.max_samples)
+        self._state = CLOSED
+        self.opened_at = 0.0
+        self.consecutive_failures = 0
+        self.probe_in_flight = False
+        self.successes = 0
+        self.failures = 0
+        self.rejected = 0
+        self.times_opened = 0
+
+    def state(self, now: Optional[float] = None) -> str:
+        if self._state == OPEN and (now or time.monotonic()) - self.opened_at >= self.config.cooldown:
+            self._state = HALF_OPEN
+            self.probe_in_flight = False
+        return self._state
+
+    def try_acquire(self, now: Optional[float] = None) -> bool:
+        """Whether a request may go to this backend; in half_open this claims the probe."""
+        if not self.config.enabled:
+            return True
+        state = self.state(now)
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and not self.probe_in_flight:
+            self.probe_in_flight = True
+            return True
+        self.rejected += 1
+        return False
+
+    def retry_in(self, now: Optional[float] = None) -> float:
+        return max(0.0, self.opened_at + self.config.cooldown - (now or time.monotonic()))
+
+    def record(self, ok: Optional[bool], latency: Optional[float] = None, now: Optional[float] = None):
+        """Record an outcome: True for success, False for a backend failure, None for neutral."""
+        now = now or time.monotonic()
+        state = self.state(now)
+        if ok is None:
+            if state == HALF_OPEN:
+                self.probe_in_flight = False
+            return
+
+        self._add_sample(now, ok, latency)
+        if ok:
+            self.successes += 1
+            self.consecutive_failures = 0
+            if state == HALF_OPEN:
+                self._close()
+            return
+
+        self.failures += 1
+        self.consecutive_failures += 1
+        if state == HALF_OPEN:
+            self._open(now)
+        elif state == CLOSED and self._should_trip(now):
+            self._open(now)
+
+    def _should_trip(self, now: float) -> bool:
+        if self.consecutive_failures >= self.config.consecutive_failures:
+            return True
+        samples = self._window(now)
+        if len(samples) < self.config.min_requests:
+            return False
+        return sum(1 for _, ok, _ in samples if not ok) / len(samples) >= self.config.error_rate
+
+    def _add_sample(self, now: float, ok: bool, latency: Optional[float]):
+        self._samples.append((now, ok, latency))
+
+    def _window(self, now: float) -> List[Tuple[float, bool, Optional[float]]]:
+        while self._samples and self._samples[0][0] < now - self.config.window:
+            self._samples.popleft()
+        return list(self._samples)
+
+    def _clear_samples(self):
+        self._samples.clear()
+
+    def _open(self, now: float):
+        self._state = OPEN
+        self.opened_at = now
+        self.probe_in_flight = False
+        self.times_opened += 1
+
+    def _close(self):
+        self._state = CLOSED
+        self.probe_in_flight = False
+        self.consecutive_failures = 0
+        self._clear_samples()
+
+    def reset(self):
+        """Close the breaker and forget the window, e.g. after fixing a misconfigured backend."""
+        self._close()
+
+    def snapshot(self, now: Optional[float] = None) -> Dict[str, Any]:
+        now = now or time.monotonic()
+        state = self.state(now)
+        samples = self._window(now)
+        latencies = sorted(latency for _, ok, latency in samples if ok and latency is not None)
+
+        def percentile(p):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] * 1000, 1)
+
+        errors = sum(1 for _, ok, _ in samples if not ok)
+        return {
+            "state": state,
+            "requests_in_window": len(samples),
+            "error_rate": round(errors / len(samples), 3) if samples else 0.0,
+            "latency_ms": {"p50": percentile(50), "p95": percentile(95), "p99": percentile(99)},
+            "consecutive_failures": self.consecutive_failures,
+            "retry_in_s": round(self.retry_in(now), 1) if state == OPEN else None,
+            "successes": self.successes,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "times_opened": self.times_opened,
+        }
+
+
+class SharedHealthTracker(HealthTracker):
+    """A HealthTracker whose breaker and window are kept in SharedState, for all workers.
+
+    Checks of the breaker state use the row read at most refresh seconds ago.
+    Anything that changes it (a failure, claiming the half_open probe, a
+    rejection, a reset) reads and writes the row in one transaction, so only
+    one worker probes a recovering backend. Successes and neutral outcomes
+    while closed change nothing another worker acts on, so successes are
+    saved in batches, at most every refresh seconds, and neutral outcomes not
+    at all. When the file is busy (shared.Busy is raised), the row as last read
+    decides, and this worker keeps its own copy until it can save it.
+    """
+
+    def __init__(self, name: str, config: BreakerConfig = BreakerConfig(), shared=None, refresh: float = 0.25):
+        super().__init__(name, config)
+        self.shared = shared
+        self.refresh = refresh
+        self._loaded_at: Optional[float] = None
+        self._saved_at = 0.0
+        # Outcomes not in the file yet, whether the window was cleared since the last save,
+        # and whether the breaker was changed while the file was busy
+        self._unsaved: List[Tuple[float, bool, Optional[float]]] = []
+        self._cleared = False
+        self._dirty = False
+
+    def _load(self, now: float):
+        if self._dirty:
+            return
+        fields = self.shared.breaker(self.name)
+        if fields is None:
+            fields = {"state": CLOSED, "opened_at": 0.0, "probe_in_flight": 0, "consecutive_failures": 0,
+                      "successes": 0, "failures": 0, "rejected": 0, "times_opened": 0}
+        self._state = fields["state"]
+        self.opened_at = fields["opened_at"]
+        self.probe_in_flight = bool(fields["probe_in_flight"])
+        self.consecutive_failures = fields["consecutive_failures"]
+        self.successes = fields["successes"]
+        self.failures = fields["failures"]
+        self.rejected = fields["rejected"]
+        self.times_opened = fields["times_opened"]
+        for _, ok, _ in self._unsaved:
+            if ok:
+                self.successes += 1
+                self.consecutive_failures = 0
+            else:
+                self.failures += 1
+                self.consecutive_failures += 1
+        self._loaded_at = now
+
+    def _save(self, now: float):
+        self.shared.save_breaker(self.name, {
+            "state": self._state, "opened_at": self.opened_at, "probe_in_flight": int(self.probe_in_flight),
+            "consecutive_failures": self.consecutive_failures, "successes": self.successes,
+            "failures": self.failures, "rejected": self.rejected, "times_opened": self.times_opened,
+        })
+        if self._cleared:
+            self.shared.clear_samples(self.name)
+        self.shared.add_samples(self.name, self._unsaved, self.config.window)
+        self._unsaved = []
+        self._cleared = False
+        self._dirty = False
+        self._saved_at = now
+
+    def _change(self, now: float, change, *args):
+        """Apply a change to the shared row; when the file is busy, to the row as last read."""
+        try:
+            with self.shared.transaction():
+                self._load(now)
+                result = change(self, *args)
+                self._save(now)
+                return result
+        except self.shared.Busy:
+            self._dirty = True
+            return change(self, *args)
+
+    def state(self, now: Optional[float] = None) -> str:
+        now = now or time.monotonic()
+        if self._dirty:
+            self._flush(now)
+        elif self._loaded_at is None or now - self._loaded_at >= self.refresh:
+            self._load(now)
+        return super().state(now)
+
+    def try_acquire(self, now: Optional[float] = None) -> bool:
+        if not self.config.enabled:
+            return True
+        now = now or time.monotonic()
+        if self.state(now) == CLOSED:
+            return True
+        return self._change(now, HealthTracker.try_acquire, now)
+
+    def record(self, ok: Optional[bool], latency: Optional[float] = None, now: Optional[float] = None):
+        now = now or time.monotonic()
+        state = self.state(now)
+        if ok is None and state != HALF_OPEN:
+            return
+        if ok and state == CLOSED:
+            HealthTracker.record(self, ok, latency, now)
+            if now - self._saved_at >= self.refresh:
+                self._flush(now)
+            return
+        self._change(now, HealthTracker.record, ok, latency, now)
+
+    def _flush(self, now: float):
+        self._change(now, lambda tracker: None)
+
+    def reset(self):
+        self._change(time.monotonic(), HealthTracker.reset)
+
+    def snapshot(self, now: Optional[float] = None) -> Dict[str, Any]:
+        now = now or time.monotonic()
+        if self._unsaved:
+            self._flush(now)
+        else:
+            self._load(now)
+        return super().snapshot(now)
+
+    def _add_sample(self, now: float, ok: bool, latency: Optional[float]):
+        self._unsaved.append((now, ok, latency))
+
+    def _window(self, now: float) -> List[Tuple[float, bool, Optional[float]]]:
+        saved = [] if self._cleared else self.shared.samples(self.name, now - self.config.window,
+                                                            self.config.max_samples)
+        return (saved + [sample for sample in self._unsaved if sample[0] >= now - self.config.window])[
+            -self.config.max_samples:]
+
+    def _clear_samples(self):
+        self._unsaved = []
+        self._cleared = True
+
+
+class UpstreamAttempt:
+    """One upstream call: the endpoint it holds and the trackers its outcome goes to."""
+
+    def __init__(self, trackers: List[HealthTracker], pool=None, endpoint=None):
+        self.trackers = trackers
+        self.pool = pool
+        self.endpoint = endpoint
+        self.started = time.monotonic()
+        self.latency: Optional[float] = None
+        self.finished = False
+
+    def responded(self):
+        """Upstream started answering (first chunk, or the whole response)."""
+        if self.latency is None:
+            self.latency = time.monotonic() - self.started
+            if self.pool is not None:
+                self.pool.observe(self.endpoint, self.latency)
+
+    def abandon(self):
+        """The call never reached upstream (e.g. shed by admission control): neutral outcome."""
+        if self.finished:
+            return
+        self.finished = True
+        for tracker in self.trackers:
+            tracker.record(None)
+        if self.pool is not None:
+            self.pool.release(self.endpoint)
+
+    def finish(self, error: Optional[BaseException] = None):
+        if self.finished:
+            return
+        self.finished = True
+        failed = error is not None and is_backend_failure(error)
+        ok = None if error is not None and not failed else not failed
+        for tracker in self.trackers:
+            tracker.record(ok, self.latency)
+        if self.pool is not None:
+            self.pool.release(self.endpoint, failed)
+
+    async def track_stream(self, stream: AsyncIterator[Any]) -> AsyncIterator[Any]:
+        """Pass a stream through, finishing the attempt when the stream ends."""
+        error = None
+        try:
+            async for chunk in stream:
+                self.responded()
+                yield chunk
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            if error is None and self.latency is None:
+                # Closed by the consumer before any chunk arrived
+                error = asyncio.CancelledError()
+            self.finish(error)
@@ -2,12 +2,15 @@
 OpenAI provider implementation.
 """
 import os
-from typing import Dict, Any, List
-from .base import BaseProvider
+from typing import Dict, Any, List, Optional, Tuple
+from .base import BaseProvider, Capabilities
+from .pool import Endpoint, EndpointPool
 
 class OpenAIProvider(BaseProvider):
     """OpenAI API provider."""
     
+    capabilities = Capabilities(flatten_content=True, max_tokens_limit=16384)
+    
     def __init__(self):
         super().__init__("openai", "openai")
         self.api_key = os.getenv("OPENAI_API_KEY")
@@ -25,10 +28,11 @@ class OpenAIProvider(BaseProvider):
             "gpt-4.1",
             "gpt-4.1-mini"
         ]
+        self.endpoint_pool = EndpointPool.from_env(self.name, self.api_key)
     
     def is_available(self) -> bool:
         """Check if OpenAI API key is available."""
-        return bool(self.api_key)
+        return bool(self.api_key) or self.endpoint_pool is not None
     
     def get_default_models(self) -> Dict[str, str]:
         """Get default OpenAI models."""
@@ -41,9 +45,19 @@ class OpenAIProvider(BaseProvider):
         """Get list of supported OpenAI models."""
         return self.supported_models
     
-    def configure_request(self, request: Dict[str, Any]) -> Dict[str, Any]:
-        """Configure request for OpenAI."""
+    def configure_request(self, request: Dict[str, Any], endpoint: Optional[Endpoint] = None) -> Dict[str, Any]:
+        """Configure request for OpenAI, or for one endpoint of the endpoint pool."""
         request["api_key"] = self.api_key
+        if endpoint is not None:
+            endpoint.apply(request)
         
-        self.logger.debug(f"Configured OpenAI request for model: {request.get('model')}")
-        return request
\ No newline at end of file
+        self.logger.debug("Configured OpenAI request for model: %s", request.get('model'))
+        return request
+    
+    def get_direct_endpoint(self, model: str, endpoint: Optional[Endpoint] = None) -> Tuple[str, Dict[str, str]]:
+        """Get the OpenAI chat completions endpoint."""
+        base = os.getenv("OPENAI_API_BASE") or os.getenv("OPENAI_BASE_URL") or "https://api.openai.com/v1"
+        api_key = self.api_key
+        if endpoint is not None:
+            base, api_key = endpoint.api_base, endpoint.api_key or api_key
+        return f"{base.rstrip('/')}/chat/completions", {"Authorization": f"Bearer {api_key}"}
\ No newline at end of file
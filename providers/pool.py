@@ -0,0 +1,168 @@
+"""
+Weighted pools of upstream endpoints for one provider.
+
+A provider normally talks to a single endpoint with a single key, so its
+throughput is capped by that deployment's rate limits. A pool spreads requests
+over several endpoints (Azure resources, deployments, proxies in front of
+OpenAI, ...), each with its own credentials and a weight.
+
+Configured per provider with a JSON list in {NAME}_ENDPOINTS, e.g.
+
+  AZURE_ENDPOINTS='[
+    {"api_base": "https://east.openai.azure.com", "api_key": "...", "weight": 2},
+    {"api_base": "https://west.openai.azure.com", "api_key": "...",
+     "deployments": {"gpt-4o": "gpt-4o-west"}}
+  ]'
+
+api_key and api_version default to the provider's own settings. deployments
+renames models for endpoints whose deployment names differ. rpm and tpm are
+the endpoint's rate limits, enforced by admission control (proxy/admission.py).
+
+Selection strategies ({NAME}_ENDPOINT_STRATEGY, or ENDPOINT_STRATEGY):
+  - least_outstanding (default): fewest requests in flight relative to weight
+  - ewma: peak-EWMA, i.e. the latency EWMA scaled by requests in flight, so
+    slow endpoints get less traffic until the fast ones queue up
+Ties go round-robin. Latency is the time until upstream starts answering:
+the first chunk for streams, the full response otherwise. Endpoints whose
+circuit breaker is open (see health.py) are skipped.
+"""
+import json
+import logging
+import os
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import urlparse
+
+logger = logging.getLogger("providers.pool")
+
+STRATEGIES = ("least_outstanding", "ewma")
+
+
+class Endpoint:
+    """One upstream endpoint and its live load figures."""
+
+    def __init__(self, name: str, api_base: str, api_key: Optional[str] = None, weight: float = 1.0,
+                 api_version: Optional[str] = None, deployments: Optional[Dict[str, str]] = None,
+                 rpm: Optional[float] = None, tpm: Optional[float] = None):
+        if weight <= 0:
+            raise ValueError(f"Endpoint {name} needs a positive weight, got {weight}")
+        self.name = name
+        self.api_base = api_base
+        self.api_key = api_key
+        self.weight = float(weight)
+        self.api_version = api_version
+        self.deployments = dict(deployments or {})
+        self.rpm = rpm
+        self.tpm = tpm
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.ewma: Optional[float] = None  # Seconds, None until the first response
+
+    def apply(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Point a LiteLLM request at this endpoint."""
+        request["api_base"] = self.api_base
+        if self.api_key is not None:
+            request["api_key"] = self.api_key
+        if self.api_version is not None:
+            request["api_version"] = self.api_version
+        prefix, slash, model = request.get("model", "").rpartition("/")
+        deployment = self.deployments.get(model)
+        if deployment is not None:
+            request["model"] = f"{prefix}{slash}{deployment}"
+        return request
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "api_base": self.api_base,
+            "weight": self.weight,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "failures": self.failures,
+            "latency_ewma_ms": round(self.ewma * 1000, 1) if self.ewma is not None else None,
+        }
+
+
+class EndpointPool:
+    """Picks an endpoint per request and tracks its load until the request ends."""
+
+    def __init__(self, endpoints: List[Endpoint], strategy: str = "least_outstanding", decay: float = 0.3):
+        """
+        Args:
+            endpoints: Pool members
+            strategy: least_outstanding or ewma
+            decay: Weight of the newest latency sample in the EWMA
+        """
+        if not endpoints:
+            raise ValueError("An endpoint pool needs at least one endpoint")
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown endpoint strategy {strategy!r}, expected one of {STRATEGIES}")
+        self.endpoints = endpoints
+        self.strategy = strategy
+        self.decay = decay
+        self._next = 0
+
+    @classmethod
+    def from_env(cls, provider_name: str, api_key: Optional[str] = None,
+                 api_version: Optional[str] = None) -> Optional["EndpointPool"]:
+        """Build the pool from {NAME}_ENDPOINTS; returns None when it is not set."""
+        raw = os.getenv(f"{provider_name.upper()}_ENDPOINTS")
+        if not raw:
+            return None
+        endpoints = []
+        for entry in json.loads(raw):
+            api_base = entry["api_base"]
+            endpoints.append(Endpoint(
+                name=entry.get("name") or urlparse(api_base).netloc or api_base,
+                api_base=api_base,
+                api_key=entry.get("api_key", api_key),
+                weight=entry.get("weight", 1.0),
+                api_version=entry.get("api_version", api_version),
+                deployments=entry.get("deployments"),
+                rpm=entry.get("rpm"),
+                tpm=entry.get("tpm"),
+            ))
+        strategy = os.getenv(f"{provider_name.upper()}_ENDPOINT_STRATEGY",
+                             os.getenv("ENDPOINT_STRATEGY", "least_outstanding")).lower()
+        logger.info("%s: pooling %d endpoints (%s)", provider_name, len(endpoints), strategy)
+        return cls(endpoints, strategy)
+
+    def _score(self, endpoint: Endpoint) -> float:
+        load = (endpoint.outstanding + 1) / endpoint.weight
+        if self.strategy == "ewma":
+            # Unmeasured endpoints score 0 so each gets tried once
+            return (endpoint.ewma or 0.0) * load
+        return load
+
+    def acquire(self, admit: Optional[Callable[[Endpoint], bool]] = None) -> Optional[Endpoint]:
+        """Pick the endpoint for a new request and count it as in flight.
+
+        Candidates are tried best score first; admit can turn one down (e.g.
+        an open circuit breaker). Returns None when every endpoint is refused.
+        """
+        count = len(self.endpoints)
+        order = sorted(range(count), key=lambda i: (self._score(self.endpoints[i]), (i - self._next) % count))
+        self._next = (self._next + 1) % count
+        for i in order:
+            endpoint = self.endpoints[i]
+            if admit is None or admit(endpoint):
+                endpoint.outstanding += 1
+                endpoint.requests += 1
+                return endpoint
+        return None
+
+    def observe(self, endpoint: Endpoint, latency: float):
+        """Feed a latency sample into the endpoint's EWMA."""
+        if endpoint.ewma is None:
+            endpoint.ewma = latency
+        else:
+            endpoint.ewma += self.decay * (latency - endpoint.ewma)
+
+    def release(self, endpoint: Endpoint, failed: bool = False):
+        """Mark a request as finished."""
+        endpoint.outstanding -= 1
+        if failed:
+            endpoint.failures += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {"strategy": self.strategy, "endpoints": [endpoint.snapshot() for endpoint in self.endpoints]}
@@ -8,6 +8,8 @@ from .openai import OpenAIProvider
 from .gemini import GeminiProvider
 from .azure import AzureOpenAIProvider
 from .anthropic import AnthropicProvider
+from .routing import ModelRouter
+from .health import OPEN, BreakerConfig, CircuitOpenError, HealthTracker, SharedHealthTracker, UpstreamAttempt
 
 class ProviderRegistry:
     """Registry for managing AI model providers."""
@@ -15,6 +17,11 @@ class ProviderRegistry:
     def __init__(self):
         self.providers: Dict[str, BaseProvider] = {}
         self.logger = logging.getLogger("providers.registry")
+        self._router: Optional[ModelRouter] = None
+        self.breaker_config = BreakerConfig.from_env()
+        # Keyed by provider name, and "provider/endpoint" for pool endpoints
+        self.health: Dict[str, HealthTracker] = {}
+        self.shared_state = None
         self._register_default_providers()
     
     def _register_default_providers(self):
@@ -32,7 +39,8 @@ class ProviderRegistry:
     def register_provider(self, provider: BaseProvider):
         """Register a new provider."""
         self.providers[provider.name] = provider
-        self.logger.debug(f"Registered provider: {provider.name}")
+        self._router = None
+        self.logger.debug("Registered provider: %s", provider.name)
     
     def get_provider(self, name: str) -> Optional[BaseProvider]:
         """Get a provider by name."""
@@ -45,8 +53,84 @@ class ProviderRegistry:
         return self.get_provider(preferred)
     
     def get_available_providers(self) -> List[BaseProvider]:
-        """Get all available providers (those with valid credentials)."""
-        return [provider for provider in self.providers.values() if provider.is_available()]
+        """Get all available providers (valid credentials and not shut out by circuit breakers)."""
+        return [
+            provider for provider in self.providers.values()
+            if provider.is_available() and self.is_healthy(provider)
+        ]
+    
+    def health_for(self, provider_name: str, endpoint_name: Optional[str] = None) -> HealthTracker:
+        """The health tracker of a provider, or of one endpoint in its pool."""
+        key = f"{provider_name}/{endpoint_name}" if endpoint_name else provider_name
+        tracker = self.health.get(key)
+        if tracker is None:
+            if self.shared_state is not None:
+                tracker = SharedHealthTracker(key, self.breaker_config, self.shared_state)
+            else:
+                tracker = HealthTracker(key, self.breaker_config)
+            self.health[key] = tracker
+        return tracker
+    
+    def use_shared_state(self, shared_state):
+        """Keep breakers and health windows in a SharedState (proxy/shared_state.py), shared by all workers."""
+        self.shared_state = shared_state
+        self.health = {}
+    
+    def is_healthy(self, provider: BaseProvider) -> bool:
+        """Whether a provider can take traffic: its breaker, or any pool endpoint's, is not open."""
+        if provider.endpoint_pool is None:
+            return self.health_for(provider.name).state() != OPEN
+        return any(
+            self.health_for(provider.name, endpoint.name).state() != OPEN
+            for endpoint in provider.endpoint_pool.endpoints
+        )
+    
+    def start_call(self, provider: BaseProvider) -> UpstreamAttempt:
+        """
+        Admit an upstream call to a provider, picking a healthy endpoint from its pool.
+        
+        Pooled providers are tracked per endpoint only, so one failing endpoint
+        does not shut out the healthy ones.
+        
+        Raises:
+            CircuitOpenError: The provider's breaker is open, or every endpoint's is
+        """
+        pool = provider.endpoint_pool
+        if pool is None:
+            tracker = self.health_for(provider.name)
+            if not tracker.try_acquire():
+                raise CircuitOpenError(provider.name, tracker.retry_in())
+            return UpstreamAttempt([tracker])
+        
+        endpoint = pool.acquire(lambda e: self.health_for(provider.name, e.name).try_acquire())
+        if endpoint is None:
+            retry_in = min(self.health_for(provider.name, e.name).retry_in() for e in pool.endpoints)
+            raise CircuitOpenError(f"{provider.name} (all endpoints)", retry_in)
+        return UpstreamAttempt([self.health_for(provider.name, endpoint.name)], pool, endpoint)
+    
+    def health_report(self) -> Dict[str, Dict]:
+        """Breaker state, error rate and latency for each provider in use, and its pool endpoints."""
+        tracked = {key.partition("/")[0] for key in self.health}
+        report = {}
+        for provider in self.providers.values():
+            if not provider.is_available() and provider.name not in tracked:
+                continue
+            entry = {"healthy": self.is_healthy(provider)}
+            if provider.endpoint_pool is None:
+                entry.update(self.health_for(provider.name).snapshot())
+            else:
+                entry["endpoints"] = {
+                    endpoint.name: self.health_for(provider.name, endpoint.name).snapshot()
+                    for endpoint in provider.endpoint_pool.endpoints
+                }
+            report[provider.name] = entry
+        return report
+    
+    def reset_health(self, provider_name: Optional[str] = None):
+        """Close the breakers of one provider (and its endpoints), or of all."""
+        for key, tracker in self.health.items():
+            if provider_name is None or key.partition("/")[0] == provider_name:
+                tracker.reset()
     
     def get_provider_by_model(self, model: str) -> Optional[BaseProvider]:
         """Get the provider for a specific model based on prefix."""
@@ -57,10 +141,25 @@ class ProviderRegistry:
                     return provider
         return None
     
+    @property
+    def router(self) -> ModelRouter:
+        """The model routing table, built on first use from the providers and env."""
+        if self._router is None:
+            self._router = ModelRouter.from_registry(self)
+        return self._router
+    
+    def reload_router(self) -> ModelRouter:
+        """Rebuild the routing table, e.g. after the routing env settings change."""
+        self._router = None
+        return self.router
+    
     def map_model(self, model: str) -> tuple[str, BaseProvider]:
         """
         Map a model name to a provider and return the mapped model and provider.
         
+        Names with a provider prefix are used as given, so "openai/claude-3-haiku"
+        is not remapped to SMALL_MODEL; other names go through the router.
+        
         Returns:
             tuple: (mapped_model, provider)
         """
@@ -69,13 +168,10 @@ class ProviderRegistry:
         if provider:
             return model, provider
         
-        # Map common model names to providers
-        if model.lower() in ["sonnet", "haiku"]:
-            preferred = self.get_preferred_provider()
-            if preferred and preferred.is_available():
-                model_type = "big" if model.lower() == "sonnet" else "small"
-                mapped_model = preferred.map_model(model, model_type)
-                return mapped_model, preferred
+        route = self.router.resolve(model)
+        provider = self.get_provider(route.provider) if route.provider else None
+        if provider:
+            return route.model, provider
         
         # Default to first available provider
         available = self.get_available_providers()
@@ -101,6 +197,11 @@ class ProviderRegistry:
     def get_available_provider_names(self) -> List[str]:
         """Get names of available providers."""
         return [provider.name for provider in self.get_available_providers()]
+    
+    async def aclose(self):
+        """Close pooled upstream connections for all providers."""
+        for provider in self.providers.values():
+            await provider.aclose()
 
 # Global registry instance
 registry = ProviderRegistry()
\ No newline at end of file
@@ -0,0 +1,168 @@
+"""
+Model routing table.
+
+Resolves the model name a client asks for (a Claude model, a bare OpenAI or
+Gemini model, or a provider-prefixed name) to the provider-prefixed model the
+proxy calls. The rules are evaluated once per distinct name: names built from
+the providers' model lists are resolved when the router is built, and any other
+name is resolved on first sight and memoized.
+
+Rules, in order:
+  - names containing "haiku" go to SMALL_MODEL, names containing "sonnet" to
+    BIG_MODEL, on the preferred provider (azure only when it is configured,
+    google only when the model is a known Gemini model, openai otherwise)
+  - known Gemini and OpenAI model names get their provider prefix
+  - anything else is passed through unchanged
+
+Fallback chains (FALLBACK_CHAINS) list the models to try, in order, when a
+backend fails, keyed by any name the router resolves, e.g.
+
+  FALLBACK_CHAINS='{"sonnet": ["azure/gpt-4.1", "openai/gpt-4.1", "gemini/gemini-2.5-pro"]}'
+
+Keys are resolved like requested names, so "sonnet" covers every name that
+routes to BIG_MODEL. Entries with a provider prefix are used as written, bare
+ones are resolved. A routed model missing from its chain is tried first.
+"""
+import json
+import logging
+import os
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger("providers.routing")
+
+
+class Route(NamedTuple):
+    """Where a requested model name goes."""
+    model: str  # Provider-prefixed model name sent upstream
+    provider: Optional[str]  # Registered provider name, None if the prefix is unknown
+    rule: str  # "small", "big", "known" or "passthrough"
+
+
+class ModelRouter:
+    """Precomputed, memoizing model name resolver."""
+
+    def __init__(self, prefixes: Dict[str, str], openai_models: Iterable[str], gemini_models: Iterable[str],
+                 preferred_provider: str, big_model: str, small_model: str, azure_available: bool,
+                 max_memoized: int = 4096, fallbacks: Optional[Dict[str, Iterable[str]]] = None):
+        """
+        Args:
+            prefixes: Provider prefix (without the slash) to provider name
+            openai_models: Bare model names that route to OpenAI
+            gemini_models: Bare model names that route to Gemini
+            preferred_provider: openai, google or azure
+            big_model: Model for sonnet-class requests
+            small_model: Model for haiku-class requests
+            azure_available: Whether Azure credentials are configured
+            max_memoized: Cap on names remembered beyond the precomputed table
+            fallbacks: Model name to the models to try in order when a backend fails
+        """
+        self.prefixes = dict(prefixes)
+        self.openai_models = frozenset(openai_models)
+        self.gemini_models = frozenset(gemini_models)
+        self.preferred_provider = preferred_provider
+        self.big_model = big_model
+        self.small_model = small_model
+        self.azure_available = azure_available
+        self.max_memoized = max_memoized
+
+        self._prefixes_with_slash = tuple(f"{prefix}/" for prefix in self.prefixes)
+        self.tiers = {"big": self._tier_route(big_model, "big"), "small": self._tier_route(small_model, "small")}
+
+        known = set(self.openai_models) | set(self.gemini_models) | {"haiku", "sonnet", big_model, small_model}
+        self._routes: Dict[str, Route] = {}
+        for name in sorted(known):
+            for candidate in (name, *(prefix + name for prefix in self._prefixes_with_slash)):
+                self._routes[candidate] = self._compute(candidate)
+        self.precomputed = len(self._routes)
+
+        self.fallbacks: Dict[str, Tuple[str, ...]] = {}
+        for name, chain in (fallbacks or {}).items():
+            models = tuple(dict.fromkeys(
+                entry if self._provider_for(entry) else self.resolve(entry).model for entry in chain
+            ))
+            if models:
+                self.fallbacks[self.resolve(name).model] = models
+
+    @classmethod
+    def from_registry(cls, registry) -> "ModelRouter":
+        """Build the router from the registry's providers and the routing env settings."""
+        openai = registry.get_provider("openai")
+        gemini = registry.get_provider("gemini")
+        azure = registry.get_provider("azure")
+        return cls(
+            prefixes={provider.prefix: name for name, provider in registry.providers.items()},
+            openai_models=openai.get_supported_models() if openai else (),
+            gemini_models=gemini.get_supported_models() if gemini else (),
+            preferred_provider=os.getenv("PREFERRED_PROVIDER", "openai").lower(),
+            big_model=os.getenv("BIG_MODEL", "gpt-4.1"),
+            small_model=os.getenv("SMALL_MODEL", "gpt-4.1-mini"),
+            azure_available=bool(azure and azure.is_available()),
+            fallbacks=json.loads(os.getenv("FALLBACK_CHAINS") or "{}"),
+        )
+
+    def _tier_route(self, model: str, tier: str) -> Route:
+        if self.preferred_provider == "azure" and self.azure_available:
+            return Route(f"azure/{model}", "azure", tier)
+        if self.preferred_provider == "google" and model in self.gemini_models:
+            return Route(f"gemini/{model}", "gemini", tier)
+        return Route(f"openai/{model}", "openai", tier)
+
+    def _provider_for(self, model: str) -> Optional[str]:
+        prefix, slash, _ = model.partition("/")
+        return self.prefixes.get(prefix) if slash else None
+
+    def _compute(self, name: str) -> Route:
+        clean = name
+        for prefix in self._prefixes_with_slash:
+            if clean.startswith(prefix):
+                clean = clean[len(prefix):]
+                break
+
+        lowered = clean.lower()
+        if "haiku" in lowered:
+            return self.tiers["small"]
+        if "sonnet" in lowered:
+            return self.tiers["big"]
+        if clean in self.gemini_models and not name.startswith("gemini/"):
+            return Route(f"gemini/{clean}", "gemini", "known")
+        if clean in self.openai_models and not name.startswith("openai/"):
+            return Route(f"openai/{clean}", "openai", "known")
+        return Route(name, self._provider_for(name), "passthrough")
+
+    def resolve(self, name: str) -> Route:
+        """Resolve a requested model name."""
+        route = self._routes.get(name)
+        if route is not None:
+            return route
+
+        route = self._compute(name)
+        if route.rule != "passthrough":
+            logger.debug("📌 MODEL MAPPING: '%s' ➡️ '%s'", name, route.model)
+        elif route.provider is None:
+            logger.warning("⚠️ No prefix or mapping rule for model: '%s'. Using as is.", name)
+        # Clients choose the names, so stop remembering new ones past the cap
+        if len(self._routes) < self.precomputed + self.max_memoized:
+            self._routes[name] = route
+        return route
+
+    def fallback_chain(self, model: str) -> Tuple[str, ...]:
+        """The models to try, in order, for a routed model."""
+        chain = self.fallbacks.get(model)
+        if chain is None:
+            return (model,)
+        if model in chain:
+            return chain
+        return (model, *chain)
+
+    def describe(self) -> Dict[str, object]:
+        """Routing configuration and every resolved name, for introspection."""
+        return {
+            "preferred_provider": self.preferred_provider,
+            "big_model": self.big_model,
+            "small_model": self.small_model,
+            "tiers": {tier: route._asdict() for tier, route in self.tiers.items()},
+            "fallbacks": {model: list(chain) for model, chain in self.fallbacks.items()},
+            "precomputed": self.precomputed,
+            "memoized": len(self._routes) - self.precomputed,
+            "routes": {name: route._asdict() for name, route in self._routes.items()},
+        }
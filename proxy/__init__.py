@@ -0,0 +1,3 @@
+"""
+Request and response processing for the Anthropic API proxy.
+"""
\ No newline at end of file
@@ -0,0 +1,395 @@
+"""
+Admission control against upstream rate limits.
+
+Upstream deployments enforce requests per minute (RPM) and tokens per minute
+(TPM). Sending past them only buys a 429, so calls are admitted through token
+buckets that mirror those limits, per provider ({NAME}_RPM, {NAME}_TPM) and
+per pool endpoint ("rpm"/"tpm" in {NAME}_ENDPOINTS). A call costs one request
+and its estimated tokens, the prompt plus max_tokens, which is how upstreams
+count a request against TPM when it arrives. Upstreams enforce the limits
+over short windows (Azure: 10 seconds' worth), so buckets hold burst_seconds
+of refill rather than a whole minute.
+
+A call that does not fit waits in a queue until the buckets refill, and queued
+calls are released in weighted fair order of priority class and client (see
+proxy/priority.py). A call is shed with OverloadedError (Anthropic's 529
+overloaded_error) instead when the queue is full, unless it would be released
+before the last call queued, which is shed in its place; or when it could not
+be admitted before its deadline, in which case it is shed at once rather than
+after waiting out the deadline.
+
+With SHARED_STATE_PATH the buckets are kept in the shared state file (see
+proxy/shared_state.py), so all workers together stay within the limits; each
+worker still queues and orders its own calls. When the file is busy (see
+SharedStateBusy), a worker admits from the levels it read last and saves what
+it took with its next update.
+"""
+import asyncio
+import os
+import time
+from collections import deque
+from contextlib import nullcontext
+from typing import Any, Deque, Dict, List, Optional
+
+from proxy.priority import FairQueue, Priority
+from proxy.shared_state import SharedStateBusy
+
+
+class OverloadedError(Exception):
+    """A call shed by admission control; reported to clients as overloaded_error."""
+
+    def __init__(self, name: str, reason: str, retry_after: float):
+        self.status_code = 529
+        self.llm_provider = name
+        self.retry_after = retry_after
+        self.message = f"{name} is over its rate limits ({reason}), retry in {retry_after:.0f}s"
+        super().__init__(self.message)
+
+
+class TokenBucket:
+    """A per-minute limit, refilled continuously, holding burst_seconds of refill."""
+
+    def __init__(self, per_minute: float, burst_seconds: float = 60.0, now: Optional[float] = None):
+        self.rate = float(per_minute) / 60.0
+        self.capacity = self.rate * burst_seconds
+        self.level = self.capacity
+        self.updated = now if now is not None else time.monotonic()
+
+    def _refill(self, now: float):
+        # now can trail updated by a hair when another worker updated a shared bucket
+        self.level = min(self.capacity, self.level + max(0.0, now - self.updated) * self.rate)
+        self.updated = max(self.updated, now)
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until amount is available; amounts over capacity wait for a full bucket."""
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing / self.rate)
+
+    def take(self, amount: float, now: float):
+        self._refill(now)
+        self.level -= amount
+
+    def available(self, now: float) -> int:
+        self._refill(now)
+        return int(self.level)
+
+    def give_back(self, amount: float, now: float):
+        self._refill(now)
+        self.level = min(self.capacity, self.level + amount)
+
+
+class SharedTokenBucket(TokenBucket):
+    """A TokenBucket whose level is kept in SharedState, drawn on by every worker."""
+
+    def __init__(self, shared, key: str, per_minute: float, burst_seconds: float = 60.0,
+                 now: Optional[float] = None):
+        super().__init__(per_minute, burst_seconds, now)
+        self.shared = shared
+        self.key = key
+        # Taken (less given back) while the file was busy, not saved yet
+        self.unsaved = 0.0
+
+    def _load(self):
+        row = self.shared.bucket(self.key)
+        if row is not None:
+            level, self.updated = row
+            self.level = min(self.capacity, level - self.unsaved)
+
+    def _change(self, change, amount: float, now: float, taken: float):
+        """Apply a change to the shared level; when the file is busy, to the level last read."""
+        try:
+            with self.shared.transaction():
+                self._load()
+                change(self, amount, now)
+                self.shared.save_bucket(self.key, self.level, self.updated)
+                self.unsaved = 0.0
+        except SharedStateBusy:
+            change(self, amount, now)
+            self.unsaved += taken
+
+    def wait_time(self, amount: float, now: float) -> float:
+        self._load()
+        return super().wait_time(amount, now)
+
+    def take(self, amount: float, now: float):
+        self._change(TokenBucket.take, amount, now, amount)
+
+    def available(self, now: float) -> int:
+        self._load()
+        return super().available(now)
+
+    def give_back(self, amount: float, now: float):
+        self._change(TokenBucket.give_back, amount, now, -amount)
+
+
+class _Waiter:
+    """A call queued on a RateLimiter, resolved by its dispatcher."""
+
+    __slots__ = ("tokens", "deadline", "priority", "future")
+
+    def __init__(self, tokens: int, deadline: float, priority: Priority, future: "asyncio.Future"):
+        self.tokens = tokens
+        self.deadline = deadline
+        self.priority = priority
+        self.future = future
+
+
+class RateLimiter:
+    """RPM/TPM buckets of one provider or endpoint, with its fair queue of waiting calls."""
+
+    def __init__(self, name: str, rpm: Optional[float] = None, tpm: Optional[float] = None,
+                 burst_seconds: float = 10.0, waits: int = 1000, shared=None):
+        self.name = name
+        self.rpm = rpm
+        self.tpm = tpm
+        self.shared = shared
+        if shared is not None:
+            self.requests = SharedTokenBucket(shared, f"{name}:rpm", rpm, burst_seconds) if rpm else None
+            self.tokens = SharedTokenBucket(shared, f"{name}:tpm", tpm, burst_seconds) if tpm else None
+        else:
+            self.requests = TokenBucket(rpm, burst_seconds) if rpm else None
+            self.tokens = TokenBucket(tpm, burst_seconds) if tpm else None
+        self.queue = FairQueue()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self.max_queued = 0
+        self.admitted = 0
+        self.shed = 0
+        self.waited = 0
+        self.wait_total = 0.0
+        self._waits: Deque[float] = deque(maxlen=waits)
+        self._classes: Dict[str, Dict[str, Any]] = {}
+        self._waits_per_class = waits
+
+    @property
+    def queued(self) -> int:
+        return len(self.queue)
+
+    def cost(self, tokens: int) -> float:
+        """What a call spends of this limiter's scarcer resource, for fair queuing."""
+        return float(tokens) if self.tokens is not None else 1.0
+
+    def wait_time(self, tokens: int, now: float) -> float:
+        wait = 0.0
+        if self.requests is not None:
+            wait = self.requests.wait_time(1, now)
+        if self.tokens is not None:
+            wait = max(wait, self.tokens.wait_time(tokens, now))
+        return wait
+
+    def take(self, tokens: int, now: float):
+        if self.requests is not None:
+            self.requests.take(1, now)
+        if self.tokens is not None:
+            self.tokens.take(tokens, now)
+
+    def try_take(self, tokens: int, now: float) -> float:
+        """Take a call's share if the buckets hold it, and return 0; else the seconds to wait.
+
+        With shared buckets, checking and taking is one transaction, so two
+        workers cannot both take the last of a bucket. When the file is busy,
+        the buckets as last read decide.
+        """
+        try:
+            with self.shared.transaction() if self.shared is not None else nullcontext():
+                return self._try_take(tokens, now)
+        except SharedStateBusy:
+            return self._try_take(tokens, now)
+
+    def _try_take(self, tokens: int, now: float) -> float:
+        wait = self.wait_time(tokens, now)
+        if wait <= 0:
+            self.take(tokens, now)
+        return wait
+
+    def give_back(self, tokens: int, now: float):
+        if self.requests is not None:
+            self.requests.give_back(1, now)
+        if self.tokens is not None:
+            self.tokens.give_back(tokens, now)
+
+    def _class(self, name: str) -> Dict[str, Any]:
+        counters = self._classes.get(name)
+        if counters is None:
+            counters = self._classes[name] = {"admitted": 0, "shed": 0, "waits": deque(maxlen=self._waits_per_class)}
+        return counters
+
+    def record_wait(self, seconds: float, queued: bool, priority: Priority):
+        self.admitted += 1
+        if queued:
+            self.waited += 1
+            self.wait_total += seconds
+        self._waits.append(seconds)
+        counters = self._class(priority.name)
+        counters["admitted"] += 1
+        counters["waits"].append(seconds)
+
+    def record_shed(self, priority: Priority):
+        self.shed += 1
+        self._class(priority.name)["shed"] += 1
+
+    def enqueue(self, waiter: _Waiter, max_queue: int):
+        """Queue a call, or shed it (or the call behind it in fair order) when the queue is full."""
+        flow = (waiter.priority.name, waiter.priority.flow)
+        cost = self.cost(waiter.tokens)
+        if len(self.queue) >= max_queue:
+            last_tag, last = self.queue.last()
+            if self.queue.tag(flow, waiter.priority.weight, cost) >= last_tag:
+                self.record_shed(waiter.priority)
+                raise OverloadedError(self.name, "queue full", self.wait_time(waiter.tokens, time.monotonic()))
+            # The newcomer would leave before the last call queued: that one makes room
+            self.queue.remove(last)
+            self.record_shed(last.priority)
+            last.future.set_exception(
+                OverloadedError(self.name, "queue full", self.wait_time(last.tokens, time.monotonic()))
+            )
+        self.queue.push(waiter, flow, waiter.priority.weight, cost)
+        self.max_queued = max(self.max_queued, len(self.queue))
+        if self._dispatcher is None:
+            self._dispatcher = asyncio.ensure_future(self._dispatch())
+
+    async def _dispatch(self):
+        """Admit queued calls in fair order as the buckets refill; runs while the queue is not empty."""
+        try:
+            while self.queue:
+                waiter = self.queue.peek()
+                now = time.monotonic()
+                wait = self.try_take(waiter.tokens, now)
+                if wait <= 0:
+                    self.queue.pop()
+                    waiter.future.set_result(None)
+                elif now + wait > waiter.deadline:
+                    # It could not be admitted in time, so shed it now rather than at its deadline
+                    self.queue.pop()
+                    self.record_shed(waiter.priority)
+                    waiter.future.set_exception(OverloadedError(self.name, "not admitted before the deadline", wait))
+                else:
+                    await asyncio.sleep(wait)
+        finally:
+            self._dispatcher = None
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "rpm": self.rpm,
+            "tpm": self.tpm,
+            "requests_available": self.requests.available(now) if self.requests else None,
+            "tokens_available": self.tokens.available(now) if self.tokens else None,
+            "queued": self.queued,
+            "max_queued": self.max_queued,
+            "admitted": self.admitted,
+            "waited": self.waited,
+            "shed": self.shed,
+            "wait_ms": {**_percentiles_ms(self._waits), "total": round(self.wait_total * 1000, 1)},
+            "classes": {
+                name: {"admitted": counters["admitted"], "shed": counters["shed"],
+                       "wait_ms": _percentiles_ms(counters["waits"])}
+                for name, counters in sorted(self._classes.items())
+            },
+        }
+
+
+def _percentiles_ms(samples) -> Dict[str, float]:
+    waits = sorted(samples)
+
+    def percentile(p):
+        if not waits:
+            return 0.0
+        return round(waits[min(len(waits) - 1, int(p / 100 * len(waits)))] * 1000, 1)
+
+    return {"p50": percentile(50), "p95": percentile(95), "p99": percentile(99)}
+
+
+class AdmissionController:
+    """Queues calls until the rate limits of their provider and endpoint allow them."""
+
+    def __init__(self, provider_limits: Dict[str, Dict[str, float]], timeout: float = 30.0, max_queue: int = 256,
+                 burst_seconds: float = 10.0, shared=None):
+        """
+        Args:
+            provider_limits: Provider name to {"rpm": ..., "tpm": ...}
+            timeout: Longest a call may wait to be admitted, in seconds
+            max_queue: Most calls waiting per limiter before new ones are shed
+            burst_seconds: Seconds of refill a bucket holds, i.e. the largest burst
+            shared: SharedState to keep the buckets in, so workers share the limits
+        """
+        self.provider_limits = provider_limits
+        self.timeout = timeout
+        self.max_queue = max_queue
+        self.burst_seconds = burst_seconds
+        self.shared = shared
+        self._limiters: Dict[str, RateLimiter] = {}
+
+    @classmethod
+    def from_env(cls, provider_names: List[str], timeout: float = 30.0, max_queue: int = 256,
+                 burst_seconds: float = 10.0, shared=None) -> "AdmissionController":
+        """Read {NAME}_RPM and {NAME}_TPM for each provider."""
+        limits = {}
+        for name in provider_names:
+            rpm, tpm = os.getenv(f"{name.upper()}_RPM"), os.getenv(f"{name.upper()}_TPM")
+            if rpm or tpm:
+                limits[name] = {"rpm": float(rpm) if rpm else None, "tpm": float(tpm) if tpm else None}
+        return cls(limits, timeout, max_queue, burst_seconds, shared)
+
+    def limiters(self, provider_name: str, endpoint=None) -> List[RateLimiter]:
+        """The limiters a call to this provider (and endpoint) goes through, provider first."""
+        found = []
+        limits = self.provider_limits.get(provider_name)
+        if limits:
+            found.append(self._limiter(provider_name, limits.get("rpm"), limits.get("tpm")))
+        if endpoint is not None and (endpoint.rpm or endpoint.tpm):
+            found.append(self._limiter(f"{provider_name}/{endpoint.name}", endpoint.rpm, endpoint.tpm))
+        return found
+
+    def _limiter(self, key: str, rpm: Optional[float], tpm: Optional[float]) -> RateLimiter:
+        limiter = self._limiters.get(key)
+        if limiter is None:
+            limiter = self._limiters[key] = RateLimiter(key, rpm, tpm, self.burst_seconds, shared=self.shared)
+        return limiter
+
+    async def admit(self, limiters: List[RateLimiter], tokens: int, priority: Optional[Priority] = None):
+        """Wait until every limiter admits the call.
+
+        Raises:
+            OverloadedError: The queue is full, or the call cannot be admitted in time
+        """
+        priority = priority or Priority()
+        deadline = time.monotonic() + self.timeout
+        taken = []
+        try:
+            for limiter in limiters:
+                await self._admit_one(limiter, tokens, deadline, priority)
+                taken.append(limiter)
+        except BaseException:
+            now = time.monotonic()
+            for limiter in taken:
+                limiter.give_back(tokens, now)
+            raise
+
+    async def _admit_one(self, limiter: RateLimiter, tokens: int, deadline: float, priority: Priority):
+        started = time.monotonic()
+        if not limiter.queue and limiter.try_take(tokens, started) <= 0:
+            limiter.record_wait(0.0, False, priority)
+            return
+        waiter = _Waiter(tokens, deadline, priority, asyncio.get_running_loop().create_future())
+        limiter.enqueue(waiter, self.max_queue)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), max(0.0, deadline - started))
+        except asyncio.TimeoutError:
+            if limiter.queue.remove(waiter):
+                # Still queued behind others at its deadline
+                limiter.record_shed(priority)
+                raise OverloadedError(limiter.name, "queue timeout", limiter.wait_time(tokens, time.monotonic()))
+            # Released by the dispatcher as the timeout fired
+            waiter.future.result()
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled() and waiter.future.exception() is None:
+                limiter.give_back(tokens, time.monotonic())
+            else:
+                limiter.queue.remove(waiter)
+                waiter.future.cancel()
+            raise
+        limiter.record_wait(time.monotonic() - started, True, priority)
+
+    def stats(self) -> Dict[str, Any]:
+        return {key: limiter.stats() for key, limiter in sorted(self._limiters.items())}
@@ -0,0 +1,194 @@
+"""
+Adaptive coalescing of small streaming deltas.
+
+Upstream models often stream one or two characters per chunk, and every chunk
+becomes its own SSE frame and socket write. coalesce_chunks sits between the
+upstream stream and handle_streaming and merges consecutive text deltas, or
+consecutive argument deltas of the same tool call, into one chunk. A merged
+chunk is flushed when it reaches a size threshold, when its time budget runs
+out (even if the upstream has stalled), or at a block boundary: a switch
+between text and tools, a new tool call, a finish_reason or usage data.
+"""
+import asyncio
+import time
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+
+class CoalescingStats:
+    """Counters for frames saved and latency added by coalescing."""
+
+    def __init__(self):
+        self.chunks_in = 0  # Mergeable deltas received from upstream
+        self.chunks_out = 0  # Merged deltas passed on to handle_streaming
+        self.added_latency_total = 0.0
+        self.added_latency_max = 0.0
+
+    def record_flush(self, merged: int, held_for: float):
+        self.chunks_in += merged
+        self.chunks_out += 1
+        self.added_latency_total += held_for
+        self.added_latency_max = max(self.added_latency_max, held_for)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "chunks_in": self.chunks_in,
+            "chunks_out": self.chunks_out,
+            "frames_saved": self.chunks_in - self.chunks_out,
+            "added_latency_avg_ms": round(1000 * self.added_latency_total / self.chunks_out, 3) if self.chunks_out else 0.0,
+            "added_latency_max_ms": round(1000 * self.added_latency_max, 3),
+        }
+
+
+def _field(obj: Any, name: str) -> Any:
+    if isinstance(obj, dict):
+        return obj.get(name)
+    return getattr(obj, name, None)
+
+
+def _classify(chunk: Any):
+    """Return ("text", None, text) or ("tool", tool_call, arguments) for mergeable chunks."""
+    if _field(chunk, "usage") is not None:
+        return None
+    choices = _field(chunk, "choices")
+    if not choices or len(choices) != 1 or _field(choices[0], "finish_reason"):
+        return None
+    delta = _field(choices[0], "delta")
+    if delta is None:
+        return None
+    content = _field(delta, "content")
+    tool_calls = _field(delta, "tool_calls")
+    if tool_calls:
+        if content or not isinstance(tool_calls, list) or len(tool_calls) != 1:
+            return None
+        arguments = _field(_field(tool_calls[0], "function"), "arguments")
+        if not isinstance(arguments, str):
+            return None
+        return "tool", tool_calls[0], arguments
+    if isinstance(content, str) and content:
+        return "text", None, content
+    return None
+
+
+class _Pending:
+    """Deltas waiting to be merged into one chunk."""
+
+    def __init__(self, kind: str, tool_call: Any, part: str, deadline: float):
+        self.kind = kind
+        self.tool_call = tool_call
+        self.tool_index = _field(tool_call, "index") if tool_call is not None else None
+        self.parts: List[str] = [part]
+        self.size = len(part)
+        self.started = time.monotonic()
+        self.deadline = deadline
+
+    def accepts(self, kind: str, tool_call: Any) -> bool:
+        if kind != self.kind:
+            return False
+        if kind == "text":
+            return True
+        # Same tool call, and not the start of a new one
+        return (_field(tool_call, "index") == self.tool_index
+                and not _field(tool_call, "id")
+                and not _field(_field(tool_call, "function"), "name"))
+
+    def add(self, part: str):
+        self.parts.append(part)
+        self.size += len(part)
+
+    def to_chunk(self) -> Any:
+        joined = "".join(self.parts)
+        if self.kind == "text":
+            delta = SimpleNamespace(content=joined)
+        else:
+            function = _field(self.tool_call, "function")
+            delta = SimpleNamespace(content=None, tool_calls=[SimpleNamespace(
+                index=self.tool_index,
+                id=_field(self.tool_call, "id"),
+                function=SimpleNamespace(name=_field(function, "name"), arguments=joined)
+            )])
+        return SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=delta, finish_reason=None)])
+
+
+# Chunks read ahead of the consumer; bounds memory if the client is slower than upstream
+_READ_AHEAD = 64
+_END = object()
+
+
+class _UpstreamFailure:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+async def _pump(upstream: AsyncIterator[Any], queue: asyncio.Queue):
+    """Read the upstream stream into a queue so waiting on it can time out safely."""
+    try:
+        async for chunk in upstream:
+            if queue.full():
+                await queue.put(chunk)
+            else:
+                queue.put_nowait(chunk)
+    except Exception as e:
+        await queue.put(_UpstreamFailure(e))
+        return
+    await queue.put(_END)
+
+
+async def coalesce_chunks(upstream: AsyncIterator[Any], budget: float, max_chars: int,
+                          stats: Optional[CoalescingStats] = None) -> AsyncIterator[Any]:
+    """Merge consecutive small deltas from an upstream stream.
+
+    Args:
+        upstream: The chunk stream handle_streaming would otherwise consume
+        budget: Longest time, in seconds, a delta may be held back
+        max_chars: Flush as soon as a merged delta reaches this many characters
+        stats: Optional counters to update
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=_READ_AHEAD)
+    pump = asyncio.ensure_future(_pump(upstream, queue))
+    pending: Optional[_Pending] = None
+
+    def flush():
+        nonlocal pending
+        chunk = pending.to_chunk()
+        if stats is not None:
+            stats.record_flush(len(pending.parts), time.monotonic() - pending.started)
+        pending = None
+        return chunk
+
+    try:
+        while True:
+            if not queue.empty():
+                item = queue.get_nowait()
+            elif pending is None:
+                item = await queue.get()
+            else:
+                # Upstream is idle: wait no longer than the pending delta's budget
+                try:
+                    item = await asyncio.wait_for(queue.get(), max(0.0, pending.deadline - loop.time()))
+                except asyncio.TimeoutError:
+                    yield flush()
+                    continue
+
+            if item is _END or isinstance(item, _UpstreamFailure):
+                if pending is not None:
+                    yield flush()
+                if item is not _END:
+                    raise item.error
+                return
+
+            mergeable = _classify(item)
+            if pending is not None and mergeable and pending.accepts(mergeable[0], mergeable[1]):
+                pending.add(mergeable[2])
+            else:
+                if pending is not None:
+                    yield flush()
+                if not mergeable:
+                    yield item
+                    continue
+                pending = _Pending(*mergeable, deadline=loop.time() + budget)
+            if pending.size >= max_chars or loop.time() >= pending.deadline:
+                yield flush()
+    finally:
+        pump.cancel()
@@ -0,0 +1,248 @@
+"""
+Single-pass compiler from an Anthropic MessagesRequest to the provider payload.
+
+Each message is visited once and emitted in its final shape for the target
+provider: content-block lists for providers that accept them, or flat strings
+for providers (OpenAI) that only take text. Strings are built by collecting
+parts and joining once, never by repeated concatenation.
+"""
+import copy
+import logging
+from typing import Any, Dict, List
+
+from providers.base import Capabilities
+from proxy import json_backend
+
+logger = logging.getLogger(__name__)
+
+IMAGE_PLACEHOLDER = "[Image content - not displayed in text format]\n"
+
+
+def clean_gemini_schema(schema: Any) -> Any:
+    """Recursively removes unsupported fields from a JSON schema for Gemini."""
+    if isinstance(schema, dict):
+        # Remove specific keys unsupported by Gemini tool parameters
+        schema.pop("additionalProperties", None)
+        schema.pop("default", None)
+
+        # Check for unsupported 'format' in string types
+        if schema.get("type") == "string" and "format" in schema:
+            allowed_formats = {"enum", "date-time"}
+            if schema["format"] not in allowed_formats:
+                logger.debug("Removing unsupported format '%s' for string type in Gemini schema.", schema['format'])
+                schema.pop("format")
+
+        # Recursively clean nested schemas (properties, items, etc.)
+        for key, value in list(schema.items()): # Use list() to allow modification during iteration
+            schema[key] = clean_gemini_schema(value)
+    elif isinstance(schema, list):
+        # Recursively clean items in a list
+        return [clean_gemini_schema(item) for item in schema]
+    return schema
+
+
+def _dumps(value: Any) -> str:
+    try:
+        return json_backend.dumps(value)
+    except (TypeError, ValueError):
+        return str(value)
+
+
+def _block_type(block: Any):
+    if isinstance(block, dict):
+        return block.get("type")
+    return getattr(block, "type", None)
+
+
+def _tool_result_lines(content: List[Any], parts: List[str]):
+    """Append one line per item of a tool_result content list to parts."""
+    for item in content:
+        if isinstance(item, dict):
+            if item.get("type") == "text" or "text" in item:
+                parts.append(item.get("text", ""))
+            else:
+                parts.append(_dumps(item))
+            parts.append("\n")
+        elif getattr(item, "type", None) == "text":
+            parts.append(item.text)
+            parts.append("\n")
+
+
+def _tool_result_text(content: Any) -> str:
+    """Flatten a tool_result's content, whatever shape the client sent."""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        parts: List[str] = []
+        _tool_result_lines(content, parts)
+        return "".join(parts)
+    if isinstance(content, dict):
+        return content.get("text", "") if content.get("type") == "text" else _dumps(content)
+    return str(content)
+
+
+def _compile_user_tool_results(content: List[Any]) -> str:
+    """User turns carrying tool results become a single text message."""
+    parts: List[str] = []
+    for block in content:
+        block_type = _block_type(block)
+        if block_type == "text":
+            parts.append(block.text)
+            parts.append("\n")
+        elif block_type == "tool_result":
+            parts.append(f"Tool result for {getattr(block, 'tool_use_id', '')}:\n")
+            parts.append(_tool_result_text(block.content))
+            parts.append("\n")
+    return "".join(parts).strip()
+
+
+def _tool_result_blocks(content: Any) -> List[Any]:
+    if isinstance(content, str):
+        return [{"type": "text", "text": content}]
+    if isinstance(content, list):
+        return content
+    return [{"type": "text", "text": str(content)}]
+
+
+def _compile_blocks(content: List[Any]) -> List[Dict[str, Any]]:
+    """Keep content blocks for providers that accept them."""
+    blocks = []
+    for block in content:
+        block_type = _block_type(block)
+        if block_type == "text":
+            blocks.append({"type": "text", "text": block.text})
+        elif block_type == "image":
+            blocks.append({"type": "image", "source": block.source})
+        elif block_type == "tool_use":
+            blocks.append({"type": "tool_use", "id": block.id, "name": block.name, "input": block.input})
+        elif block_type == "tool_result":
+            blocks.append({
+                "type": "tool_result",
+                "tool_use_id": getattr(block, "tool_use_id", ""),
+                "content": _tool_result_blocks(block.content)
+            })
+    return blocks
+
+
+def _flatten_blocks(content: List[Any]) -> str:
+    """Render content blocks as one string for text-only providers."""
+    parts: List[str] = []
+    only_tool_results = all(_block_type(block) == "tool_result" for block in content)
+    for block in content:
+        block_type = _block_type(block)
+        if only_tool_results:
+            parts.append("Tool Result:\n")
+            _tool_result_lines(_tool_result_blocks(block.content), parts)
+        elif block_type == "text":
+            parts.append(block.text)
+            parts.append("\n")
+        elif block_type == "tool_result":
+            parts.append(f"[Tool Result ID: {getattr(block, 'tool_use_id', 'unknown')}]\n")
+            _tool_result_lines(_tool_result_blocks(block.content), parts)
+        elif block_type == "tool_use":
+            parts.append(f"[Tool: {block.name} (ID: {block.id})]\nInput: {_dumps(block.input)}\n\n")
+        elif block_type == "image":
+            parts.append(IMAGE_PLACEHOLDER)
+    return "".join(parts).strip() or "..."
+
+
+def compile_message(msg: Any, capabilities: Capabilities) -> Dict[str, Any]:
+    """Compile one Anthropic message to its final provider shape."""
+    content = msg.content
+    if isinstance(content, str):
+        return {"role": msg.role, "content": content}
+    if msg.role == "user" and any(_block_type(block) == "tool_result" for block in content):
+        return {"role": "user", "content": _compile_user_tool_results(content)}
+    if capabilities.flatten_content:
+        return {"role": msg.role, "content": _flatten_blocks(content)}
+    return {"role": msg.role, "content": _compile_blocks(content)}
+
+
+def compile_system(system: Any) -> List[Dict[str, Any]]:
+    """Compile the system prompt into zero or one system messages."""
+    if not system:
+        return []
+    if isinstance(system, str):
+        return [{"role": "system", "content": system}]
+    parts = []
+    for block in system:
+        if _block_type(block) == "text":
+            parts.append(block.get("text", "") if isinstance(block, dict) else block.text)
+            parts.append("\n\n")
+    system_text = "".join(parts).strip()
+    return [{"role": "system", "content": system_text}] if system_text else []
+
+
+def compile_tools(tools: List[Any], capabilities: Capabilities) -> List[Dict[str, Any]]:
+    """Convert Anthropic tool definitions to OpenAI function tools."""
+    openai_tools = []
+    for tool in tools:
+        if isinstance(tool, dict):
+            name, description, input_schema = tool["name"], tool.get("description"), tool.get("input_schema", {})
+        else:
+            name, description, input_schema = tool.name, tool.description, tool.input_schema
+        if capabilities.clean_tool_schemas:
+            # Clean a copy so the incoming request is left untouched
+            input_schema = clean_gemini_schema(copy.deepcopy(input_schema))
+        openai_tools.append({
+            "type": "function",
+            "function": {
+                "name": name,
+                "description": description or "",
+                "parameters": input_schema
+            }
+        })
+    return openai_tools
+
+
+def compile_tool_choice(tool_choice: Dict[str, Any]) -> Any:
+    """Convert Anthropic's tool_choice to OpenAI format."""
+    choice_type = tool_choice.get("type")
+    if choice_type == "auto":
+        return "auto"
+    if choice_type == "any":
+        return "any"
+    if choice_type == "tool" and "name" in tool_choice:
+        return {"type": "function", "function": {"name": tool_choice["name"]}}
+    # Default to auto if we can't determine
+    return "auto"
+
+
+def compile_request(request: Any, capabilities: Capabilities, cache: Any = None) -> Dict[str, Any]:
+    """Compile a MessagesRequest into the final LiteLLM/provider payload in one pass.
+
+    When a ConversionCache is given and the provider takes flattened content,
+    messages already compiled on an earlier turn of the same conversation are
+    reused instead of compiled again. For providers that take content blocks,
+    compiling a message costs about as much as looking it up, so the cache is
+    not used for them.
+    """
+    messages = compile_system(request.system)
+    if cache is not None and capabilities.flatten_content:
+        messages.extend(cache.compile_messages(request.messages, capabilities, compile_message))
+    else:
+        messages.extend(compile_message(msg, capabilities) for msg in request.messages)
+
+    max_tokens = request.max_tokens
+    if capabilities.max_tokens_limit is not None and max_tokens > capabilities.max_tokens_limit:
+        logger.debug("Capping max_tokens to %s (original value: %s)", capabilities.max_tokens_limit, max_tokens)
+        max_tokens = capabilities.max_tokens_limit
+
+    payload = {
+        "model": request.model,
+        "messages": messages,
+        "max_tokens": max_tokens,
+        "temperature": request.temperature,
+        "stream": request.stream,
+    }
+    if request.stop_sequences:
+        payload["stop"] = request.stop_sequences
+    if request.top_p:
+        payload["top_p"] = request.top_p
+    if request.top_k:
+        payload["top_k"] = request.top_k
+    if request.tools:
+        payload["tools"] = compile_tools(request.tools, capabilities)
+    if request.tool_choice:
+        payload["tool_choice"] = compile_tool_choice(request.tool_choice)
+    return payload
@@ -0,0 +1,146 @@
+"""
+Incremental conversion cache for growing conversations.
+
+Claude Code resends the whole conversation every turn. The cache remembers the
+compiled form of each message, keyed by a rolling hash of the conversation
+prefix up to that message plus the target provider's capabilities, so only the
+new tail of a conversation has to be compiled again. compile_request only
+uses it for providers whose content is flattened to strings, where flattening
+is the real cost; for the others, freezing and hashing a message costs about
+as much as compiling it.
+
+Each message's content is frozen into nested tuples and hashed once; the
+prefix hash chains those digests, so a key is two integers and costs nothing
+more to hash however long the conversation. Entries keep the frozen content,
+and a hit compares it with the message's: a hash collision can never return
+the compiled form of a different message. The hashes use Python's built-in
+hash, which is keyed per process and cheap compared to a cryptographic digest.
+"""
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List
+
+from providers.base import Capabilities
+
+logger = logging.getLogger(__name__)
+
+# Rough per-entry bookkeeping cost on top of the string payloads
+_ENTRY_OVERHEAD = 256
+
+
+def _freeze(value: Any) -> Any:
+    """Turn a message (or any part of one) into a hashable, order-preserving key."""
+    if isinstance(value, str) or value is None:
+        return value
+    if isinstance(value, list):
+        return (list, tuple([_freeze_block(item) for item in value]))
+    if isinstance(value, (bool, int, float)):
+        # Tag scalars so True, 1 and 1.0 (which serialize differently) never collide
+        return (type(value), value)
+    if isinstance(value, dict):
+        return (dict, tuple([(key, _freeze(item)) for key, item in value.items()]))
+    if isinstance(value, tuple):
+        return (list, tuple([_freeze(item) for item in value]))
+    if hasattr(value, "__dict__"):
+        return (type(value).__name__, _freeze(value.__dict__))
+    return (type(value).__name__, repr(value))
+
+
+def _freeze_block(block: Any) -> Any:
+    """Fast paths for the content block models; everything else goes through _freeze."""
+    block_type = getattr(block, "type", None)
+    if block_type == "text":
+        return ("text", block.text)
+    if block_type == "tool_result":
+        return ("tool_result", block.tool_use_id, _freeze(block.content))
+    if block_type == "tool_use":
+        return ("tool_use", block.id, block.name, _freeze(block.input))
+    if isinstance(block, dict) and block.get("type") == "text" and len(block) == 2 and "text" in block:
+        return ("text_dict", block["text"])
+    return _freeze(block)
+
+
+def _approx_size(value: Any) -> int:
+    """Approximate bytes held by a compiled message (strings dominate)."""
+    if isinstance(value, str):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(_approx_size(item) for item in value.values())
+    if isinstance(value, list):
+        return sum(_approx_size(item) for item in value)
+    return 8
+
+
+def _copy_message(message: Dict[str, Any]) -> Dict[str, Any]:
+    """Shallow copy so callers can edit the returned message without touching the cache."""
+    content = message["content"]
+    if isinstance(content, list):
+        return {**message, "content": [dict(block) for block in content]}
+    return dict(message)
+
+
+class ConversionCache:
+    """Bounded LRU of compiled messages with a memory cap."""
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, max_entries: int = 100_000):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Any, tuple]" = OrderedDict()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def compile_messages(self, messages: List[Any], capabilities: Capabilities,
+                         compile_message: Callable[[Any, Capabilities], Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Compile a conversation, reusing cached results for the unchanged prefix."""
+        compiled = []
+        prefix_hash = hash(capabilities)
+        for msg in messages:
+            content = (capabilities, msg.role, _freeze(msg.content))
+            # The only pass over the content that hashes it; the keys are plain integers
+            content_hash = hash(content)
+            key = (prefix_hash, content_hash)
+            prefix_hash = hash(key)
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] == content:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                compiled.append(_copy_message(entry[0]))
+                continue
+
+            self.misses += 1
+            result = compile_message(msg, capabilities)
+            self._store(key, result, content)
+            compiled.append(_copy_message(result))
+        return compiled
+
+    def _store(self, key: Any, result: Dict[str, Any], content: Any):
+        # Entries keep the request's content alive too, so count the payload twice
+        size = 2 * _approx_size(result["content"]) + _ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self.current_bytes -= previous[1]
+        self._entries[key] = (result, size, content)
+        self.current_bytes += size
+        while self.current_bytes > self.max_bytes or len(self._entries) > self.max_entries:
+            _, (_, evicted_size, _) = self._entries.popitem(last=False)
+            self.current_bytes -= evicted_size
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+        self.current_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Counters for monitoring cache effectiveness."""
+        return {
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
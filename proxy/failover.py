@@ -0,0 +1,148 @@
+"""
+Cross-provider failover along a model's fallback chain.
+
+A call that fails on one backend (timeout, connection error, 429, 5xx, an
+open circuit breaker, or a backend that rejects our credentials or does not
+know the model) moves on to the next model of the chain instead of failing
+the client's turn. Client errors such as a malformed request are raised
+straight away, since every backend would reject them too.
+
+Streams can only be retried while the client has seen nothing, so a stream
+is held back until its first chunk with content (text, a tool call or a
+finish reason). Failures before that point move on to the next backend;
+failures after it reach the client as before.
+"""
+import logging
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Sequence, Tuple
+
+from providers.health import is_backend_failure
+
+logger = logging.getLogger(__name__)
+
+
+def should_fail_over(error: BaseException) -> bool:
+    """Whether another backend may succeed where this one failed."""
+    return is_backend_failure(error) or getattr(error, "status_code", None) in (401, 403, 404)
+
+
+def _has_content(chunk: Any) -> bool:
+    for choice in getattr(chunk, "choices", None) or ():
+        delta = getattr(choice, "delta", None)
+        if getattr(choice, "finish_reason", None) or getattr(delta, "content", None) \
+                or getattr(delta, "tool_calls", None):
+            return True
+    return False
+
+
+async def close_stream(stream: Any):
+    aclose = getattr(stream, "aclose", None)
+    if aclose is not None:
+        try:
+            await aclose()
+        except Exception:
+            pass
+
+
+async def open_until_content(open_stream: Callable[[], Awaitable[AsyncIterator[Any]]]
+                             ) -> Tuple[List[Any], AsyncIterator[Any]]:
+    """Open a stream and read it up to its first chunk with content (closing it on failure)."""
+    iterator = (await open_stream()).__aiter__()
+    buffered = []
+    try:
+        while True:
+            try:
+                chunk = await iterator.__anext__()
+            except StopAsyncIteration:
+                break
+            buffered.append(chunk)
+            if _has_content(chunk):
+                break
+    except BaseException:
+        await close_stream(iterator)
+        raise
+    return buffered, iterator
+
+
+async def resume_stream(buffered: List[Any], iterator: AsyncIterator[Any]) -> AsyncIterator[Any]:
+    """Replay the chunks read by open_until_content, then the rest of the stream."""
+    try:
+        for chunk in buffered:
+            yield chunk
+        async for chunk in iterator:
+            yield chunk
+    finally:
+        await close_stream(iterator)
+
+
+class Failover:
+    """Runs calls along fallback chains and keeps depth and time-lost figures."""
+
+    def __init__(self):
+        self.requests = 0
+        self.served_by_depth: Dict[int, int] = {}
+        self.exhausted = 0
+        self.time_lost = 0.0  # Seconds spent on failed backends before one answered
+        self.max_time_lost = 0.0
+        self.backend_failures: Dict[str, int] = {}
+
+    def _failed(self, backends: Sequence[str], depth: int, error: BaseException) -> bool:
+        """Record a failed attempt; returns whether to move on to the next backend."""
+        if not should_fail_over(error):
+            return False
+        backend = backends[depth]
+        self.backend_failures[backend] = self.backend_failures.get(backend, 0) + 1
+        if depth + 1 == len(backends):
+            self.exhausted += 1
+            return False
+        reason = getattr(error, "status_code", None) or type(error).__name__
+        logger.warning("Backend %s failed (%s), failing over to %s", backend, reason, backends[depth + 1])
+        return True
+
+    def _served(self, depth: int, lost: float):
+        self.served_by_depth[depth] = self.served_by_depth.get(depth, 0) + 1
+        if depth:
+            self.time_lost += lost
+            self.max_time_lost = max(self.max_time_lost, lost)
+
+    async def call(self, backends: Sequence[str], send: Callable[[str], Awaitable[Any]]) -> Any:
+        """Return the response of the first backend that answers."""
+        self.requests += 1
+        started = time.monotonic()
+        for depth, backend in enumerate(backends):
+            attempt_started = time.monotonic()
+            try:
+                response = await send(backend)
+            except Exception as e:
+                if self._failed(backends, depth, e):
+                    continue
+                raise
+            self._served(depth, attempt_started - started)
+            return response
+
+    async def stream(self, backends: Sequence[str],
+                     open_stream: Callable[[str], Awaitable[AsyncIterator[Any]]]) -> AsyncIterator[Any]:
+        """Return the stream of the first backend that produces content."""
+        self.requests += 1
+        started = time.monotonic()
+        for depth, backend in enumerate(backends):
+            attempt_started = time.monotonic()
+            try:
+                buffered, iterator = await open_until_content(lambda: open_stream(backend))
+            except BaseException as e:
+                if self._failed(backends, depth, e):
+                    continue
+                raise
+            self._served(depth, attempt_started - started)
+            return resume_stream(buffered, iterator)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "failed_over": sum(count for depth, count in self.served_by_depth.items() if depth),
+            "served_by_depth": {str(depth): count for depth, count in sorted(self.served_by_depth.items())},
+            "exhausted": self.exhausted,
+            "time_lost_s": round(self.time_lost, 3),
+            "max_time_lost_s": round(self.max_time_lost, 3),
+            "backend_failures": dict(self.backend_failures),
+        }
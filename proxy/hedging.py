@@ -0,0 +1,174 @@
+"""
+Hedged upstream calls for latency-critical model classes.
+
+A hedged call starts the upstream call as usual. If it has not produced its
+first content within the hedge delay, a second call is started, to the next
+model of the fallback chain or to the same model, whose endpoint pool then
+picks another endpoint, since the first one is busy. Whichever call produces
+content first wins and the other is cancelled. Only the winner is returned,
+so the client never sees more than one response.
+
+The delay tracks a percentile (HEDGE_PERCENTILE) of recent time to first
+content per model class, clamped to [min_delay, max_delay]; until enough
+samples are in, max_delay is used. Hedges spend from a budget: every request
+earns `budget` credits (capped at max_burst), every hedge costs one, so at
+most that fraction of requests is hedged even when upstream slows down as a
+whole.
+"""
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Iterable, Optional
+
+from proxy.failover import close_stream, open_until_content, resume_stream
+
+
+class _ClassState:
+    """Latency samples, hedge budget and counters of one model class."""
+
+    def __init__(self, samples: int, max_burst: float):
+        self.samples: Deque[float] = deque(maxlen=samples)
+        self.credits = 0.0
+        self.max_burst = max_burst
+        self.requests = 0
+        self.hedges_fired = 0
+        self.hedges_won = 0
+        self.budget_denied = 0
+
+
+def _failed(task: asyncio.Future) -> bool:
+    """Whether a finished call failed; cancelled ones have no exception() to ask for."""
+    return task.cancelled() or task.exception() is not None
+
+
+class Hedger:
+    """Races a second upstream call against a slow first one."""
+
+    def __init__(self, model_classes: Iterable[str], percentile: float = 95.0, min_delay: float = 0.1,
+                 max_delay: float = 2.0, budget: float = 0.1, min_samples: int = 20, samples: int = 500,
+                 max_burst: float = 10.0):
+        """
+        Args:
+            model_classes: Router tiers to hedge ("small", "big")
+            percentile: Percentile of recent time to first content used as the delay
+            min_delay: Floor of the delay, in seconds
+            max_delay: Cap of the delay, and the delay until min_samples are in
+            budget: Most hedges per request, on average
+            min_samples: Samples needed before the percentile is used
+            samples: Samples kept per class
+            max_burst: Most hedge credits a class can save up
+        """
+        self.model_classes = frozenset(model_classes)
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.budget = budget
+        self.min_samples = min_samples
+        self._classes = {name: _ClassState(samples, max_burst) for name in self.model_classes}
+
+    def hedges(self, model_class: str) -> bool:
+        return model_class in self.model_classes
+
+    def delay(self, model_class: str) -> float:
+        """Seconds to wait for first content before hedging."""
+        samples = self._classes[model_class].samples
+        if len(samples) < self.min_samples:
+            return self.max_delay
+        ordered = sorted(samples)
+        value = ordered[max(0, math.ceil(self.percentile / 100 * len(ordered)) - 1)]
+        return min(self.max_delay, max(self.min_delay, value))
+
+    def _try_spend(self, state: _ClassState) -> bool:
+        if state.credits >= 1.0:
+            state.credits -= 1.0
+            state.hedges_fired += 1
+            return True
+        state.budget_denied += 1
+        return False
+
+    async def call(self, model_class: str, primary: Callable[[], Awaitable[Any]],
+                   hedge: Callable[[], Awaitable[Any]]) -> Any:
+        """Hedged non-streaming call; first content is the whole response."""
+        return await self._race(model_class, primary, hedge)
+
+    async def stream(self, model_class: str, primary: Callable[[], Awaitable[AsyncIterator[Any]]],
+                     hedge: Callable[[], Awaitable[AsyncIterator[Any]]]) -> AsyncIterator[Any]:
+        """Hedged stream; the winner is the first stream to produce content."""
+        buffered, iterator = await self._race(
+            model_class, lambda: open_until_content(primary), lambda: open_until_content(hedge)
+        )
+        return resume_stream(buffered, iterator)
+
+    async def _race(self, model_class: str, primary: Callable[[], Awaitable[Any]],
+                    hedge: Callable[[], Awaitable[Any]]) -> Any:
+        state = self._classes[model_class]
+        state.requests += 1
+        state.credits = min(state.max_burst, state.credits + self.budget)
+        started = time.monotonic()
+        first = asyncio.ensure_future(primary())
+        second: Optional[asyncio.Future] = None
+        try:
+            done, _ = await asyncio.wait({first}, timeout=self.delay(model_class))
+            if not done:
+                if self._try_spend(state):
+                    second = asyncio.ensure_future(hedge())
+                    done, _ = await asyncio.wait({first, second}, return_when=asyncio.FIRST_COMPLETED)
+                    # A call that failed first leaves the race to the other one
+                    if len(done) == 1 and _failed(next(iter(done))):
+                        done, _ = await asyncio.wait({first, second})
+                else:
+                    done, _ = await asyncio.wait({first})
+        except BaseException:
+            await self._cancel(first, second)
+            raise
+
+        winner = self._winner(first, second, done)
+        if not first.done() or not _failed(first):
+            # A primary that lost to the hedge counts with the time it had taken, a lower bound
+            state.samples.append(time.monotonic() - started)
+        if winner is second:
+            state.hedges_won += 1
+        await self._cancel(*(task for task in (first, second) if task is not None and task is not winner))
+        return winner.result()
+
+    @staticmethod
+    def _winner(first: asyncio.Future, second: Optional[asyncio.Future], done) -> asyncio.Future:
+        succeeded = [task for task in (first, second) if task in done and not _failed(task)]
+        if succeeded:
+            return succeeded[0]
+        # Both failed (or no hedge was fired): report the primary's error, unless it was
+        # cancelled from within (e.g. by its HTTP client) and the hedge has a real one
+        errors = [task for task in (first, second) if task in done and not task.cancelled()]
+        if errors:
+            return errors[0]
+        return first if first in done else second
+
+    @staticmethod
+    async def _cancel(*tasks: Optional[asyncio.Future]):
+        for task in tasks:
+            if task is None:
+                continue
+            if not task.done():
+                task.cancel()
+                try:
+                    await task
+                except BaseException:
+                    pass
+            elif not task.cancelled() and task.exception() is None:
+                # The loser finished too: close its stream, if it is one
+                result = task.result()
+                if isinstance(result, tuple):
+                    await close_stream(result[1])
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            name: {
+                "requests": state.requests,
+                "hedges_fired": state.hedges_fired,
+                "hedges_won": state.hedges_won,
+                "budget_denied": state.budget_denied,
+                "delay_ms": round(self.delay(name) * 1000, 1),
+            }
+            for name, state in self._classes.items()
+        }
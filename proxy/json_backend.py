@@ -0,0 +1,140 @@
+"""
+Pluggable JSON backend.
+
+Uses orjson or msgspec when one is installed and falls back to the standard
+library otherwise. JSON_BACKEND=orjson|msgspec|json forces a choice; the default
+(auto) takes the first one available in that order.
+
+The fast backends write compact, UTF-8 JSON where the standard library writes
+", "/": " separators and \\u escapes. Both are equivalent to any JSON parser, so
+the backend is used for parsing, for wire formats (SSE frames, upstream
+request bodies, logs) and for tool inputs and results flattened into prompt
+text.
+"""
+import json
+import logging
+import os
+from typing import Any, Callable, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+
+def _stdlib_dumpb(obj: Any, default: Optional[Callable] = None) -> bytes:
+    return json.dumps(obj, default=default).encode("utf-8")
+
+
+def _stdlib_pretty(obj: Any, default: Optional[Callable] = None) -> str:
+    return json.dumps(obj, indent=2, default=default)
+
+
+def _stdlib_canonical(obj: Any, default: Optional[Callable] = None) -> bytes:
+    return json.dumps(obj, default=default, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def _load_orjson():
+    import orjson
+
+    options = orjson.OPT_NON_STR_KEYS
+
+    def dumpb(obj: Any, default: Optional[Callable] = None) -> bytes:
+        try:
+            return orjson.dumps(obj, default=default, option=options)
+        except TypeError:
+            # Integers beyond 64 bits and other edge cases the stdlib still handles
+            return _stdlib_dumpb(obj, default)
+
+    def pretty(obj: Any, default: Optional[Callable] = None) -> str:
+        try:
+            return orjson.dumps(obj, default=default, option=options | orjson.OPT_INDENT_2).decode("utf-8")
+        except TypeError:
+            return _stdlib_pretty(obj, default)
+
+    def canonical(obj: Any, default: Optional[Callable] = None) -> bytes:
+        try:
+            return orjson.dumps(obj, default=default, option=options | orjson.OPT_SORT_KEYS)
+        except TypeError:
+            return _stdlib_canonical(obj, default)
+
+    return orjson.loads, dumpb, pretty, canonical
+
+
+def _load_msgspec():
+    import msgspec
+
+    decoder = msgspec.json.Decoder()
+    encoder = msgspec.json.Encoder()
+
+    def loads(data: Union[str, bytes]) -> Any:
+        try:
+            return decoder.decode(data)
+        except msgspec.DecodeError as e:
+            raise ValueError(str(e)) from None
+
+    def dumpb(obj: Any, default: Optional[Callable] = None) -> bytes:
+        try:
+            if default is None:
+                return encoder.encode(obj)
+            return msgspec.json.encode(obj, enc_hook=default)
+        except (TypeError, msgspec.EncodeError):
+            return _stdlib_dumpb(obj, default)
+
+    def pretty(obj: Any, default: Optional[Callable] = None) -> str:
+        return msgspec.json.format(dumpb(obj, default), indent=2).decode("utf-8")
+
+    def canonical(obj: Any, default: Optional[Callable] = None) -> bytes:
+        try:
+            return msgspec.json.encode(obj, enc_hook=default, order="sorted")
+        except (TypeError, msgspec.EncodeError):
+            return _stdlib_canonical(obj, default)
+
+    return loads, dumpb, pretty, canonical
+
+
+def _load_stdlib():
+    return json.loads, _stdlib_dumpb, _stdlib_pretty, _stdlib_canonical
+
+
+_LOADERS = {"orjson": _load_orjson, "msgspec": _load_msgspec, "json": _load_stdlib}
+
+
+def _select(requested: str):
+    candidates = list(_LOADERS) if requested == "auto" else [requested, "json"]
+    for name in candidates:
+        loader = _LOADERS.get(name)
+        if loader is None:
+            logger.warning("Unknown JSON_BACKEND %r, falling back to the standard library", name)
+            continue
+        try:
+            return (name, *loader())
+        except ImportError:
+            if name == requested:
+                logger.warning("JSON_BACKEND=%s is not installed, falling back to the standard library", name)
+    raise RuntimeError("No JSON backend available")
+
+
+BACKEND, _loads, _dumpb, _pretty, _canonical = _select(os.environ.get("JSON_BACKEND", "auto").lower())
+
+
+def loads(data: Union[str, bytes, bytearray]) -> Any:
+    """Parse JSON from str or bytes. Invalid input raises ValueError."""
+    return _loads(data)
+
+
+def dumpb(obj: Any, default: Optional[Callable] = None) -> bytes:
+    """Serialize to UTF-8 JSON bytes."""
+    return _dumpb(obj, default)
+
+
+def dumps(obj: Any, default: Optional[Callable] = None) -> str:
+    """Serialize to a JSON string."""
+    return _dumpb(obj, default).decode("utf-8")
+
+
+def dumps_pretty(obj: Any, default: Optional[Callable] = None) -> str:
+    """Serialize with two-space indentation, for logs."""
+    return _pretty(obj, default)
+
+
+def dumpb_canonical(obj: Any, default: Optional[Callable] = None) -> bytes:
+    """Serialize compactly with sorted keys, so equal values give equal bytes (for hashing)."""
+    return _canonical(obj, default)
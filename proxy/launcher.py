@@ -0,0 +1,154 @@
+"""
+Running the proxy: a dev profile and a multi-worker prod profile.
+
+dev runs one process that reloads when the code changes. prod runs WORKERS
+processes (default: one per CPU) that serve a single listening socket. The
+socket is bound once in a supervising parent and inherited by each worker, so
+the kernel spreads connections across them. Request conversion and SSE
+encoding are CPU bound, and one event loop used at most one core. Workers are
+spawned rather than forked after import: the app starts threads at import (the
+log writer, executors), and forked children would not get them. Combine it
+with FAST_START for workers that are up in about a second.
+
+Start it with python -m proxy.launcher --profile prod (or python server.py,
+whose process then imports the app once more than it needs to).
+
+uvloop and httptools are used when they are installed (uvicorn[standard]).
+
+MAX_REQUESTS recycles a worker after it has served that many requests, plus a
+random number up to MAX_REQUESTS_JITTER so that workers do not all restart
+together, which bounds memory growth. The worker stops accepting connections,
+finishes the requests it is serving within GRACEFUL_TIMEOUT and exits; the
+parent then starts a replacement while the other workers keep serving. A
+connection the worker accepted in the instant it began stopping, before it
+read the request, is closed unanswered; clients retry those (the Anthropic
+SDK does by default).
+
+With more than one worker, rate limit buckets and circuit breakers are shared
+through a SQLite file (proxy/shared_state.py): SHARED_STATE_PATH, by default a
+file in the temp directory named after the port; "off" keeps them per worker.
+"""
+import argparse
+import importlib.util
+import inspect
+import logging
+import os
+import tempfile
+from typing import Any, Dict, List, Optional
+
+import uvicorn
+
+logger = logging.getLogger(__name__)
+
+PROFILES = ("dev", "prod")
+
+
+def _installed(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+class LaunchConfig:
+    """Settings for running the app under uvicorn in the dev or prod profile."""
+
+    def __init__(self, profile: str = "dev", host: str = "0.0.0.0", port: int = 8082, workers: Optional[int] = None,
+                 max_requests: int = 0, max_requests_jitter: int = 0, graceful_timeout: float = 30,
+                 log_level: str = "warning"):
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown profile {profile!r}, expected one of {', '.join(PROFILES)}")
+        self.profile = profile
+        self.host = host
+        self.port = port
+        if profile == "dev":
+            # Reloading runs a single worker, and it restarts on every change anyway
+            self.workers = 1
+            self.max_requests = 0
+        else:
+            self.workers = workers or os.cpu_count() or 1
+            self.max_requests = max_requests
+            if max_requests and self.workers == 1:
+                logger.warning("MAX_REQUESTS needs at least 2 workers to restart one; recycling is off")
+                self.max_requests = 0
+        self.max_requests_jitter = max_requests_jitter
+        self.graceful_timeout = graceful_timeout
+        self.log_level = log_level
+        self.shared_state_path = os.environ.get("SHARED_STATE_PATH", "")
+        if not self.shared_state_path and self.workers > 1:
+            self.shared_state_path = os.path.join(tempfile.gettempdir(), f"anthropic-proxy-{port}.sqlite3")
+        self.loop = "uvloop" if _installed("uvloop") else "asyncio"
+        self.http = "httptools" if _installed("httptools") else "h11"
+
+    @classmethod
+    def from_args(cls, argv: Optional[List[str]] = None) -> "LaunchConfig":
+        """Read the command line, defaulting to SERVER_PROFILE, HOST, PORT, WORKERS,
+        MAX_REQUESTS, MAX_REQUESTS_JITTER and GRACEFUL_TIMEOUT."""
+        env = os.environ.get
+        parser = argparse.ArgumentParser(description="Run the Anthropic proxy")
+        parser.add_argument("--profile", choices=PROFILES, default=env("SERVER_PROFILE", "dev"),
+                            help="dev: one process, reload on change; prod: WORKERS processes on one socket")
+        parser.add_argument("--host", default=env("HOST", "0.0.0.0"))
+        parser.add_argument("--port", type=int, default=int(env("PORT", "8082")))
+        parser.add_argument("--workers", type=int, default=int(env("WORKERS", "0")),
+                            help="Worker processes in the prod profile (default: one per CPU)")
+        parser.add_argument("--max-requests", type=int, default=int(env("MAX_REQUESTS", "0")),
+                            help="Recycle a worker after this many requests (0: never)")
+        parser.add_argument("--max-requests-jitter", type=int, default=int(env("MAX_REQUESTS_JITTER", "0")))
+        parser.add_argument("--graceful-timeout", type=float, default=float(env("GRACEFUL_TIMEOUT", "30")),
+                            help="Seconds a stopping worker has to finish its requests")
+        args = parser.parse_args(argv)
+        return cls(args.profile, args.host, args.port, args.workers or None, args.max_requests,
+                   args.max_requests_jitter, args.graceful_timeout)
+
+    def uvicorn_options(self) -> Dict[str, Any]:
+        """Keyword arguments for uvicorn.run."""
+        options: Dict[str, Any] = {
+            "host": self.host,
+            "port": self.port,
+            "loop": self.loop,
+            "http": self.http,
+            "log_level": self.log_level,
+            "timeout_graceful_shutdown": self.graceful_timeout,
+        }
+        if self.profile == "dev":
+            options["reload"] = True
+            return options
+        options["workers"] = self.workers
+        if self.max_requests:
+            options["limit_max_requests"] = self.max_requests
+            if self.max_requests_jitter:
+                if "limit_max_requests_jitter" in inspect.signature(uvicorn.Config).parameters:
+                    options["limit_max_requests_jitter"] = self.max_requests_jitter
+                else:
+                    logger.warning("This uvicorn has no max requests jitter; workers may recycle together")
+        return options
+
+    def describe(self) -> str:
+        if self.profile == "dev":
+            return f"dev profile on {self.host}:{self.port}, reloading on change, {self.loop}/{self.http}"
+        recycle = (f", recycled after {self.max_requests}+{self.max_requests_jitter} requests"
+                   if self.max_requests else "")
+        shared = f", shared state in {self.shared_state_path}" if self.workers > 1 else ""
+        return (f"prod profile on {self.host}:{self.port}, {self.workers} workers, {self.loop}/{self.http}"
+                f"{recycle}{shared}")
+
+
+def run(app: str, config: LaunchConfig):
+    """Run app (an import string, which uvicorn needs to start workers and reload) with config."""
+    logger.info("Starting %s", config.describe())
+    if config.shared_state_path:
+        # Inherited by the workers
+        os.environ["SHARED_STATE_PATH"] = config.shared_state_path
+    uvicorn.run(app, **config.uvicorn_options())
+
+
+def main(argv: Optional[List[str]] = None):
+    """python -m proxy.launcher [--profile prod] [--workers N] ...
+
+    Unlike python server.py, the supervising process never imports the app,
+    so it stays small; only the workers do.
+    """
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    run("server:app", LaunchConfig.from_args(argv))
+
+
+if __name__ == "__main__":
+    main()
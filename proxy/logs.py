@@ -0,0 +1,207 @@
+"""
+Non-blocking logging.
+
+Handlers that write to a terminal or a pipe block when it is slow to drain,
+and on the event loop that stalls every request in flight. Here loggers only
+put records on a bounded queue; a writer thread formats them and writes them
+out. Records are formatted in the writer thread too, so log immutable values
+(names, numbers), not objects that change after the call. When the writer
+falls behind and the queue is full, records are dropped and counted rather
+than waiting for room.
+
+LOG_LEVEL sets the proxy's level (default INFO), LOG_LIBRARY_LEVEL the level
+of the chatty HTTP client libraries (LiteLLM, httpx, httpcore; default
+WARNING), and LOG_FORMAT=json writes one JSON object per record instead of
+text. Request lines (log_request) carry their fields as structured data: the
+text format renders them in colour, the JSON format as fields.
+"""
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+from typing import Any, Dict, Optional, TextIO
+
+from proxy import json_backend
+
+LIBRARY_LOGGERS = ("LiteLLM", "LiteLLM Router", "LiteLLM Proxy", "httpx", "httpcore")
+
+# Library messages that are noise even at the levels they are logged at
+BLOCKED_PHRASES = (
+    "LiteLLM completion()",
+    "HTTP Request:",
+    "selected model name for cost calculation",
+    "utils.py",
+    "cost_calculator",
+)
+
+request_logger = logging.getLogger("anthropic_proxy.requests")
+
+
+class Colors:
+    CYAN = "\033[96m"
+    BLUE = "\033[94m"
+    GREEN = "\033[92m"
+    YELLOW = "\033[93m"
+    RED = "\033[91m"
+    MAGENTA = "\033[95m"
+    RESET = "\033[0m"
+    BOLD = "\033[1m"
+    UNDERLINE = "\033[4m"
+    DIM = "\033[2m"
+
+
+class BlockedPhraseFilter(logging.Filter):
+    """Drops library noise; runs in the writer thread, off the event loop."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.name.startswith("anthropic_proxy") or not isinstance(record.msg, str):
+            return True
+        return not any(phrase in record.msg for phrase in BLOCKED_PHRASES)
+
+
+class TextFormatter(logging.Formatter):
+    """The usual "time - level - message" lines, and request lines in colour."""
+
+    def __init__(self):
+        super().__init__("%(asctime)s - %(levelname)s - %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        request = getattr(record, "request", None)
+        if request is None:
+            return super().format(record)
+        mapped = request["mapped_model"].split("/")[-1]
+        status = request["status"]
+        status_str = (f"{Colors.GREEN}✓ {status} OK{Colors.RESET}" if status == 200
+                      else f"{Colors.RED}✗ {status}{Colors.RESET}")
+        return (
+            f"{Colors.BOLD}{request['method']} {request['path']}{Colors.RESET} {status_str}\n"
+            f"{Colors.CYAN}{request['model']}{Colors.RESET} → {Colors.GREEN}{mapped}{Colors.RESET} "
+            f"{Colors.MAGENTA}{request['tools']} tools{Colors.RESET} "
+            f"{Colors.BLUE}{request['messages']} messages{Colors.RESET}"
+        )
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message, request fields, exception."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        request = getattr(record, "request", None)
+        if request is not None:
+            entry["request"] = request
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json_backend.dumps(entry, default=str)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Puts records on the queue as they are, dropping them when it is full."""
+
+    def __init__(self, log_queue: "queue.Queue"):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Formatting is left to the writer thread (QueueHandler formats here)
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _Writer(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        # Wait for room: the queue may be full when stopping
+        self.queue.put(self._sentinel)
+
+
+class LogPipeline:
+    """The queue handler installed on the root logger and the writer thread behind it."""
+
+    def __init__(self, level: int = logging.INFO, library_level: int = logging.WARNING, json_format: bool = False,
+                 queue_size: int = 10000, stream: Optional[TextIO] = None):
+        self.level = level
+        self.json_format = json_format
+        self.queue: "queue.Queue" = queue.Queue(queue_size)
+        self.handler = DroppingQueueHandler(self.queue)
+        output = logging.StreamHandler(stream or sys.stderr)
+        output.setFormatter(JsonFormatter() if json_format else TextFormatter())
+        output.addFilter(BlockedPhraseFilter())
+        self.output = output
+        self.listener = _Writer(self.queue, output, respect_handler_level=True)
+        self.library_level = library_level
+        self._started = False
+
+    @classmethod
+    def from_env(cls, stream: Optional[TextIO] = None) -> "LogPipeline":
+        """Read LOG_LEVEL, LOG_LIBRARY_LEVEL, LOG_FORMAT and LOG_QUEUE_SIZE."""
+        return cls(
+            _level(os.environ.get("LOG_LEVEL", "INFO"), logging.INFO),
+            _level(os.environ.get("LOG_LIBRARY_LEVEL", "WARNING"), logging.WARNING),
+            os.environ.get("LOG_FORMAT", "text").lower() == "json",
+            int(os.environ.get("LOG_QUEUE_SIZE", "10000")),
+            stream,
+        )
+
+    def install(self) -> "LogPipeline":
+        """Route the root logger through the queue and start the writer thread."""
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            if isinstance(handler, DroppingQueueHandler):
+                root.removeHandler(handler)
+        root.addHandler(self.handler)
+        root.setLevel(self.level)
+        for name in LIBRARY_LOGGERS:
+            logging.getLogger(name).setLevel(max(self.level, self.library_level))
+        return self.start()
+
+    def start(self) -> "LogPipeline":
+        """Start the writer thread."""
+        if not self._started:
+            self.listener.start()
+            self._started = True
+            atexit.register(self.stop)
+        return self
+
+    def stop(self):
+        """Write out what is queued and stop the writer thread."""
+        if self._started:
+            self._started = False
+            self.listener.stop()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "level": logging.getLevelName(self.level),
+            "format": "json" if self.json_format else "text",
+            "queued": self.queue.qsize(),
+            "dropped": self.handler.dropped,
+        }
+
+
+def _level(name: str, default: int) -> int:
+    level = logging.getLevelName(name.upper())
+    return level if isinstance(level, int) else default
+
+
+def log_request(method: str, path: str, model: str, mapped_model: str, num_messages: int, num_tools: int,
+                status_code: int):
+    """Log a request line: the path, its status and the model it was mapped to."""
+    if request_logger.isEnabledFor(logging.INFO):
+        request_logger.info(
+            "%s %s %s: %s -> %s", method, path, status_code, model, mapped_model,
+            extra={"request": {
+                "method": method, "path": path.split("?")[0], "status": status_code, "model": model,
+                "mapped_model": mapped_model, "messages": num_messages, "tools": num_tools,
+            }},
+        )
@@ -0,0 +1,247 @@
+"""
+Prometheus metrics in the text exposition format, without a client library.
+
+One histogram covers the stages a request goes through, labelled by stage and
+by the model as requested, the model it was routed to and the provider:
+
+    parse              request body to a validated MessagesRequest
+    convert            compiling it to the provider payload (including the
+                       flattening of content for providers that take text only)
+    upstream_ttft      upstream call to its first streamed chunk
+    upstream_total     upstream call to the end of its response or stream
+    stream_processing  time a stream spent in handle_streaming, upstream waits excluded
+    serialize          a non-streaming response to its JSON body
+
+Counters cover upstream tokens in and out and error responses by status, and
+a gauge the streams being sent. Metrics are only updated from the event loop,
+so they need no locks: an update is a dict lookup and a few additions. Label
+values come from clients (model names), so each metric keeps at most
+max_series label sets and counts the rest under "other".
+"""
+import time
+from bisect import bisect_left
+from typing import Any, AsyncIterator, Dict, List, Sequence, Tuple
+
+STAGE_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# original_model, model, provider
+Labels = Tuple[str, str, str]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), max_series: int = 1000):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.max_series = max_series
+        self._series: Dict[Tuple[str, ...], Any] = {}
+        self._overflow = ("other",) * len(self.labelnames)
+
+    def _get(self, labels: Tuple[str, ...]):
+        series = self._series.get(labels)
+        if series is None:
+            if len(self._series) >= self.max_series:
+                labels = self._overflow
+                series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = self._new()
+        return series
+
+    def _new(self):
+        return [0.0]
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for labels, series in sorted(self._series.items()):
+            lines.extend(self._render_series(labels, series))
+        return lines
+
+    def _render_series(self, labels, series) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(series[0])}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, labels: Tuple[str, ...] = (), amount: float = 1):
+        self._get(labels)[0] += amount
+
+    def value(self, labels: Tuple[str, ...] = ()) -> float:
+        series = self._series.get(labels)
+        return series[0] if series else 0.0
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, labels: Tuple[str, ...] = (), amount: float = 1):
+        self._get(labels)[0] -= amount
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = STAGE_BUCKETS, max_series: int = 1000):
+        super().__init__(name, documentation, labelnames, max_series)
+        self.buckets = tuple(buckets)
+
+    def _new(self):
+        # Per-bucket counts (not cumulative; the last one is +Inf), then sum and count
+        return [0] * (len(self.buckets) + 1) + [0.0, 0]
+
+    def observe(self, labels: Tuple[str, ...], value: float):
+        series = self._get(labels)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def count(self, labels: Tuple[str, ...]) -> int:
+        series = self._series.get(labels)
+        return series[-1] if series else 0
+
+    def _render_series(self, labels, series) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), series):
+            cumulative += count
+            le = 'le="' + _format_value(bound) + '"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+        lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(series[-2])}")
+        lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {series[-1]}")
+        return lines
+
+
+def _usage_tokens(usage: Any) -> Tuple[int, int]:
+    if usage is None:
+        return 0, 0
+    if isinstance(usage, dict):
+        return usage.get("prompt_tokens") or 0, usage.get("completion_tokens") or 0
+    return getattr(usage, "prompt_tokens", None) or 0, getattr(usage, "completion_tokens", None) or 0
+
+
+class Metrics:
+    """The proxy's metrics and the helpers that time its stages."""
+
+    def __init__(self, max_series: int = 1000):
+        model_labels = ("original_model", "model", "provider")
+        self.stage_seconds = Histogram(
+            "anthropic_proxy_stage_seconds", "Time spent per request stage.",
+            ("stage",) + model_labels, max_series=max_series,
+        )
+        self.tokens = Counter(
+            "anthropic_proxy_tokens_total", "Upstream tokens, by direction (input, output).",
+            ("direction",) + model_labels, max_series=max_series,
+        )
+        self.active_streams = Gauge("anthropic_proxy_active_streams", "Streaming responses being sent.")
+        self.errors = Counter(
+            "anthropic_proxy_errors_total", "Error responses by HTTP status; stream for errors mid-stream.",
+            ("status",), max_series=max_series,
+        )
+
+    def observe(self, stage: str, labels: Labels, seconds: float):
+        self.stage_seconds.observe((stage,) + labels, seconds)
+
+    def count_tokens(self, labels: Labels, usage: Any):
+        input_tokens, output_tokens = _usage_tokens(usage)
+        if input_tokens:
+            self.tokens.inc(("input",) + labels, input_tokens)
+        if output_tokens:
+            self.tokens.inc(("output",) + labels, output_tokens)
+
+    def error(self, status: Any):
+        self.errors.inc((str(status),))
+
+    def completed(self, labels: Labels, started: float, response: Any):
+        """A non-streaming upstream call started at `started` returned response."""
+        self.observe("upstream_total", labels, time.perf_counter() - started)
+        usage = response.get("usage") if isinstance(response, dict) else getattr(response, "usage", None)
+        self.count_tokens(labels, usage)
+
+    async def track_upstream(self, stream: AsyncIterator[Any], labels: Labels, started: float) -> AsyncIterator[Any]:
+        """Pass an upstream stream through, timing its first chunk and its end and counting its tokens.
+
+        The call is timed to its finish reason; the usage may come in a chunk
+        after it, which handle_streaming reads on to. Streams abandoned before
+        the finish reason (e.g. a losing hedge) are not timed.
+        """
+        first = True
+        finished = False
+        async for chunk in stream:
+            if first:
+                first = False
+                self.observe("upstream_ttft", labels, time.perf_counter() - started)
+            usage = getattr(chunk, "usage", None)
+            if usage is not None:
+                self.count_tokens(labels, usage)
+            choices = getattr(chunk, "choices", None)
+            if not finished and choices and getattr(choices[0], "finish_reason", None):
+                finished = True
+                self.observe("upstream_total", labels, time.perf_counter() - started)
+            yield chunk
+        if not finished:
+            self.observe("upstream_total", labels, time.perf_counter() - started)
+
+    def stream_timer(self, labels: Labels) -> "StreamTimer":
+        return StreamTimer(self, labels)
+
+    def render(self) -> str:
+        lines = []
+        for metric in (self.stage_seconds, self.tokens, self.active_streams, self.errors):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class StreamTimer:
+    """Splits the time a stream takes into time waiting on chunks and time spent converting them.
+
+    upstream() wraps the chunks going into handle_streaming, frames() the frames
+    coming out of it; the difference of the two is the stream_processing stage.
+    """
+
+    def __init__(self, metrics: Metrics, labels: Labels):
+        self.metrics = metrics
+        self.labels = labels
+        self.waiting = 0.0
+
+    async def upstream(self, stream: AsyncIterator[Any]) -> AsyncIterator[Any]:
+        asked = time.perf_counter()
+        async for chunk in stream:
+            self.waiting += time.perf_counter() - asked
+            yield chunk
+            asked = time.perf_counter()
+        self.waiting += time.perf_counter() - asked
+
+    async def frames(self, frames: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        self.metrics.active_streams.inc()
+        busy = 0.0
+        try:
+            asked = time.perf_counter()
+            async for frame in frames:
+                busy += time.perf_counter() - asked
+                yield frame
+                asked = time.perf_counter()
+            busy += time.perf_counter() - asked
+            self.metrics.observe("stream_processing", self.labels, max(0.0, busy - self.waiting))
+        finally:
+            self.metrics.active_streams.dec()
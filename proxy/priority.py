@@ -0,0 +1,130 @@
+"""
+Priority classes and weighted fair queuing for calls waiting on rate limits.
+
+Every request gets a priority class and a flow. The class comes from the
+x-request-priority header, else "priority" in the request metadata, else the
+router tier of the requested model (sonnet-mapped main-loop turns are
+interactive, haiku-mapped calls are background work). The flow is who sent
+it: metadata.user_id, else the API key.
+
+Calls queued by admission control are released in weighted fair order: each
+(class, flow) pair is a queue of its own, served in proportion to its class
+weight, so interactive traffic outweighs background traffic and one client
+flooding the proxy only gets its share instead of starving everyone queued
+behind it. The scheduler is self-clocked fair queuing: a call's finish tag is
+max(virtual time, its flow's last tag) + cost / weight, calls leave in tag
+order, and virtual time is the tag of the last call to leave.
+"""
+import hashlib
+import heapq
+import itertools
+import json
+import os
+from typing import Any, Dict, Hashable, List, Mapping, NamedTuple, Optional, Tuple
+
+
+class Priority(NamedTuple):
+    name: str = "default"
+    weight: float = 1.0
+    flow: str = "anonymous"
+
+
+class PriorityClassifier:
+    """Derives a request's Priority from its headers, metadata and model class."""
+
+    HEADER = "x-request-priority"
+
+    def __init__(self, weights: Optional[Dict[str, float]] = None,
+                 model_classes: Optional[Dict[str, str]] = None, default: str = "interactive"):
+        """
+        Args:
+            weights: Class name to its weight
+            model_classes: Router tier (big, small) to class name
+            default: Class of requests nothing else classifies
+        """
+        self.weights = weights or {"interactive": 4.0, "background": 1.0}
+        self.model_classes = model_classes if model_classes is not None else {
+            "big": "interactive", "small": "background"
+        }
+        self.default = default if default in self.weights else next(iter(self.weights))
+
+    @classmethod
+    def from_env(cls) -> "PriorityClassifier":
+        """Read PRIORITY_WEIGHTS and PRIORITY_MODEL_CLASSES (JSON) and PRIORITY_DEFAULT."""
+        weights = os.getenv("PRIORITY_WEIGHTS")
+        model_classes = os.getenv("PRIORITY_MODEL_CLASSES")
+        return cls(
+            {name: float(weight) for name, weight in json.loads(weights).items()} if weights else None,
+            json.loads(model_classes) if model_classes else None,
+            os.getenv("PRIORITY_DEFAULT", "interactive"),
+        )
+
+    def classify(self, headers: Mapping[str, str], metadata: Optional[Dict[str, Any]],
+                 model_class: Optional[str]) -> Priority:
+        metadata = metadata or {}
+        name = None
+        for candidate in (headers.get(self.HEADER), metadata.get("priority"), self.model_classes.get(model_class)):
+            if isinstance(candidate, str) and candidate.lower() in self.weights:
+                name = candidate.lower()
+                break
+        name = name or self.default
+        return Priority(name, self.weights[name], self.flow(headers, metadata))
+
+    @staticmethod
+    def flow(headers: Mapping[str, str], metadata: Dict[str, Any]) -> str:
+        user_id = metadata.get("user_id")
+        if user_id:
+            return f"user:{user_id}"
+        api_key = headers.get("x-api-key") or headers.get("authorization")
+        if api_key:
+            # Keys are only compared, so keep a digest rather than the secret
+            return "key:" + hashlib.sha256(api_key.encode()).hexdigest()[:12]
+        return "anonymous"
+
+
+class FairQueue:
+    """Self-clocked weighted fair queue of items, each in a flow with a weight."""
+
+    def __init__(self):
+        self._heap: List[Tuple[float, int, Any]] = []
+        self._finish: Dict[Hashable, float] = {}
+        self._seq = itertools.count()
+        self.virtual_time = 0.0
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def tag(self, flow: Hashable, weight: float, cost: float) -> float:
+        """The finish tag an item would get if pushed now."""
+        return max(self.virtual_time, self._finish.get(flow, 0.0)) + cost / weight
+
+    def push(self, item: Any, flow: Hashable, weight: float, cost: float) -> float:
+        tag = self.tag(flow, weight, cost)
+        self._finish[flow] = tag
+        heapq.heappush(self._heap, (tag, next(self._seq), item))
+        return tag
+
+    def peek(self) -> Any:
+        return self._heap[0][2] if self._heap else None
+
+    def pop(self) -> Any:
+        tag, _, item = heapq.heappop(self._heap)
+        self.virtual_time = tag
+        # Flows whose last tag is behind virtual time restart from it anyway
+        if len(self._finish) > 4 * len(self._heap) + 64:
+            self._finish = {flow: t for flow, t in self._finish.items() if t > self.virtual_time}
+        return item
+
+    def last(self) -> Tuple[float, Any]:
+        """The tag and item that would leave last."""
+        tag, _, item = max(self._heap)
+        return tag, item
+
+    def remove(self, item: Any) -> bool:
+        for i, entry in enumerate(self._heap):
+            if entry[2] is item:
+                self._heap[i] = self._heap[-1]
+                self._heap.pop()
+                heapq.heapify(self._heap)
+                return True
+        return False
@@ -0,0 +1,346 @@
+"""
+Exact-match response cache for deterministic requests.
+
+Claude Code sends the same temperature 0 helper requests (titles, summaries,
+topic checks) again and again. When the cache is enabled, a response to a
+temperature 0 request is stored under a hash of the compiled provider payload
+(model, messages, tools and sampling parameters, minus the API key and the
+stream flag), and an identical request is answered without calling upstream.
+
+Entries are kept in provider-neutral form: the text, the tool calls, the
+finish_reason and the usage. A hit is answered as a regular completion for
+non-streaming requests, and replayed as chunks through handle_streaming for
+streaming ones, so both get the same event sequence as an upstream response.
+Streamed responses are recorded as they pass through and stored once the
+finish_reason and the usage (which OpenAI-style streams send in a chunk of its
+own after the finish) have arrived; a stream that fails or is cut short before
+its finish_reason is never stored.
+
+Two stores are available: an in-process LRU, and a SQLite file that survives
+restarts and can be shared by several workers. Both expire entries after a TTL
+and evict the least recently used entries past a byte cap. Calls to the SQLite
+store run in a thread, so waiting on the disk or on another worker's write
+does not block the event loop.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from proxy import json_backend
+
+logger = logging.getLogger(__name__)
+
+# Payload fields that do not change the response
+_IGNORED_FIELDS = frozenset({"api_key", "stream", "stream_options"})
+
+
+def request_key(payload: Dict[str, Any]) -> str:
+    """Hash of a compiled provider payload, independent of key order and of streaming."""
+    canonical = {name: value for name, value in payload.items() if name not in _IGNORED_FIELDS}
+    return hashlib.blake2b(json_backend.dumpb_canonical(canonical, default=str), digest_size=20).hexdigest()
+
+
+def _field(obj: Any, name: str) -> Any:
+    if isinstance(obj, dict):
+        return obj.get(name)
+    return getattr(obj, name, None)
+
+
+def _usage(usage: Any) -> Dict[str, int]:
+    return {
+        "prompt_tokens": _field(usage, "prompt_tokens") or 0,
+        "completion_tokens": _field(usage, "completion_tokens") or 0,
+    }
+
+
+class MemoryStore:
+    """In-process LRU of serialized entries."""
+
+    blocking = False
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.current_bytes = 0
+        self.evictions = 0
+
+    def get(self, key: str, now: float) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= now:
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: str, value: bytes, expires_at: float, now: float):
+        if len(value) > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (value, expires_at)
+        self.current_bytes += len(value)
+        while self.current_bytes > self.max_bytes:
+            _, (evicted, _) = self._entries.popitem(last=False)
+            self.current_bytes -= len(evicted)
+            self.evictions += 1
+
+    def _remove(self, key: str):
+        value, _ = self._entries.pop(key)
+        self.current_bytes -= len(value)
+
+    def clear(self):
+        self._entries.clear()
+        self.current_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "bytes": self.current_bytes, "evictions": self.evictions}
+
+
+class SqliteStore:
+    """Entries in a SQLite file (WAL mode), usable from several processes at once."""
+
+    blocking = True
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, "
+            "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+
+    def get(self, key: str, now: float) -> Optional[bytes]:
+        with self._lock:
+            row = self._db.execute("SELECT value, expires_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            self._db.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def put(self, key: str, value: bytes, expires_at: float, now: float):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                    (key, value, len(value), expires_at, now)
+                )
+                self._db.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+                # Stores happen once per upstream call, so summing the sizes here is cheap enough
+                excess = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0] - self.max_bytes
+                if excess > 0:
+                    evicted = []
+                    for evict_key, size in self._db.execute("SELECT key, size FROM responses ORDER BY accessed_at"):
+                        if excess <= 0:
+                            break
+                        evicted.append((evict_key,))
+                        excess -= size
+                    self._db.executemany("DELETE FROM responses WHERE key = ?", evicted)
+                    self.evictions += len(evicted)
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM responses")
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {"entries": entries, "bytes": size, "evictions": self.evictions}
+
+
+class ResponseCache:
+    """Looks up, stores and replays responses to deterministic requests."""
+
+    def __init__(self, store, ttl: float = 3600.0):
+        self.store = store
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    @staticmethod
+    def cacheable(payload: Dict[str, Any]) -> bool:
+        """Only temperature 0 requests are deterministic enough to answer from the cache."""
+        return payload.get("temperature") == 0
+
+    key = staticmethod(request_key)
+
+    async def _call(self, method, *args):
+        if self.store.blocking:
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            value = await self._call(self.store.get, key, time.time())
+        except sqlite3.Error as e:
+            # The cache is an optimization; a broken store must not fail the request
+            logger.warning("Response cache lookup failed: %s", e)
+            value = None
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json_backend.loads(value)
+
+    async def put(self, key: str, entry: Dict[str, Any]):
+        try:
+            now = time.time()
+            await self._call(self.store.put, key, json_backend.dumpb(entry), now + self.ttl, now)
+        except sqlite3.Error as e:
+            logger.warning("Response cache store failed: %s", e)
+            return
+        self.stores += 1
+
+    async def put_completion(self, key: str, response: Any):
+        """Store a non-streaming LiteLLM response (object or dict)."""
+        choices = _field(response, "choices")
+        if not choices:
+            return
+        message = _field(choices[0], "message")
+        tool_calls = []
+        for tool_call in _field(message, "tool_calls") or []:
+            function = _field(tool_call, "function")
+            tool_calls.append({
+                "id": _field(tool_call, "id"),
+                "name": _field(function, "name") or "",
+                "arguments": _field(function, "arguments") or "",
+            })
+        await self.put(key, {
+            "content": _field(message, "content"),
+            "tool_calls": tool_calls,
+            "finish_reason": _field(choices[0], "finish_reason") or "stop",
+            "usage": _usage(_field(response, "usage")),
+        })
+
+    async def record_stream(self, upstream: AsyncIterator[Any], key: str) -> AsyncIterator[Any]:
+        """Pass a chunk stream through, storing the response once its finish_reason and usage arrive."""
+        text: List[str] = []
+        tool_calls: Dict[Any, Dict[str, Any]] = {}
+        usage = None
+        finished = None
+        try:
+            async for chunk in upstream:
+                if _field(chunk, "usage") is not None:
+                    usage = _field(chunk, "usage")
+                choices = _field(chunk, "choices")
+                if choices and finished is None:
+                    delta = _field(choices[0], "delta")
+                    content = _field(delta, "content") if delta is not None else None
+                    if content:
+                        text.append(content)
+                    for tool_call in (_field(delta, "tool_calls") if delta is not None else None) or []:
+                        function = _field(tool_call, "function")
+                        index = _field(tool_call, "index") or 0
+                        recorded = tool_calls.get(index)
+                        if recorded is None:
+                            recorded = tool_calls[index] = {"id": _field(tool_call, "id"), "name": "", "arguments": ""}
+                        recorded["name"] = recorded["name"] or _field(function, "name") or ""
+                        recorded["arguments"] += _field(function, "arguments") or ""
+                    finished = _field(choices[0], "finish_reason")
+                if finished and usage is not None:
+                    await self._store_stream(key, text, tool_calls, finished, usage)
+                    finished = False
+                yield chunk
+        finally:
+            if finished:
+                # Closed by a consumer that stopped at the finish_reason: the usage chunk is still upstream
+                try:
+                    async for chunk in upstream:
+                        if _field(chunk, "usage") is not None:
+                            usage = _field(chunk, "usage")
+                            break
+                except Exception as e:
+                    logger.debug("Reading the usage after a cached stream's finish failed: %s", e)
+                await self._store_stream(key, text, tool_calls, finished, usage)
+
+    async def _store_stream(self, key: str, text: List[str], tool_calls: Dict[Any, Dict[str, Any]],
+                            finish_reason: str, usage: Any):
+        await self.put(key, {
+            "content": "".join(text) or None,
+            "tool_calls": list(tool_calls.values()),
+            "finish_reason": finish_reason,
+            "usage": _usage(usage),
+        })
+
+    @staticmethod
+    def to_completion(entry: Dict[str, Any]) -> Dict[str, Any]:
+        """An entry as an OpenAI-format completion dict for convert_litellm_to_anthropic."""
+        message = {"role": "assistant", "content": entry["content"]}
+        if entry["tool_calls"]:
+            message["tool_calls"] = [
+                {"id": call["id"], "type": "function",
+                 "function": {"name": call["name"], "arguments": call["arguments"]}}
+                for call in entry["tool_calls"]
+            ]
+        return {"choices": [{"message": message, "finish_reason": entry["finish_reason"]}], "usage": entry["usage"]}
+
+    @staticmethod
+    async def replay(entry: Dict[str, Any]) -> AsyncIterator[Any]:
+        """An entry as stream chunks for handle_streaming: text, each tool call, then the finish."""
+        if entry["content"]:
+            delta = SimpleNamespace(content=entry["content"])
+            yield SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=delta, finish_reason=None)])
+        for index, call in enumerate(entry["tool_calls"]):
+            delta = SimpleNamespace(content=None, tool_calls=[SimpleNamespace(
+                index=index, id=call["id"], function=SimpleNamespace(name=call["name"], arguments=call["arguments"])
+            )])
+            yield SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=delta, finish_reason=None)])
+        usage = SimpleNamespace(**entry["usage"])
+        finish = SimpleNamespace(delta=SimpleNamespace(content=None), finish_reason=entry["finish_reason"])
+        yield SimpleNamespace(usage=usage, choices=[finish])
+
+    def clear(self):
+        self.store.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters for monitoring cache effectiveness."""
+        return {
+            **self.store.stats(),
+            "max_bytes": self.store.max_bytes,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stores": self.stores,
+        }
+
+
+def create_response_cache(backend: str, ttl: float, max_bytes: int, path: str) -> Optional[ResponseCache]:
+    """Build the cache from configuration; returns None when it is disabled."""
+    backend = backend.lower()
+    if backend in ("", "off", "none", "0", "false"):
+        return None
+    if backend == "memory":
+        return ResponseCache(MemoryStore(max_bytes), ttl)
+    if backend == "sqlite":
+        return ResponseCache(SqliteStore(path, max_bytes), ttl)
+    logger.warning("Unknown RESPONSE_CACHE backend %r, response cache disabled", backend)
+    return None
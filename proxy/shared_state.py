@@ -0,0 +1,193 @@
+"""
+State shared by the worker processes of one host.
+
+With several workers (see proxy/launcher.py) each process would otherwise
+keep its own token buckets and circuit breakers: every worker would admit up
+to the full upstream rate limit, and a failing backend would have to trip a
+breaker in each worker before traffic stopped. With SHARED_STATE_PATH set,
+the buckets of the admission controller (proxy/admission.py), and the breaker
+states and recent outcomes of the provider health trackers
+(providers/health.py), are kept in one SQLite file in WAL mode, which every
+worker reads and updates in short transactions. No external service is
+needed.
+
+These transactions run on the event loop, so a worker waits at most
+SHARED_STATE_BUSY_TIMEOUT_MS (default 50) for another to release the file.
+When it cannot get it in that time, SharedStateBusy is raised and callers
+decide from the state they read last, as a lone worker would; for a second
+after that the file is not tried at all, so contention costs at most one such
+wait per second. The sqlite response cache can share the file too (see
+RESPONSE_CACHE_PATH).
+
+Times are time.monotonic() values, which on one host are the same clock in
+every process. They do not survive a reboot, so state written before the
+last boot is dropped when the file is opened.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+BREAKER_FIELDS = ("state", "opened_at", "probe_in_flight", "consecutive_failures", "successes", "failures",
+                  "rejected", "times_opened")
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value REAL NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, level REAL NOT NULL, updated REAL NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS breakers (key TEXT PRIMARY KEY, state TEXT NOT NULL, opened_at REAL NOT NULL, "
+    "probe_in_flight INTEGER NOT NULL, consecutive_failures INTEGER NOT NULL, successes INTEGER NOT NULL, "
+    "failures INTEGER NOT NULL, rejected INTEGER NOT NULL, times_opened INTEGER NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS health_samples (key TEXT NOT NULL, at REAL NOT NULL, ok INTEGER NOT NULL, "
+    "latency REAL)",
+    "CREATE INDEX IF NOT EXISTS health_samples_key_at ON health_samples (key, at)",
+)
+
+# Seconds transactions are not attempted after the file was found busy
+_BUSY_BACKOFF = 1.0
+
+# Monotonic times from a boot whose start differs by more than this are from another boot
+_BOOT_TOLERANCE = 5.0
+
+
+class SharedStateBusy(Exception):
+    """Another worker held the shared file past the busy timeout."""
+
+
+class SharedState:
+    """The shared SQLite file: token bucket levels, breaker states and health samples."""
+
+    # Raised by transaction(), for callers (providers/health.py) that do not import this module
+    Busy = SharedStateBusy
+
+    def __init__(self, path: str, busy_timeout: float = 0.05):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self._lock = threading.RLock()
+        self._busy_until = 0.0
+        self.transactions = 0
+        self.busy_waits = 0
+        self.busy = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # Workers starting together wait for each other to set the file up
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        with self.transaction() as db:
+            for statement in _SCHEMA:
+                db.execute(statement)
+            self._check_boot(db)
+        self._db.execute(f"PRAGMA busy_timeout = {int(busy_timeout * 1000)}")
+
+    @classmethod
+    def from_env(cls) -> Optional["SharedState"]:
+        """The file at SHARED_STATE_PATH; None (state kept per process) when it is not set or "off"."""
+        path = os.environ.get("SHARED_STATE_PATH", "")
+        if path.lower() in ("", "off", "none", "false", "0"):
+            return None
+        return cls(path, float(os.environ.get("SHARED_STATE_BUSY_TIMEOUT_MS", "50")) / 1000)
+
+    def _check_boot(self, db: sqlite3.Connection):
+        boot = time.time() - time.monotonic()
+        row = db.execute("SELECT value FROM meta WHERE name = 'boot'").fetchone()
+        if row is not None and abs(row[0] - boot) <= _BOOT_TOLERANCE:
+            return
+        if row is not None:
+            logger.info("Shared state in %s is from before the last boot, starting afresh", self.path)
+        for table in ("buckets", "breakers", "health_samples"):
+            db.execute(f"DELETE FROM {table}")
+        db.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('boot', ?)", (boot,))
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """A write transaction; re-entrant within a thread, exclusive across processes.
+
+        Raises:
+            SharedStateBusy: Another worker holds the file, or did so less than a second ago
+        """
+        with self._lock:
+            if self._db.in_transaction:
+                yield self._db
+                return
+            started = time.monotonic()
+            if started < self._busy_until:
+                self.busy += 1
+                raise SharedStateBusy(self.path)
+            try:
+                self._db.execute("BEGIN IMMEDIATE")
+            except sqlite3.OperationalError as error:
+                if "locked" not in str(error) and "busy" not in str(error):
+                    raise
+                self.busy += 1
+                self._busy_until = time.monotonic() + _BUSY_BACKOFF
+                logger.debug("Shared state in %s is busy, deciding locally for %.0fs", self.path, _BUSY_BACKOFF)
+                raise SharedStateBusy(self.path) from error
+            if time.monotonic() - started > 0.001:
+                self.busy_waits += 1
+            self.transactions += 1
+            try:
+                yield self._db
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    # Token buckets
+
+    def bucket(self, key: str) -> Optional[Tuple[float, float]]:
+        """(level, updated) of a bucket, or None if no worker has used it yet."""
+        with self._lock:
+            return self._db.execute("SELECT level, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+
+    def save_bucket(self, key: str, level: float, updated: float):
+        with self.transaction() as db:
+            db.execute("INSERT OR REPLACE INTO buckets (key, level, updated) VALUES (?, ?, ?)", (key, level, updated))
+
+    # Circuit breakers
+
+    def breaker(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute(f"SELECT {', '.join(BREAKER_FIELDS)} FROM breakers WHERE key = ?",
+                                   (key,)).fetchone()
+        return dict(zip(BREAKER_FIELDS, row)) if row is not None else None
+
+    def save_breaker(self, key: str, fields: Dict[str, Any]):
+        with self.transaction() as db:
+            db.execute(
+                f"INSERT OR REPLACE INTO breakers (key, {', '.join(BREAKER_FIELDS)}) "
+                f"VALUES (?, {', '.join('?' * len(BREAKER_FIELDS))})",
+                (key, *(fields[name] for name in BREAKER_FIELDS)),
+            )
+
+    def add_samples(self, key: str, samples: List[Tuple[float, bool, Optional[float]]], window: float):
+        """Record (at, ok, latency) outcomes, dropping the ones that fell out of the window."""
+        if not samples:
+            return
+        with self.transaction() as db:
+            db.executemany("INSERT INTO health_samples (key, at, ok, latency) VALUES (?, ?, ?, ?)",
+                           [(key, at, int(ok), latency) for at, ok, latency in samples])
+            db.execute("DELETE FROM health_samples WHERE key = ? AND at < ?", (key, samples[-1][0] - window))
+
+    def samples(self, key: str, since: float, limit: int) -> List[Tuple[float, bool, Optional[float]]]:
+        """The latest outcomes since a time, oldest first."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT at, ok, latency FROM health_samples WHERE key = ? AND at >= ? ORDER BY at DESC LIMIT ?",
+                (key, since, limit),
+            ).fetchall()
+        return [(at, bool(ok), latency) for at, ok, latency in reversed(rows)]
+
+    def clear_samples(self, key: str):
+        with self.transaction() as db:
+            db.execute("DELETE FROM health_samples WHERE key = ?", (key,))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = {table: self._db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                      for table in ("buckets", "breakers", "health_samples")}
+        return {"path": self.path, **counts, "transactions": self.transactions, "busy_waits": self.busy_waits,
+                "busy": self.busy}
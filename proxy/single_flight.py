@@ -0,0 +1,181 @@
+"""
+Single-flight coalescing of identical in-flight upstream requests.
+
+When several clients send the same request at the same moment, only the first
+one (the leader) calls upstream; the others attach to its call. The upstream
+call runs in its own task, so a leader that disconnects does not take the
+call down with it; the call is only cancelled once every attached request is
+gone.
+
+For streaming requests each attached request gets its own iterator over the
+shared chunk sequence and feeds it into its own handle_streaming. Chunks are
+kept for the life of the call, so a request that attaches late first replays
+every chunk received so far and then follows the live stream.
+
+Keys come from the caller (the canonical hash of the compiled request).
+Non-streaming calls and streams are tracked separately, so the same key can
+be used for both.
+"""
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+
+class _Flight:
+    """One upstream call and the requests attached to it."""
+
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        self.subscribers = 0
+        # Streaming only
+        self.opened: Optional[asyncio.Future] = None
+        self.chunks: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.changed = asyncio.Event()
+
+    def notify(self):
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+    def release(self):
+        self.subscribers -= 1
+        if self.subscribers == 0 and not self.task.done():
+            self.task.cancel()
+
+
+class _Subscription:
+    """One request's iterator over the chunks of a shared stream.
+
+    It is counted among the flight's subscribers from the moment it is handed
+    out, and gives its place up when it ends, fails, is closed, or is dropped
+    without ever being read (a client gone before its response started), so
+    it never keeps the upstream call going for nobody.
+    """
+
+    def __init__(self, flight: _Flight):
+        self.flight = flight
+        self.index = 0
+        self.released = False
+
+    def __aiter__(self) -> "_Subscription":
+        return self
+
+    async def __anext__(self) -> Any:
+        flight = self.flight
+        try:
+            while True:
+                if self.index < len(flight.chunks):
+                    chunk = flight.chunks[self.index]
+                    self.index += 1
+                    return chunk
+                if flight.done:
+                    if flight.error is not None:
+                        raise flight.error
+                    raise StopAsyncIteration
+                await flight.changed.wait()
+        except BaseException:
+            self._release()
+            raise
+
+    async def aclose(self):
+        self._release()
+
+    def _release(self):
+        if not self.released:
+            self.released = True
+            self.flight.release()
+
+    def __del__(self):
+        if not self.released and not self.flight.task.get_loop().is_closed():
+            self._release()
+
+
+class SingleFlight:
+    """Shares one upstream call between concurrent identical requests."""
+
+    def __init__(self):
+        self._calls: Dict[str, _Flight] = {}
+        self._streams: Dict[str, _Flight] = {}
+        self.leaders = 0  # Upstream calls made
+        self.coalesced = 0  # Requests that attached to a call already in flight
+        self.coalesced_streams = 0
+
+    def _start(self, flights: Dict[str, _Flight], key: str, flight: _Flight, coro: Awaitable[Any]):
+        flight.task = asyncio.ensure_future(coro)
+        flights[key] = flight
+        self.leaders += 1
+
+        def forget(_):
+            if flights.get(key) is flight:
+                del flights[key]
+
+        flight.task.add_done_callback(forget)
+
+    async def call(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """Return factory()'s result, awaiting one shared call for all concurrent callers with this key."""
+        flight = self._calls.get(key)
+        if flight is None:
+            flight = _Flight()
+            self._start(self._calls, key, flight, factory())
+        else:
+            self.coalesced += 1
+        flight.subscribers += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.release()
+
+    async def stream(self, key: str, open_stream: Callable[[], Awaitable[AsyncIterator[Any]]]) -> AsyncIterator[Any]:
+        """Open one upstream stream for all concurrent callers with this key.
+
+        Returns once the upstream stream is open (errors opening it are raised
+        to every caller) with an iterator over every chunk from the start.
+        """
+        flight = self._streams.get(key)
+        if flight is None:
+            flight = _Flight()
+            flight.opened = asyncio.get_running_loop().create_future()
+            self._start(self._streams, key, flight, self._pump(flight, open_stream))
+        else:
+            self.coalesced_streams += 1
+        # Counted before the iterator starts, so the stream stays up for requests
+        # that have attached but not started reading yet (see _Subscription)
+        flight.subscribers += 1
+        try:
+            await asyncio.shield(flight.opened)
+        except BaseException:
+            flight.release()
+            raise
+        return _Subscription(flight)
+
+    async def _pump(self, flight: _Flight, open_stream: Callable[[], Awaitable[AsyncIterator[Any]]]):
+        try:
+            upstream = await open_stream()
+        except asyncio.CancelledError:
+            flight.opened.cancel()
+            raise
+        except Exception as e:
+            flight.opened.set_exception(e)
+            return
+        flight.opened.set_result(None)
+        try:
+            async for chunk in upstream:
+                flight.chunks.append(chunk)
+                flight.notify()
+        except Exception as e:
+            flight.error = e
+        finally:
+            flight.done = True
+            flight.notify()
+            aclose = getattr(upstream, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+    def stats(self) -> Dict[str, int]:
+        """Counters for monitoring how many upstream calls were saved."""
+        return {
+            "upstream_calls": self.leaders,
+            "coalesced": self.coalesced,
+            "coalesced_streams": self.coalesced_streams,
+            "in_flight": len(self._calls) + len(self._streams),
+        }
@@ -0,0 +1,95 @@
+"""
+Server-sent event encoder for Anthropic streaming responses.
+
+Every frame the proxy streams has a fixed shape, so the bytes around the
+variable part are serialized once at import time. Encoding a text or tool
+argument delta is then a single JSON string escape plus one bytes join. The
+variable parts go through proxy.json_backend; with the standard library backend
+the output is byte-for-byte what json.dumps of the full event dict produces.
+"""
+from typing import Dict, Optional
+
+from proxy.json_backend import dumpb
+
+DONE = b"data: [DONE]\n\n"
+PING = b'event: ping\ndata: {"type": "ping"}\n\n'
+MESSAGE_STOP = b'event: message_stop\ndata: {"type": "message_stop"}\n\n'
+
+_TEXT_DELTA_PREFIX = b'event: content_block_delta\ndata: {"type": "content_block_delta", "index": '
+_TEXT_DELTA_MIDDLE = b', "delta": {"type": "text_delta", "text": '
+_JSON_DELTA_MIDDLE = b', "delta": {"type": "input_json_delta", "partial_json": '
+_DELTA_SUFFIX = b"}}\n\n"
+
+# Per-index prefixes, built on first use; streams rarely have more than a few blocks
+_text_prefixes: Dict[int, bytes] = {}
+_json_prefixes: Dict[int, bytes] = {}
+_block_stops: Dict[int, bytes] = {}
+
+
+def _frame(event: str, data: dict) -> bytes:
+    return b"".join((b"event: ", event.encode(), b"\ndata: ", dumpb(data), b"\n\n"))
+
+
+def text_delta(index: int, text: str) -> bytes:
+    """content_block_delta carrying a text_delta."""
+    prefix = _text_prefixes.get(index)
+    if prefix is None:
+        prefix = _text_prefixes[index] = _TEXT_DELTA_PREFIX + str(index).encode() + _TEXT_DELTA_MIDDLE
+    return b"".join((prefix, dumpb(text), _DELTA_SUFFIX))
+
+
+def input_json_delta(index: int, partial_json: str) -> bytes:
+    """content_block_delta carrying an input_json_delta."""
+    prefix = _json_prefixes.get(index)
+    if prefix is None:
+        prefix = _json_prefixes[index] = _TEXT_DELTA_PREFIX + str(index).encode() + _JSON_DELTA_MIDDLE
+    return b"".join((prefix, dumpb(partial_json), _DELTA_SUFFIX))
+
+
+def content_block_stop(index: int) -> bytes:
+    frame = _block_stops.get(index)
+    if frame is None:
+        frame = _block_stops[index] = _frame("content_block_stop", {"type": "content_block_stop", "index": index})
+    return frame
+
+
+TEXT_BLOCK_START = _frame("content_block_start", {
+    "type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}
+})
+
+
+def tool_use_block_start(index: int, tool_id: str, name: str) -> bytes:
+    return _frame("content_block_start", {
+        "type": "content_block_start",
+        "index": index,
+        "content_block": {"type": "tool_use", "id": tool_id, "name": name, "input": {}}
+    })
+
+
+def message_start(message_id: str, model: str) -> bytes:
+    return _frame("message_start", {
+        "type": "message_start",
+        "message": {
+            "id": message_id,
+            "type": "message",
+            "role": "assistant",
+            "model": model,
+            "content": [],
+            "stop_reason": None,
+            "stop_sequence": None,
+            "usage": {
+                "input_tokens": 0,
+                "cache_creation_input_tokens": 0,
+                "cache_read_input_tokens": 0,
+                "output_tokens": 0
+            }
+        }
+    })
+
+
+def message_delta(stop_reason: str, output_tokens: int, stop_sequence: Optional[str] = None) -> bytes:
+    return _frame("message_delta", {
+        "type": "message_delta",
+        "delta": {"stop_reason": stop_reason, "stop_sequence": stop_sequence},
+        "usage": {"output_tokens": output_tokens}
+    })
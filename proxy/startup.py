@@ -0,0 +1,256 @@
+"""
+Fast start: deferred heavy imports, background pre-warming and a startup report.
+
+LiteLLM accounts for nearly all of the proxy's import time and a large part
+of its idle memory, yet requests to providers on the direct httpx engine
+never need it. With FAST_START, modules wrapped in lazy_import() are imported
+on first use instead of at startup; PREWARM then imports them (and warms
+what they load lazily themselves, like tokenizers) on a worker thread once
+startup has finished, so the socket is bound and serving while they load.
+
+The StartupReport keeps how long each startup phase took, when each deferred
+module was loaded, by what and at what cost, and the process RSS. With
+STARTUP_PROFILE_IMPORTS it also times every module imported, the way
+python -X importtime does, and keeps the slowest. It is shown on GET /.
+"""
+import asyncio
+import builtins
+import importlib.util
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def rss_mb() -> Optional[float]:
+    """Resident set size of this process in MB, where the platform exposes it."""
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # Peak rather than current RSS: in KB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+class ImportTimer:
+    """Times modules as they are imported, like python -X importtime.
+
+    Wraps builtins.__import__ while running, so it sees import statements (not
+    importlib.import_module calls made by libraries themselves). Each module
+    imported for the first time gets its cumulative time, including the
+    modules it imports, and its self time, excluding them.
+    """
+
+    def __init__(self):
+        self.times: Dict[str, Tuple[float, float]] = {}
+        self._original = None
+        self._local = threading.local()
+
+    def start(self):
+        if self._original is None:
+            self._original = builtins.__import__
+            builtins.__import__ = self._import
+
+    def stop(self):
+        if self._original is not None:
+            builtins.__import__ = self._original
+            self._original = None
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        original = self._original or builtins.__import__
+        if level:
+            package = (globals or {}).get("__package__") or ""
+            try:
+                resolved = importlib.util.resolve_name("." * level + name, package)
+            except (ImportError, ValueError):
+                resolved = name
+        else:
+            resolved = name
+        if resolved not in sys.modules:
+            pending = [resolved]
+        else:
+            # from package import submodule: the submodules are the new imports
+            pending = [f"{resolved}.{item}" for item in fromlist or () if item != "*"]
+            pending = [module for module in pending if module not in sys.modules]
+        if not pending:
+            return original(name, globals, locals, fromlist, level)
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        stack.append(0.0)
+        started = time.perf_counter()
+        try:
+            return original(name, globals, locals, fromlist, level)
+        finally:
+            cumulative = time.perf_counter() - started
+            children = stack.pop()
+            if stack:
+                stack[-1] += cumulative
+            imported = [module for module in pending if module in sys.modules and module not in self.times]
+            if imported:
+                self.times[imported[0]] = (cumulative - children, cumulative)
+
+    def slowest(self, count: int = 15) -> List[Dict[str, Any]]:
+        ranked = sorted(self.times.items(), key=lambda item: item[1][1], reverse=True)[:count]
+        return [{"module": name, "self_ms": round(own * 1000, 1), "cumulative_ms": round(total * 1000, 1)}
+                for name, (own, total) in ranked]
+
+
+class StartupReport:
+    """How long startup took, phase by phase, and what was loaded later."""
+
+    def __init__(self, fast_start: bool = False, prewarm: bool = True, profile_imports: bool = False):
+        self.fast_start = fast_start
+        self.prewarm = prewarm and fast_start
+        self.started = time.perf_counter()
+        self._mark = self.started
+        self.phases: Dict[str, float] = {}
+        self.ready_after: Optional[float] = None
+        self.rss_at_ready: Optional[float] = None
+        self.deferred: Dict[str, Dict[str, Any]] = {}
+        self.prewarm_state = "off" if not self.prewarm else "pending"
+        self.prewarm_seconds: Optional[float] = None
+        self.import_timer = ImportTimer() if profile_imports else None
+        if self.import_timer is not None:
+            self.import_timer.start()
+
+    @classmethod
+    def from_env(cls) -> "StartupReport":
+        """Read FAST_START, PREWARM and STARTUP_PROFILE_IMPORTS."""
+        def flag(name, default):
+            return os.environ.get(name, default).lower() in ("1", "true", "yes")
+        return cls(flag("FAST_START", "false"), flag("PREWARM", "true"), flag("STARTUP_PROFILE_IMPORTS", "false"))
+
+    def mark(self, phase: str):
+        """Close a startup phase: the time since the previous mark goes to it."""
+        now = time.perf_counter()
+        self.phases[phase] = now - self._mark
+        self._mark = now
+
+    def ready(self):
+        """The app finished starting up and is about to serve."""
+        if self.ready_after is None:
+            self.ready_after = time.perf_counter() - self.started
+            self.rss_at_ready = rss_mb()
+            deferred = [name for name, entry in self.deferred.items() if not entry["loaded"]]
+            logger.info(
+                "Ready in %.0fms (%s), RSS %sMB%s", self.ready_after * 1000,
+                ", ".join(f"{phase} {seconds * 1000:.0f}ms" for phase, seconds in self.phases.items()),
+                self.rss_at_ready, f", deferred: {', '.join(deferred)}" if deferred else "",
+            )
+
+    def loaded(self, name: str, seconds: float, modules: int, trigger: str):
+        self.deferred[name].update(loaded=True, load_ms=round(seconds * 1000, 1), modules=modules, trigger=trigger)
+        logger.info("Loaded %s in %.0fms (%d modules, %s)", name, seconds * 1000, modules, trigger)
+
+    async def run_prewarm(self, steps: List[Tuple[str, Callable[[], Any]]]):
+        """Run warm-up steps on a worker thread, one after the other."""
+        if not self.prewarm:
+            return
+        self.prewarm_state = "running"
+        started = time.perf_counter()
+        try:
+            for name, step in steps:
+                await asyncio.to_thread(step)
+        except Exception as e:
+            self.prewarm_state = f"failed at {name}: {e}"
+            logger.warning("Pre-warming failed at %s: %s", name, e)
+            return
+        finally:
+            self.prewarm_seconds = time.perf_counter() - started
+        self.prewarm_state = "done"
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "fast_start": self.fast_start,
+            "phases_ms": {phase: round(seconds * 1000, 1) for phase, seconds in self.phases.items()},
+            "ready_ms": round(self.ready_after * 1000, 1) if self.ready_after is not None else None,
+            "rss_mb_at_ready": self.rss_at_ready,
+            "rss_mb": rss_mb(),
+            "deferred": self.deferred,
+            "prewarm": {
+                "state": self.prewarm_state,
+                "ms": round(self.prewarm_seconds * 1000, 1) if self.prewarm_seconds is not None else None,
+            },
+            "slowest_imports": self.import_timer.slowest() if self.import_timer is not None else None,
+        }
+
+
+class LazyModule:
+    """A module imported on first attribute access (or load()), recorded in the startup report.
+
+    Setting an attribute sets it on the module, so patching module functions
+    through the proxy works as it does on the module itself.
+    """
+
+    def __init__(self, name: str, report: StartupReport):
+        object.__setattr__(self, "_name", name)
+        object.__setattr__(self, "_report", report)
+        object.__setattr__(self, "_module", None)
+        object.__setattr__(self, "_lock", threading.Lock())
+        report.deferred.setdefault(name, {"loaded": False})
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    def load(self, trigger: str = "first use") -> Any:
+        module = self._module
+        if module is not None:
+            return module
+        with self._lock:
+            if self._module is None:
+                already = self._name in sys.modules
+                before = len(sys.modules)
+                started = time.perf_counter()
+                # An import statement rather than importlib, so the ImportTimer sees it
+                __import__(self._name)
+                module = sys.modules[self._name]
+                if not already:
+                    self._report.loaded(self._name, time.perf_counter() - started, len(sys.modules) - before, trigger)
+                else:
+                    self._report.deferred[self._name].update(loaded=True)
+                object.__setattr__(self, "_module", module)
+        return self._module
+
+    async def load_async(self, trigger: str = "first use") -> Any:
+        """Load on a worker thread, so the event loop keeps serving meanwhile."""
+        if self._module is not None:
+            return self._module
+        return await asyncio.to_thread(self.load, trigger)
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self.load(), attr)
+
+    def __setattr__(self, attr: str, value: Any):
+        setattr(self.load(), attr, value)
+
+    def __repr__(self) -> str:
+        return f"<lazy module {self._name!r}{' (loaded)' if self.loaded else ''}>"
+
+
+# One report and one proxy per module for the process, shared by every module that defers an import
+report = StartupReport.from_env()
+_lazy: Dict[str, LazyModule] = {}
+
+
+def lazy_import(name: str) -> LazyModule:
+    """The module, imported on first use; at once unless FAST_START is on."""
+    module = _lazy.get(name)
+    if module is None:
+        module = _lazy[name] = LazyModule(name, report)
+        if not report.fast_start:
+            module.load("startup")
+    return module
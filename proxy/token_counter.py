@@ -0,0 +1,119 @@
+"""
+Incremental token counting for /v1/messages/count_tokens.
+
+LiteLLM's token_counter adds up a count per message plus a fixed overhead that
+depends only on the tools, the tool choice and the system messages. Claude Code
+calls count_tokens over and over with a conversation that only grows at the end,
+so the counter caches each message's count by a hash of its content and the
+tokenizer model. A repeated call only tokenizes the messages, and the tool
+schemas, that it has not seen before. Totals are identical to a single
+litellm.token_counter call over the whole request.
+
+Tokenizers are the ones LiteLLM bundles (tiktoken encodings and the Anthropic
+tokenizer), so counting never needs the network. LiteLLM loads each one once
+and keeps it for the life of the process. LiteLLM itself is imported lazily
+with FAST_START (see proxy/startup.py), by the first count.
+"""
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from proxy import json_backend
+from proxy.startup import lazy_import
+
+logger = logging.getLogger(__name__)
+
+litellm = lazy_import("litellm")
+
+_PROVIDER_PREFIXES = ("openai/", "azure/", "gemini/", "anthropic/")
+
+
+def tokenizer_model(model: str) -> str:
+    """Model name to pick a tokenizer by: the routed model without its provider prefix."""
+    if model.startswith(_PROVIDER_PREFIXES):
+        return model.split("/", 1)[1]
+    return model
+
+
+def _digest(value: Any) -> bytes:
+    return hashlib.blake2b(json_backend.dumpb(value, default=str), digest_size=16).digest()
+
+
+class TokenCounter:
+    """Token counter with an LRU of per-message counts.
+
+    Thread-safe: counts can be computed on worker threads while the event
+    loop keeps serving other requests.
+    """
+
+    def __init__(self, max_entries: int = 50_000):
+        self.max_entries = max_entries
+        self._counts: "OrderedDict[tuple, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def count(self, model: str, messages: List[Dict[str, Any]], tools: Optional[List[Dict[str, Any]]] = None,
+              tool_choice: Any = None) -> int:
+        """Count the input tokens of a compiled (OpenAI format) request."""
+        tokenizer = tokenizer_model(model)
+        total = 0
+        system = []
+        for message in messages:
+            digest = _digest(message)
+            total += self._message_tokens(tokenizer, message, digest)
+            if message.get("role") == "system":
+                system.append((message, digest))
+        return total + self._extra_tokens(tokenizer, system, tools, tool_choice)
+
+    def _message_tokens(self, tokenizer: str, message: Dict[str, Any], digest: bytes) -> int:
+        key = ("message", tokenizer, digest)
+        count = self._get(key)
+        if count is None:
+            count = litellm.token_counter(model=tokenizer, messages=[message], count_response_tokens=True)
+            self._put(key, count)
+        return count
+
+    def _extra_tokens(self, tokenizer: str, system: List[tuple], tools: Optional[List[Dict[str, Any]]],
+                      tool_choice: Any) -> int:
+        """Reply priming plus tool definitions, which LiteLLM adjusts when a system message is present."""
+        key = ("extra", tokenizer, _digest([tools, tool_choice]), tuple(digest for _, digest in system))
+        count = self._get(key)
+        if count is None:
+            system_messages = [message for message, _ in system]
+            with_system = litellm.token_counter(model=tokenizer, messages=system_messages,
+                                                tools=tools, tool_choice=tool_choice)
+            count = with_system - sum(self._message_tokens(tokenizer, message, digest) for message, digest in system)
+            self._put(key, count)
+        return count
+
+    def _get(self, key: tuple) -> Optional[int]:
+        with self._lock:
+            count = self._counts.get(key)
+            if count is None:
+                self.misses += 1
+                return None
+            self._counts.move_to_end(key)
+            self.hits += 1
+            return count
+
+    def _put(self, key: tuple, count: int):
+        with self._lock:
+            self._counts[key] = count
+            while len(self._counts) > self.max_entries:
+                self._counts.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._counts.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Counters for monitoring cache effectiveness."""
+        return {
+            "entries": len(self._counts),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
@@ -1,90 +1,81 @@
-from fastapi import FastAPI, Request, HTTPException
+# Load environment variables from .env file before the providers read their settings
+from dotenv import load_dotenv
+load_dotenv()
+
+# Startup timing starts before anything heavy is imported. With FAST_START,
+# LiteLLM is only imported by the first request that needs it (or PREWARM).
+from proxy.startup import lazy_import, report as startup_report
+
+from fastapi import Depends, FastAPI, Request, HTTPException
+from fastapi.exceptions import RequestValidationError
 import uvicorn
 import logging
-import json
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, Field, ValidationError, field_validator, model_validator
 from typing import List, Dict, Any, Optional, Union, Literal
 import httpx
 import os
-from fastapi.responses import JSONResponse, StreamingResponse
-import litellm
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 import uuid
 import time
-from dotenv import load_dotenv
+import math
 import re
 from datetime import datetime
 import sys
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 
 # Import the modular provider system
 try:
     from providers.registry import registry
 except ImportError:
     # If running from the project directory
-    import sys
     sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
     from providers.registry import registry
-
-# Load environment variables from .env file
-load_dotenv()
-
-# Configure logging
-logging.basicConfig(
-    level=logging.DEBUG,  # Show all debug messages
-    format='%(asctime)s - %(levelname)s - %(message)s',
-)
+from providers.base import Capabilities
+from proxy.admission import AdmissionController, OverloadedError
+from proxy.priority import Priority, PriorityClassifier
+from proxy.compiler import compile_request
+from proxy.conversion_cache import ConversionCache
+from proxy.failover import Failover
+from proxy.hedging import Hedger
+from proxy.logs import LogPipeline, log_request
+from proxy.metrics import Metrics
+from proxy.coalesce import CoalescingStats, coalesce_chunks
+from proxy.response_cache import create_response_cache, request_key
+from proxy.shared_state import SharedState
+from proxy.single_flight import SingleFlight
+from proxy.token_counter import TokenCounter, tokenizer_model
+from proxy import json_backend, sse
+
+litellm = lazy_import("litellm")
+startup_report.mark("imports")
+
+# Configure logging: records go through a queue to a writer thread, so a slow
+# terminal never blocks the event loop. LOG_LEVEL (default INFO), LOG_FORMAT=json
+# for structured output, LOG_LIBRARY_LEVEL for LiteLLM/httpx (default WARNING).
+log_pipeline = LogPipeline.from_env().install()
 logger = logging.getLogger(__name__)
 
 # Configure uvicorn to be quieter
-import uvicorn
 # Tell uvicorn's loggers to be quiet
 logging.getLogger("uvicorn").setLevel(logging.WARNING)
 logging.getLogger("uvicorn.access").setLevel(logging.WARNING)
 logging.getLogger("uvicorn.error").setLevel(logging.WARNING)
 
-# Create a filter to block any log messages containing specific strings
-class MessageFilter(logging.Filter):
-    def filter(self, record):
-        # Block messages containing these strings
-        blocked_phrases = [
-            "LiteLLM completion()",
-            "HTTP Request:", 
-            "selected model name for cost calculation",
-            "utils.py",
-            "cost_calculator"
-        ]
-        
-        if hasattr(record, 'msg') and isinstance(record.msg, str):
-            for phrase in blocked_phrases:
-                if phrase in record.msg:
-                    return False
-        return True
-
-# Apply the filter to the root logger to catch all messages
-root_logger = logging.getLogger()
-root_logger.addFilter(MessageFilter())
-
-# Custom formatter for model mapping logs
-class ColorizedFormatter(logging.Formatter):
-    """Custom formatter to highlight model mappings"""
-    BLUE = "\033[94m"
-    GREEN = "\033[92m"
-    YELLOW = "\033[93m"
-    RED = "\033[91m"
-    RESET = "\033[0m"
-    BOLD = "\033[1m"
-    
-    def format(self, record):
-        if record.levelno == logging.debug and "MODEL MAPPING" in record.msg:
-            # Apply colors and formatting to model mapping logs
-            return f"{self.BOLD}{self.GREEN}{record.msg}{self.RESET}"
-        return super().format(record)
-
-# Apply custom formatter to console handler
-for handler in logger.handlers:
-    if isinstance(handler, logging.StreamHandler):
-        handler.setFormatter(ColorizedFormatter('%(asctime)s - %(levelname)s - %(message)s'))
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    startup_report.mark("app_startup")
+    startup_report.ready()
+    # The imports run on a worker thread, so the socket is bound and serving meanwhile
+    prewarm = asyncio.create_task(startup_report.run_prewarm(PREWARM_STEPS))
+    yield
+    prewarm.cancel()
+    # Release pooled upstream connections held by the direct httpx engines
+    await registry.aclose()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Get API keys from environment
 ANTHROPIC_API_KEY = os.environ.get("ANTHROPIC_API_KEY")
@@ -104,50 +95,98 @@ PREFERRED_PROVIDER = os.environ.get("PREFERRED_PROVIDER", "openai").lower()
 BIG_MODEL = os.environ.get("BIG_MODEL", "gpt-4.1")
 SMALL_MODEL = os.environ.get("SMALL_MODEL", "gpt-4.1-mini")
 
-# List of OpenAI models
-OPENAI_MODELS = [
-    "o3-mini",
-    "o1",
-    "o1-mini",
-    "o1-pro",
-    "gpt-4.5-preview",
-    "gpt-4o",
-    "gpt-4o-audio-preview",
-    "chatgpt-4o-latest",
-    "gpt-4o-mini",
-    "gpt-4o-mini-audio-preview",
-    "gpt-4.1",  # Added default big model
-    "gpt-4.1-mini" # Added default small model
-]
-
-# List of Gemini models
-GEMINI_MODELS = [
-    "gemini-2.5-pro-preview-03-25",
-    "gemini-2.0-flash"
-]
-
-# Helper function to clean schema for Gemini
-def clean_gemini_schema(schema: Any) -> Any:
-    """Recursively removes unsupported fields from a JSON schema for Gemini."""
-    if isinstance(schema, dict):
-        # Remove specific keys unsupported by Gemini tool parameters
-        schema.pop("additionalProperties", None)
-        schema.pop("default", None)
-
-        # Check for unsupported 'format' in string types
-        if schema.get("type") == "string" and "format" in schema:
-            allowed_formats = {"enum", "date-time"}
-            if schema["format"] not in allowed_formats:
-                logger.debug(f"Removing unsupported format '{schema['format']}' for string type in Gemini schema.")
-                schema.pop("format")
-
-        # Recursively clean nested schemas (properties, items, etc.)
-        for key, value in list(schema.items()): # Use list() to allow modification during iteration
-            schema[key] = clean_gemini_schema(value)
-    elif isinstance(schema, list):
-        # Recursively clean items in a list
-        return [clean_gemini_schema(item) for item in schema]
-    return schema
+# Bounded thread pool for providers that have no async client. Keeps blocking
+# upstream calls off the event loop without letting them spawn unbounded threads.
+UPSTREAM_SYNC_WORKERS = int(os.environ.get("UPSTREAM_SYNC_WORKERS", "8"))
+_sync_upstream_executor = ThreadPoolExecutor(
+    max_workers=UPSTREAM_SYNC_WORKERS,
+    thread_name_prefix="upstream-sync"
+)
+
+# Cache of compiled messages so each turn only converts the new tail of a
+# conversation, for providers with flattened content (see compile_request).
+# Disabled unless CONVERSION_CACHE_MAX_BYTES is set.
+CONVERSION_CACHE_MAX_BYTES = int(os.environ.get("CONVERSION_CACHE_MAX_BYTES", "0"))
+conversion_cache = ConversionCache(CONVERSION_CACHE_MAX_BYTES) if CONVERSION_CACHE_MAX_BYTES > 0 else None
+
+# Merge tiny streaming deltas into fewer SSE frames. STREAM_COALESCE_MS is the
+# longest a delta may be held back (0 disables); a request can override it with
+# the x-stream-coalesce-ms header.
+STREAM_COALESCE_MS = float(os.environ.get("STREAM_COALESCE_MS", "0"))
+STREAM_COALESCE_MAX_CHARS = int(os.environ.get("STREAM_COALESCE_MAX_CHARS", "256"))
+coalescing_stats = CoalescingStats()
+
+# Per-message token counts, so count_tokens only tokenizes what it has not seen
+TOKEN_COUNT_CACHE_ENTRIES = int(os.environ.get("TOKEN_COUNT_CACHE_ENTRIES", "50000"))
+token_counter = TokenCounter(TOKEN_COUNT_CACHE_ENTRIES)
+
+# Rate limit buckets and circuit breakers shared by the workers of one host, in the
+# SQLite file at SHARED_STATE_PATH. The prod launcher sets it for several workers.
+shared_state = SharedState.from_env()
+if shared_state is not None:
+    registry.use_shared_state(shared_state)
+
+# Exact-match cache of responses to temperature 0 requests. RESPONSE_CACHE is
+# memory or sqlite (shared by workers, in the shared state file if there is one);
+# disabled by default.
+RESPONSE_CACHE = os.environ.get("RESPONSE_CACHE", "off")
+RESPONSE_CACHE_TTL = float(os.environ.get("RESPONSE_CACHE_TTL", "3600"))
+RESPONSE_CACHE_MAX_BYTES = int(os.environ.get("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+RESPONSE_CACHE_PATH = os.environ.get(
+    "RESPONSE_CACHE_PATH", shared_state.path if shared_state is not None else "response_cache.sqlite3"
+)
+response_cache = create_response_cache(
+    RESPONSE_CACHE, RESPONSE_CACHE_TTL, RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_PATH
+)
+
+# Send identical concurrent requests upstream once and share the response.
+# Disabled by default: attached requests get the same sampled completion.
+SINGLE_FLIGHT = os.environ.get("SINGLE_FLIGHT", "false").lower() in ("1", "true", "yes")
+single_flight = SingleFlight() if SINGLE_FLIGHT else None
+
+# Queue upstream calls within the RPM/TPM limits of providers ({NAME}_RPM,
+# {NAME}_TPM) and pool endpoints ("rpm"/"tpm"); calls that would wait longer than
+# ADMISSION_TIMEOUT, or find ADMISSION_MAX_QUEUE calls waiting, are shed with 529.
+# ADMISSION_BURST_SECONDS is the window upstream enforces the limits over.
+ADMISSION_TIMEOUT = float(os.environ.get("ADMISSION_TIMEOUT", "30"))
+ADMISSION_MAX_QUEUE = int(os.environ.get("ADMISSION_MAX_QUEUE", "256"))
+ADMISSION_BURST_SECONDS = float(os.environ.get("ADMISSION_BURST_SECONDS", "10"))
+admission = AdmissionController.from_env(
+    registry.get_provider_names(), ADMISSION_TIMEOUT, ADMISSION_MAX_QUEUE, ADMISSION_BURST_SECONDS, shared_state
+)
+
+# Priority classes of queued calls (x-request-priority header, metadata.priority,
+# else PRIORITY_MODEL_CLASSES by router tier) and their PRIORITY_WEIGHTS in the
+# fair queue, which is shared fairly between users / API keys within a class.
+priority_classifier = PriorityClassifier.from_env()
+
+# Move failed calls along the model's fallback chain (FALLBACK_CHAINS, see
+# providers/routing.py); the figures are reported on GET /
+failover = Failover()
+
+# Hedge slow first calls for the model classes (router tiers: small, big) in
+# HEDGE_MODEL_CLASSES; off by default. The delay follows HEDGE_PERCENTILE of recent
+# time to first content, and HEDGE_BUDGET caps the fraction of requests hedged.
+HEDGE_MODEL_CLASSES = [name.strip() for name in os.environ.get("HEDGE_MODEL_CLASSES", "").split(",") if name.strip()]
+hedger = Hedger(
+    HEDGE_MODEL_CLASSES,
+    percentile=float(os.environ.get("HEDGE_PERCENTILE", "95")),
+    min_delay=float(os.environ.get("HEDGE_MIN_DELAY_MS", "100")) / 1000,
+    max_delay=float(os.environ.get("HEDGE_MAX_DELAY_MS", "2000")) / 1000,
+    budget=float(os.environ.get("HEDGE_BUDGET", "0.1")),
+) if HEDGE_MODEL_CLASSES else None
+
+# Prometheus metrics on GET /metrics: per-stage latency histograms, tokens, active
+# streams and errors. On by default; METRICS_MAX_SERIES caps the label sets per metric.
+METRICS = os.environ.get("METRICS", "true").lower() in ("1", "true", "yes")
+metrics = Metrics(int(os.environ.get("METRICS_MAX_SERIES", "1000"))) if METRICS else None
+
+# What PREWARM loads in the background once a FAST_START server is up: LiteLLM,
+# then the tokenizer of BIG_MODEL, which LiteLLM itself loads on first use.
+def _warm_tokenizer():
+    litellm.token_counter(model=tokenizer_model(BIG_MODEL), text="warm-up")
+
+PREWARM_STEPS = [("litellm", lambda: litellm.load("prewarm")), ("tokenizer", _warm_tokenizer)]
 
 # Models for Anthropic API requests
 class ContentBlockText(BaseModel):
@@ -185,8 +224,24 @@ class Tool(BaseModel):
 class ThinkingConfig(BaseModel):
     enabled: bool
 
-class MessagesRequest(BaseModel):
+class ModelRoutedRequest(BaseModel):
+    """Request whose model name is resolved through the registry's routing table."""
     model: str
+    original_model: Optional[str] = None  # The model name as requested, before routing
+    
+    @model_validator(mode='before')
+    @classmethod
+    def capture_original_model(cls, data):
+        # Keep the model name as requested; the field validator below maps it
+        if isinstance(data, dict) and data.get('original_model') is None and 'model' in data:
+            data = {**data, 'original_model': data['model']}
+        return data
+
+    @field_validator('model')
+    def validate_model_field(cls, v):
+        return registry.router.resolve(v).model
+
+class MessagesRequest(ModelRoutedRequest):
     max_tokens: int
     messages: List[Message]
     system: Optional[Union[str, List[SystemContent]]] = None
@@ -199,156 +254,13 @@ class MessagesRequest(BaseModel):
     tools: Optional[List[Tool]] = None
     tool_choice: Optional[Dict[str, Any]] = None
     thinking: Optional[ThinkingConfig] = None
-    original_model: Optional[str] = None  # Will store the original model name
-    
-    @field_validator('model')
-    def validate_model_field(cls, v, info): # Renamed to avoid conflict
-        original_model = v
-        new_model = v # Default to original value
-
-        logger.debug(f"📋 MODEL VALIDATION: Original='{original_model}', Preferred='{PREFERRED_PROVIDER}', BIG='{BIG_MODEL}', SMALL='{SMALL_MODEL}'")
-
-        # Remove provider prefixes for easier matching
-        clean_v = v
-        if clean_v.startswith('anthropic/'):
-            clean_v = clean_v[10:]
-        elif clean_v.startswith('openai/'):
-            clean_v = clean_v[7:]
-        elif clean_v.startswith('gemini/'):
-            clean_v = clean_v[7:]
-        elif clean_v.startswith('azure/'):
-            clean_v = clean_v[6:]
-
-        # --- Mapping Logic --- START ---
-        mapped = False
-        # Map Haiku to SMALL_MODEL based on provider preference
-        if 'haiku' in clean_v.lower():
-            if PREFERRED_PROVIDER == "azure" and AZURE_OPENAI_API_KEY and AZURE_OPENAI_ENDPOINT:
-                new_model = f"azure/{SMALL_MODEL}"
-                mapped = True
-            elif PREFERRED_PROVIDER == "google" and SMALL_MODEL in GEMINI_MODELS:
-                new_model = f"gemini/{SMALL_MODEL}"
-                mapped = True
-            else:
-                new_model = f"openai/{SMALL_MODEL}"
-                mapped = True
-
-        # Map Sonnet to BIG_MODEL based on provider preference
-        elif 'sonnet' in clean_v.lower():
-            if PREFERRED_PROVIDER == "azure" and AZURE_OPENAI_API_KEY and AZURE_OPENAI_ENDPOINT:
-                new_model = f"azure/{BIG_MODEL}"
-                mapped = True
-            elif PREFERRED_PROVIDER == "google" and BIG_MODEL in GEMINI_MODELS:
-                new_model = f"gemini/{BIG_MODEL}"
-                mapped = True
-            else:
-                new_model = f"openai/{BIG_MODEL}"
-                mapped = True
-
-        # Add prefixes to non-mapped models if they match known lists
-        elif not mapped:
-            if clean_v in GEMINI_MODELS and not v.startswith('gemini/'):
-                new_model = f"gemini/{clean_v}"
-                mapped = True # Technically mapped to add prefix
-            elif clean_v in OPENAI_MODELS and not v.startswith('openai/'):
-                new_model = f"openai/{clean_v}"
-                mapped = True # Technically mapped to add prefix
-        # --- Mapping Logic --- END ---
-
-        if mapped:
-            logger.debug(f"📌 MODEL MAPPING: '{original_model}' ➡️ '{new_model}'")
-        else:
-             # If no mapping occurred and no prefix exists, log warning or decide default
-             if not v.startswith(('openai/', 'gemini/', 'anthropic/', 'azure/')):
-                 logger.warning(f"⚠️ No prefix or mapping rule for model: '{original_model}'. Using as is.")
-             new_model = v # Ensure we return the original if no rule applied
-
-        # Store the original model in the values dictionary
-        values = info.data
-        if isinstance(values, dict):
-            values['original_model'] = original_model
-
-        return new_model
 
-class TokenCountRequest(BaseModel):
-    model: str
+class TokenCountRequest(ModelRoutedRequest):
     messages: List[Message]
     system: Optional[Union[str, List[SystemContent]]] = None
     tools: Optional[List[Tool]] = None
     thinking: Optional[ThinkingConfig] = None
     tool_choice: Optional[Dict[str, Any]] = None
-    original_model: Optional[str] = None  # Will store the original model name
-    
-    @field_validator('model')
-    def validate_model_token_count(cls, v, info): # Renamed to avoid conflict
-        # Use the same logic as MessagesRequest validator
-        # NOTE: Pydantic validators might not share state easily if not class methods
-        # Re-implementing the logic here for clarity, could be refactored
-        original_model = v
-        new_model = v # Default to original value
-
-        logger.debug(f"📋 TOKEN COUNT VALIDATION: Original='{original_model}', Preferred='{PREFERRED_PROVIDER}', BIG='{BIG_MODEL}', SMALL='{SMALL_MODEL}'")
-
-        # Remove provider prefixes for easier matching
-        clean_v = v
-        if clean_v.startswith('anthropic/'):
-            clean_v = clean_v[10:]
-        elif clean_v.startswith('openai/'):
-            clean_v = clean_v[7:]
-        elif clean_v.startswith('gemini/'):
-            clean_v = clean_v[7:]
-        elif clean_v.startswith('azure/'):
-            clean_v = clean_v[6:]
-
-        # --- Mapping Logic --- START ---
-        mapped = False
-        # Map Haiku to SMALL_MODEL based on provider preference
-        if 'haiku' in clean_v.lower():
-            if PREFERRED_PROVIDER == "azure" and AZURE_OPENAI_API_KEY and AZURE_OPENAI_ENDPOINT:
-                new_model = f"azure/{SMALL_MODEL}"
-                mapped = True
-            elif PREFERRED_PROVIDER == "google" and SMALL_MODEL in GEMINI_MODELS:
-                new_model = f"gemini/{SMALL_MODEL}"
-                mapped = True
-            else:
-                new_model = f"openai/{SMALL_MODEL}"
-                mapped = True
-
-        # Map Sonnet to BIG_MODEL based on provider preference
-        elif 'sonnet' in clean_v.lower():
-            if PREFERRED_PROVIDER == "azure" and AZURE_OPENAI_API_KEY and AZURE_OPENAI_ENDPOINT:
-                new_model = f"azure/{BIG_MODEL}"
-                mapped = True
-            elif PREFERRED_PROVIDER == "google" and BIG_MODEL in GEMINI_MODELS:
-                new_model = f"gemini/{BIG_MODEL}"
-                mapped = True
-            else:
-                new_model = f"openai/{BIG_MODEL}"
-                mapped = True
-
-        # Add prefixes to non-mapped models if they match known lists
-        elif not mapped:
-            if clean_v in GEMINI_MODELS and not v.startswith('gemini/'):
-                new_model = f"gemini/{clean_v}"
-                mapped = True # Technically mapped to add prefix
-            elif clean_v in OPENAI_MODELS and not v.startswith('openai/'):
-                new_model = f"openai/{clean_v}"
-                mapped = True # Technically mapped to add prefix
-        # --- Mapping Logic --- END ---
-
-        if mapped:
-            logger.debug(f"📌 TOKEN COUNT MAPPING: '{original_model}' ➡️ '{new_model}'")
-        else:
-             if not v.startswith(('openai/', 'gemini/', 'anthropic/', 'azure/')):
-                 logger.warning(f"⚠️ No prefix or mapping rule for token count model: '{original_model}'. Using as is.")
-             new_model = v # Ensure we return the original if no rule applied
-
-        # Store the original model in the values dictionary
-        values = info.data
-        if isinstance(values, dict):
-            values['original_model'] = original_model
-
-        return new_model
 
 class TokenCountResponse(BaseModel):
     input_tokens: int
@@ -376,274 +288,85 @@ async def log_requests(request: Request, call_next):
     path = request.url.path
     
     # Log only basic request details at debug level
-    logger.debug(f"Request: {method} {path}")
+    logger.debug("Request: %s %s", method, path)
     
     # Process the request and get the response
-    response = await call_next(request)
+    try:
+        response = await call_next(request)
+    except Exception:
+        if metrics is not None:
+            metrics.error(500)
+        raise
+    if metrics is not None and response.status_code >= 400:
+        metrics.error(response.status_code)
     
     return response
 
 # Not using validation function as we're using the environment API key
 
-def parse_tool_result_content(content):
-    """Helper function to properly parse and normalize tool result content."""
-    if content is None:
-        return "No content provided"
-        
-    if isinstance(content, str):
-        return content
-        
-    if isinstance(content, list):
-        result = ""
-        for item in content:
-            if isinstance(item, dict) and item.get("type") == "text":
-                result += item.get("text", "") + "\n"
-            elif isinstance(item, str):
-                result += item + "\n"
-            elif isinstance(item, dict):
-                if "text" in item:
-                    result += item.get("text", "") + "\n"
-                else:
-                    try:
-                        result += json.dumps(item) + "\n"
-                    except:
-                        result += str(item) + "\n"
-            else:
-                try:
-                    result += str(item) + "\n"
-                except:
-                    result += "Unparseable content\n"
-        return result.strip()
-        
-    if isinstance(content, dict):
-        if content.get("type") == "text":
-            return content.get("text", "")
+def get_capabilities(model: str) -> Capabilities:
+    """Get the capabilities of the provider serving a (prefixed) model name."""
+    provider = registry.get_provider_by_model(model)
+    return provider.capabilities if provider else Capabilities()
+
+def parsed_body(model_class):
+    """Dependency that validates the raw body straight into model_class.
+
+    FastAPI's own body handling json.loads the whole body into a dict before
+    validating it. Claude Code bodies run to several MB, so going from bytes to
+    the model directly avoids holding a second full copy of the request.
+    """
+    async def parse(raw_request: Request):
+        body = await raw_request.body()
+        started = time.perf_counter()
         try:
-            return json.dumps(content)
-        except:
-            return str(content)
-            
-    # Fallback for any other type
+            parsed = model_class.model_validate_json(body)
+        except ValidationError as e:
+            # Same 422 response FastAPI gives for an invalid body
+            raise RequestValidationError(
+                [{**error, "loc": ("body", *error["loc"])} for error in e.errors(include_url=False)]
+            )
+        if metrics is not None:
+            metrics.observe("parse", metric_labels(parsed.original_model, parsed.model), time.perf_counter() - started)
+        return parsed
+    return Depends(parse)
+
+def metric_labels(original_model: Optional[str], model: str):
+    """Metric labels of a call: the model as requested, the model it goes to and its provider."""
+    provider = registry.get_provider_by_model(model)
+    return (original_model or model, model, provider.name if provider else "anthropic")
+
+def get_coalesce_budget_ms(raw_request: Request) -> float:
+    """Coalescing budget for a stream: the x-stream-coalesce-ms header, else STREAM_COALESCE_MS."""
+    header = raw_request.headers.get("x-stream-coalesce-ms")
+    if header is None:
+        return STREAM_COALESCE_MS
     try:
-        return str(content)
-    except:
-        return "Unparseable content"
+        return max(0.0, float(header))
+    except ValueError:
+        logger.warning("Ignoring invalid x-stream-coalesce-ms header: %r", header)
+        return STREAM_COALESCE_MS
 
 def convert_anthropic_to_litellm(anthropic_request: MessagesRequest) -> Dict[str, Any]:
-    """Convert Anthropic API request format to LiteLLM format (which follows OpenAI)."""
-    # LiteLLM already handles Anthropic models when using the format model="anthropic/claude-3-opus-20240229"
-    # So we just need to convert our Pydantic model to a dict in the expected format
-    
-    messages = []
-    
-    # Add system message if present
-    if anthropic_request.system:
-        # Handle different formats of system messages
-        if isinstance(anthropic_request.system, str):
-            # Simple string format
-            messages.append({"role": "system", "content": anthropic_request.system})
-        elif isinstance(anthropic_request.system, list):
-            # List of content blocks
-            system_text = ""
-            for block in anthropic_request.system:
-                if hasattr(block, 'type') and block.type == "text":
-                    system_text += block.text + "\n\n"
-                elif isinstance(block, dict) and block.get("type") == "text":
-                    system_text += block.get("text", "") + "\n\n"
-            
-            if system_text:
-                messages.append({"role": "system", "content": system_text.strip()})
-    
-    # Add conversation messages
-    for idx, msg in enumerate(anthropic_request.messages):
-        content = msg.content
-        if isinstance(content, str):
-            messages.append({"role": msg.role, "content": content})
-        else:
-            # Special handling for tool_result in user messages
-            # OpenAI/LiteLLM format expects the assistant to call the tool, 
-            # and the user's next message to include the result as plain text
-            if msg.role == "user" and any(block.type == "tool_result" for block in content if hasattr(block, "type")):
-                # For user messages with tool_result, split into separate messages
-                text_content = ""
-                
-                # Extract all text parts and concatenate them
-                for block in content:
-                    if hasattr(block, "type"):
-                        if block.type == "text":
-                            text_content += block.text + "\n"
-                        elif block.type == "tool_result":
-                            # Add tool result as a message by itself - simulate the normal flow
-                            tool_id = block.tool_use_id if hasattr(block, "tool_use_id") else ""
-                            
-                            # Handle different formats of tool result content
-                            result_content = ""
-                            if hasattr(block, "content"):
-                                if isinstance(block.content, str):
-                                    result_content = block.content
-                                elif isinstance(block.content, list):
-                                    # If content is a list of blocks, extract text from each
-                                    for content_block in block.content:
-                                        if hasattr(content_block, "type") and content_block.type == "text":
-                                            result_content += content_block.text + "\n"
-                                        elif isinstance(content_block, dict) and content_block.get("type") == "text":
-                                            result_content += content_block.get("text", "") + "\n"
-                                        elif isinstance(content_block, dict):
-                                            # Handle any dict by trying to extract text or convert to JSON
-                                            if "text" in content_block:
-                                                result_content += content_block.get("text", "") + "\n"
-                                            else:
-                                                try:
-                                                    result_content += json.dumps(content_block) + "\n"
-                                                except:
-                                                    result_content += str(content_block) + "\n"
-                                elif isinstance(block.content, dict):
-                                    # Handle dictionary content
-                                    if block.content.get("type") == "text":
-                                        result_content = block.content.get("text", "")
-                                    else:
-                                        try:
-                                            result_content = json.dumps(block.content)
-                                        except:
-                                            result_content = str(block.content)
-                                else:
-                                    # Handle any other type by converting to string
-                                    try:
-                                        result_content = str(block.content)
-                                    except:
-                                        result_content = "Unparseable content"
-                            
-                            # In OpenAI format, tool results come from the user (rather than being content blocks)
-                            text_content += f"Tool result for {tool_id}:\n{result_content}\n"
-                
-                # Add as a single user message with all the content
-                messages.append({"role": "user", "content": text_content.strip()})
-            else:
-                # Regular handling for other message types
-                processed_content = []
-                for block in content:
-                    if hasattr(block, "type"):
-                        if block.type == "text":
-                            processed_content.append({"type": "text", "text": block.text})
-                        elif block.type == "image":
-                            processed_content.append({"type": "image", "source": block.source})
-                        elif block.type == "tool_use":
-                            # Handle tool use blocks if needed
-                            processed_content.append({
-                                "type": "tool_use",
-                                "id": block.id,
-                                "name": block.name,
-                                "input": block.input
-                            })
-                        elif block.type == "tool_result":
-                            # Handle different formats of tool result content
-                            processed_content_block = {
-                                "type": "tool_result",
-                                "tool_use_id": block.tool_use_id if hasattr(block, "tool_use_id") else ""
-                            }
-                            
-                            # Process the content field properly
-                            if hasattr(block, "content"):
-                                if isinstance(block.content, str):
-                                    # If it's a simple string, create a text block for it
-                                    processed_content_block["content"] = [{"type": "text", "text": block.content}]
-                                elif isinstance(block.content, list):
-                                    # If it's already a list of blocks, keep it
-                                    processed_content_block["content"] = block.content
-                                else:
-                                    # Default fallback
-                                    processed_content_block["content"] = [{"type": "text", "text": str(block.content)}]
-                            else:
-                                # Default empty content
-                                processed_content_block["content"] = [{"type": "text", "text": ""}]
-                                
-                            processed_content.append(processed_content_block)
-                
-                messages.append({"role": msg.role, "content": processed_content})
-    
-    # Cap max_tokens for OpenAI models to their limit of 16384
-    max_tokens = anthropic_request.max_tokens
-    if anthropic_request.model.startswith("openai/") or anthropic_request.model.startswith("gemini/"):
-        max_tokens = min(max_tokens, 16384)
-        logger.debug(f"Capping max_tokens to 16384 for OpenAI/Gemini model (original value: {anthropic_request.max_tokens})")
-    
-    # Create LiteLLM request dict
-    litellm_request = {
-        "model": anthropic_request.model,  # t understands "anthropic/claude-x" format
-        "messages": messages,
-        "max_tokens": max_tokens,
-        "temperature": anthropic_request.temperature,
-        "stream": anthropic_request.stream,
-    }
-    
-    # Add optional parameters if present
-    if anthropic_request.stop_sequences:
-        litellm_request["stop"] = anthropic_request.stop_sequences
-    
-    if anthropic_request.top_p:
-        litellm_request["top_p"] = anthropic_request.top_p
-    
-    if anthropic_request.top_k:
-        litellm_request["top_k"] = anthropic_request.top_k
-    
-    # Convert tools to OpenAI format
-    if anthropic_request.tools:
-        openai_tools = []
-        is_gemini_model = anthropic_request.model.startswith("gemini/")
-
-        for tool in anthropic_request.tools:
-            # Convert to dict if it's a pydantic model
-            if hasattr(tool, 'dict'):
-                tool_dict = tool.dict()
-            else:
-                # Ensure tool_dict is a dictionary, handle potential errors if 'tool' isn't dict-like
-                try:
-                    tool_dict = dict(tool) if not isinstance(tool, dict) else tool
-                except (TypeError, ValueError):
-                     logger.error(f"Could not convert tool to dict: {tool}")
-                     continue # Skip this tool if conversion fails
-
-            # Clean the schema if targeting a Gemini model
-            input_schema = tool_dict.get("input_schema", {})
-            if is_gemini_model:
-                 logger.debug(f"Cleaning schema for Gemini tool: {tool_dict.get('name')}")
-                 input_schema = clean_gemini_schema(input_schema)
-
-            # Create OpenAI-compatible function tool
-            openai_tool = {
-                "type": "function",
-                "function": {
-                    "name": tool_dict["name"],
-                    "description": tool_dict.get("description", ""),
-                    "parameters": input_schema # Use potentially cleaned schema
-                }
-            }
-            openai_tools.append(openai_tool)
-
-        litellm_request["tools"] = openai_tools
-    
-    # Convert tool_choice to OpenAI format if present
-    if anthropic_request.tool_choice:
-        if hasattr(anthropic_request.tool_choice, 'dict'):
-            tool_choice_dict = anthropic_request.tool_choice.dict()
-        else:
-            tool_choice_dict = anthropic_request.tool_choice
-            
-        # Handle Anthropic's tool_choice format
-        choice_type = tool_choice_dict.get("type")
-        if choice_type == "auto":
-            litellm_request["tool_choice"] = "auto"
-        elif choice_type == "any":
-            litellm_request["tool_choice"] = "any"
-        elif choice_type == "tool" and "name" in tool_choice_dict:
-            litellm_request["tool_choice"] = {
-                "type": "function",
-                "function": {"name": tool_choice_dict["name"]}
-            }
-        else:
-            # Default to auto if we can't determine
-            litellm_request["tool_choice"] = "auto"
-    
+    """Convert Anthropic API request format to the final LiteLLM payload for the target provider."""
+    return compile_request(anthropic_request, get_capabilities(anthropic_request.model), conversion_cache)
+
+def prepare_upstream_request(anthropic_request: MessagesRequest) -> Dict[str, Any]:
+    """Compile a request for its model and attach the credentials of the model's provider.
+
+    Providers with an endpoint pool are pointed at one of their endpoints in call_upstream.
+    """
+    started = time.perf_counter()
+    litellm_request = convert_anthropic_to_litellm(anthropic_request)
+    if metrics is not None:
+        labels = metric_labels(anthropic_request.original_model, anthropic_request.model)
+        metrics.observe("convert", labels, time.perf_counter() - started)
+    provider = registry.get_provider_by_model(anthropic_request.model)
+    if provider is not None:
+        provider.configure_request(litellm_request)
+    else:
+        litellm_request["api_key"] = ANTHROPIC_API_KEY
+        logger.debug("Using Anthropic API key for model: %s", anthropic_request.model)
     return litellm_request
 
 def convert_litellm_to_anthropic(litellm_response: Union[Dict[str, Any], Any], 
@@ -707,14 +430,14 @@ def convert_litellm_to_anthropic(litellm_response: Union[Dict[str, Any], Any],
         
         # Add tool calls if present (tool_use in Anthropic format) - only for Claude models
         if tool_calls and is_claude_model:
-            logger.debug(f"Processing tool calls: {tool_calls}")
+            logger.debug("Processing tool calls: %s", tool_calls)
             
             # Convert to list if it's not already
             if not isinstance(tool_calls, list):
                 tool_calls = [tool_calls]
                 
             for idx, tool_call in enumerate(tool_calls):
-                logger.debug(f"Processing tool call {idx}: {tool_call}")
+                logger.debug("Processing tool call %d: %s", idx, tool_call)
                 
                 # Extract function data based on whether it's a dict or object
                 if isinstance(tool_call, dict):
@@ -731,12 +454,12 @@ def convert_litellm_to_anthropic(litellm_response: Union[Dict[str, Any], Any],
                 # Convert string arguments to dict if needed
                 if isinstance(arguments, str):
                     try:
-                        arguments = json.loads(arguments)
-                    except json.JSONDecodeError:
-                        logger.warning(f"Failed to parse tool arguments as JSON: {arguments}")
+                        arguments = json_backend.loads(arguments)
+                    except ValueError:
+                        logger.warning("Failed to parse tool arguments as JSON: %s", arguments)
                         arguments = {"raw": arguments}
                 
-                logger.debug(f"Adding tool_use block: id={tool_id}, name={name}, input={arguments}")
+                logger.debug("Adding tool_use block: id=%s, name=%s, input=%s", tool_id, name, arguments)
                 
                 content.append({
                     "type": "tool_use",
@@ -746,7 +469,7 @@ def convert_litellm_to_anthropic(litellm_response: Union[Dict[str, Any], Any],
                 })
         elif tool_calls and not is_claude_model:
             # For non-Claude models, convert tool calls to text format
-            logger.debug(f"Converting tool calls to text for non-Claude model: {clean_model}")
+            logger.debug("Converting tool calls to text for non-Claude model: %s", clean_model)
             
             # We'll append tool info to the text content
             tool_text = "\n\nTool usage:\n"
@@ -771,12 +494,12 @@ def convert_litellm_to_anthropic(litellm_response: Union[Dict[str, Any], Any],
                 # Convert string arguments to dict if needed
                 if isinstance(arguments, str):
                     try:
-                        args_dict = json.loads(arguments)
-                        arguments_str = json.dumps(args_dict, indent=2)
-                    except json.JSONDecodeError:
+                        args_dict = json_backend.loads(arguments)
+                        arguments_str = json_backend.dumps_pretty(args_dict)
+                    except ValueError:
                         arguments_str = arguments
                 else:
-                    arguments_str = json.dumps(arguments, indent=2)
+                    arguments_str = json_backend.dumps_pretty(arguments)
                 
                 tool_text += f"Tool: {name}\nArguments: {arguments_str}\n\n"
             
@@ -827,9 +550,7 @@ def convert_litellm_to_anthropic(litellm_response: Union[Dict[str, Any], Any],
         
     except Exception as e:
         import traceback
-        error_traceback = traceback.format_exc()
-        error_message = f"Error converting response: {str(e)}\n\nFull traceback:\n{error_traceback}"
-        logger.error(error_message)
+        logger.error("Error converting response: %s\n\nFull traceback:\n%s", e, traceback.format_exc())
         
         # In case of any error, create a fallback response
         return MessagesResponse(
@@ -841,37 +562,116 @@ def convert_litellm_to_anthropic(litellm_response: Union[Dict[str, Any], Any],
             usage=Usage(input_tokens=0, output_tokens=0)
         )
 
+async def _iterate_in_executor(iterator):
+    """Drain a blocking iterator on the fallback executor, one chunk at a time."""
+    loop = asyncio.get_running_loop()
+    sentinel = object()
+    while True:
+        chunk = await loop.run_in_executor(_sync_upstream_executor, next, iterator, sentinel)
+        if chunk is sentinel:
+            return
+        yield chunk
+
+async def call_upstream(litellm_request: Dict[str, Any], priority: Optional[Priority] = None,
+                        original_model: Optional[str] = None):
+    """Send a request upstream without blocking the event loop.
+
+    Providers configured for the direct httpx engine bypass LiteLLM entirely.
+    Providers with an async client go through litellm.acompletion. Anything else
+    runs litellm.completion on the bounded fallback executor, and streamed chunks
+    are pulled through the same executor so handle_streaming can consume them.
+
+    Providers and endpoints with RPM/TPM limits admit calls through admission
+    control first, which queues them in fair order of priority until the limits
+    allow or sheds them with OverloadedError. Every call is recorded in the provider's health tracker (or the endpoint's,
+    for pooled providers). Backends whose circuit breaker is open are skipped,
+    and when none is left the call fails fast with CircuitOpenError (503)
+    instead of waiting on a backend that is timing out. Providers with an
+    endpoint pool get the request pointed at the endpoint the pool picks, which
+    stays counted as busy until the response (or stream) ends.
+
+    original_model labels the call's upstream timings and tokens in metrics.
+    """
+    provider = registry.get_provider_by_model(litellm_request.get("model", ""))
+    if provider is None:
+        return await _timed_upstream(provider, litellm_request, None, original_model)
+    
+    attempt = registry.start_call(provider)
+    if attempt.endpoint is not None:
+        litellm_request = provider.configure_request(dict(litellm_request), attempt.endpoint)
+    limiters = admission.limiters(provider.name, attempt.endpoint)
+    if limiters:
+        try:
+            tokens = await asyncio.to_thread(estimate_request_tokens, litellm_request)
+            await admission.admit(limiters, tokens, priority)
+        except BaseException:
+            attempt.abandon()
+            raise
+        # Time spent queued is not upstream latency
+        attempt.started = time.monotonic()
+    try:
+        response = await _timed_upstream(provider, litellm_request, attempt.endpoint, original_model)
+    except BaseException as e:
+        attempt.finish(e)
+        raise
+    if litellm_request.get("stream"):
+        return attempt.track_stream(response)
+    attempt.responded()
+    attempt.finish()
+    return response
+
+def estimate_request_tokens(litellm_request: Dict[str, Any]) -> int:
+    """Tokens a request counts against TPM limits: its prompt (as count_tokens counts it) plus max_tokens."""
+    prompt_tokens = token_counter.count(
+        litellm_request["model"],
+        litellm_request["messages"],
+        litellm_request.get("tools"),
+        litellm_request.get("tool_choice"),
+    )
+    return prompt_tokens + (litellm_request.get("max_tokens") or 0)
+
+async def _timed_upstream(provider, litellm_request: Dict[str, Any], endpoint, original_model: Optional[str]):
+    """_send_upstream, timed (and its tokens counted) in metrics."""
+    if metrics is None:
+        return await _send_upstream(provider, litellm_request, endpoint)
+    labels = metric_labels(original_model, litellm_request["model"])
+    started = time.perf_counter()
+    response = await _send_upstream(provider, litellm_request, endpoint)
+    if litellm_request.get("stream"):
+        return metrics.track_upstream(response, labels, started)
+    metrics.completed(labels, started, response)
+    return response
+
+async def _send_upstream(provider, litellm_request: Dict[str, Any], endpoint=None):
+    if provider is not None and provider.uses_direct_engine():
+        return await provider.get_engine().acompletion(litellm_request, endpoint)
+    await litellm.load_async()
+    if provider is None or provider.supports_async:
+        return await litellm.acompletion(**litellm_request)
+
+    logger.debug("Provider %s has no async client, using fallback executor", provider.name)
+    loop = asyncio.get_running_loop()
+    response = await loop.run_in_executor(
+        _sync_upstream_executor,
+        functools.partial(litellm.completion, **litellm_request)
+    )
+    if litellm_request.get("stream"):
+        return _iterate_in_executor(iter(response))
+    return response
+
 async def handle_streaming(response_generator, original_request: MessagesRequest):
-    """Handle streaming responses from LiteLLM and convert to Anthropic format."""
+    """Handle streaming responses from LiteLLM and convert to Anthropic SSE frames (bytes)."""
     try:
         # Send message_start event
         message_id = f"msg_{uuid.uuid4().hex[:24]}"  # Format similar to Anthropic's IDs
         
-        message_data = {
-            'type': 'message_start',
-            'message': {
-                'id': message_id,
-                'type': 'message',
-                'role': 'assistant',
-                'model': original_request.model,
-                'content': [],
-                'stop_reason': None,
-                'stop_sequence': None,
-                'usage': {
-                    'input_tokens': 0,
-                    'cache_creation_input_tokens': 0,
-                    'cache_read_input_tokens': 0,
-                    'output_tokens': 0
-                }
-            }
-        }
-        yield f"event: message_start\ndata: {json.dumps(message_data)}\n\n"
+        yield sse.message_start(message_id, original_request.model)
         
         # Content block index for the first text block
-        yield f"event: content_block_start\ndata: {json.dumps({'type': 'content_block_start', 'index': 0, 'content_block': {'type': 'text', 'text': ''}})}\n\n"
+        yield sse.TEXT_BLOCK_START
         
         # Send a ping to keep the connection alive (Anthropic does this)
-        yield f"event: ping\ndata: {json.dumps({'type': 'ping'})}\n\n"
+        yield sse.PING
         
         tool_index = None
         current_tool_call = None
@@ -882,15 +682,23 @@ async def handle_streaming(response_generator, original_request: MessagesRequest
         input_tokens = 0
         output_tokens = 0
         has_sent_stop_reason = False
+        has_usage = False
         last_tool_index = 0
         
         # Process each chunk
         async for chunk in response_generator:
+            if has_sent_stop_reason:
+                # OpenAI-style streams send the usage in a chunk after the finish_reason: read on to it,
+                # so upstream metrics and the response cache see it
+                if getattr(chunk, 'usage', None) is not None:
+                    break
+                continue
             try:
 
                 
                 # Check if this is the end of the response with usage data
                 if hasattr(chunk, 'usage') and chunk.usage is not None:
+                    has_usage = True
                     if hasattr(chunk.usage, 'prompt_tokens'):
                         input_tokens = chunk.usage.prompt_tokens
                     if hasattr(chunk.usage, 'completion_tokens'):
@@ -919,14 +727,14 @@ async def handle_streaming(response_generator, original_request: MessagesRequest
                     elif isinstance(delta, dict) and 'content' in delta:
                         delta_content = delta['content']
                     
-                    # Accumulate text content
+                    # Emit text content, only accumulating what can't be sent yet
                     if delta_content is not None and delta_content != "":
-                        accumulated_text += delta_content
-                        
                         # Always emit text deltas if no tool calls started
                         if tool_index is None and not text_block_closed:
                             text_sent = True
-                            yield f"event: content_block_delta\ndata: {json.dumps({'type': 'content_block_delta', 'index': 0, 'delta': {'type': 'text_delta', 'text': delta_content}})}\n\n"
+                            yield sse.text_delta(0, delta_content)
+                        else:
+                            accumulated_text += delta_content
                     
                     # Process tool calls
                     delta_tool_calls = None
@@ -944,20 +752,20 @@ async def handle_streaming(response_generator, original_request: MessagesRequest
                             # If we've been streaming text, close that text block
                             if text_sent and not text_block_closed:
                                 text_block_closed = True
-                                yield f"event: content_block_stop\ndata: {json.dumps({'type': 'content_block_stop', 'index': 0})}\n\n"
+                                yield sse.content_block_stop(0)
                             # If we've accumulated text but not sent it, we need to emit it now
                             # This handles the case where the first delta has both text and a tool call
                             elif accumulated_text and not text_sent and not text_block_closed:
                                 # Send the accumulated text
                                 text_sent = True
-                                yield f"event: content_block_delta\ndata: {json.dumps({'type': 'content_block_delta', 'index': 0, 'delta': {'type': 'text_delta', 'text': accumulated_text}})}\n\n"
+                                yield sse.text_delta(0, accumulated_text)
                                 # Close the text block
                                 text_block_closed = True
-                                yield f"event: content_block_stop\ndata: {json.dumps({'type': 'content_block_stop', 'index': 0})}\n\n"
+                                yield sse.content_block_stop(0)
                             # Close text block even if we haven't sent anything - models sometimes emit empty text blocks
                             elif not text_block_closed:
                                 text_block_closed = True
-                                yield f"event: content_block_stop\ndata: {json.dumps({'type': 'content_block_stop', 'index': 0})}\n\n"
+                                yield sse.content_block_stop(0)
                                 
                         # Convert to list if it's not already
                         if not isinstance(delta_tool_calls, list):
@@ -991,7 +799,7 @@ async def handle_streaming(response_generator, original_request: MessagesRequest
                                     tool_id = getattr(tool_call, 'id', f"toolu_{uuid.uuid4().hex[:24]}")
                                 
                                 # Start a new tool_use block
-                                yield f"event: content_block_start\ndata: {json.dumps({'type': 'content_block_start', 'index': anthropic_tool_index, 'content_block': {'type': 'tool_use', 'id': tool_id, 'name': name, 'input': {}}})}\n\n"
+                                yield sse.tool_use_block_start(anthropic_tool_index, tool_id, name)
                                 current_tool_call = tool_call
                                 tool_content = ""
                             
@@ -1010,12 +818,12 @@ async def handle_streaming(response_generator, original_request: MessagesRequest
                                 try:
                                     # If it's already a dict, use it
                                     if isinstance(arguments, dict):
-                                        args_json = json.dumps(arguments)
+                                        args_json = json_backend.dumps(arguments)
                                     else:
                                         # Otherwise, try to parse it
-                                        json.loads(arguments)
+                                        json_backend.loads(arguments)
                                         args_json = arguments
-                                except (json.JSONDecodeError, TypeError):
+                                except (ValueError, TypeError):
                                     # If it's a fragment, treat it as a string
                                     args_json = arguments
                                 
@@ -1023,7 +831,7 @@ async def handle_streaming(response_generator, original_request: MessagesRequest
                                 tool_content += args_json if isinstance(args_json, str) else ""
                                 
                                 # Send the update
-                                yield f"event: content_block_delta\ndata: {json.dumps({'type': 'content_block_delta', 'index': anthropic_tool_index, 'delta': {'type': 'input_json_delta', 'partial_json': args_json}})}\n\n"
+                                yield sse.input_json_delta(anthropic_tool_index, args_json)
                     
                     # Process finish_reason - end the streaming response
                     if finish_reason and not has_sent_stop_reason:
@@ -1032,15 +840,15 @@ async def handle_streaming(response_generator, original_request: MessagesRequest
                         # Close any open tool call blocks
                         if tool_index is not None:
                             for i in range(1, last_tool_index + 1):
-                                yield f"event: content_block_stop\ndata: {json.dumps({'type': 'content_block_stop', 'index': i})}\n\n"
+                                yield sse.content_block_stop(i)
                         
                         # If we accumulated text but never sent or closed text block, do it now
                         if not text_block_closed:
                             if accumulated_text and not text_sent:
                                 # Send the accumulated text
-                                yield f"event: content_block_delta\ndata: {json.dumps({'type': 'content_block_delta', 'index': 0, 'delta': {'type': 'text_delta', 'text': accumulated_text}})}\n\n"
+                                yield sse.text_delta(0, accumulated_text)
                             # Close the text block
-                            yield f"event: content_block_stop\ndata: {json.dumps({'type': 'content_block_stop', 'index': 0})}\n\n"
+                            yield sse.content_block_stop(0)
                         
                         # Map OpenAI finish_reason to Anthropic stop_reason
                         stop_reason = "end_turn"
@@ -1052,19 +860,18 @@ async def handle_streaming(response_generator, original_request: MessagesRequest
                             stop_reason = "end_turn"
                         
                         # Send message_delta with stop reason and usage
-                        usage = {"output_tokens": output_tokens}
-                        
-                        yield f"event: message_delta\ndata: {json.dumps({'type': 'message_delta', 'delta': {'stop_reason': stop_reason, 'stop_sequence': None}, 'usage': usage})}\n\n"
+                        yield sse.message_delta(stop_reason, output_tokens)
                         
                         # Send message_stop event
-                        yield f"event: message_stop\ndata: {json.dumps({'type': 'message_stop'})}\n\n"
+                        yield sse.MESSAGE_STOP
                         
                         # Send final [DONE] marker to match Anthropic's behavior
-                        yield "data: [DONE]\n\n"
-                        return
+                        yield sse.DONE
+                        if has_usage:
+                            return
             except Exception as e:
                 # Log error but continue processing other chunks
-                logger.error(f"Error processing chunk: {str(e)}")
+                logger.error("Error processing chunk: %s", e)
                 continue
         
         # If we didn't get a finish reason, close any open blocks
@@ -1072,230 +879,101 @@ async def handle_streaming(response_generator, original_request: MessagesRequest
             # Close any open tool call blocks
             if tool_index is not None:
                 for i in range(1, last_tool_index + 1):
-                    yield f"event: content_block_stop\ndata: {json.dumps({'type': 'content_block_stop', 'index': i})}\n\n"
+                    yield sse.content_block_stop(i)
             
             # Close the text content block
-            yield f"event: content_block_stop\ndata: {json.dumps({'type': 'content_block_stop', 'index': 0})}\n\n"
+            yield sse.content_block_stop(0)
             
             # Send final message_delta with usage
-            usage = {"output_tokens": output_tokens}
-            
-            yield f"event: message_delta\ndata: {json.dumps({'type': 'message_delta', 'delta': {'stop_reason': 'end_turn', 'stop_sequence': None}, 'usage': usage})}\n\n"
+            yield sse.message_delta('end_turn', output_tokens)
             
             # Send message_stop event
-            yield f"event: message_stop\ndata: {json.dumps({'type': 'message_stop'})}\n\n"
+            yield sse.MESSAGE_STOP
             
             # Send final [DONE] marker to match Anthropic's behavior
-            yield "data: [DONE]\n\n"
+            yield sse.DONE
     
     except Exception as e:
         import traceback
-        error_traceback = traceback.format_exc()
-        error_message = f"Error in streaming: {str(e)}\n\nFull traceback:\n{error_traceback}"
-        logger.error(error_message)
+        logger.error("Error in streaming: %s\n\nFull traceback:\n%s", e, traceback.format_exc())
+        if metrics is not None:
+            metrics.error("stream")
         
         # Send error message_delta
-        yield f"event: message_delta\ndata: {json.dumps({'type': 'message_delta', 'delta': {'stop_reason': 'error', 'stop_sequence': None}, 'usage': {'output_tokens': 0}})}\n\n"
+        yield sse.message_delta('error', 0)
         
         # Send message_stop event
-        yield f"event: message_stop\ndata: {json.dumps({'type': 'message_stop'})}\n\n"
+        yield sse.MESSAGE_STOP
         
         # Send final [DONE] marker
-        yield "data: [DONE]\n\n"
+        yield sse.DONE
 
 @app.post("/v1/messages")
 async def create_message(
-    request: MessagesRequest,
-    raw_request: Request
+    raw_request: Request,
+    request: MessagesRequest = parsed_body(MessagesRequest)
 ):
     try:
-        # print the body here
-        body = await raw_request.body()
-    
-        # Parse the raw body as JSON since it's bytes
-        body_json = json.loads(body.decode('utf-8'))
-        original_model = body_json.get("model", "unknown")
+        original_model = request.original_model or request.model
         
         # Get the display name for logging, just the model name without provider prefix
         display_model = original_model
         if "/" in display_model:
             display_model = display_model.split("/")[-1]
         
-        # Clean model name for capability check
-        clean_model = request.model
-        if clean_model.startswith("anthropic/"):
-            clean_model = clean_model[len("anthropic/"):]
-        elif clean_model.startswith("openai/"):
-            clean_model = clean_model[len("openai/"):]
+        logger.debug("📊 PROCESSING REQUEST: Model=%s, Stream=%s", request.model, request.stream)
         
-        logger.debug(f"📊 PROCESSING REQUEST: Model={request.model}, Stream={request.stream}")
+        # Compile the Anthropic request into the final provider payload in one pass
+        litellm_request = prepare_upstream_request(request)
         
-        # Convert Anthropic request to LiteLLM format
-        litellm_request = convert_anthropic_to_litellm(request)
+        # Backends to try in order; fallbacks get the request compiled for their own model
+        backends = registry.router.fallback_chain(request.model)
         
-        # Determine which API key to use based on the model
-        if request.model.startswith("openai/"):
-            litellm_request["api_key"] = OPENAI_API_KEY
-            logger.debug(f"Using OpenAI API key for model: {request.model}")
-        elif request.model.startswith("gemini/"):
-            litellm_request["api_key"] = GEMINI_API_KEY
-            logger.debug(f"Using Gemini API key for model: {request.model}")
-        elif request.model.startswith("azure/"):
-            litellm_request["api_key"] = AZURE_OPENAI_API_KEY
-            litellm_request["api_base"] = AZURE_OPENAI_ENDPOINT
-            litellm_request["api_version"] = AZURE_OPENAI_API_VERSION
-            logger.debug(f"Using Azure OpenAI API key for model: {request.model}")
-        else:
-            litellm_request["api_key"] = ANTHROPIC_API_KEY
-            logger.debug(f"Using Anthropic API key for model: {request.model}")
+        # Interactive turns go ahead of background work when calls queue on rate limits
+        model_class = registry.router.resolve(original_model).rule
+        priority = priority_classifier.classify(raw_request.headers, request.metadata, model_class)
         
-        # For OpenAI models - modify request format to work with limitations
-        if "openai" in litellm_request["model"] and "messages" in litellm_request:
-            logger.debug(f"Processing OpenAI model request: {litellm_request['model']}")
-            
-            # For OpenAI models, we need to convert content blocks to simple strings
-            # and handle other requirements
-            for i, msg in enumerate(litellm_request["messages"]):
-                # Special case - handle message content directly when it's a list of tool_result
-                # This is a specific case we're seeing in the error
-                if "content" in msg and isinstance(msg["content"], list):
-                    is_only_tool_result = True
-                    for block in msg["content"]:
-                        if not isinstance(block, dict) or block.get("type") != "tool_result":
-                            is_only_tool_result = False
-                            break
-                    
-                    if is_only_tool_result and len(msg["content"]) > 0:
-                        logger.warning(f"Found message with only tool_result content - special handling required")
-                        # Extract the content from all tool_result blocks
-                        all_text = ""
-                        for block in msg["content"]:
-                            all_text += "Tool Result:\n"
-                            result_content = block.get("content", [])
-                            
-                            # Handle different formats of content
-                            if isinstance(result_content, list):
-                                for item in result_content:
-                                    if isinstance(item, dict) and item.get("type") == "text":
-                                        all_text += item.get("text", "") + "\n"
-                                    elif isinstance(item, dict):
-                                        # Fall back to string representation of any dict
-                                        try:
-                                            item_text = item.get("text", json.dumps(item))
-                                            all_text += item_text + "\n"
-                                        except:
-                                            all_text += str(item) + "\n"
-                            elif isinstance(result_content, str):
-                                all_text += result_content + "\n"
-                            else:
-                                try:
-                                    all_text += json.dumps(result_content) + "\n"
-                                except:
-                                    all_text += str(result_content) + "\n"
-                        
-                        # Replace the list with extracted text
-                        litellm_request["messages"][i]["content"] = all_text.strip() or "..."
-                        logger.warning(f"Converted tool_result to plain text: {all_text.strip()[:200]}...")
-                        continue  # Skip normal processing for this message
-                
-                # 1. Handle content field - normal case
-                if "content" in msg:
-                    # Check if content is a list (content blocks)
-                    if isinstance(msg["content"], list):
-                        # Convert complex content blocks to simple string
-                        text_content = ""
-                        for block in msg["content"]:
-                            if isinstance(block, dict):
-                                # Handle different content block types
-                                if block.get("type") == "text":
-                                    text_content += block.get("text", "") + "\n"
-                                
-                                # Handle tool_result content blocks - extract nested text
-                                elif block.get("type") == "tool_result":
-                                    tool_id = block.get("tool_use_id", "unknown")
-                                    text_content += f"[Tool Result ID: {tool_id}]\n"
-                                    
-                                    # Extract text from the tool_result content
-                                    result_content = block.get("content", [])
-                                    if isinstance(result_content, list):
-                                        for item in result_content:
-                                            if isinstance(item, dict) and item.get("type") == "text":
-                                                text_content += item.get("text", "") + "\n"
-                                            elif isinstance(item, dict):
-                                                # Handle any dict by trying to extract text or convert to JSON
-                                                if "text" in item:
-                                                    text_content += item.get("text", "") + "\n"
-                                                else:
-                                                    try:
-                                                        text_content += json.dumps(item) + "\n"
-                                                    except:
-                                                        text_content += str(item) + "\n"
-                                    elif isinstance(result_content, dict):
-                                        # Handle dictionary content
-                                        if result_content.get("type") == "text":
-                                            text_content += result_content.get("text", "") + "\n"
-                                        else:
-                                            try:
-                                                text_content += json.dumps(result_content) + "\n"
-                                            except:
-                                                text_content += str(result_content) + "\n"
-                                    elif isinstance(result_content, str):
-                                        text_content += result_content + "\n"
-                                    else:
-                                        try:
-                                            text_content += json.dumps(result_content) + "\n"
-                                        except:
-                                            text_content += str(result_content) + "\n"
-                                
-                                # Handle tool_use content blocks
-                                elif block.get("type") == "tool_use":
-                                    tool_name = block.get("name", "unknown")
-                                    tool_id = block.get("id", "unknown")
-                                    tool_input = json.dumps(block.get("input", {}))
-                                    text_content += f"[Tool: {tool_name} (ID: {tool_id})]\nInput: {tool_input}\n\n"
-                                
-                                # Handle image content blocks
-                                elif block.get("type") == "image":
-                                    text_content += "[Image content - not displayed in text format]\n"
-                        
-                        # Make sure content is never empty for OpenAI models
-                        if not text_content.strip():
-                            text_content = "..."
-                        
-                        litellm_request["messages"][i]["content"] = text_content.strip()
-                    # Also check for None or empty string content
-                    elif msg["content"] is None:
-                        litellm_request["messages"][i]["content"] = "..." # Empty content not allowed
-                
-                # 2. Remove any fields OpenAI doesn't support in messages
-                for key in list(msg.keys()):
-                    if key not in ["role", "content", "name", "tool_call_id", "tool_calls"]:
-                        logger.warning(f"Removing unsupported field from message: {key}")
-                        del msg[key]
-            
-            # 3. Final validation - check for any remaining invalid values and dump full message details
-            for i, msg in enumerate(litellm_request["messages"]):
-                # Log the message format for debugging
-                logger.debug(f"Message {i} format check - role: {msg.get('role')}, content type: {type(msg.get('content'))}")
-                
-                # If content is still a list or None, replace with placeholder
-                if isinstance(msg.get("content"), list):
-                    logger.warning(f"CRITICAL: Message {i} still has list content after processing: {json.dumps(msg.get('content'))}")
-                    # Last resort - stringify the entire content as JSON
-                    litellm_request["messages"][i]["content"] = f"Content as JSON: {json.dumps(msg.get('content'))}"
-                elif msg.get("content") is None:
-                    logger.warning(f"Message {i} has None content - replacing with placeholder")
-                    litellm_request["messages"][i]["content"] = "..." # Fallback placeholder
+        async def send_to(model):
+            if model == request.model:
+                return await call_upstream(litellm_request, priority, original_model)
+            return await call_upstream(
+                prepare_upstream_request(request.model_copy(update={"model": model})), priority, original_model
+            )
+        
+        # Latency-critical model classes race a second call against a slow first one,
+        # to the next backend of the chain or to the same model (another pool endpoint)
+        hedged = hedger is not None and hedger.hedges(model_class)
+        
+        async def send(model):
+            if not hedged or model != backends[0]:
+                return await send_to(model)
+            hedge_model = backends[1] if len(backends) > 1 else model
+            race = hedger.stream if request.stream else hedger.call
+            return await race(model_class, lambda: send_to(model), lambda: send_to(hedge_model))
         
         # Only log basic info about the request, not the full details
-        logger.debug(f"Request for model: {litellm_request.get('model')}, stream: {litellm_request.get('stream', False)}")
+        logger.debug("Request for model: %s, stream: %s", litellm_request.get('model'), litellm_request.get('stream', False))
+        
+        # Look up deterministic requests in the response cache
+        cache_key = None
+        cached = None
+        if response_cache is not None and response_cache.cacheable(litellm_request):
+            cache_key = response_cache.key(litellm_request)
+            cached = await response_cache.get(cache_key)
+            if cached is not None:
+                logger.debug("Response cache hit for model: %s", litellm_request.get('model'))
+        
+        # Identical requests already in flight share one upstream call
+        flight_key = None
+        if single_flight is not None and cached is None:
+            flight_key = cache_key or request_key(litellm_request)
         
         # Handle streaming mode
         if request.stream:
             # Use LiteLLM for streaming
             num_tools = len(request.tools) if request.tools else 0
             
-            log_request_beautifully(
+            log_request(
                 "POST", 
                 raw_request.url.path, 
                 display_model, 
@@ -1304,18 +982,44 @@ async def create_message(
                 num_tools,
                 200  # Assuming success at this point
             )
-            # Ensure we use the async version for streaming
-            response_generator = await litellm.acompletion(**litellm_request)
+            if cached is not None:
+                # Replay the stored response through the same SSE conversion
+                return StreamingResponse(
+                    handle_streaming(response_cache.replay(cached), request),
+                    media_type="text/event-stream"
+                )
             
-            return StreamingResponse(
-                handle_streaming(response_generator, request),
-                media_type="text/event-stream"
-            )
+            async def open_stream():
+                # Ensure we use the async version for streaming
+                if len(backends) > 1:
+                    stream = await failover.stream(backends, send)
+                else:
+                    stream = await send(backends[0])
+                if cache_key is not None:
+                    stream = response_cache.record_stream(stream, cache_key)
+                return stream
+            
+            if flight_key is not None:
+                response_generator = await single_flight.stream(flight_key, open_stream)
+            else:
+                response_generator = await open_stream()
+            coalesce_ms = get_coalesce_budget_ms(raw_request)
+            if coalesce_ms > 0:
+                response_generator = coalesce_chunks(
+                    response_generator, coalesce_ms / 1000, STREAM_COALESCE_MAX_CHARS, coalescing_stats
+                )
+            
+            if metrics is None:
+                frames = handle_streaming(response_generator, request)
+            else:
+                timer = metrics.stream_timer(metric_labels(original_model, request.model))
+                frames = timer.frames(handle_streaming(timer.upstream(response_generator), request))
+            return StreamingResponse(frames, media_type="text/event-stream")
         else:
             # Use LiteLLM for regular completion
             num_tools = len(request.tools) if request.tools else 0
             
-            log_request_beautifully(
+            log_request(
                 "POST", 
                 raw_request.url.path, 
                 display_model, 
@@ -1324,14 +1028,44 @@ async def create_message(
                 num_tools,
                 200  # Assuming success at this point
             )
+            if cached is not None:
+                return convert_litellm_to_anthropic(response_cache.to_completion(cached), request)
+            
+            async def complete():
+                if len(backends) > 1:
+                    response = await failover.call(backends, send)
+                else:
+                    response = await send(backends[0])
+                if cache_key is not None:
+                    await response_cache.put_completion(cache_key, response)
+                return response
+            
             start_time = time.time()
-            litellm_response = litellm.completion(**litellm_request)
-            logger.debug(f"✅ RESPONSE RECEIVED: Model={litellm_request.get('model')}, Time={time.time() - start_time:.2f}s")
+            if flight_key is not None:
+                litellm_response = await single_flight.call(flight_key, complete)
+            else:
+                litellm_response = await complete()
+            logger.debug("✅ RESPONSE RECEIVED: Model=%s, Time=%.2fs", litellm_request.get('model'), time.time() - start_time)
             
             # Convert LiteLLM response to Anthropic format
+            started = time.perf_counter()
             anthropic_response = convert_litellm_to_anthropic(litellm_response, request)
+            response = JSONResponse(anthropic_response.model_dump(mode="json"))
+            if metrics is not None:
+                metrics.observe(
+                    "serialize", metric_labels(original_model, request.model), time.perf_counter() - started
+                )
             
-            return anthropic_response
+            return response
+    
+    except OverloadedError as e:
+        # Shed by admission control: Anthropic's overloaded_error, which clients retry
+        logger.warning("Shedding request for model %s: %s", request.model, e.message)
+        return JSONResponse(
+            status_code=529,
+            content={"type": "error", "error": {"type": "overloaded_error", "message": e.message}},
+            headers={"retry-after": str(max(1, math.ceil(e.retry_after)))}
+        )
                 
     except Exception as e:
         import traceback
@@ -1356,7 +1090,7 @@ async def create_message(
                     error_details[key] = str(value)
         
         # Log all error details
-        logger.error(f"Error processing request: {json.dumps(error_details, indent=2)}")
+        logger.error("Error processing request: %s", json_backend.dumps_pretty(error_details, default=str))
         
         # Format error for response
         error_message = f"Error: {str(e)}"
@@ -1371,8 +1105,8 @@ async def create_message(
 
 @app.post("/v1/messages/count_tokens")
 async def count_tokens(
-    request: TokenCountRequest,
-    raw_request: Request
+    raw_request: Request,
+    request: TokenCountRequest = parsed_body(TokenCountRequest)
 ):
     try:
         # Log the incoming token count request
@@ -1383,17 +1117,12 @@ async def count_tokens(
         if "/" in display_model:
             display_model = display_model.split("/")[-1]
         
-        # Clean model name for capability check
-        clean_model = request.model
-        if clean_model.startswith("anthropic/"):
-            clean_model = clean_model[len("anthropic/"):]
-        elif clean_model.startswith("openai/"):
-            clean_model = clean_model[len("openai/"):]
-        
-        # Convert the messages to a format LiteLLM can understand
+        # Convert the messages to a format LiteLLM can understand. The fields are
+        # already validated, so skip validating them again.
         converted_request = convert_anthropic_to_litellm(
-            MessagesRequest(
+            MessagesRequest.model_construct(
                 model=request.model,
+                original_model=request.original_model,
                 max_tokens=100,  # Arbitrary value not used for token counting
                 messages=request.messages,
                 system=request.system,
@@ -1403,125 +1132,104 @@ async def count_tokens(
             )
         )
         
-        # Add API key configuration based on the model
-        if request.model.startswith("openai/"):
-            converted_request["api_key"] = OPENAI_API_KEY
-        elif request.model.startswith("gemini/"):
-            converted_request["api_key"] = GEMINI_API_KEY
-        elif request.model.startswith("azure/"):
-            converted_request["api_key"] = AZURE_OPENAI_API_KEY
-            converted_request["api_base"] = AZURE_OPENAI_ENDPOINT
-            converted_request["api_version"] = AZURE_OPENAI_API_VERSION
-        else:
-            converted_request["api_key"] = ANTHROPIC_API_KEY
+        # Log the request beautifully
+        num_tools = len(request.tools) if request.tools else 0
         
-        # Use LiteLLM's token_counter function
-        try:
-            # Import token_counter function
-            from litellm import token_counter
-            
-            # Log the request beautifully
-            num_tools = len(request.tools) if request.tools else 0
-            
-            log_request_beautifully(
-                "POST",
-                raw_request.url.path,
-                display_model,
-                converted_request.get('model'),
-                len(converted_request['messages']),
-                num_tools,
-                200  # Assuming success at this point
-            )
-            
-            # Count tokens
-            token_count = token_counter(
-                model=converted_request["model"],
-                messages=converted_request["messages"],
-            )
-            
-            # Return Anthropic-style response
-            return TokenCountResponse(input_tokens=token_count)
-            
-        except ImportError:
-            logger.error("Could not import token_counter from litellm")
-            # Fallback to a simple approximation
-            return TokenCountResponse(input_tokens=1000)  # Default fallback
+        log_request(
+            "POST",
+            raw_request.url.path,
+            display_model,
+            converted_request.get('model'),
+            len(converted_request['messages']),
+            num_tools,
+            200  # Assuming success at this point
+        )
+        
+        # Count tokens with the bundled tokenizers, reusing cached per-message counts.
+        # New messages are tokenized on a worker thread to keep the event loop free.
+        token_count = await asyncio.to_thread(
+            token_counter.count,
+            converted_request["model"],
+            converted_request["messages"],
+            converted_request.get("tools"),
+            converted_request.get("tool_choice"),
+        )
+        
+        # Return Anthropic-style response
+        return TokenCountResponse(input_tokens=token_count)
             
     except Exception as e:
         import traceback
         error_traceback = traceback.format_exc()
-        logger.error(f"Error counting tokens: {str(e)}\n{error_traceback}")
+        logger.error("Error counting tokens: %s\n%s", e, error_traceback)
         raise HTTPException(status_code=500, detail=f"Error counting tokens: {str(e)}")
 
+@app.get("/v1/routes")
+async def routes(model: Optional[str] = None):
+    """Show the model routing table, or how a single model name resolves."""
+    if model is not None:
+        return {"requested": model, **registry.router.resolve(model)._asdict()}
+    return registry.router.describe()
+
+@app.get("/admin/health")
+async def backend_health():
+    """Circuit breaker state, error rate and latency percentiles per provider and endpoint."""
+    return registry.health_report()
+
+@app.post("/admin/health/reset")
+async def reset_backend_health(provider: Optional[str] = None):
+    """Close the circuit breakers of one provider, or of all, without waiting for the cooldown."""
+    if provider is not None and registry.get_provider(provider) is None:
+        raise HTTPException(status_code=404, detail=f"Unknown provider: {provider}")
+    registry.reset_health(provider)
+    return registry.health_report()
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Metrics in the Prometheus text format."""
+    if metrics is None:
+        raise HTTPException(status_code=404, detail="Metrics are disabled (METRICS=false)")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/")
 async def root():
     return {
         "message": "Anthropic Proxy for LiteLLM with Modular Provider Support", 
         "version": "2.0.0",
+        "worker_pid": os.getpid(),
         "supported_providers": registry.get_provider_names(),
         "available_providers": registry.get_available_provider_names(),
         "preferred_provider": PREFERRED_PROVIDER,
+        "conversion_cache": conversion_cache.stats() if conversion_cache else None,
+        "stream_coalescing": coalescing_stats.stats(),
+        "token_count_cache": token_counter.stats(),
+        "response_cache": response_cache.stats() if response_cache else None,
+        "single_flight": single_flight.stats() if single_flight else None,
+        "admission": admission.stats(),
+        "failover": failover.stats(),
+        "hedging": hedger.stats() if hedger else None,
+        "logging": log_pipeline.stats(),
+        "startup": startup_report.stats(),
+        "shared_state": shared_state.stats() if shared_state is not None else None,
+        "endpoint_pools": {
+            name: provider.endpoint_pool.stats()
+            for name, provider in registry.providers.items() if provider.endpoint_pool is not None
+        },
         "endpoints": {
             "messages": "/v1/messages",
-            "count_tokens": "/v1/messages/count_tokens"
+            "count_tokens": "/v1/messages/count_tokens",
+            "routes": "/v1/routes",
+            "health": "/admin/health",
+            "metrics": "/metrics"
         }
     }
 
-# Define ANSI color codes for terminal output
-class Colors:
-    CYAN = "\033[96m"
-    BLUE = "\033[94m"
-    GREEN = "\033[92m"
-    YELLOW = "\033[93m"
-    RED = "\033[91m"
-    MAGENTA = "\033[95m"
-    RESET = "\033[0m"
-    BOLD = "\033[1m"
-    UNDERLINE = "\033[4m"
-    DIM = "\033[2m"
-def log_request_beautifully(method, path, claude_model, openai_model, num_messages, num_tools, status_code):
-    """Log requests in a beautiful, twitter-friendly format showing Claude to OpenAI mapping."""
-    # Format the Claude model name nicely
-    claude_display = f"{Colors.CYAN}{claude_model}{Colors.RESET}"
-    
-    # Extract endpoint name
-    endpoint = path
-    if "?" in endpoint:
-        endpoint = endpoint.split("?")[0]
-    
-    # Extract just the OpenAI model name without provider prefix
-    openai_display = openai_model
-    if "/" in openai_display:
-        openai_display = openai_display.split("/")[-1]
-    openai_display = f"{Colors.GREEN}{openai_display}{Colors.RESET}"
-    
-    # Format tools and messages
-    tools_str = f"{Colors.MAGENTA}{num_tools} tools{Colors.RESET}"
-    messages_str = f"{Colors.BLUE}{num_messages} messages{Colors.RESET}"
-    
-    # Format status code
-    status_str = f"{Colors.GREEN}✓ {status_code} OK{Colors.RESET}" if status_code == 200 else f"{Colors.RED}✗ {status_code}{Colors.RESET}"
-    
-
-    # Put it all together in a clear, beautiful format
-    log_line = f"{Colors.BOLD}{method} {endpoint}{Colors.RESET} {status_str}"
-    model_line = f"{claude_display} → {openai_display} {tools_str} {messages_str}"
-    
-    # Print to console
-    print(log_line)
-    print(model_line)
-    sys.stdout.flush()
+startup_report.mark("setup")
 
 def main():
-    """Main entry point for the CLI script."""
-    import uvicorn
-    uvicorn.run(
-        "server:app",
-        host="0.0.0.0",
-        port=5000,
-        reload=True
-    )
-
+    """Main entry point for the CLI script: the dev profile, or --profile prod for workers (see proxy/launcher.py)."""
+    from proxy.launcher import LaunchConfig, run
+    run("server:app", LaunchConfig.from_args())
 
 if __name__ == "__main__":
     main()
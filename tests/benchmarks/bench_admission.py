@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Admission control benchmark: a burst over the upstream rate limit.
+
+The mock upstream enforces --rpm like Azure, in 10 second slices of rpm / 6
+requests, with 429s beyond. Sends a burst of --requests through the proxy with no
+admission control, where the excess turns into 429 errors, and with OPENAI_RPM
+set to the same limit, where the excess queues until the limit allows it.
+Circuit breakers are off so the 429s reach every request.
+
+Usage:
+  python -m tests.benchmarks.bench_admission
+  python -m tests.benchmarks.bench_admission --requests 400 --rpm 1200
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+
+from tests.benchmarks.bench_failover import run_load
+from tests.benchmarks.common import summarize
+from tests.mock_upstream import BackgroundServer, create_mock_app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--rpm", type=int, default=1200)
+    parser.add_argument("--timeout", type=float, default=30.0, help="ADMISSION_TIMEOUT")
+    args = parser.parse_args()
+
+    mock_app = create_mock_app(0.05, 0.002, num_tokens=8, rpm_limit=args.rpm)
+    mock = BackgroundServer(mock_app).start()
+    os.environ["OPENAI_API_KEY"] = "mock-key"
+    os.environ["OPENAI_API_BASE"] = f"{mock.url}/v1"
+
+    import server
+    from providers.health import BreakerConfig
+    from proxy.admission import AdmissionController
+    logging.getLogger().setLevel(logging.CRITICAL)
+    provider = server.registry.get_provider("openai")
+    provider.api_key = "mock-key"
+    provider.upstream_engine = "httpx"
+    server.registry.breaker_config = BreakerConfig(enabled=False)
+
+    proxy = BackgroundServer(server.app).start()
+    results = {}
+    try:
+        for enabled in (False, True):
+            limits = {"openai": {"rpm": args.rpm}} if enabled else {}
+            server.admission = AdmissionController(limits, timeout=args.timeout)
+            limited_before = mock_app.state.rate_limited
+            # Start each run on a fresh upstream window
+            time.sleep(10)
+            start = time.perf_counter()
+            outcomes = asyncio.run(run_load(proxy.url, args.requests, args.concurrency))
+            elapsed = time.perf_counter() - start
+            stats = server.admission.stats().get("openai")
+            results["on" if enabled else "off"] = (
+                outcomes, elapsed, mock_app.state.rate_limited - limited_before, stats
+            )
+    finally:
+        proxy.stop()
+        mock.stop()
+
+    print(f"\n📊 Admission control: burst of {args.requests} requests, concurrency {args.concurrency}, "
+          f"upstream limit {args.rpm} RPM ({args.rpm // 6} per 10s)")
+    for label, (outcomes, elapsed, rate_limited, stats) in results.items():
+        succeeded = [latency for ok, latency in outcomes if ok]
+        print(summarize(f"admission {label}", succeeded))
+        line = (f"{'':<16} failed={len(outcomes) - len(succeeded)} upstream 429s={rate_limited} "
+                f"elapsed={elapsed:.1f}s")
+        if stats:
+            line += (f" queued={stats['waited']} max queue={stats['max_queued']} shed={stats['shed']} "
+                     f"wait p95={stats['wait_ms']['p95']:.0f}ms")
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
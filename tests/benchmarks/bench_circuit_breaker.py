@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Circuit breaker benchmark: load on a pool where one endpoint is failing.
+
+One of --deployments mock deployments answers every request with a 503 after
+--failure-delay seconds (a backend that is timing out). Sends the same load
+through call_upstream with circuit breakers off and on, and reports how many
+requests failed, the time spent waiting on failures, and the latency of the
+requests that succeeded.
+
+Usage:
+  python -m tests.benchmarks.bench_circuit_breaker
+  python -m tests.benchmarks.bench_circuit_breaker --requests 400 --failure-delay 2
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+from tests.benchmarks.common import summarize
+from tests.mock_upstream import BackgroundServer, create_mock_app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--deployments", type=int, default=3)
+    parser.add_argument("--ttft", type=float, default=0.05)
+    parser.add_argument("--failure-delay", type=float, default=1.0, help="Seconds before the failing endpoint errors")
+    args = parser.parse_args()
+
+    mock_apps = [create_mock_app(args.ttft, 0.002) for _ in range(args.deployments)]
+    mock_apps[-1].state.failure_rate = 1.0
+    mock_apps[-1].state.failure_delay = args.failure_delay
+    mocks = [BackgroundServer(app).start() for app in mock_apps]
+
+    import server
+    from providers.engine import UpstreamError
+    from providers.health import BreakerConfig
+    from providers.pool import Endpoint, EndpointPool
+    logging.getLogger().setLevel(logging.CRITICAL)
+    provider = server.registry.get_provider("openai")
+    provider.upstream_engine = "httpx"
+
+    async def one(semaphore, i):
+        request = {
+            "model": "openai/gpt-4.1",
+            "max_tokens": 256,
+            "stream": i % 2 == 0,
+            "messages": [{"role": "user", "content": "Hello from the benchmark"}]
+        }
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response = await server.call_upstream(request)
+                if request["stream"]:
+                    async for _ in response:
+                        pass
+                return True, time.perf_counter() - start
+            except UpstreamError:
+                return False, time.perf_counter() - start
+
+    async def run():
+        semaphore = asyncio.Semaphore(args.concurrency)
+        start = time.perf_counter()
+        results = await asyncio.gather(*(one(semaphore, i) for i in range(args.requests)))
+        elapsed = time.perf_counter() - start
+        await provider.aclose()
+        return results, elapsed
+
+    results = {}
+    try:
+        for enabled in (False, True):
+            provider.endpoint_pool = EndpointPool(
+                [Endpoint(f"mock{i}", f"{mock.url}/v1", api_key="mock-key") for i, mock in enumerate(mocks)]
+            )
+            server.registry.health = {}
+            server.registry.breaker_config = BreakerConfig(enabled=enabled)
+            results["on" if enabled else "off"] = asyncio.run(run())
+    finally:
+        for mock in mocks:
+            mock.stop()
+
+    print(f"\n📊 Circuit breaker: {args.requests} requests, concurrency {args.concurrency}, "
+          f"{args.deployments} deployments (one failing after {args.failure_delay}s)")
+    for label, (outcomes, elapsed) in results.items():
+        succeeded = [latency for ok, latency in outcomes if ok]
+        failed = [latency for ok, latency in outcomes if not ok]
+        print(summarize(f"breaker {label}", succeeded))
+        print(f"{'':<16} failed={len(failed)} time lost to failures={sum(failed):.1f}s "
+              f"throughput={args.requests / elapsed:.1f} req/s")
+
+
+if __name__ == "__main__":
+    main()
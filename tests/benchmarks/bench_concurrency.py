@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Concurrency benchmark: p99 latency for mixed streaming and non-streaming load.
+
+Starts the mock upstream and the proxy in-process, then fires concurrent
+/v1/messages requests at the proxy and reports latency percentiles per kind.
+
+Usage:
+  python -m tests.benchmarks.bench_concurrency
+  python -m tests.benchmarks.bench_concurrency --requests 400 --concurrency 64
+  python -m tests.benchmarks.bench_concurrency --blocking   # old blocking litellm.completion path
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+
+from tests.benchmarks.common import summarize
+from tests.mock_upstream import BackgroundServer, create_mock_app
+
+
+async def _one_request(client, url, stream, model="openai/gpt-4.1"):
+    payload = {
+        "model": model,
+        "max_tokens": 256,
+        "stream": stream,
+        "messages": [{"role": "user", "content": "Hello from the benchmark"}]
+    }
+    start = time.perf_counter()
+    if stream:
+        async with client.stream("POST", url, json=payload) as response:
+            response.raise_for_status()
+            async for _ in response.aiter_bytes():
+                pass
+    else:
+        response = await client.post(url, json=payload)
+        response.raise_for_status()
+    return stream, time.perf_counter() - start
+
+
+async def run_load(proxy_url, total, concurrency, stream_ratio, model="openai/gpt-4.1"):
+    import httpx
+
+    url = f"{proxy_url}/v1/messages"
+    semaphore = asyncio.Semaphore(concurrency)
+    stream_every = max(1, round(1 / stream_ratio)) if stream_ratio > 0 else 0
+
+    async def guarded(i, client):
+        async with semaphore:
+            stream = bool(stream_every) and i % stream_every == 0
+            return await _one_request(client, url, stream, model)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=60.0, limits=limits) as client:
+        start = time.perf_counter()
+        results = await asyncio.gather(*(guarded(i, client) for i in range(total)))
+        elapsed = time.perf_counter() - start
+
+    streaming = [latency for is_stream, latency in results if is_stream]
+    non_streaming = [latency for is_stream, latency in results if not is_stream]
+    return streaming, non_streaming, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--stream-ratio", type=float, default=0.5, help="Fraction of requests that stream")
+    parser.add_argument("--ttft", type=float, default=0.05)
+    parser.add_argument("--inter-token-delay", type=float, default=0.002)
+    parser.add_argument("--num-tokens", type=int, default=32)
+    parser.add_argument("--blocking", action="store_true",
+                        help="Call litellm.completion synchronously for non-streaming requests (pre-async baseline)")
+    args = parser.parse_args()
+
+    mock = BackgroundServer(create_mock_app(args.ttft, args.inter_token_delay, args.num_tokens)).start()
+    os.environ["OPENAI_API_KEY"] = "mock-key"
+    os.environ["OPENAI_API_BASE"] = f"{mock.url}/v1"
+
+    import server
+    logging.getLogger().setLevel(logging.WARNING)
+
+    if args.blocking:
+        original_call_upstream = server.call_upstream
+
+        async def blocking_call_upstream(litellm_request):
+            if litellm_request.get("stream"):
+                return await original_call_upstream(litellm_request)
+            return server.litellm.completion(**litellm_request)
+
+        server.call_upstream = blocking_call_upstream
+
+    proxy = BackgroundServer(server.app).start()
+    try:
+        streaming, non_streaming, elapsed = asyncio.run(
+            run_load(proxy.url, args.requests, args.concurrency, args.stream_ratio)
+        )
+    finally:
+        proxy.stop()
+        mock.stop()
+
+    mode = "blocking" if args.blocking else "async"
+    print(f"\n📊 Concurrency benchmark ({mode}): {args.requests} requests, concurrency {args.concurrency}")
+    print(summarize("streaming", streaming))
+    print(summarize("non-streaming", non_streaming))
+    print(summarize("all", streaming + non_streaming))
+    print(f"throughput       {args.requests / elapsed:.1f} req/s over {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
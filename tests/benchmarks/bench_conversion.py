@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Conversion microbenchmark: compiling long conversations into provider payloads.
+
+Times convert_anthropic_to_litellm (the single-pass compiler) over synthetic
+Claude Code sessions of growing length, for a text-only provider (OpenAI,
+content flattened to strings) and a block-preserving one (Azure).
+
+The growing-session section replays a conversation turn by turn, the way
+Claude Code resends it, with and without the conversion cache.
+
+Usage:
+  python -m tests.benchmarks.bench_conversion
+  python -m tests.benchmarks.bench_conversion --sizes 50 200 500 --tool-result-chars 20000
+"""
+import argparse
+import logging
+import time
+
+from proxy.compiler import compile_request
+from proxy.conversion_cache import ConversionCache
+from tests.benchmarks.corpus import make_conversation
+
+
+def time_call(func, repeat):
+    """Best-of-N wall time for one call, in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20, 200, 500])
+    parser.add_argument("--tool-result-chars", type=int, default=4000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    import server
+    logging.getLogger().setLevel(logging.WARNING)
+
+    print(f"\n📊 Conversion benchmark (tool results ~{args.tool_result_chars} chars, best of {args.repeat})")
+    print(f"{'provider':<10} {'messages':>8} {'validate':>10} {'compile':>10}")
+    for model in ("openai/gpt-4.1", "azure/gpt-4o"):
+        for size in args.sizes:
+            payload = make_conversation(size, args.tool_result_chars, model=model)
+            validate = time_call(lambda: server.MessagesRequest(**payload), args.repeat)
+            request = server.MessagesRequest(**payload)
+            compile_time = time_call(lambda: server.convert_anthropic_to_litellm(request), args.repeat)
+            print(f"{model.split('/')[0]:<10} {size:>8} {validate * 1000:>8.2f}ms {compile_time * 1000:>8.2f}ms")
+
+    size = max(args.sizes)
+    payload = make_conversation(size, args.tool_result_chars)
+    capabilities = server.get_capabilities(payload["model"])
+    # Each turn is parsed afresh, as it would be when it arrives over HTTP
+    turns = [
+        server.MessagesRequest(**{**payload, "messages": payload["messages"][:end]})
+        for end in range(2, size + 1, 2)
+    ]
+    cache = ConversionCache(max_bytes=512 * 1024 * 1024)
+
+    print(f"\n📊 Growing session: {len(turns)} turns up to {size} messages (per-turn compile time)")
+    print(f"{'turn':>6} {'messages':>8} {'uncached':>10} {'cached':>10}")
+    for i, turn in enumerate(turns):
+        start = time.perf_counter()
+        compile_request(turn, capabilities)
+        uncached = time.perf_counter() - start
+        start = time.perf_counter()
+        compile_request(turn, capabilities, cache)
+        cached = time.perf_counter() - start
+        if i % max(1, len(turns) // 5) == 0 or i == len(turns) - 1:
+            print(f"{i + 1:>6} {len(turn.messages):>8} {uncached * 1000:>8.2f}ms {cached * 1000:>8.2f}ms")
+    print(f"cache stats: {cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
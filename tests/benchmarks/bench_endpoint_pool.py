@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Endpoint pool benchmark: throughput with one deployment vs several.
+
+Each mock deployment serves at most --capacity responses at once (standing in
+for its rate limit). Runs the same load through the proxy against one
+deployment, then against a pool of --deployments, where one deployment is
+slower than the rest, with each selection strategy.
+
+Usage:
+  python -m tests.benchmarks.bench_endpoint_pool
+  python -m tests.benchmarks.bench_endpoint_pool --deployments 4 --capacity 8 --engine httpx
+"""
+import argparse
+import asyncio
+import logging
+import os
+
+from tests.benchmarks.bench_concurrency import run_load
+from tests.benchmarks.common import summarize
+from tests.mock_upstream import BackgroundServer, create_mock_app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--deployments", type=int, default=3)
+    parser.add_argument("--capacity", type=int, default=4, help="Concurrent responses per deployment")
+    parser.add_argument("--ttft", type=float, default=0.05)
+    parser.add_argument("--slow-ttft", type=float, default=0.25, help="Time to first token of the slow deployment")
+    parser.add_argument("--engine", default="litellm", choices=["litellm", "httpx"])
+    args = parser.parse_args()
+
+    ttfts = [args.ttft] * (args.deployments - 1) + [args.slow_ttft]
+    mock_apps = [create_mock_app(ttft, 0.002, max_concurrency=args.capacity) for ttft in ttfts]
+    mocks = [BackgroundServer(app).start() for app in mock_apps]
+    os.environ["OPENAI_API_KEY"] = "mock-key"
+    os.environ["OPENAI_API_BASE"] = f"{mocks[0].url}/v1"
+
+    import server
+    from providers.pool import Endpoint, EndpointPool
+    logging.getLogger().setLevel(logging.WARNING)
+    provider = server.registry.get_provider("openai")
+    provider.api_key = "mock-key"
+    provider.upstream_engine = args.engine
+
+    def endpoints(count):
+        return [Endpoint(f"mock{i}", f"{mock.url}/v1", api_key="mock-key") for i, mock in enumerate(mocks[:count])]
+
+    scenarios = [("single deployment", None)]
+    for strategy in ("least_outstanding", "ewma"):
+        scenarios.append((f"pool {strategy}", lambda strategy=strategy: EndpointPool(endpoints(len(mocks)), strategy)))
+
+    proxy = BackgroundServer(server.app).start()
+    results = []
+    try:
+        for label, make_pool in scenarios:
+            provider.endpoint_pool = make_pool() if make_pool else None
+            served_before = [app.state.requests_served for app in mock_apps]
+            streaming, non_streaming, elapsed = asyncio.run(run_load(proxy.url, args.requests, args.concurrency, 0.5))
+            served = [app.state.requests_served - before for app, before in zip(mock_apps, served_before)]
+            results.append((label, streaming + non_streaming, elapsed, served))
+    finally:
+        proxy.stop()
+        for mock in mocks:
+            mock.stop()
+
+    print(f"\n📊 Endpoint pool: {args.requests} requests, concurrency {args.concurrency}, "
+          f"{args.deployments} deployments x {args.capacity} slots (last one slow), {args.engine} engine")
+    for label, latencies, elapsed, served in results:
+        print(summarize(label, latencies))
+        print(f"{'':<16} throughput={args.requests / elapsed:.1f} req/s served per deployment={served}")
+
+
+if __name__ == "__main__":
+    main()
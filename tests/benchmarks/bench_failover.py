@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Failover benchmark: load through the proxy while the primary backend is flaky.
+
+The primary (OpenAI) mock answers --failure-rate of its requests with a 503
+after --failure-delay seconds; the fallback (Azure) mock is healthy. Sends the
+same load with no fallback chain and with openai/gpt-4.1 -> azure/gpt-4.1, and
+reports failed requests, latency, and the failover depth and time lost.
+Circuit breakers are off so every request meets the flaky primary.
+
+Usage:
+  python -m tests.benchmarks.bench_failover
+  python -m tests.benchmarks.bench_failover --failure-rate 0.5 --failure-delay 0.5
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+from tests.benchmarks.common import summarize
+from tests.mock_upstream import BackgroundServer, create_mock_app
+
+
+async def run_load(proxy_url, total, concurrency):
+    """Like bench_concurrency.run_load, but counts failed requests instead of raising."""
+    import httpx
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(client, i):
+        payload = {
+            "model": "openai/gpt-4.1",
+            "max_tokens": 256,
+            "stream": i % 2 == 0,
+            "messages": [{"role": "user", "content": "Hello from the benchmark"}]
+        }
+        async with semaphore:
+            start = time.perf_counter()
+            async with client.stream("POST", f"{proxy_url}/v1/messages", json=payload) as response:
+                async for _ in response.aiter_bytes():
+                    pass
+            return response.status_code == 200, time.perf_counter() - start
+
+    async with httpx.AsyncClient(timeout=60.0) as client:
+        return await asyncio.gather(*(one(client, i) for i in range(total)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--ttft", type=float, default=0.05)
+    parser.add_argument("--failure-rate", type=float, default=0.3)
+    parser.add_argument("--failure-delay", type=float, default=0.2)
+    args = parser.parse_args()
+
+    primary_app = create_mock_app(args.ttft, 0.002, failure_rate=args.failure_rate, failure_delay=args.failure_delay)
+    fallback_app = create_mock_app(args.ttft, 0.002)
+    primary, fallback = BackgroundServer(primary_app).start(), BackgroundServer(fallback_app).start()
+
+    import server
+    from providers.health import BreakerConfig
+    from providers.pool import Endpoint, EndpointPool
+    from proxy.failover import Failover
+    logging.getLogger().setLevel(logging.CRITICAL)
+    server.registry.breaker_config = BreakerConfig(enabled=False)
+    for name, mock in (("openai", primary), ("azure", fallback)):
+        provider = server.registry.get_provider(name)
+        provider.upstream_engine = "httpx"
+        provider.endpoint_pool = EndpointPool([Endpoint(name, f"{mock.url}/v1" if name == "openai" else mock.url,
+                                                        api_key="mock-key")])
+
+    proxy = BackgroundServer(server.app).start()
+    results = {}
+    try:
+        for label, chain in (("no fallback", None), ("fallback", ["openai/gpt-4.1", "azure/gpt-4.1"])):
+            server.registry._router = None
+            server.registry.router.fallbacks = {"openai/gpt-4.1": tuple(chain)} if chain else {}
+            server.failover = Failover()
+            outcomes = asyncio.run(run_load(proxy.url, args.requests, args.concurrency))
+            results[label] = (outcomes, server.failover.stats())
+    finally:
+        proxy.stop()
+        primary.stop()
+        fallback.stop()
+
+    print(f"\n📊 Failover: {args.requests} requests, concurrency {args.concurrency}, primary failing "
+          f"{args.failure_rate:.0%} of requests after {args.failure_delay}s")
+    for label, (outcomes, stats) in results.items():
+        succeeded = [latency for ok, latency in outcomes if ok]
+        print(summarize(label, succeeded))
+        print(f"{'':<16} failed={len(outcomes) - len(succeeded)} served by depth={stats['served_by_depth']} "
+              f"time lost={stats['time_lost_s']:.1f}s (max {stats['max_time_lost_s'] * 1000:.0f}ms)")
+
+
+if __name__ == "__main__":
+    main()
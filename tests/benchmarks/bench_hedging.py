@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Hedging benchmark: tail latency of haiku requests against a jittery upstream.
+
+The mock upstream gives --slow-rate of its responses a first token after
+--slow-ttft instead of --ttft. Sends haiku-class requests (routed to
+SMALL_MODEL) through the proxy with hedging off and on for the small class,
+and reports latency percentiles, hedges fired and won, and upstream requests.
+
+Usage:
+  python -m tests.benchmarks.bench_hedging
+  python -m tests.benchmarks.bench_hedging --slow-rate 0.05 --budget 0.2
+"""
+import argparse
+import asyncio
+import logging
+import os
+
+from tests.benchmarks.bench_concurrency import run_load
+from tests.benchmarks.common import summarize
+from tests.mock_upstream import BackgroundServer, create_mock_app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--ttft", type=float, default=0.05)
+    parser.add_argument("--slow-rate", type=float, default=0.03)
+    parser.add_argument("--slow-ttft", type=float, default=1.0)
+    parser.add_argument("--percentile", type=float, default=95)
+    parser.add_argument("--budget", type=float, default=0.1)
+    args = parser.parse_args()
+
+    mock_app = create_mock_app(args.ttft, 0.002, num_tokens=8, slow_rate=args.slow_rate, slow_ttft=args.slow_ttft)
+    mock = BackgroundServer(mock_app).start()
+    os.environ["OPENAI_API_KEY"] = "mock-key"
+    os.environ["OPENAI_API_BASE"] = f"{mock.url}/v1"
+
+    import server
+    from proxy.hedging import Hedger
+    logging.getLogger().setLevel(logging.WARNING)
+    server.registry.get_provider("openai").api_key = "mock-key"
+
+    proxy = BackgroundServer(server.app).start()
+    results = {}
+    try:
+        for enabled in (False, True):
+            server.hedger = Hedger(["small"], args.percentile, budget=args.budget) if enabled else None
+            served_before = mock_app.state.requests_served
+            streaming, non_streaming, elapsed = asyncio.run(
+                run_load(proxy.url, args.requests, args.concurrency, 0.5, model="claude-3-haiku-20240307")
+            )
+            stats = server.hedger.stats()["small"] if enabled else None
+            results["on" if enabled else "off"] = (
+                streaming + non_streaming, mock_app.state.requests_served - served_before, stats
+            )
+    finally:
+        proxy.stop()
+        mock.stop()
+
+    print(f"\n📊 Hedging: {args.requests} haiku requests, concurrency {args.concurrency}, "
+          f"{args.slow_rate:.0%} of responses slow ({args.slow_ttft}s), p{args.percentile:g} delay, "
+          f"budget {args.budget:.0%}")
+    for label, (latencies, upstream_calls, stats) in results.items():
+        print(summarize(f"hedging {label}", latencies))
+        line = f"{'':<16} upstream requests={upstream_calls}"
+        if stats:
+            line += (f" hedges fired={stats['hedges_fired']} won={stats['hedges_won']} "
+                     f"budget denied={stats['budget_denied']} delay={stats['delay_ms']}ms")
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+JSON backend microbenchmark: CPU time per backend for the proxy's JSON paths.
+
+Measures, for every installed backend (orjson, msgspec, stdlib json):
+  - parsing a large Anthropic request body (create_message)
+  - serializing the compiled upstream request body (httpx engine)
+  - a 4k-token stream: parsing each upstream chunk and encoding each SSE frame
+
+Usage:
+  python -m tests.benchmarks.bench_json
+  python -m tests.benchmarks.bench_json --messages 500 --tool-result-chars 20000 --tokens 4000
+"""
+import argparse
+import importlib.util
+import json
+import time
+
+from proxy import json_backend
+from tests.benchmarks.corpus import make_conversation
+
+_FRAME_PREFIX = b'event: content_block_delta\ndata: {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": '
+_FRAME_SUFFIX = b"}}\n\n"
+
+
+def cpu_ms(fn, rounds):
+    """Best-of-N process CPU time in milliseconds."""
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.process_time()
+        fn()
+        best = min(best, time.process_time() - start)
+    return best * 1000
+
+
+def upstream_chunks(tokens):
+    """The data: payloads an OpenAI-compatible upstream streams for a text response."""
+    return [json.dumps({
+        "id": "chatcmpl-bench", "object": "chat.completion.chunk", "created": 1700000000,
+        "model": "gpt-4.1", "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]
+    }).encode() for token in tokens]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--tool-result-chars", type=int, default=20000)
+    parser.add_argument("--tokens", type=int, default=4000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    payload = make_conversation(args.messages, args.tool_result_chars)
+    body = json.dumps(payload).encode("utf-8")
+    words = ["the", " proxy", " streams", " tokens", " quickly", ",", " \"quoted\"", " ünïcode", "\n"]
+    tokens = [words[i % len(words)] for i in range(args.tokens)]
+    chunks = upstream_chunks(tokens)
+
+    print(f"\n📊 JSON backends (default: {json_backend.BACKEND}); CPU ms, best of {args.rounds}")
+    print(f"request body: {len(body) / 1e6:.1f} MB, {args.messages} messages; stream: {args.tokens} tokens")
+    print(f"{'backend':<10} {'parse body':>11} {'dump body':>10} {'stream':>8}")
+    baseline = None
+    for name in ("json", "orjson", "msgspec"):
+        if name != "json" and importlib.util.find_spec(name) is None:
+            print(f"{name:<10} not installed")
+            continue
+        _, loads, dumpb, _ = json_backend._select(name)
+
+        def stream():
+            for chunk in chunks:
+                text = loads(chunk)["choices"][0]["delta"]["content"]
+                b"".join((_FRAME_PREFIX, dumpb(text, None), _FRAME_SUFFIX))
+
+        row = (cpu_ms(lambda: loads(body), args.rounds),
+               cpu_ms(lambda: dumpb(payload, None), args.rounds),
+               cpu_ms(stream, args.rounds))
+        baseline = baseline or row
+        speedups = "  ".join(f"{b / r:4.1f}x" for b, r in zip(baseline, row))
+        print(f"{name:<10} {row[0]:11.2f} {row[1]:10.2f} {row[2]:8.2f}   ({speedups} vs json)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Logging benchmark: request throughput with logging off, on through blocking
+handlers, and on through the queued pipeline.
+
+Logs go to a sink whose writes take --write-delay-ms, like a terminal or a
+pipe that is slow to drain. With blocking handlers (the old basicConfig and
+print setup) every write holds up the event loop and every stream on it;
+through the pipeline the writes happen on the writer thread. Logging runs at
+DEBUG, so a request writes several records.
+
+Usage:
+  python -m tests.benchmarks.bench_logging
+  python -m tests.benchmarks.bench_logging --requests 800 --write-delay-ms 0.5
+"""
+import argparse
+import asyncio
+import io
+import logging
+import os
+import time
+
+from tests.benchmarks.bench_concurrency import run_load
+from tests.benchmarks.common import summarize
+from tests.mock_upstream import BackgroundServer, create_mock_app
+
+
+class SlowSink(io.TextIOBase):
+    """Discards what it is given, slowly."""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.writes = 0
+
+    def write(self, text):
+        self.writes += 1
+        time.sleep(self.delay)
+        return len(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--write-delay-ms", type=float, default=1.0)
+    args = parser.parse_args()
+
+    mock = BackgroundServer(create_mock_app(0.02, 0.001, num_tokens=16)).start()
+    os.environ["OPENAI_API_KEY"] = "mock-key"
+    os.environ["OPENAI_API_BASE"] = f"{mock.url}/v1"
+
+    import server
+    from proxy.logs import LogPipeline
+    provider = server.registry.get_provider("openai")
+    provider.api_key = "mock-key"
+    provider.upstream_engine = "httpx"
+    root = logging.getLogger()
+
+    def blocking(sink):
+        handler = logging.StreamHandler(sink)
+        handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+        root.addHandler(handler)
+        root.setLevel(logging.DEBUG)
+
+    def queued(sink):
+        return LogPipeline(logging.DEBUG, stream=sink).install()
+
+    proxy = BackgroundServer(server.app).start()
+    results = {}
+    try:
+        for label, setup in (("off", None), ("blocking", blocking), ("queued", queued)):
+            server.log_pipeline.stop()
+            root.handlers = []
+            root.setLevel(logging.WARNING)
+            sink = SlowSink(args.write_delay_ms / 1000)
+            pipeline = setup(sink) if setup else None
+            streaming, non_streaming, elapsed = asyncio.run(
+                run_load(proxy.url, args.requests, args.concurrency, 0.5)
+            )
+            if isinstance(pipeline, LogPipeline):
+                dropped = pipeline.handler.dropped
+                pipeline.stop()
+            else:
+                dropped = 0
+            results[label] = (streaming + non_streaming, elapsed, sink.writes, dropped)
+    finally:
+        proxy.stop()
+        mock.stop()
+
+    print(f"\n📊 Logging: {args.requests} requests, concurrency {args.concurrency}, "
+          f"DEBUG to a sink taking {args.write_delay_ms:g}ms per write")
+    for label, (latencies, elapsed, writes, dropped) in results.items():
+        print(summarize(f"logging {label}", latencies))
+        print(f"{'':<16} throughput={len(latencies) / elapsed:.1f} req/s writes={writes} dropped={dropped}")
+
+
+if __name__ == "__main__":
+    main()
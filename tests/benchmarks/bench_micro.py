@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark suite for the CPU-bound parts of the proxy, with JSON
+baselines and a regression check.
+
+Cases, by prefix:
+  compile         compile_request, what convert_anthropic_to_litellm runs, for
+                  OpenAI (content flattened to strings), Azure (blocks kept)
+                  and Gemini (tool schemas cleaned); compile_cached goes
+                  through the conversion cache, as a resent conversation does.
+                  compile_fresh and compile_cached_fresh get a request parsed
+                  afresh from its body for every call (parsing is not timed),
+                  as the server does each turn; their difference is what the
+                  cache saves
+  clean_schema    clean_gemini_schema, on a copy of each tool schema
+  tool_result     the compiler's flattening of tool_result content
+  response        convert_litellm_to_anthropic
+  stream          handle_streaming over text and tool call streams
+
+The request corpora are a small chat, a 500-message tool-heavy session, 60
+tools with large JSON schemas, and 20 screenshots (see corpus.py).
+
+Each case runs in --rounds rounds of enough calls to last --min-time
+seconds, interleaved with the other cases. The best round (time per call) is
+what compare uses by default, as timeit does: interference from other
+processes only ever makes a round slower. `run --save NAME` stores the
+results as tests/benchmarks/baselines/NAME.json. `compare` checks a run
+against a baseline, and exits with status 1 when a case got slower by more
+than --threshold percent. Baselines only compare on the same machine and
+Python, so record one there before making a change; on shared or virtual
+machines, use more --rounds and a higher --threshold.
+
+Usage:
+  python -m tests.benchmarks.bench_micro run
+  python -m tests.benchmarks.bench_micro run --save main
+  python -m tests.benchmarks.bench_micro compare main                 # run now, compare with main
+  python -m tests.benchmarks.bench_micro compare main branch --threshold 5
+  python -m tests.benchmarks.bench_micro run -k stream -k compile.session_500
+"""
+import argparse
+import asyncio
+import copy
+import datetime
+import gc
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from types import SimpleNamespace
+from typing import Any, Callable, NamedTuple
+
+from tests.benchmarks.common import ROOT
+from tests.benchmarks.corpus import make_conversation, make_image_conversation, make_tools
+from tests.helpers import make_chunk
+
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+
+CORPORA = {
+    "small_chat": lambda model: make_conversation(4, 200, model=model),
+    "session_500": lambda model: make_conversation(500, 4000, model=model),
+    "large_schemas": lambda model: {**make_conversation(4, 200, model=model), "tools": make_tools(60, 40)},
+    "images": lambda model: make_image_conversation(20, model=model),
+}
+
+
+class Prepared(NamedTuple):
+    """A case whose input is made afresh for every call, outside the timed part."""
+    prepare: Callable[[], Any]
+    func: Callable[[Any], Any]
+
+
+def _tool_call_stream(text_tokens=50, calls=3, argument_chars=2000, fragment=16):
+    chunks = [make_chunk(f" word{i}") for i in range(text_tokens)]
+    for index in range(calls):
+        arguments = json.dumps({"path": f"/src/module_{index}.py", "content": "x" * argument_chars})
+        chunks.append(make_chunk(tool_calls=[SimpleNamespace(
+            index=index, id=f"call_{index}", type="function", function=SimpleNamespace(name="Edit", arguments=""))]))
+        chunks.extend(make_chunk(tool_calls=[SimpleNamespace(index=index, function=SimpleNamespace(arguments=part))])
+                      for part in (arguments[i:i + fragment] for i in range(0, len(arguments), fragment)))
+    usage = SimpleNamespace(prompt_tokens=1000, completion_tokens=2000)
+    return chunks + [make_chunk(finish_reason="tool_calls", usage=usage)]
+
+
+def build_cases():
+    """Name -> zero-argument callable, with every input prepared up front."""
+    import server
+    from providers.azure import AzureOpenAIProvider
+    from providers.gemini import GeminiProvider
+    from providers.openai import OpenAIProvider
+    from proxy.compiler import _tool_result_text, clean_gemini_schema, compile_request
+    from proxy.conversion_cache import ConversionCache
+
+    logging.getLogger().setLevel(logging.WARNING)
+    providers = {
+        "openai": ("openai/gpt-4.1", OpenAIProvider.capabilities),
+        "azure": ("azure/gpt-4o", AzureOpenAIProvider.capabilities),
+        "gemini": ("gemini/gemini-2.0-flash", GeminiProvider.capabilities),
+    }
+    cases = {}
+    for corpus, make in CORPORA.items():
+        for provider, (model, capabilities) in providers.items():
+            request = server.MessagesRequest(**make(model))
+            cases[f"compile.{corpus}.{provider}"] = (
+                lambda request=request, capabilities=capabilities: compile_request(request, capabilities))
+    request = server.MessagesRequest(**CORPORA["session_500"]("openai/gpt-4.1"))
+    cache = ConversionCache(max_bytes=512 * 1024 * 1024)
+    cases["compile_cached.session_500.openai"] = (
+        lambda request=request, cache=cache: compile_request(request, OpenAIProvider.capabilities, cache))
+    # A request parsed afresh for every call (outside the timed part), as the server gets one each
+    # turn: the cache then hashes and compares new strings rather than the very objects it stored
+    for provider in ("openai", "azure"):
+        model, capabilities = providers[provider]
+        body = json.dumps(CORPORA["session_500"](model)).encode()
+        cache = ConversionCache(max_bytes=512 * 1024 * 1024)
+        compile_request(server.MessagesRequest.model_validate_json(body), capabilities, cache)
+        parse = lambda body=body: server.MessagesRequest.model_validate_json(body)
+        cases[f"compile_fresh.session_500.{provider}"] = Prepared(
+            parse, lambda request, capabilities=capabilities: compile_request(request, capabilities))
+        cases[f"compile_cached_fresh.session_500.{provider}"] = Prepared(
+            parse, lambda request, capabilities=capabilities, cache=cache:
+            compile_request(request, capabilities, cache))
+
+    schemas = [tool["input_schema"] for tool in make_tools(60, 40)]
+    cases["clean_schema.large_schemas"] = lambda: [clean_gemini_schema(copy.deepcopy(schema)) for schema in schemas]
+
+    session = CORPORA["session_500"]("openai/gpt-4.1")
+    results = [block["content"] for message in session["messages"] if isinstance(message["content"], list)
+               for block in message["content"] if block["type"] == "tool_result"]
+    cases["tool_result.session_500"] = lambda: [_tool_result_text(content) for content in results]
+    mixed = [None, "plain output", {"type": "text", "text": "done"}, {"exit_code": 0, "stdout": "ok"},
+             ["line one", {"type": "text", "text": "line two"}, {"path": "/src/a.py", "lines": 120}, 42]] * 50
+    cases["tool_result.mixed"] = lambda: [_tool_result_text(content) for content in mixed]
+
+    request = server.MessagesRequest(**CORPORA["small_chat"]("openai/gpt-4.1"))
+    usage = {"prompt_tokens": 1000, "completion_tokens": 2000, "total_tokens": 3000}
+    text_response = {"id": "chatcmpl-1", "choices": [{"index": 0, "finish_reason": "stop", "message": {
+        "role": "assistant", "content": "the proxy streams tokens quickly " * 400}}], "usage": usage}
+    tool_response = {"id": "chatcmpl-2", "choices": [{"index": 0, "finish_reason": "tool_calls", "message": {
+        "role": "assistant", "content": "Editing the files.", "tool_calls": [
+            {"id": f"call_{i}", "type": "function", "function": {
+                "name": "Edit", "arguments": json.dumps({"path": f"/src/module_{i}.py", "content": "x" * 2000})}}
+            for i in range(5)]}}], "usage": usage}
+    cases["response.text"] = lambda request=request: server.convert_litellm_to_anthropic(text_response, request)
+    cases["response.tool_calls"] = lambda request=request: server.convert_litellm_to_anthropic(tool_response, request)
+
+    request = server.MessagesRequest(**{**CORPORA["small_chat"]("openai/gpt-4.1"), "stream": True})
+    words = ["the", " proxy", " streams", " tokens", " quickly", ",", " \"quoted\"", " ünïcode", "\n"]
+    streams = {
+        "stream.text_4k": [make_chunk(words[i % len(words)]) for i in range(4000)] + [make_chunk(finish_reason="stop")],
+        "stream.tool_calls": _tool_call_stream(),
+    }
+    loop = asyncio.new_event_loop()
+
+    async def drain(chunks):
+        async def upstream():
+            for chunk in chunks:
+                yield chunk
+
+        async for _ in server.handle_streaming(upstream(), request):
+            pass
+
+    for name, chunks in streams.items():
+        cases[name] = lambda chunks=chunks: loop.run_until_complete(drain(chunks))
+    return cases
+
+
+def calibrate(func, min_time):
+    """Calls per round: enough to last min_time."""
+    time_round(func, 1)
+    loops = 1
+    while True:
+        elapsed = time_round(func, loops)
+        if elapsed >= min_time:
+            return loops
+        loops = max(loops * 2, int(loops * min_time / max(elapsed, 1e-9) * 1.1))
+
+
+def time_round(func, loops):
+    """Seconds for loops calls, with the garbage collector off as in timeit.
+
+    A collection triggered by one case's garbage would otherwise be charged
+    to whichever case happens to run then.
+    """
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        if isinstance(func, Prepared):
+            elapsed = 0.0
+            for _ in range(loops):
+                value = func.prepare()
+                started = time.perf_counter()
+                func.func(value)
+                elapsed += time.perf_counter() - started
+            return elapsed
+        started = time.perf_counter()
+        for _ in range(loops):
+            func()
+        return time.perf_counter() - started
+    finally:
+        if collecting:
+            gc.enable()
+
+
+def environment():
+    """What a baseline was recorded on; figures only compare within the same environment."""
+    from proxy import json_backend
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {"created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "commit": commit, "python": platform.python_version(), "implementation": platform.python_implementation(),
+            "machine": platform.machine(), "system": platform.system(), "cpus": os.cpu_count(),
+            "json_backend": json_backend.BACKEND}
+
+
+def run(patterns=(), rounds=7, min_time=0.1, verbose=True):
+    """Time the cases whose name contains one of patterns (all of them by default).
+
+    Rounds are interleaved: every case runs its first round, then its second
+    and so on, so a slow spell on the machine costs each case one round rather
+    than all the rounds of whichever case was running.
+    """
+    cases = build_cases()
+    selected = [name for name in cases if not patterns or any(pattern in name for pattern in patterns)]
+    if not selected:
+        raise SystemExit(f"No benchmark matches {', '.join(patterns)}")
+    loops = {name: calibrate(cases[name], min_time) for name in selected}
+    per_call = {name: [] for name in selected}
+    for _ in range(rounds):
+        for name in selected:
+            per_call[name].append(time_round(cases[name], loops[name]) / loops[name])
+            gc.collect()
+    results = {}
+    for name in selected:
+        results[name] = {"min_us": round(min(per_call[name]) * 1e6, 3),
+                         "median_us": round(statistics.median(per_call[name]) * 1e6, 3),
+                         "rounds": rounds, "loops": loops[name]}
+        if verbose:
+            print(f"{name:<36} {_format_us(results[name]['min_us']):>10}  "
+                  f"(median {_format_us(results[name]['median_us'])}, {rounds}x{loops[name]})")
+    return {"environment": environment(), "results": results}
+
+
+def _format_us(us):
+    return f"{us / 1000:.2f}ms" if us >= 1000 else f"{us:.1f}µs"
+
+
+def baseline_path(name):
+    """A baseline by name (in tests/benchmarks/baselines) or by path."""
+    if name.endswith(".json") or os.sep in name:
+        return name
+    return os.path.join(BASELINES, f"{name}.json")
+
+
+def load(name):
+    with open(baseline_path(name)) as file:
+        return json.load(file)
+
+
+def save(data, name):
+    path = baseline_path(name)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as file:
+        json.dump(data, file, indent=2, sort_keys=True)
+        file.write("\n")
+    return path
+
+
+def compare(baseline, current, threshold=15.0, stat="min_us"):
+    """(name, baseline, current, percent change, verdict) for the cases in both, and the regressions."""
+    rows, regressions = [], []
+    for name in sorted(set(baseline["results"]) & set(current["results"])):
+        before, after = baseline["results"][name][stat], current["results"][name][stat]
+        change = (after / before - 1) * 100 if before else 0.0
+        verdict = "REGRESSION" if change > threshold else "faster" if change < -threshold else ""
+        rows.append((name, before, after, change, verdict))
+        if verdict == "REGRESSION":
+            regressions.append(name)
+    return rows, regressions
+
+
+def print_comparison(baseline, current, threshold, stat):
+    rows, regressions = compare(baseline, current, threshold, stat)
+    differences = [f"{key} {baseline['environment'].get(key)} -> {current['environment'].get(key)}"
+                   for key in ("python", "implementation", "machine", "system", "cpus", "json_backend")
+                   if baseline["environment"].get(key) != current["environment"].get(key)]
+    if differences:
+        print(f"⚠️  Different environments, figures may not compare: {'; '.join(differences)}")
+    print(f"\n📊 {baseline['environment'].get('commit') or 'baseline'} -> "
+          f"{current['environment'].get('commit') or 'current'} ({stat[:-3]}, threshold {threshold:g}%)")
+    print(f"{'case':<36} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, before, after, change, verdict in rows:
+        print(f"{name:<36} {_format_us(before):>10} {_format_us(after):>10} {change:>+7.1f}%  {verdict}")
+    for name in sorted(set(baseline["results"]) - set(current["results"])):
+        print(f"{name:<36} only in the baseline")
+    for name in sorted(set(current["results"]) - set(baseline["results"])):
+        print(f"{name:<36} new, not in the baseline")
+    if regressions:
+        print(f"\n❌ {len(regressions)} regression(s) over {threshold:g}%: {', '.join(regressions)}")
+    else:
+        print(f"\n✅ No regressions over {threshold:g}%")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="Run the suite")
+    run_parser.add_argument("--save", metavar="NAME", help="Store the results as a baseline")
+    compare_parser = commands.add_parser("compare", help="Compare a run (or a second baseline) with a baseline")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current", nargs="?", help="Baseline to compare instead of running the suite")
+    compare_parser.add_argument("--threshold", type=float, default=15.0, help="Percent slower that fails")
+    compare_parser.add_argument("--stat", choices=("min_us", "median_us"), default="min_us")
+    compare_parser.add_argument("--save", metavar="NAME", help="Also store this run as a baseline")
+    for sub in (run_parser, compare_parser):
+        sub.add_argument("-k", dest="patterns", action="append", default=[],
+                         help="Only cases whose name contains this (repeatable)")
+        sub.add_argument("--rounds", type=int, default=7)
+        sub.add_argument("--min-time", type=float, default=0.1, help="Seconds per round of each case")
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        baseline = load(args.baseline)
+        if args.current:
+            current = load(args.current)
+        else:
+            # Only what the baseline has, unless narrowed further
+            patterns = args.patterns or list(baseline["results"])
+            current = run(patterns, args.rounds, args.min_time)
+    else:
+        current = run(args.patterns, args.rounds, args.min_time)
+    if args.save:
+        print(f"Saved {save(current, args.save)}")
+    if args.command == "compare":
+        sys.exit(1 if print_comparison(baseline, current, args.threshold, args.stat) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Priority scheduling benchmark: fairness of admission under overload, simulated.
+
+Drives the admission controller directly, with no proxy or upstream: a provider
+limited to --rpm, a runaway agent keeping --agent-concurrency calls queued at
+all times, and --users interactive sessions that each send a turn, wait for it
+(--service seconds) and think for --think seconds before the next one. Compares
+a plain FIFO queue (every call the same priority and flow) with weighted fair
+queuing, once with the agent's calls classed as background work and once as
+interactive (only per-user fairness protects the sessions then). Reports the
+calls each side got admitted and the time interactive turns spent queued.
+
+Usage:
+  python -m tests.benchmarks.bench_priority
+  python -m tests.benchmarks.bench_priority --rpm 1200 --agent-concurrency 128
+"""
+import argparse
+import asyncio
+import time
+
+from proxy.admission import AdmissionController, OverloadedError
+from proxy.priority import Priority, PriorityClassifier
+
+
+async def simulate(args, agent_class, fair):
+    classifier = PriorityClassifier()
+    admission = AdmissionController({"sim": {"rpm": args.rpm}}, timeout=args.timeout)
+    limiters = admission.limiters("sim")
+    stop = time.monotonic() + args.duration
+    results = {"agent": [], "users": [], "shed": {"agent": 0, "users": 0}}
+
+    def priority(name, flow):
+        return Priority(name, classifier.weights[name], flow) if fair else Priority()
+
+    async def loop(side, prio, think):
+        while time.monotonic() < stop:
+            started = time.monotonic()
+            try:
+                await admission.admit(limiters, 1, prio)
+            except OverloadedError:
+                results["shed"][side] += 1
+                continue
+            results[side].append(time.monotonic() - started)
+            await asyncio.sleep(args.service)
+            await asyncio.sleep(think)
+
+    agent = priority(agent_class, "user:agent")
+    tasks = [loop("agent", agent, 0.0) for _ in range(args.agent_concurrency)]
+    tasks += [loop("users", priority("interactive", f"user:{i}"), args.think) for i in range(args.users)]
+    await asyncio.gather(*tasks)
+    return results
+
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    if not samples:
+        return 0.0
+    return samples[min(len(samples) - 1, int(p / 100 * len(samples)))] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rpm", type=int, default=3000)
+    parser.add_argument("--agent-concurrency", type=int, default=64)
+    parser.add_argument("--users", type=int, default=4)
+    parser.add_argument("--service", type=float, default=0.2, help="Seconds an admitted call takes upstream")
+    parser.add_argument("--think", type=float, default=0.5, help="Seconds between a user's turns")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--timeout", type=float, default=30.0, help="ADMISSION_TIMEOUT")
+    args = parser.parse_args()
+
+    scenarios = [
+        ("fifo", "background", False),
+        ("fair, agent background", "background", True),
+        ("fair, agent interactive", "interactive", True),
+    ]
+    print(f"\n📊 Priority scheduling: {args.rpm} RPM, runaway agent with {args.agent_concurrency} calls in flight, "
+          f"{args.users} interactive users, {args.duration:g}s simulated")
+    print(f"{'':<26}{'agent calls':>12}{'user turns':>12}{'turn wait p50':>15}{'p95':>10}{'max':>10}")
+    for label, agent_class, fair in scenarios:
+        results = asyncio.run(simulate(args, agent_class, fair))
+        waits = results["users"]
+        print(f"{label:<26}{len(results['agent']):>12}{len(waits):>12}"
+              f"{percentile(waits, 50):>13.0f}ms{percentile(waits, 95):>8.0f}ms{percentile(waits, 100):>8.0f}ms"
+              + (f"  shed agent={results['shed']['agent']} users={results['shed']['users']}"
+                 if any(results["shed"].values()) else ""))
+
+
+if __name__ == "__main__":
+    main()
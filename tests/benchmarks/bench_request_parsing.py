@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Request parsing benchmark: peak RSS and time per request for large bodies.
+
+Compares how create_message used to get its request (FastAPI json.loads into a
+dict, pydantic validation, then a second json.loads of the body in the handler)
+with the current single validation from bytes (server.parsed_body). Each
+measurement runs in a fresh subprocess so ru_maxrss reflects one request.
+
+Usage:
+  python -m tests.benchmarks.bench_request_parsing
+  python -m tests.benchmarks.bench_request_parsing --sizes 1 2.5 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from tests.benchmarks.common import ROOT
+from tests.benchmarks.corpus import make_conversation
+
+
+def _raw_request(body):
+    from starlette.requests import Request
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+    return Request({"type": "http", "method": "POST", "headers": []}, receive)
+
+
+def _body_of_size(megabytes):
+    """A Claude Code style body (tool results and images) of roughly the given size."""
+    messages = max(4, int(megabytes * 1e6 / 13000))
+    return json.dumps(make_conversation(messages, 20000, images=True)).encode("utf-8")
+
+
+def child(mode, path):
+    """Parse one body and print RSS growth (KB) and wall time (ms) as JSON."""
+    import logging
+    import server
+    logging.getLogger().setLevel(logging.WARNING)
+
+    # Read the body from disk so building it leaves no freed heap for the parse to reuse
+    with open(path, "rb") as f:
+        body = f.read()
+    parse = server.parsed_body(server.MessagesRequest).dependency
+
+    async def handle():
+        raw_request = _raw_request(body)
+        if mode == "current":
+            return await parse(raw_request)
+        data = await raw_request.body()
+        request = server.MessagesRequest.model_validate(json.loads(data))
+        return request, json.loads(data.decode("utf-8"))
+
+    async def measure():
+        baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        start = time.perf_counter()
+        result = await handle()
+        elapsed = time.perf_counter() - start
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        del result
+        return peak - baseline, elapsed
+
+    rss_kb, elapsed = asyncio.run(measure())
+    print(json.dumps({"body_mb": len(body) / 1e6, "rss_kb": rss_kb, "ms": elapsed * 1000}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 2.5, 5], help="Body sizes in MB")
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(*args.child)
+        return
+
+    print("\n📊 Parsing one request body (fresh process per measurement)")
+    print(f"{'body':>8} {'mode':<8} {'peak RSS +':>11} {'time':>9}")
+    for megabytes in args.sizes:
+        with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+            f.write(_body_of_size(megabytes))
+        try:
+            for mode in ("legacy", "current"):
+                output = subprocess.run(
+                    [sys.executable, "-m", "tests.benchmarks.bench_request_parsing", "--child", mode, f.name],
+                    cwd=ROOT, capture_output=True, text=True, check=True
+                ).stdout.strip().splitlines()[-1]
+                result = json.loads(output)
+                print(f"{result['body_mb']:6.1f}MB {mode:<8} {result['rss_kb'] / 1024:9.1f}MB {result['ms']:7.1f}ms")
+        finally:
+            os.unlink(f.name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Response cache benchmark: repeated temperature 0 helper requests.
+
+Sends the same small set of title/summary style prompts again and again
+through the proxy, against the mock upstream, with the cache off and with each
+store. Reports latency (streaming and non-streaming mixed) and how many
+requests actually reached upstream.
+
+Usage:
+  python -m tests.benchmarks.bench_response_cache
+  python -m tests.benchmarks.bench_response_cache --requests 400 --distinct 20 --ttft 0.2
+"""
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+import httpx
+
+from tests.benchmarks.common import summarize
+from tests.mock_upstream import BackgroundServer, create_mock_app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--distinct", type=int, default=10, help="Distinct prompts among the requests")
+    parser.add_argument("--ttft", type=float, default=0.05)
+    parser.add_argument("--inter-token-delay", type=float, default=0.002)
+    args = parser.parse_args()
+
+    mock_app = create_mock_app(args.ttft, args.inter_token_delay)
+    mock = BackgroundServer(mock_app).start()
+    os.environ["OPENAI_API_KEY"] = "mock-key"
+    os.environ["OPENAI_API_BASE"] = f"{mock.url}/v1"
+
+    import server
+    from proxy.response_cache import create_response_cache
+    logging.getLogger().setLevel(logging.WARNING)
+    server.registry.get_provider("openai").api_key = "mock-key"
+
+    proxy = BackgroundServer(server.app).start()
+    results = {}
+    try:
+        with tempfile.TemporaryDirectory() as directory, httpx.Client(base_url=proxy.url, timeout=60) as client:
+            for backend in ("off", "memory", "sqlite"):
+                server.response_cache = create_response_cache(
+                    backend, 3600, 64 * 1024 * 1024, os.path.join(directory, "responses.sqlite3")
+                )
+                served_before = mock_app.state.requests_served
+                latencies = []
+                for i in range(args.requests):
+                    body = {
+                        "model": "claude-3-haiku-20240307",
+                        "max_tokens": 64,
+                        "temperature": 0,
+                        "stream": i % 2 == 1,
+                        "messages": [{"role": "user", "content": f"Write a 5-10 word title for topic {i % args.distinct}"}],
+                    }
+                    start = time.perf_counter()
+                    response = client.post("/v1/messages", json=body)
+                    response.read()
+                    latencies.append(time.perf_counter() - start)
+                    assert response.status_code == 200, response.text
+                results[backend] = (latencies, mock_app.state.requests_served - served_before)
+    finally:
+        proxy.stop()
+        mock.stop()
+
+    print(f"\n📊 Response cache: {args.requests} requests over {args.distinct} distinct prompts")
+    for backend, (latencies, upstream_calls) in results.items():
+        print(summarize(f"cache={backend}", latencies))
+        print(f"{'':<16} upstream requests={upstream_calls}")
+
+
+if __name__ == "__main__":
+    main()
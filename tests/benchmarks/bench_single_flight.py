@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Single-flight benchmark: bursts of identical concurrent requests.
+
+Fires the same prompt from many concurrent clients through the proxy, against
+the mock upstream, with single-flight off and on. Reports latency and how many
+requests reached upstream.
+
+Usage:
+  python -m tests.benchmarks.bench_single_flight
+  python -m tests.benchmarks.bench_single_flight --requests 400 --concurrency 64
+"""
+import argparse
+import asyncio
+import logging
+import os
+
+from tests.benchmarks.bench_concurrency import run_load
+from tests.benchmarks.common import summarize
+from tests.mock_upstream import BackgroundServer, create_mock_app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--stream-ratio", type=float, default=0.5)
+    parser.add_argument("--ttft", type=float, default=0.05)
+    parser.add_argument("--inter-token-delay", type=float, default=0.002)
+    args = parser.parse_args()
+
+    mock_app = create_mock_app(args.ttft, args.inter_token_delay)
+    mock = BackgroundServer(mock_app).start()
+    os.environ["OPENAI_API_KEY"] = "mock-key"
+    os.environ["OPENAI_API_BASE"] = f"{mock.url}/v1"
+
+    import server
+    from proxy.single_flight import SingleFlight
+    logging.getLogger().setLevel(logging.WARNING)
+    server.registry.get_provider("openai").api_key = "mock-key"
+
+    proxy = BackgroundServer(server.app).start()
+    results = {}
+    try:
+        for enabled in (False, True):
+            server.single_flight = SingleFlight() if enabled else None
+            served_before = mock_app.state.requests_served
+            streaming, non_streaming, elapsed = asyncio.run(
+                run_load(proxy.url, args.requests, args.concurrency, args.stream_ratio)
+            )
+            results["on" if enabled else "off"] = (
+                streaming, non_streaming, elapsed, mock_app.state.requests_served - served_before
+            )
+    finally:
+        proxy.stop()
+        mock.stop()
+
+    print(f"\n📊 Single-flight: {args.requests} identical requests, concurrency {args.concurrency}")
+    for label, (streaming, non_streaming, elapsed, upstream_calls) in results.items():
+        print(summarize(f"{label} stream", streaming))
+        print(summarize(f"{label} non-stream", non_streaming))
+        print(f"{'':<16} upstream requests={upstream_calls} throughput={args.requests / elapsed:.1f} req/s")
+
+
+if __name__ == "__main__":
+    main()
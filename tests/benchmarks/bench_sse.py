@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Streaming microbenchmark: SSE frame encoding in handle_streaming.
+
+Compares the precomputed encoder in proxy/sse.py with the previous approach
+(an f-string around json.dumps of a fresh event dict, encoded by Starlette),
+then runs handle_streaming end to end over a synthetic token stream, with and
+without delta coalescing (proxy/coalesce.py).
+
+Usage:
+  python -m tests.benchmarks.bench_sse
+  python -m tests.benchmarks.bench_sse --tokens 4000
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+import tracemalloc
+
+from proxy import sse
+from proxy.coalesce import coalesce_chunks
+from tests.helpers import make_chunk
+
+
+def legacy_text_delta(index, text):
+    """The frame encoding handle_streaming used before proxy/sse.py."""
+    frame = f"event: content_block_delta\ndata: {json.dumps({'type': 'content_block_delta', 'index': index, 'delta': {'type': 'text_delta', 'text': text}})}\n\n"
+    return frame.encode("utf-8")
+
+
+def tokens_per_second(encode, tokens):
+    start = time.perf_counter()
+    for token in tokens:
+        encode(0, token)
+    return len(tokens) / (time.perf_counter() - start)
+
+
+def transient_bytes_per_frame(encode, token, frames=1000):
+    """Peak memory allocated while encoding a frame, beyond what is kept."""
+    tracemalloc.start()
+    try:
+        base, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        for _ in range(frames):
+            encode(0, token)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak - base
+
+
+async def _drain(handle_streaming, chunks, request, coalesce_ms=0):
+    async def upstream():
+        for chunk in chunks:
+            yield chunk
+
+    stream = upstream()
+    if coalesce_ms:
+        stream = coalesce_chunks(stream, coalesce_ms / 1000, 256)
+    frames = 0
+    async for _ in handle_streaming(stream, request):
+        frames += 1
+    return frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", type=int, default=4000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    words = ["the", " proxy", " streams", " tokens", " quickly", ",", " \"quoted\"", " ünïcode", "\n"]
+    tokens = [words[i % len(words)] for i in range(args.tokens)]
+
+    print(f"\n📊 SSE frame encoding ({args.tokens} text deltas, best of {args.rounds})")
+    for label, encode in (("f-string+json", legacy_text_delta), ("precomputed", sse.text_delta)):
+        rate = max(tokens_per_second(encode, tokens) for _ in range(args.rounds))
+        transient = transient_bytes_per_frame(encode, " tokens")
+        print(f"{label:<16} {rate / 1000:8.0f}k frames/s   peak transient allocation {transient}B per frame")
+
+    import server
+    logging.getLogger().setLevel(logging.WARNING)
+    request = server.MessagesRequest(model="openai/gpt-4.1", max_tokens=10,
+                                     messages=[{"role": "user", "content": "hi"}], stream=True)
+    chunks = [make_chunk(token) for token in tokens] + [make_chunk(finish_reason="stop")]
+    for label, coalesce_ms in (("handle_streaming", 0), ("  + coalescing", 5)):
+        best = float("inf")
+        for _ in range(args.rounds):
+            start = time.perf_counter()
+            frames = asyncio.run(_drain(server.handle_streaming, chunks, request, coalesce_ms))
+            best = min(best, time.perf_counter() - start)
+        print(f"{label:<16} {args.tokens / best / 1000:8.0f}k tokens/s   ({frames} frames in {best * 1000:.1f}ms)")
+
+
+if __name__ == "__main__":
+    main()
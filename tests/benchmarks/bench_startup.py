@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark: time to first ready, idle RSS and first request latency of
+a freshly started proxy, with eager imports, FAST_START, FAST_START with
+PREWARM, and FAST_START with the direct httpx engine (which never needs
+LiteLLM).
+
+Each run starts `uvicorn server:app` in a new process and times how long it
+takes until GET / answers. It then leaves the server idle for --settle
+seconds (long enough for pre-warming to finish), reads its RSS, and sends one
+request to the mock upstream: without pre-warming, that request pays for the
+imports that were deferred.
+
+Usage:
+  python -m tests.benchmarks.bench_startup
+  python -m tests.benchmarks.bench_startup --runs 5 --settle 10
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+from tests.mock_upstream import BackgroundServer, create_mock_app
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MODES = {
+    "eager": {"FAST_START": "false"},
+    "fast": {"FAST_START": "true", "PREWARM": "false"},
+    "fast+prewarm": {"FAST_START": "true", "PREWARM": "true"},
+    "fast+httpx": {"FAST_START": "true", "PREWARM": "false", "OPENAI_UPSTREAM_ENGINE": "httpx"},
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def rss_mb(pid):
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+def start_once(environment, settle):
+    """Start a proxy; return (ready seconds, idle RSS MB, first request seconds, startup report)."""
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=ROOT, env=environment, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        with httpx.Client(timeout=60) as client:
+            while True:
+                if process.poll() is not None:
+                    raise RuntimeError("proxy exited during startup")
+                try:
+                    client.get(f"{url}/")
+                    break
+                except httpx.TransportError:
+                    time.sleep(0.005)
+            ready = time.perf_counter() - started
+            time.sleep(settle)
+            idle_rss = rss_mb(process.pid)
+            request_started = time.perf_counter()
+            response = client.post(f"{url}/v1/messages", json={
+                "model": "openai/gpt-4.1", "max_tokens": 16, "messages": [{"role": "user", "content": "Hi"}],
+            })
+            first_request = time.perf_counter() - request_started
+            response.raise_for_status()
+            report = client.get(f"{url}/").json()["startup"]
+    finally:
+        process.terminate()
+        process.wait(10)
+    return ready, idle_rss, first_request, report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--settle", type=float, default=8.0, help="Seconds idle before measuring RSS")
+    args = parser.parse_args()
+
+    mock = BackgroundServer(create_mock_app(0.01, 0.001, num_tokens=8)).start()
+    base = {**os.environ, "OPENAI_API_KEY": "mock-key", "OPENAI_API_BASE": f"{mock.url}/v1",
+            "LITELLM_LOCAL_MODEL_COST_MAP": "True", "LOG_LEVEL": "WARNING"}
+    results = {}
+    try:
+        for label, overrides in MODES.items():
+            results[label] = [start_once({**base, **overrides}, args.settle) for _ in range(args.runs)]
+    finally:
+        mock.stop()
+
+    print(f"\n📊 Startup: median of {args.runs} runs, RSS after {args.settle:g}s idle")
+    print(f"{'mode':<14} {'ready':>9} {'idle RSS':>10} {'1st request':>12}  deferred / prewarm")
+    for label, runs in results.items():
+        ready, idle_rss, first_request = (statistics.median(run[i] for run in runs) for i in range(3))
+        report = runs[-1][3]
+        loaded = "; ".join(f"{name}: {entry.get('trigger', 'not loaded')}"
+                           for name, entry in report["deferred"].items())
+        print(f"{label:<14} {ready * 1000:>7.0f}ms {idle_rss:>8.1f}MB {first_request * 1000:>10.0f}ms  "
+              f"{loaded} / {report['prewarm']['state']}")
+
+
+if __name__ == "__main__":
+    main()
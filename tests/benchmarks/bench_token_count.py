@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Token counting benchmark: count_tokens latency on ~100k-token conversations.
+
+Replays a Claude Code session the way count_tokens sees it: the same
+conversation again and again, two messages longer each turn. Compares one
+litellm.token_counter call over the whole request (what count_tokens used to
+do) with the incremental TokenCounter, cold and on each following turn.
+
+Usage:
+  python -m tests.benchmarks.bench_token_count
+  python -m tests.benchmarks.bench_token_count --messages 240 --tool-result-chars 4000 --turns 10
+"""
+import argparse
+import logging
+import time
+
+import litellm
+
+from proxy.token_counter import TokenCounter, tokenizer_model
+from tests.benchmarks.common import percentile
+from tests.benchmarks.corpus import make_conversation
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=240)
+    parser.add_argument("--tool-result-chars", type=int, default=4000)
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--model", default="openai/gpt-4.1")
+    args = parser.parse_args()
+
+    import server
+    logging.getLogger().setLevel(logging.WARNING)
+
+    payload = make_conversation(args.messages + 2 * args.turns, args.tool_result_chars, model=args.model)
+    compiled = server.convert_anthropic_to_litellm(server.MessagesRequest(**payload))
+    messages, tools = compiled["messages"], compiled.get("tools")
+    tokenizer = tokenizer_model(compiled["model"])
+    # Load the tokenizer up front so neither side pays for it
+    litellm.token_counter(model=tokenizer, text="warm up")
+
+    def full_count(end):
+        return litellm.token_counter(model=tokenizer, messages=messages[:end], tools=tools)
+
+    counter = TokenCounter()
+    first = len(messages) - 2 * args.turns
+    total = full_count(first)
+    print(f"\n📊 count_tokens on a {total // 1000}k-token conversation ({first} messages, {tokenizer})")
+
+    start = time.perf_counter()
+    assert counter.count(compiled["model"], messages[:first], tools) == total
+    cold = time.perf_counter() - start
+
+    full, incremental = [], []
+    for end in range(first + 2, len(messages) + 1, 2):
+        start = time.perf_counter()
+        expected = full_count(end)
+        full.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        assert counter.count(compiled["model"], messages[:end], tools) == expected
+        incremental.append(time.perf_counter() - start)
+
+    print(f"token_counter, whole request   p50={percentile(full, 50) * 1000:8.2f}ms  "
+          f"p99={percentile(full, 99) * 1000:8.2f}ms")
+    print(f"TokenCounter, first call       {cold * 1000:8.2f}ms")
+    print(f"TokenCounter, following turns  p50={percentile(incremental, 50) * 1000:8.2f}ms  "
+          f"p99={percentile(incremental, 99) * 1000:8.2f}ms")
+    print(f"cache: {counter.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Upstream engine benchmark: LiteLLM path vs the direct pooled httpx engine.
+
+Runs the same load through the proxy twice against the mock upstream and
+reports latency plus how many TCP connections each engine opened.
+
+Usage:
+  python -m tests.benchmarks.bench_upstream_engine
+  python -m tests.benchmarks.bench_upstream_engine --requests 500 --concurrency 50
+"""
+import argparse
+import asyncio
+import logging
+import os
+
+from tests.benchmarks.bench_concurrency import run_load
+from tests.benchmarks.common import summarize
+from tests.mock_upstream import BackgroundServer, create_mock_app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--stream-ratio", type=float, default=0.5)
+    parser.add_argument("--ttft", type=float, default=0.02)
+    parser.add_argument("--inter-token-delay", type=float, default=0.001)
+    args = parser.parse_args()
+
+    mock_app = create_mock_app(args.ttft, args.inter_token_delay)
+    mock = BackgroundServer(mock_app).start()
+    os.environ["OPENAI_API_KEY"] = "mock-key"
+    os.environ["OPENAI_API_BASE"] = f"{mock.url}/v1"
+
+    import server
+    logging.getLogger().setLevel(logging.WARNING)
+    provider = server.registry.get_provider("openai")
+    provider.api_key = "mock-key"
+
+    proxy = BackgroundServer(server.app).start()
+    results = {}
+    try:
+        for engine in ("litellm", "httpx"):
+            provider.upstream_engine = engine
+            mock_app.state.connections.clear()
+            streaming, non_streaming, elapsed = asyncio.run(
+                run_load(proxy.url, args.requests, args.concurrency, args.stream_ratio)
+            )
+            results[engine] = (streaming + non_streaming, elapsed, len(mock_app.state.connections))
+    finally:
+        proxy.stop()
+        mock.stop()
+
+    print(f"\n📊 Upstream engine benchmark: {args.requests} requests, concurrency {args.concurrency}")
+    for engine, (latencies, elapsed, connections) in results.items():
+        print(summarize(engine, latencies))
+        print(f"{'':<16} connections opened={connections} throughput={args.requests / elapsed:.1f} req/s")
+
+
+if __name__ == "__main__":
+    main()
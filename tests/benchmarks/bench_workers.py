@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Worker scaling benchmark: proxy throughput against the mock upstream as the
+number of prod profile workers grows.
+
+For each worker count the proxy is started with `python -m proxy.launcher
+--profile prod`, on the direct httpx engine with FAST_START, so what is
+measured is the proxy's own request conversion and SSE encoding. The mock
+upstream runs in its own processes (--upstream-workers), and the load comes
+from --client-processes processes, so neither shares a core with the proxy
+more than it has to. Expect throughput to grow with workers up to the cores
+that are left.
+
+Usage:
+  python -m tests.benchmarks.bench_workers
+  python -m tests.benchmarks.bench_workers --workers 1,2,4,8 --requests 4000 --concurrency 256
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import httpx
+
+from tests.benchmarks.bench_concurrency import run_load
+from tests.benchmarks.common import ROOT, summarize
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_up(url, process, timeout=120):
+    deadline = time.time() + timeout
+    while True:
+        try:
+            httpx.get(url)
+            return
+        except httpx.TransportError:
+            if process.poll() is not None or time.time() > deadline:
+                raise RuntimeError(f"{url} did not come up")
+            time.sleep(0.05)
+
+
+def spawn(args, environment=None):
+    return subprocess.Popen([sys.executable, "-m", *args], cwd=ROOT, env=environment,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def client_load(proxy_url, total, concurrency, stream_ratio):
+    """One load generator process; returns latencies and its elapsed time."""
+    streaming, non_streaming, elapsed = asyncio.run(run_load(proxy_url, total, concurrency, stream_ratio))
+    return streaming + non_streaming, elapsed
+
+
+def measure(proxy_url, args):
+    clients = args.client_processes
+    with ProcessPoolExecutor(clients) as pool:
+        started = time.perf_counter()
+        futures = [pool.submit(client_load, proxy_url, args.requests // clients, max(1, args.concurrency // clients),
+                               args.stream_ratio) for _ in range(clients)]
+        results = [future.result() for future in futures]
+        elapsed = time.perf_counter() - started
+    return [latency for latencies, _ in results for latency in latencies], elapsed
+
+
+def main():
+    cores = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default=",".join(str(n) for n in (1, 2, 4, 8, 16) if n <= cores) or "1",
+                        help="Comma separated worker counts (default: powers of two up to the core count)")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=128)
+    parser.add_argument("--stream-ratio", type=float, default=0.5)
+    parser.add_argument("--upstream-workers", type=int, default=max(1, cores // 4))
+    parser.add_argument("--client-processes", type=int, default=max(1, cores // 4))
+    args = parser.parse_args()
+
+    upstream_port = free_port()
+    upstream = spawn(["uvicorn", "tests.mock_upstream:create_mock_app", "--factory", "--host", "127.0.0.1",
+                      "--port", str(upstream_port), "--workers", str(args.upstream_workers), "--log-level", "warning"])
+    environment = {**os.environ, "OPENAI_API_KEY": "mock-key", "OPENAI_API_BASE": f"http://127.0.0.1:{upstream_port}/v1",
+                   "OPENAI_UPSTREAM_ENGINE": "httpx", "FAST_START": "true", "PREWARM": "false",
+                   "LOG_LEVEL": "WARNING", "LITELLM_LOCAL_MODEL_COST_MAP": "True"}
+    results = {}
+    try:
+        wait_until_up(f"http://127.0.0.1:{upstream_port}/", upstream)
+        for workers in (int(n) for n in args.workers.split(",")):
+            port = free_port()
+            proxy = spawn(["proxy.launcher", "--profile", "prod", "--host", "127.0.0.1", "--port", str(port),
+                           "--workers", str(workers)], environment)
+            try:
+                proxy_url = f"http://127.0.0.1:{port}"
+                wait_until_up(f"{proxy_url}/", proxy)
+                # Let every worker finish starting before the clock runs
+                time.sleep(1 + workers * 0.5)
+                results[workers] = measure(proxy_url, args)
+            finally:
+                proxy.terminate()
+                proxy.wait(30)
+    finally:
+        upstream.terminate()
+        upstream.wait(30)
+
+    print(f"\n📊 Worker scaling: {args.requests} requests, concurrency {args.concurrency}, "
+          f"{args.stream_ratio:.0%} streaming, {cores} cores, {args.upstream_workers} upstream / "
+          f"{args.client_processes} client processes")
+    baseline = None
+    for workers, (latencies, elapsed) in results.items():
+        throughput = len(latencies) / elapsed
+        baseline = baseline or throughput
+        print(summarize(f"{workers} workers", latencies))
+        print(f"{'':<16} throughput={throughput:.1f} req/s ({throughput / baseline:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+"""
+Shared helpers for the benchmark scripts.
+"""
+import math
+import os
+import sys
+
+# Make the project root importable when running a benchmark as a plain script
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(label, values, unit="ms", scale=1000.0):
+    """Format p50/p95/p99/max for a list of durations in seconds."""
+    return (
+        f"{label:<16} n={len(values):<5} "
+        f"p50={percentile(values, 50) * scale:8.1f}{unit} "
+        f"p95={percentile(values, 95) * scale:8.1f}{unit} "
+        f"p99={percentile(values, 99) * scale:8.1f}{unit} "
+        f"max={(max(values) if values else 0) * scale:8.1f}{unit}"
+    )
@@ -0,0 +1,95 @@
+"""
+Synthetic Claude Code-shaped conversations for benchmarks.
+
+Everything is generated from a seeded RNG so runs are comparable.
+"""
+import random
+
+_WORDS = (
+    "the proxy converts anthropic requests into provider payloads and streams "
+    "results back while tools read files run commands and edit code"
+).split()
+
+
+def _text(rng, words):
+    return " ".join(rng.choice(_WORDS) for _ in range(words))
+
+
+def make_tools(count=12, properties=8):
+    """Tool definitions with moderately nested JSON schemas."""
+    tools = []
+    for i in range(count):
+        tools.append({
+            "name": f"tool_{i}",
+            "description": f"Synthetic tool number {i} used for benchmarking",
+            "input_schema": {
+                "type": "object",
+                "additionalProperties": False,
+                "properties": {
+                    f"arg_{j}": {
+                        "type": "string",
+                        "format": "uri" if j % 3 == 0 else "date-time",
+                        "description": f"Argument {j}",
+                        "default": "x"
+                    } if j % 2 else {
+                        "type": "array",
+                        "items": {"type": "object", "properties": {"value": {"type": "integer", "default": 0}}}
+                    }
+                    for j in range(properties)
+                },
+                "required": [f"arg_{j}" for j in range(0, properties, 2)]
+            }
+        })
+    return tools
+
+
+def make_conversation(num_messages=200, tool_result_chars=4000, seed=0, model="openai/gpt-4.1",
+                      images=False, stream=False):
+    """A MessagesRequest payload alternating tool_use turns and tool_result turns."""
+    rng = random.Random(seed)
+    messages = [{"role": "user", "content": _text(rng, 60)}]
+    for i in range(1, num_messages):
+        if i % 2:
+            messages.append({"role": "assistant", "content": [
+                {"type": "text", "text": _text(rng, 30)},
+                {"type": "tool_use", "id": f"toolu_{i}", "name": f"tool_{i % 12}",
+                 "input": {"path": f"/src/file_{i}.py", "query": _text(rng, 5)}}
+            ]})
+        else:
+            result = (_text(rng, 20) + "\n") * max(1, tool_result_chars // 120)
+            content = [{"type": "tool_result", "tool_use_id": f"toolu_{i - 1}",
+                        "content": [{"type": "text", "text": result}]}]
+            if images and i % 10 == 0:
+                content.append({"type": "image", "source": {
+                    "type": "base64", "media_type": "image/png", "data": "iVBORw0KGgo" * 2000
+                }})
+            messages.append({"role": "user", "content": content})
+    return {
+        "model": model,
+        "max_tokens": 32000,
+        "stream": stream,
+        "system": [{"type": "text", "text": _text(rng, 400)}],
+        "messages": messages,
+        "tools": make_tools(),
+    }
+
+
+def make_image_conversation(num_images=20, image_bytes=200_000, seed=0, model="openai/gpt-4.1", stream=False):
+    """A MessagesRequest payload of user turns that each attach a screenshot, e.g. UI debugging sessions."""
+    rng = random.Random(seed)
+    data = "iVBORw0KGgo" * (image_bytes // 11)
+    messages = []
+    for i in range(num_images):
+        messages.append({"role": "user", "content": [
+            {"type": "image", "source": {"type": "base64", "media_type": "image/png", "data": data}},
+            {"type": "text", "text": _text(rng, 40)},
+        ]})
+        messages.append({"role": "assistant", "content": [{"type": "text", "text": _text(rng, 80)}]})
+    messages.append({"role": "user", "content": _text(rng, 20)})
+    return {
+        "model": model,
+        "max_tokens": 32000,
+        "stream": stream,
+        "messages": messages,
+        "tools": make_tools(),
+    }
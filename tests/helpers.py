@@ -0,0 +1,18 @@
+"""
+Helpers shared by the tests and benchmarks.
+"""
+from types import SimpleNamespace
+
+
+def make_chunk(content=None, finish_reason=None, usage=None, tool_calls=None, role=None):
+    """A streamed chat completion chunk, as the httpx engine and LiteLLM yield it.
+
+    The delta always has content (None when not given); tool_calls and role are
+    only set when given.
+    """
+    delta = SimpleNamespace(content=content)
+    if tool_calls is not None:
+        delta.tool_calls = tool_calls
+    if role is not None:
+        delta.role = role
+    return SimpleNamespace(usage=usage, choices=[SimpleNamespace(delta=delta, finish_reason=finish_reason)])
@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+"""
+Load generator: drives /v1/messages with Claude Code shaped traffic and
+reports throughput, time to first token and latency percentiles, and the CPU
+and memory the proxy used.
+
+The traffic is a seeded mix of the requests a Claude Code session sends (see
+SHAPES): small non-streaming haiku calls (quota checks, titles), and streamed
+sonnet turns of growing conversations full of tool results. Requests are sent
+by --concurrency clients one after the other, or, with --rate, at a fixed
+arrival rate however long the answers take.
+
+By default it starts the mock upstream (tests/mock_upstream.py) and a prod
+profile proxy (proxy/launcher.py) pointed at it, so the whole run is offline
+and repeatable. With --proxy-url it drives a proxy that is already running
+instead, and measures the process given by --proxy-pid, if any. CPU and RSS
+cover the proxy process and all its children (the workers), read from /proc.
+
+Usage:
+  python -m tests.loadgen
+  python -m tests.loadgen --requests 2000 --concurrency 64 --workers 2
+  python -m tests.loadgen --provider gemini --engine litellm --tool-calls 2 --chunk-tokens 4
+  python -m tests.loadgen --rate 50 --requests 1500 --failure-rate 0.02 --json results.json
+  python -m tests.loadgen --proxy-url http://127.0.0.1:8082 --proxy-pid 1234
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, NamedTuple, Optional
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from tests.benchmarks.common import percentile, summarize
+from tests.benchmarks.corpus import make_conversation
+
+
+class Shape(NamedTuple):
+    """One kind of request in the mix."""
+    weight: float
+    model: str
+    stream: bool
+    num_messages: int
+    tool_result_chars: int = 0
+    tools: bool = True
+    max_tokens: int = 32000
+
+
+SHAPES = {
+    # Haiku calls Claude Code makes around a session: quota check, topic and title
+    "quota": Shape(1, "claude-3-5-haiku-20241022", False, 1, tools=False, max_tokens=1),
+    "title": Shape(2, "claude-3-5-haiku-20241022", False, 2, 0, tools=False, max_tokens=512),
+    # Sonnet turns, streamed, as the conversation grows
+    "turn": Shape(4, "claude-sonnet-4-20250514", True, 10, 2000),
+    "agent": Shape(3, "claude-sonnet-4-20250514", True, 60, 4000),
+    "long": Shape(1, "claude-sonnet-4-20250514", True, 200, 4000),
+}
+
+# Distinct conversations generated per shape; requests cycle through them
+VARIANTS = 4
+
+
+class Result(NamedTuple):
+    shape: str
+    ok: bool
+    status: int
+    ttft: Optional[float]  # Seconds to the first content delta, streaming requests only
+    latency: float
+
+
+def build_requests(count: int, seed: int = 0, shapes: Dict[str, Shape] = SHAPES) -> List[tuple]:
+    """(shape name, stream, JSON body) for count requests, drawn from the weighted shapes."""
+    rng = random.Random(seed)
+    bodies = {}
+    for name, shape in shapes.items():
+        for variant in range(VARIANTS):
+            payload = make_conversation(shape.num_messages, shape.tool_result_chars, seed=seed * VARIANTS + variant,
+                                        model=shape.model, stream=shape.stream)
+            payload["max_tokens"] = shape.max_tokens
+            if not shape.tools:
+                del payload["tools"]
+            bodies[name, variant] = json.dumps(payload).encode()
+    names = list(shapes)
+    picks = rng.choices(names, weights=[shapes[name].weight for name in names], k=count)
+    return [(name, shapes[name].stream, bodies[name, i % VARIANTS]) for i, name in enumerate(picks)]
+
+
+async def send(client: httpx.AsyncClient, url: str, shape: str, stream: bool, body: bytes) -> Result:
+    started = time.perf_counter()
+    ttft = None
+    try:
+        if not stream:
+            response = await client.post(url, content=body, headers={"content-type": "application/json"})
+            return Result(shape, response.status_code == 200, response.status_code, None,
+                          time.perf_counter() - started)
+        ok = False
+        async with client.stream("POST", url, content=body, headers={"content-type": "application/json"}) as response:
+            event = None
+            async for line in response.aiter_lines():
+                if line.startswith("event:"):
+                    event = line[6:].strip()
+                    if event == "content_block_delta" and ttft is None:
+                        ttft = time.perf_counter() - started
+                elif event == "message_delta" and line.startswith("data:"):
+                    # The proxy ends a stream that failed upstream with stop_reason "error"
+                    ok = json.loads(line[5:])["delta"].get("stop_reason") != "error"
+                elif event == "message_stop":
+                    ok = ok and response.status_code == 200
+            return Result(shape, ok, response.status_code, ttft, time.perf_counter() - started)
+    except httpx.HTTPError:
+        return Result(shape, False, 0, ttft, time.perf_counter() - started)
+
+
+async def run_load(proxy_url: str, requests: List[tuple], concurrency: int = 32,
+                   rate: Optional[float] = None, timeout: float = 120.0):
+    """Send the requests; returns (results, elapsed seconds).
+
+    Without rate, concurrency clients send them back to back (closed loop);
+    with rate, request i starts i / rate seconds in (open loop) and
+    concurrency only caps the connections.
+    """
+    url = f"{proxy_url}/v1/messages"
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        started = time.perf_counter()
+        if rate:
+            async def arrive(i, request):
+                await asyncio.sleep(max(0.0, started + i / rate - time.perf_counter()))
+                return await send(client, url, *request)
+
+            results = await asyncio.gather(*(arrive(i, request) for i, request in enumerate(requests)))
+        else:
+            pending = iter(requests)
+            results = []
+
+            async def client_loop():
+                for request in pending:
+                    results.append(await send(client, url, *request))
+
+            await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return list(results), elapsed
+
+
+class ProcessSampler:
+    """Samples the CPU time and RSS of a process and its descendants on a background thread."""
+
+    def __init__(self, pid: int, interval: float = 0.25):
+        self.pid = pid
+        self.interval = interval
+        self.samples = []  # (wall time, CPU seconds, RSS bytes)
+        self._ticks = os.sysconf("SC_CLK_TCK")
+        self._page = os.sysconf("SC_PAGE_SIZE")
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _tree(self) -> List[int]:
+        children = defaultdict(list)
+        for entry in os.listdir("/proc"):
+            if entry.isdigit():
+                try:
+                    with open(f"/proc/{entry}/stat") as stat:
+                        children[int(stat.read().rsplit(")", 1)[1].split()[1])].append(int(entry))
+                except (OSError, IndexError):
+                    continue
+        tree, stack = [], [self.pid]
+        while stack:
+            pid = stack.pop()
+            tree.append(pid)
+            stack.extend(children[pid])
+        return tree
+
+    def read(self):
+        """(CPU seconds, RSS bytes) of the process tree now; dead processes count for nothing."""
+        cpu = rss = 0
+        for pid in self._tree():
+            try:
+                with open(f"/proc/{pid}/stat") as stat:
+                    fields = stat.read().rsplit(")", 1)[1].split()
+            except OSError:
+                continue
+            # utime, stime and rss, counted from the field after the command name
+            cpu += int(fields[11]) + int(fields[12])
+            rss += int(fields[21]) * self._page
+        return cpu / self._ticks, rss
+
+    def _run(self):
+        while True:
+            self.samples.append((time.perf_counter(), *self.read()))
+            if self._stop.wait(self.interval):
+                return
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.samples.append((time.perf_counter(), *self.read()))
+
+    def report(self) -> Dict[str, float]:
+        if len(self.samples) < 2:
+            return {}
+        (start, cpu_start, _), (end, cpu_end, rss_end) = self.samples[0], self.samples[-1]
+        peaks = [(cpu_b - cpu_a) / (b - a) for (a, cpu_a, _), (b, cpu_b, _) in zip(self.samples, self.samples[1:])
+                 if b > a]
+        return {
+            "cpu_seconds": round(cpu_end - cpu_start, 3),
+            "cpu_percent": round(100 * (cpu_end - cpu_start) / (end - start), 1),
+            "cpu_percent_peak": round(100 * max(peaks, default=0.0), 1),
+            "rss_mb": round(rss_end / 2 ** 20, 1),
+            "rss_mb_peak": round(max(rss for _, _, rss in self.samples) / 2 ** 20, 1),
+        }
+
+
+def report(results: List[Result], elapsed: float, process: Optional[Dict[str, float]] = None) -> Dict:
+    """Figures of a run, as a dict (what --json writes)."""
+    ok = [result for result in results if result.ok]
+
+    def figures(selected):
+        latencies = [result.latency for result in selected]
+        ttfts = [result.ttft for result in selected if result.ttft is not None]
+        return {
+            "requests": len(selected),
+            "latency_ms": {f"p{p}": round(percentile(latencies, p) * 1000, 1) for p in (50, 95, 99)},
+            "ttft_ms": {f"p{p}": round(percentile(ttfts, p) * 1000, 1) for p in (50, 95, 99)} if ttfts else None,
+        }
+
+    by_shape = defaultdict(list)
+    for result in ok:
+        by_shape[result.shape].append(result)
+    errors = defaultdict(int)
+    for result in results:
+        if not result.ok:
+            errors[str(result.status or "transport")] += 1
+    return {
+        **figures(ok),
+        "requests": len(results),
+        "errors": dict(errors),
+        "elapsed_s": round(elapsed, 3),
+        "rps": round(len(ok) / elapsed, 1) if elapsed else 0.0,
+        "shapes": {shape: figures(selected) for shape, selected in sorted(by_shape.items())},
+        "proxy": process or {},
+    }
+
+
+def print_report(results: List[Result], summary: Dict):
+    print(f"\n📊 {summary['requests']} requests in {summary['elapsed_s']:.1f}s: {summary['rps']:.1f} req/s, "
+          f"errors {summary['errors'] or 'none'}")
+    ok = [result for result in results if result.ok]
+    print(summarize("latency", [result.latency for result in ok]))
+    print(summarize("ttft", [result.ttft for result in ok if result.ttft is not None]))
+    for shape in summary["shapes"]:
+        print(summarize(f"  {shape}", [result.latency for result in ok if result.shape == shape]))
+    process = summary["proxy"]
+    if process:
+        print(f"proxy            cpu={process['cpu_percent']:.0f}% (peak {process['cpu_percent_peak']:.0f}%, "
+              f"{process['cpu_seconds']:.1f}s) rss={process['rss_mb']:.0f}MB (peak {process['rss_mb_peak']:.0f}MB)")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_up(url, process, timeout=120):
+    deadline = time.time() + timeout
+    while True:
+        try:
+            httpx.get(url)
+            return
+        except httpx.TransportError:
+            if process.poll() is not None or time.time() > deadline:
+                raise RuntimeError(f"{url} did not come up")
+            time.sleep(0.05)
+
+
+def proxy_environment(provider: str, upstream_url: str, engine: Optional[str] = None) -> Dict[str, str]:
+    """Environment for a proxy whose provider is the mock upstream."""
+    environment = {**os.environ, "PREFERRED_PROVIDER": "google" if provider == "gemini" else provider,
+                   "FAST_START": "true", "LOG_LEVEL": "WARNING", "LITELLM_LOCAL_MODEL_COST_MAP": "True"}
+    if engine:
+        environment[f"{provider.upper()}_UPSTREAM_ENGINE"] = engine
+    if provider == "openai":
+        environment.update({"OPENAI_API_KEY": "mock-key", "OPENAI_API_BASE": f"{upstream_url}/v1"})
+    elif provider == "azure":
+        environment.update({"AZURE_OPENAI_API_KEY": "mock-key", "AZURE_OPENAI_ENDPOINT": upstream_url})
+    elif provider == "gemini":
+        environment.update({"GEMINI_API_KEY": "mock-key", "GEMINI_API_BASE": f"{upstream_url}/v1beta/openai",
+                            "BIG_MODEL": "gemini-2.5-pro-preview-03-25", "SMALL_MODEL": "gemini-2.0-flash"})
+        if (engine or environment.get("UPSTREAM_ENGINE", "litellm")) == "litellm":
+            # LiteLLM speaks Gemini's own API, which it finds under the endpoint's api_base
+            environment["GEMINI_ENDPOINTS"] = json.dumps([{"name": "mock", "api_base": f"{upstream_url}/v1beta"}])
+    else:
+        raise ValueError(f"Unknown provider: {provider}")
+    return environment
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--rate", type=float, default=None, help="Requests per second (open loop)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--shapes", default=",".join(SHAPES), help="Comma separated request shapes to mix")
+    parser.add_argument("--json", help="Write the figures to this file")
+    parser.add_argument("--proxy-url", help="Drive a running proxy instead of starting one")
+    parser.add_argument("--proxy-pid", type=int, help="Process to measure with --proxy-url")
+    parser.add_argument("--provider", choices=("openai", "azure", "gemini"), default="openai")
+    parser.add_argument("--engine", choices=("litellm", "httpx"), default=None,
+                        help="Upstream engine of the started proxy (default: its own default)")
+    parser.add_argument("--workers", type=int, default=1, help="Workers of the started proxy")
+    upstream = parser.add_argument_group("mock upstream (see tests/mock_upstream.py)")
+    upstream.add_argument("--ttft", type=float, default=0.3)
+    upstream.add_argument("--inter-token-delay", type=float, default=0.01)
+    upstream.add_argument("--num-tokens", type=int, default=64)
+    upstream.add_argument("--chunk-tokens", type=int, default=1)
+    upstream.add_argument("--tool-calls", type=int, default=1)
+    upstream.add_argument("--tool-call-style", choices=("fragments", "whole"), default="fragments")
+    upstream.add_argument("--failure-rate", type=float, default=0.0)
+    upstream.add_argument("--midstream-failure-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    shapes = {name: SHAPES[name] for name in args.shapes.split(",")}
+    requests = build_requests(args.requests, args.seed, shapes)
+    processes = []
+    try:
+        proxy_url, proxy_pid = args.proxy_url, args.proxy_pid
+        if proxy_url is None:
+            upstream_port, port = free_port(), free_port()
+            upstream_url, proxy_url = f"http://127.0.0.1:{upstream_port}", f"http://127.0.0.1:{port}"
+            processes.append(subprocess.Popen(
+                [sys.executable, "-m", "tests.mock_upstream", "--port", str(upstream_port), "--ttft", str(args.ttft),
+                 "--inter-token-delay", str(args.inter_token_delay), "--num-tokens", str(args.num_tokens),
+                 "--chunk-tokens", str(args.chunk_tokens), "--tool-calls", str(args.tool_calls),
+                 "--tool-call-style", args.tool_call_style, "--failure-rate", str(args.failure_rate),
+                 "--midstream-failure-rate", str(args.midstream_failure_rate), "--seed", str(args.seed)],
+                cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            ))
+            wait_until_up(f"{upstream_url}/", processes[-1])
+            processes.append(subprocess.Popen(
+                [sys.executable, "-m", "proxy.launcher", "--profile", "prod", "--host", "127.0.0.1",
+                 "--port", str(port), "--workers", str(args.workers)],
+                cwd=ROOT, env=proxy_environment(args.provider, upstream_url, args.engine),
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            ))
+            wait_until_up(f"{proxy_url}/", processes[-1])
+            proxy_pid = processes[-1].pid
+            # Warm every worker up (deferred imports, connection pools) before the clock runs
+            asyncio.run(run_load(proxy_url, requests[:args.workers * 4], concurrency=args.workers * 2))
+
+        print(f"🚀 {len(requests)} requests to {proxy_url}, "
+              + (f"{args.rate:g} req/s" if args.rate else f"concurrency {args.concurrency}"))
+        if proxy_pid and os.path.isdir(f"/proc/{proxy_pid}"):
+            with ProcessSampler(proxy_pid) as sampler:
+                results, elapsed = asyncio.run(run_load(proxy_url, requests, args.concurrency, args.rate))
+            usage = sampler.report()
+        else:
+            results, elapsed = asyncio.run(run_load(proxy_url, requests, args.concurrency, args.rate))
+            usage = None
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            process.wait(30)
+
+    summary = report(results, elapsed, usage)
+    print_report(results, summary)
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(summary, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Deterministic mock OpenAI, Azure and Gemini upstream for offline tests and benchmarks.
+
+Usage:
+  python -m tests.mock_upstream --port 9999 --ttft 0.05 --inter-token-delay 0.005
+  python -m tests.mock_upstream --chunk-tokens 4 --tool-calls 2 --tool-call-style interleaved
+  python -m tests.mock_upstream --failure-rate 0.05 --midstream-failure-rate 0.02 --seed 7
+
+Point the proxy at it with OPENAI_API_BASE=http://127.0.0.1:9999/v1,
+AZURE_OPENAI_ENDPOINT=http://127.0.0.1:9999 or
+GEMINI_API_BASE=http://127.0.0.1:9999/v1beta/openai. tests/loadgen.py starts
+it for you.
+"""
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
+
+
+def _fragments(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)] or [""]
+
+
+def _tool_names(body):
+    """Function names declared in an OpenAI or Gemini request, to call back."""
+    names = [tool.get("function", {}).get("name") for tool in body.get("tools") or [] if "function" in tool]
+    for tool in body.get("tools") or []:
+        names.extend(declaration.get("name") for declaration in tool.get("functionDeclarations") or [])
+    return [name for name in names if name] or ["tool_0"]
+
+
+def create_mock_app(ttft=0.05, inter_token_delay=0.005, num_tokens=32, token_text="tok ", max_concurrency=None,
+                    failure_rate=0.0, failure_status=503, failure_delay=0.0, slow_rate=0.0, slow_ttft=1.0,
+                    rpm_limit=None, chunk_tokens=1, tool_calls=0, tool_call_style="fragments", tool_args_chars=200,
+                    tool_args_chunk=16, midstream_failure_rate=0.0, seed=0):
+    """Create a FastAPI app that answers chat completions with fixed timing.
+
+    It speaks the OpenAI chat completions API on the OpenAI, Azure deployment
+    and Gemini OpenAI-compatible paths, and Gemini's own generateContent and
+    streamGenerateContent.
+
+    Streamed text comes chunk_tokens tokens per chunk, each chunk after the
+    inter_token_delay of its tokens, so the total time does not depend on the
+    chunk size.
+
+    tool_calls makes every response end with that many calls to the tools of
+    the request, each with tool_args_chars of JSON arguments. On the
+    OpenAI paths tool_call_style sets how they stream:
+
+      fragments    one call after the other, the arguments tool_args_chunk
+                   characters at a time (what OpenAI sends)
+      whole        each call's arguments in a single chunk
+      interleaved  the fragments of all calls in turn, distinguished only by
+                   their index
+
+    max_concurrency caps the responses generated at once, like a deployment's
+    throughput limit; requests beyond it wait for a slot.
+
+    failure_rate injects faults: that fraction of requests gets an OpenAI-style
+    error with failure_status, after failure_delay seconds (a backend that
+    times out). midstream_failure_rate drops that fraction of streams halfway
+    through, without a finish chunk. They live on app.state, so tests can
+    break and heal the upstream while it runs.
+
+    slow_rate gives that fraction of responses slow_ttft instead of ttft, a
+    latency tail like the occasional slow upstream response.
+
+    rpm_limit enforces a rate limit the way Azure does, in 10 second slices: a
+    bucket of rpm_limit / 6 requests refilled at rpm_limit / 60 per second.
+    Requests that find it empty get a 429 with retry-after.
+
+    Which requests fail or are slow is drawn from a RNG seeded with seed, so
+    the same sequence of requests gets the same answers.
+    """
+    if tool_call_style not in ("fragments", "whole", "interleaved"):
+        raise ValueError(f"Unknown tool call style: {tool_call_style}")
+    app = FastAPI()
+    app.state.requests_served = 0
+    app.state.failure_rate = failure_rate
+    app.state.failure_status = failure_status
+    app.state.failure_delay = failure_delay
+    app.state.failures_injected = 0
+    app.state.midstream_failure_rate = midstream_failure_rate
+    app.state.midstream_failures = 0
+    app.state.slow_rate = slow_rate
+    app.state.slow_ttft = slow_ttft
+    app.state.rate_limited = 0
+    allowance = {"level": (rpm_limit or 0) / 6, "updated": time.monotonic()}
+    # Distinct (host, port) pairs seen, i.e. TCP connections the client opened
+    app.state.connections = set()
+    slots = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+    rng = random.Random(seed)
+    chunk_tokens = max(1, chunk_tokens)
+    text_chunks = [token_text * min(chunk_tokens, num_tokens - i) for i in range(0, num_tokens, chunk_tokens)]
+
+    def planned_calls(body):
+        """(id, name, arguments JSON) of the tool calls a response makes."""
+        names = _tool_names(body)
+        calls = []
+        for i in range(tool_calls):
+            path = f"/src/module_{i}.py"
+            filler = "x" * max(0, tool_args_chars - len(json.dumps({"path": path, "content": ""})))
+            arguments = json.dumps({"path": path, "content": filler})
+            calls.append((f"call_{uuid.uuid4().hex[:24]}", names[i % len(names)], arguments))
+        return calls
+
+    def completion_tokens(calls):
+        return num_tokens + sum(len(arguments) // 4 for _, _, arguments in calls)
+
+    async def admit(handler, request: Request, **params):
+        body = await request.json()
+        if rpm_limit:
+            now = time.monotonic()
+            allowance["level"] = min(rpm_limit / 6, allowance["level"] + (now - allowance["updated"]) * rpm_limit / 60)
+            allowance["updated"] = now
+            if allowance["level"] < 1:
+                app.state.rate_limited += 1
+                return JSONResponse(
+                    {"error": {"message": "Rate limit exceeded", "type": "rate_limit_error", "code": 429}},
+                    status_code=429, headers={"retry-after": "1"}
+                )
+            allowance["level"] -= 1
+        if app.state.failure_rate and rng.random() < app.state.failure_rate:
+            app.state.failures_injected += 1
+            await asyncio.sleep(app.state.failure_delay)
+            return JSONResponse(
+                {"error": {"message": "Injected fault", "type": "server_error", "code": app.state.failure_status}},
+                status_code=app.state.failure_status
+            )
+        if slots is not None:
+            await slots.acquire()
+        try:
+            app.state.requests_served += 1
+            if request.client:
+                app.state.connections.add((request.client.host, request.client.port))
+            first_token = app.state.slow_ttft if app.state.slow_rate and rng.random() < app.state.slow_rate else ttft
+            cut = bool(app.state.midstream_failure_rate) and rng.random() < app.state.midstream_failure_rate
+            response = await handler(body, first_token, cut, **params)
+        except BaseException:
+            if slots is not None:
+                slots.release()
+            raise
+        if slots is not None:
+            if isinstance(response, StreamingResponse):
+                response.background = BackgroundTask(slots.release)
+            else:
+                slots.release()
+        return response
+
+    async def sse(events, first_token, cut):
+        """Send (payload, delay) events as server-sent events, dropping the stream halfway if cut."""
+        await asyncio.sleep(first_token)
+        for i, (payload, delay) in enumerate(events):
+            if cut and i >= len(events) // 2:
+                app.state.midstream_failures += 1
+                raise ConnectionResetError("Injected mid-stream failure")
+            yield payload if isinstance(payload, str) else f"data: {json.dumps(payload)}\n\n"
+            if delay:
+                await asyncio.sleep(delay)
+
+    async def openai_completion(body, first_token, cut):
+        model = body.get("model", "mock-model")
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        created = int(time.time())
+        calls = planned_calls(body)
+        usage = {"prompt_tokens": 10, "completion_tokens": completion_tokens(calls),
+                 "total_tokens": 10 + completion_tokens(calls)}
+        finish_reason = "tool_calls" if calls else "stop"
+
+        if not body.get("stream"):
+            await asyncio.sleep(first_token + inter_token_delay * num_tokens)
+            message = {"role": "assistant", "content": token_text * num_tokens}
+            if calls:
+                message["tool_calls"] = [{"id": call_id, "type": "function",
+                                          "function": {"name": name, "arguments": arguments}}
+                                         for call_id, name, arguments in calls]
+            return JSONResponse({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+                "usage": usage
+            })
+
+        def chunk(delta, finish=None, **extra):
+            return {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish}], **extra}
+
+        events = []
+        for i, text in enumerate(text_chunks):
+            delta = {"role": "assistant", "content": text} if i == 0 else {"content": text}
+            events.append((chunk(delta), inter_token_delay * text.count(token_text)))
+        # Per call: the header (id, name) then its argument fragments
+        streams = []
+        for index, (call_id, name, arguments) in enumerate(calls):
+            fragments = [arguments] if tool_call_style == "whole" else _fragments(arguments, tool_args_chunk)
+            header = {"index": index, "id": call_id, "type": "function", "function": {"name": name, "arguments": ""}}
+            streams.append([header] + [{"index": index, "function": {"arguments": part}} for part in fragments])
+        if tool_call_style == "interleaved":
+            ordered = [stream[i] for i in range(max(map(len, streams), default=0)) for stream in streams
+                       if i < len(stream)]
+        else:
+            ordered = [delta for stream in streams for delta in stream]
+        events.extend((chunk({"tool_calls": [delta]}), inter_token_delay) for delta in ordered)
+        events.append((chunk({}, finish_reason, usage=usage), 0))
+        events.append(("data: [DONE]\n\n", 0))
+        return StreamingResponse(sse(events, first_token, cut), media_type="text/event-stream")
+
+    async def gemini_content(body, first_token, cut, model_action):
+        model, _, action = model_action.partition(":")
+        calls = planned_calls(body)
+
+        def candidate(parts, finish=None):
+            content = {"candidates": [{"content": {"parts": parts, "role": "model"}, "index": 0}]}
+            if finish:
+                content["candidates"][0]["finishReason"] = finish
+                content["usageMetadata"] = {"promptTokenCount": 10, "candidatesTokenCount": completion_tokens(calls),
+                                            "totalTokenCount": 10 + completion_tokens(calls)}
+            content["modelVersion"] = model
+            return content
+
+        function_calls = [{"functionCall": {"name": name, "args": json.loads(arguments)}}
+                          for _, name, arguments in calls]
+        if action != "streamGenerateContent":
+            await asyncio.sleep(first_token + inter_token_delay * num_tokens)
+            return JSONResponse(candidate([{"text": token_text * num_tokens}, *function_calls], "STOP"))
+
+        # Gemini streams text in chunks and sends function calls whole, with the last chunk
+        events = [(candidate([{"text": text}]), inter_token_delay * text.count(token_text)) for text in text_chunks]
+        if function_calls:
+            events.append((candidate(function_calls, "STOP"), 0))
+        else:
+            events.append((candidate([{"text": ""}], "STOP"), 0))
+        return StreamingResponse(sse(events, first_token, cut), media_type="text/event-stream")
+
+    async def chat_completions(request: Request):
+        return await admit(openai_completion, request)
+
+    async def generate_content(request: Request, model_action: str):
+        return await admit(gemini_content, request, model_action=model_action)
+
+    app.add_api_route("/v1/chat/completions", chat_completions, methods=["POST"])
+    app.add_api_route("/chat/completions", chat_completions, methods=["POST"])
+    app.add_api_route("/openai/deployments/{deployment}/chat/completions", chat_completions, methods=["POST"])
+    app.add_api_route("/v1beta/openai/chat/completions", chat_completions, methods=["POST"])
+    app.add_api_route("/v1beta/models/{model_action}", generate_content, methods=["POST"])
+    return app
+
+
+class BackgroundServer:
+    """Run an ASGI app with uvicorn on a background thread."""
+
+    def __init__(self, app, host="127.0.0.1", port=0):
+        self.config = uvicorn.Config(app, host=host, port=port, log_level="warning", lifespan="off")
+        self.server = uvicorn.Server(self.config)
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+        self.host = host
+        self.port = port
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def start(self, timeout=10.0):
+        self.thread.start()
+        deadline = time.time() + timeout
+        while not self.server.started:
+            if time.time() > deadline:
+                raise RuntimeError("Background server did not start in time")
+            time.sleep(0.01)
+        self.port = self.server.servers[0].sockets[0].getsockname()[1]
+        return self
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join(timeout=5.0)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the mock OpenAI, Azure and Gemini upstream")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9999)
+    parser.add_argument("--ttft", type=float, default=0.05, help="Seconds before the first token")
+    parser.add_argument("--inter-token-delay", type=float, default=0.005, help="Seconds between tokens")
+    parser.add_argument("--num-tokens", type=int, default=32, help="Tokens per response")
+    parser.add_argument("--chunk-tokens", type=int, default=1, help="Tokens per streamed chunk")
+    parser.add_argument("--tool-calls", type=int, default=0, help="Tool calls at the end of every response")
+    parser.add_argument("--tool-call-style", choices=("fragments", "whole", "interleaved"), default="fragments",
+                        help="How tool call arguments stream")
+    parser.add_argument("--tool-args-chars", type=int, default=200, help="Size of each call's arguments")
+    parser.add_argument("--tool-args-chunk", type=int, default=16, help="Characters per argument fragment")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of requests answered with an error")
+    parser.add_argument("--failure-status", type=int, default=503, help="HTTP status of injected errors")
+    parser.add_argument("--failure-delay", type=float, default=0.0, help="Seconds before an injected error")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Fraction of responses with --slow-ttft")
+    parser.add_argument("--slow-ttft", type=float, default=1.0, help="Time to first token of slow responses")
+    parser.add_argument("--midstream-failure-rate", type=float, default=0.0,
+                        help="Fraction of streams dropped halfway through")
+    parser.add_argument("--rpm-limit", type=int, default=None, help="Requests per minute before 429s")
+    parser.add_argument("--max-concurrency", type=int, default=None, help="Responses generated at once")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the failure and slow response draws")
+    args = parser.parse_args()
+
+    uvicorn.run(
+        create_mock_app(args.ttft, args.inter_token_delay, args.num_tokens, failure_rate=args.failure_rate,
+                        failure_status=args.failure_status, failure_delay=args.failure_delay,
+                        slow_rate=args.slow_rate, slow_ttft=args.slow_ttft, rpm_limit=args.rpm_limit,
+                        max_concurrency=args.max_concurrency, chunk_tokens=args.chunk_tokens,
+                        tool_calls=args.tool_calls, tool_call_style=args.tool_call_style,
+                        tool_args_chars=args.tool_args_chars, tool_args_chunk=args.tool_args_chunk,
+                        midstream_failure_rate=args.midstream_failure_rate, seed=args.seed),
+        host=args.host,
+        port=args.port,
+        log_level="warning"
+    )
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Test RPM/TPM admission control and load shedding.
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+import server
+from providers.pool import Endpoint
+from providers.registry import registry
+from proxy.admission import AdmissionController, OverloadedError, TokenBucket
+
+
+def test_token_bucket_refills_per_minute():
+    bucket = TokenBucket(600, now=0.0)
+    assert TokenBucket(600, burst_seconds=10).capacity == 100
+    assert bucket.wait_time(600, 0.0) == 0.0
+    bucket.take(600, 0.0)
+    assert bucket.wait_time(5, 0.0) == 0.5
+    assert bucket.available(0.5) == 5
+    # Amounts over the capacity wait for a full bucket rather than forever
+    assert bucket.wait_time(10_000, 0.5) == 59.5
+    bucket.give_back(600, 1.0)
+    assert bucket.available(1.0) == 600
+
+
+def test_calls_queue_in_order_and_are_shed_past_the_deadline():
+    """With an empty 1000 tokens/s bucket, 100-token calls are admitted 0.1s apart."""
+    async def scenario():
+        admission = AdmissionController({"openai": {"tpm": 60_000}}, timeout=0.25)
+        limiters = admission.limiters("openai")
+        limiters[0].tokens.take(10_000, time.monotonic())
+        started = time.monotonic()
+        admitted = []
+
+        async def one(i):
+            try:
+                await admission.admit(limiters, 100)
+                admitted.append((i, time.monotonic() - started))
+            except OverloadedError as e:
+                admitted.append((i, e))
+
+        await asyncio.gather(*(one(i) for i in range(3)))
+        return admission, admitted
+
+    admission, admitted = asyncio.run(scenario())
+    assert [i for i, _ in admitted] == [0, 1, 2]
+    assert 0.08 <= admitted[0][1] < 0.2 and 0.18 <= admitted[1][1] < 0.3
+    # The third would be admitted at 0.3s, past its deadline, so it is shed without waiting that long
+    error = admitted[2][1]
+    assert isinstance(error, OverloadedError) and error.status_code == 529
+    stats = admission.stats()["openai"]
+    assert (stats["admitted"], stats["waited"], stats["shed"], stats["max_queued"]) == (2, 2, 1, 3)
+    assert stats["queued"] == 0 and stats["wait_ms"]["p50"] >= 80
+
+
+def test_full_queue_sheds_and_endpoint_limits_apply():
+    endpoint = Endpoint("east", "http://east", rpm=60)
+
+    async def scenario():
+        admission = AdmissionController({}, timeout=1.0, max_queue=1)
+        limiters = admission.limiters("azure", endpoint)
+        assert [limiter.name for limiter in limiters] == ["azure/east"]
+        assert admission.limiters("openai") == []
+        limiters[0].requests.take(10, time.monotonic())
+        results = await asyncio.gather(
+            admission.admit(limiters, 1), admission.admit(limiters, 1), return_exceptions=True
+        )
+        return results
+
+    first, second = asyncio.run(scenario())
+    assert first is None
+    assert isinstance(second, OverloadedError) and "queue full" in second.message
+
+
+def test_estimate_counts_prompt_and_max_tokens():
+    request = {"model": "openai/gpt-4.1", "max_tokens": 1000,
+               "messages": [{"role": "user", "content": "Hello there"}]}
+    prompt = server.token_counter.count(request["model"], request["messages"])
+    assert prompt > 0
+    assert server.estimate_request_tokens(request) == prompt + 1000
+
+
+def test_endpoint_returns_overloaded_error():
+    """A request that cannot be admitted in time gets Anthropic's 529 overloaded_error."""
+    calls = []
+
+    async def fake_acompletion(**kwargs):
+        calls.append(kwargs)
+        return {"choices": [{"message": {"role": "assistant", "content": "hi"}, "finish_reason": "stop"}]}
+
+    body = {"model": "openai/gpt-4.1", "max_tokens": 50, "messages": [{"role": "user", "content": "Hi"}]}
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://proxy") as client:
+            return await client.post("/v1/messages", json=body)
+
+    admission = AdmissionController({"openai": {"rpm": 60}}, timeout=0.1)
+    admission.limiters("openai")[0].requests.take(10, time.monotonic())
+    original = (server.litellm.acompletion, server.admission, registry.health)
+    server.litellm.acompletion = fake_acompletion
+    server.admission = admission
+    registry.health = {}
+    try:
+        response = asyncio.run(scenario())
+        tracker = registry.health_for("openai")
+    finally:
+        server.litellm.acompletion, server.admission, registry.health = original
+
+    assert response.status_code == 529
+    error = response.json()
+    assert error["type"] == "error" and error["error"]["type"] == "overloaded_error"
+    assert error["error"]["message"].startswith("openai is over its rate limits")
+    assert response.headers["retry-after"] == "1"
+    assert calls == []
+    # Shedding is our decision, not a sign the backend is unhealthy
+    assert tracker.failures == 0 and tracker.state() == "closed"
+
+
+if __name__ == "__main__":
+    print("🧪 Testing admission control...")
+    test_token_bucket_refills_per_minute()
+    test_calls_queue_in_order_and_are_shed_past_the_deadline()
+    test_full_queue_sheds_and_endpoint_limits_apply()
+    test_estimate_counts_prompt_and_max_tokens()
+    test_endpoint_returns_overloaded_error()
+    print("✅ ALL TESTS PASSED!")
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Test that upstream calls never block the event loop.
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import server
+from fastapi.testclient import TestClient
+
+
+def _fake_response(text="Hello!"):
+    return {
+        "id": "chatcmpl-test",
+        "choices": [{"message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 5, "completion_tokens": 2}
+    }
+
+
+def test_non_streaming_uses_async_client():
+    """Non-streaming requests should await litellm.acompletion, never litellm.completion."""
+    calls = []
+
+    async def fake_acompletion(**kwargs):
+        calls.append(kwargs)
+        return _fake_response()
+
+    def forbidden_completion(**kwargs):
+        raise AssertionError("litellm.completion must not be called on the event loop")
+
+    original = (server.litellm.acompletion, server.litellm.completion)
+    server.litellm.acompletion, server.litellm.completion = fake_acompletion, forbidden_completion
+    try:
+        client = TestClient(server.app)
+        response = client.post("/v1/messages", json={
+            "model": "openai/gpt-4.1",
+            "max_tokens": 50,
+            "messages": [{"role": "user", "content": "Hi"}]
+        })
+    finally:
+        server.litellm.acompletion, server.litellm.completion = original
+
+    assert response.status_code == 200, response.text
+    assert response.json()["content"][0]["text"] == "Hello!"
+    assert len(calls) == 1 and calls[0]["stream"] is False
+
+
+def test_sync_provider_runs_on_fallback_executor():
+    """Providers without an async client must not stall other coroutines."""
+    provider = server.registry.get_provider("openai")
+
+    def slow_completion(**kwargs):
+        time.sleep(0.3)
+        return _fake_response()
+
+    async def scenario():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker_task = asyncio.create_task(ticker())
+        response = await server.call_upstream({"model": "openai/gpt-4.1", "messages": [], "stream": False})
+        ticker_task.cancel()
+        return response, ticks
+
+    original = server.litellm.completion
+    server.litellm.completion = slow_completion
+    provider.supports_async = False
+    try:
+        response, ticks = asyncio.run(scenario())
+    finally:
+        server.litellm.completion = original
+        del provider.supports_async
+
+    assert response["id"] == "chatcmpl-test"
+    # A blocked loop would record zero ticks during the 300ms call
+    assert ticks >= 10, f"event loop was blocked (only {ticks} ticks)"
+
+
+def test_sync_provider_streams_through_executor():
+    """Streaming from a sync provider should yield chunks as an async iterator."""
+    provider = server.registry.get_provider("openai")
+
+    def fake_completion(**kwargs):
+        return iter(["a", "b", "c"])
+
+    async def scenario():
+        stream = await server.call_upstream({"model": "openai/gpt-4.1", "messages": [], "stream": True})
+        return [chunk async for chunk in stream]
+
+    original = server.litellm.completion
+    server.litellm.completion = fake_completion
+    provider.supports_async = False
+    try:
+        chunks = asyncio.run(scenario())
+    finally:
+        server.litellm.completion = original
+        del provider.supports_async
+
+    assert chunks == ["a", "b", "c"]
+
+
+if __name__ == "__main__":
+    print("🧪 Testing non-blocking upstream calls...")
+    test_non_streaming_uses_async_client()
+    test_sync_provider_runs_on_fallback_executor()
+    test_sync_provider_streams_through_executor()
+    print("✅ ALL TESTS PASSED!")
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Test adaptive coalescing of streaming deltas.
+"""
+import asyncio
+import json
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from proxy.coalesce import CoalescingStats, coalesce_chunks
+from tests.helpers import make_chunk
+
+
+def _tool(index, arguments, tool_id=None, name=None):
+    call = SimpleNamespace(index=index, id=tool_id, function=SimpleNamespace(name=name, arguments=arguments))
+    return make_chunk(tool_calls=[call])
+
+
+async def _upstream(items):
+    for item in items:
+        if isinstance(item, float):
+            await asyncio.sleep(item)
+        else:
+            yield item
+
+
+def _collect(items, budget=1.0, max_chars=1000, stats=None):
+    async def run():
+        return [chunk async for chunk in coalesce_chunks(_upstream(items), budget, max_chars, stats)]
+    return asyncio.run(run())
+
+
+def test_text_and_tool_deltas_merge_up_to_boundaries():
+    """Runs of deltas merge; tool starts and finish_reason flush."""
+    stats = CoalescingStats()
+    chunks = _collect([
+        make_chunk("Hel"), make_chunk("lo"), make_chunk(" there"),
+        _tool(0, "", "call_1", "Read"), _tool(0, '{"pa'), _tool(0, 'th": 1}'),
+        _tool(1, '{"x"', "call_2", "Bash"), _tool(1, ": 2}"),
+        make_chunk(finish_reason="tool_calls"),
+    ], stats=stats)
+    assert [c.choices[0].delta.content for c in chunks[:1]] == ["Hello there"]
+    first_tool = chunks[1].choices[0].delta.tool_calls[0]
+    assert (first_tool.id, first_tool.function.name, first_tool.function.arguments) == ("call_1", "Read", '{"path": 1}')
+    second_tool = chunks[2].choices[0].delta.tool_calls[0]
+    assert (second_tool.index, second_tool.id, second_tool.function.arguments) == (1, "call_2", '{"x": 2}')
+    assert chunks[3].choices[0].finish_reason == "tool_calls"
+    assert len(chunks) == 4
+    assert stats.stats()["frames_saved"] == 5
+
+
+def test_size_threshold_flushes():
+    """A merged delta is released as soon as it reaches max_chars."""
+    chunks = _collect([make_chunk("ab")] * 5, max_chars=4)
+    assert [c.choices[0].delta.content for c in chunks] == ["abab", "abab", "ab"]
+
+
+def test_time_budget_flushes_while_upstream_stalls():
+    """A stalled upstream cannot hold a pending delta past its budget."""
+    stats = CoalescingStats()
+
+    async def run():
+        arrivals = []
+        items = [make_chunk("a"), make_chunk("b"), 0.3, make_chunk("c"), make_chunk(finish_reason="stop")]
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        async for chunk in coalesce_chunks(_upstream(items), 0.02, 1000, stats):
+            arrivals.append((chunk.choices[0].delta.content, loop.time() - start))
+        return arrivals
+
+    arrivals = asyncio.run(run())
+    assert arrivals[0][0] == "ab" and arrivals[0][1] < 0.2
+    assert [content for content, _ in arrivals[1:]] == ["c", None]
+    assert stats.stats()["added_latency_max_ms"] < 200
+
+
+def test_handle_streaming_output_is_unchanged():
+    """Coalesced streams decode to the same text and tool input."""
+    import server
+    request = server.MessagesRequest(model="openai/gpt-4.1", max_tokens=5,
+                                     messages=[{"role": "user", "content": "hi"}])
+    items = [make_chunk(c) for c in "Reading file"] + [_tool(0, "", "call_1", "Read")]
+    items += [_tool(0, c) for c in '{"path": "a.py"}'] + [make_chunk(finish_reason="tool_calls")]
+
+    def decode(coalesce):
+        async def run():
+            upstream = _upstream(items)
+            if coalesce:
+                upstream = coalesce_chunks(upstream, 1.0, 1000)
+            return [frame async for frame in server.handle_streaming(upstream, request)]
+        frames = asyncio.run(run())
+        text, arguments = "", ""
+        for frame in frames:
+            if frame.startswith(b"event: content_block_delta"):
+                delta = json.loads(frame.split(b"data: ", 1)[1])["delta"]
+                text += delta.get("text", "")
+                arguments += delta.get("partial_json", "")
+        return len(frames), text, arguments
+
+    plain, coalesced = decode(False), decode(True)
+    assert coalesced[1:] == plain[1:] == ("Reading file", '{"path": "a.py"}')
+    assert coalesced[0] < plain[0]
+
+
+if __name__ == "__main__":
+    print("🧪 Testing delta coalescing...")
+    test_text_and_tool_deltas_merge_up_to_boundaries()
+    test_size_threshold_flushes()
+    test_time_budget_flushes_while_upstream_stalls()
+    test_handle_streaming_output_is_unchanged()
+    print("✅ ALL TESTS PASSED!")
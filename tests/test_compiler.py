@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Test the single-pass Anthropic -> provider payload compiler.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import server
+from proxy import json_backend
+
+CONVERSATION = [
+    {"role": "user", "content": "List the files"},
+    {"role": "assistant", "content": [
+        {"type": "text", "text": "Sure."},
+        {"type": "tool_use", "id": "toolu_1", "name": "ls", "input": {"path": "."}}
+    ]},
+    {"role": "user", "content": [
+        {"type": "tool_result", "tool_use_id": "toolu_1", "content": [{"type": "text", "text": "a.py"}, {"size": 3}]},
+        {"type": "text", "text": "Thanks"}
+    ]},
+    {"role": "assistant", "content": [
+        {"type": "text", "text": "Here is a picture"},
+        {"type": "image", "source": {"type": "base64", "media_type": "image/png", "data": "AAAA"}}
+    ]},
+]
+
+TOOLS = [{
+    "name": "ls",
+    "input_schema": {
+        "type": "object",
+        "additionalProperties": False,
+        "properties": {"path": {"type": "string", "format": "uri", "default": "."}}
+    }
+}]
+
+
+def _compile(model, **extra):
+    request = server.MessagesRequest(model=model, max_tokens=32000, messages=CONVERSATION,
+                                     system=[{"type": "text", "text": "Be brief"}], **extra)
+    return request, server.convert_anthropic_to_litellm(request)
+
+
+def test_openai_content_is_flattened():
+    """OpenAI gets plain strings for every message and a capped max_tokens."""
+    _, payload = _compile("openai/gpt-4.1")
+    assert payload["max_tokens"] == 16384
+    assert [msg["content"] for msg in payload["messages"]] == [
+        "Be brief",
+        "List the files",
+        f"Sure.\n[Tool: ls (ID: toolu_1)]\nInput: {json_backend.dumps({'path': '.'})}",
+        f"Tool result for toolu_1:\na.py\n{json_backend.dumps({'size': 3})}\n\nThanks",
+        "Here is a picture\n[Image content - not displayed in text format]",
+    ]
+
+
+def test_block_providers_keep_content_blocks():
+    """Azure keeps Anthropic content blocks and the uncapped max_tokens."""
+    _, payload = _compile("azure/my-deployment")
+    assert payload["max_tokens"] == 32000
+    assert payload["messages"][2]["content"] == [
+        {"type": "text", "text": "Sure."},
+        {"type": "tool_use", "id": "toolu_1", "name": "ls", "input": {"path": "."}}
+    ]
+    # Tool results in user turns are always sent as text
+    assert payload["messages"][3]["content"].startswith("Tool result for toolu_1:")
+
+
+def test_gemini_schema_cleaned_without_mutating_request():
+    """Gemini tool schemas are cleaned on a copy of the request's schema."""
+    request, payload = _compile("gemini/gemini-2.0-flash", tools=TOOLS, tool_choice={"type": "tool", "name": "ls"})
+    parameters = payload["tools"][0]["function"]["parameters"]
+    assert "additionalProperties" not in parameters
+    assert parameters["properties"]["path"] == {"type": "string"}
+    assert request.tools[0].input_schema["additionalProperties"] is False
+    assert payload["tool_choice"] == {"type": "function", "function": {"name": "ls"}}
+
+
+if __name__ == "__main__":
+    print("🧪 Testing request compiler...")
+    test_openai_content_is_flattened()
+    test_block_providers_keep_content_blocks()
+    test_gemini_schema_cleaned_without_mutating_request()
+    print("✅ ALL TESTS PASSED!")
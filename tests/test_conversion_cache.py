@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Test the incremental conversion cache.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import server
+from proxy import json_backend
+from proxy.compiler import compile_request
+from proxy.conversion_cache import ConversionCache
+from tests.benchmarks.corpus import make_conversation
+
+
+def _turn(payload, end, model=None):
+    return server.MessagesRequest(**{**payload, "messages": payload["messages"][:end],
+                                     "model": model or payload["model"]})
+
+
+def test_only_new_tail_is_compiled():
+    """Each turn should hit for the resent prefix and compile just the new messages."""
+    payload = make_conversation(20, 500)
+    cache = ConversionCache()
+    for end in range(2, 21, 2):
+        request = _turn(payload, end)
+        capabilities = server.get_capabilities(request.model)
+        assert compile_request(request, capabilities, cache) == compile_request(request, capabilities)
+    stats = cache.stats()
+    assert stats["misses"] == 20
+    assert stats["hits"] == sum(range(0, 19, 2))
+
+
+def test_providers_and_edits_do_not_share_entries():
+    """Only flattening providers use the cache, and an edited earlier message must miss."""
+    payload = make_conversation(6, 200)
+    cache = ConversionCache()
+    openai = _turn(payload, 6)
+    azure = _turn(payload, 6, model="azure/my-deployment")
+    compile_request(openai, server.get_capabilities(openai.model), cache)
+    compile_request(azure, server.get_capabilities(azure.model), cache)
+    # Azure takes content blocks, which are not worth caching
+    assert cache.stats()["hits"] == 0 and cache.stats()["entries"] == 6
+
+    edited = make_conversation(6, 200)
+    edited["messages"][1]["content"][1]["input"] = {"path": True}
+    payload["messages"][1]["content"][1]["input"] = {"path": 1}
+    compile_request(_turn(payload, 6), server.get_capabilities(openai.model), cache)
+    hits_before = cache.stats()["hits"]
+    result = compile_request(_turn(edited, 6), server.get_capabilities(openai.model), cache)
+    # Only the first message is shared; everything after the edit is recompiled
+    assert cache.stats()["hits"] == hits_before + 1
+    assert json_backend.dumps({"path": True}) in result["messages"][2]["content"]
+
+
+def test_memory_cap_evicts_and_results_are_copies():
+    """The byte cap is enforced and callers cannot corrupt cached entries."""
+    payload = make_conversation(40, 2000)
+    cache = ConversionCache(max_bytes=20_000)
+    request = _turn(payload, 40)
+    capabilities = server.get_capabilities(request.model)
+    result = compile_request(request, capabilities, cache)
+    stats = cache.stats()
+    assert stats["bytes"] <= 20_000
+    assert stats["evictions"] > 0
+
+    result["messages"][-1]["content"] = "mutated"
+    again = compile_request(request, capabilities, cache)
+    assert again["messages"][-1]["content"] != "mutated"
+
+
+if __name__ == "__main__":
+    print("🧪 Testing conversion cache...")
+    test_only_new_tail_is_compiled()
+    test_providers_and_edits_do_not_share_entries()
+    test_memory_cap_evicts_and_results_are_copies()
+    print("✅ ALL TESTS PASSED!")
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Test weighted endpoint pools against several local mock deployments.
+"""
+import asyncio
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import server
+from providers.azure import AzureOpenAIProvider
+from providers.pool import Endpoint, EndpointPool
+from providers.registry import registry
+from tests.mock_upstream import BackgroundServer, create_mock_app
+
+
+def _pool(*weights, strategy="least_outstanding"):
+    endpoints = [Endpoint(f"e{i}", f"http://e{i}", weight=weight) for i, weight in enumerate(weights)]
+    return EndpointPool(endpoints, strategy)
+
+
+def test_least_outstanding_respects_weights():
+    pool = _pool(2, 1)
+    picked = [pool.acquire().name for _ in range(6)]
+    assert picked.count("e0") == 4 and picked.count("e1") == 2
+
+    # Idle endpoints with equal weights take turns
+    pool = _pool(1, 1, 1)
+    names = []
+    for _ in range(6):
+        endpoint = pool.acquire()
+        names.append(endpoint.name)
+        pool.release(endpoint)
+    assert sorted(names) == ["e0", "e0", "e1", "e1", "e2", "e2"]
+
+
+def test_ewma_prefers_fast_endpoints_until_they_queue():
+    pool = _pool(1, 1, strategy="ewma")
+    fast, slow = pool.endpoints
+    pool.observe(fast, 0.1)
+    pool.observe(slow, 1.05)
+    # Ten requests in flight on the fast endpoint make it worse than the idle slow one
+    for _ in range(10):
+        assert pool.acquire() is fast
+    assert pool.acquire() is slow
+    pool.observe(slow, 0.0)
+    assert abs(slow.ewma - 0.735) < 1e-9
+
+
+def test_pool_from_env_and_endpoint_injection():
+    """{NAME}_ENDPOINTS builds the pool; configure_request and the direct URL use the chosen endpoint."""
+    os.environ["AZURE_ENDPOINTS"] = json.dumps([
+        {"api_base": "https://east.openai.azure.com", "weight": 2},
+        {"api_base": "https://west.openai.azure.com", "api_key": "west-key",
+         "deployments": {"gpt-4o": "gpt-4o-west"}},
+    ])
+    os.environ["AZURE_ENDPOINT_STRATEGY"] = "ewma"
+    try:
+        provider = AzureOpenAIProvider()
+    finally:
+        del os.environ["AZURE_ENDPOINTS"], os.environ["AZURE_ENDPOINT_STRATEGY"]
+    pool = provider.endpoint_pool
+    assert pool.strategy == "ewma" and provider.is_available()
+    east, west = pool.endpoints
+    assert (east.name, east.weight, east.api_key, east.api_version) == (
+        "east.openai.azure.com", 2.0, provider.api_key, provider.api_version
+    )
+
+    request = provider.configure_request({"model": "azure/gpt-4o"}, west)
+    assert request["model"] == "azure/gpt-4o-west"
+    assert request["api_base"] == "https://west.openai.azure.com" and request["api_key"] == "west-key"
+    url, headers = provider.get_direct_endpoint("gpt-4o-west", west)
+    assert url.startswith("https://west.openai.azure.com/openai/deployments/gpt-4o-west/chat/completions?")
+    assert headers == {"api-key": "west-key"}
+
+
+def _serve_through_pool(latencies, strategy, requests=24):
+    """Send concurrent requests through call_upstream to one mock deployment per latency."""
+    mocks = [create_mock_app(ttft=ttft, inter_token_delay=0.001, num_tokens=4) for ttft in latencies]
+    servers = [BackgroundServer(app).start() for app in mocks]
+    provider = AzureOpenAIProvider()
+    provider.upstream_engine = "httpx"
+    provider.endpoint_pool = EndpointPool(
+        [Endpoint(f"mock{i}", mock.url, api_key="mock-key") for i, mock in enumerate(servers)], strategy
+    )
+    original = registry.get_provider("azure")
+    registry.register_provider(provider)
+
+    async def one(i):
+        request = {"model": "azure/gpt-4o", "messages": [{"role": "user", "content": "Hi"}], "stream": i % 2 == 0}
+        response = await server.call_upstream(request)
+        if request["stream"]:
+            return [chunk async for chunk in response][-1].choices[0].finish_reason
+        return response["choices"][0]["finish_reason"]
+
+    async def scenario():
+        try:
+            results = []
+            # Waves of concurrent requests, so EWMA has samples to learn from
+            for wave in range(0, requests, 6):
+                results += await asyncio.gather(*(one(i) for i in range(wave, wave + 6)))
+            return results
+        finally:
+            await provider.aclose()
+
+    try:
+        results = asyncio.run(scenario())
+    finally:
+        registry.register_provider(original)
+        for mock in servers:
+            mock.stop()
+    return results, [app.state.requests_served for app in mocks], provider.endpoint_pool
+
+
+def test_requests_spread_over_mock_deployments():
+    results, served, pool = _serve_through_pool([0.01, 0.01, 0.01], "least_outstanding")
+    assert results == ["stop"] * 24
+    assert sum(served) == 24 and min(served) >= 6
+    assert all(endpoint.outstanding == 0 for endpoint in pool.endpoints)
+
+
+def test_ewma_steers_away_from_a_slow_deployment():
+    results, served, pool = _serve_through_pool([0.01, 0.01, 0.2], "ewma")
+    assert results == ["stop"] * 24
+    assert served[2] < min(served[0], served[1])
+    assert pool.endpoints[2].ewma > pool.endpoints[0].ewma
+    assert all(endpoint.outstanding == 0 for endpoint in pool.endpoints)
+
+
+if __name__ == "__main__":
+    print("🧪 Testing endpoint pools...")
+    test_least_outstanding_respects_weights()
+    test_ewma_prefers_fast_endpoints_until_they_queue()
+    test_pool_from_env_and_endpoint_injection()
+    test_requests_spread_over_mock_deployments()
+    test_ewma_steers_away_from_a_slow_deployment()
+    print("✅ ALL TESTS PASSED!")
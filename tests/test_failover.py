@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Test cross-provider failover along fallback chains.
+"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+import server
+from providers.engine import UpstreamError
+from providers.registry import registry
+from proxy.failover import Failover
+from tests.helpers import make_chunk
+from tests.test_routing import _router
+
+CHAIN = ["azure/gpt-4.1", "openai/gpt-4.1", "gemini/gemini-2.0-flash"]
+
+
+async def _stream(chunks, error=None):
+    for chunk in chunks:
+        await asyncio.sleep(0)
+        yield chunk
+    if error is not None:
+        raise error
+
+
+def test_fallback_chains_resolve_through_the_router():
+    router = _router(fallbacks={"sonnet": CHAIN, "gpt-4.1-mini": ["gemini-2.0-flash"]})
+    # "sonnet" keys the chain of BIG_MODEL's route; the chain sets the order
+    assert router.fallback_chain(router.resolve("claude-sonnet-4").model) == tuple(CHAIN)
+    # A routed model missing from its chain is tried first; entries resolve like requests
+    assert router.fallback_chain("openai/gpt-4.1-mini") == ("openai/gpt-4.1-mini", "gemini/gemini-2.0-flash")
+    assert router.fallback_chain("openai/gpt-4o") == ("openai/gpt-4o",)
+    assert router.describe()["fallbacks"]["openai/gpt-4.1"] == CHAIN
+
+
+def test_call_moves_on_for_backend_failures_only():
+    tried = []
+
+    async def send(model):
+        tried.append(model)
+        if model == "a":
+            raise UpstreamError(503, "unavailable")
+        if model == "b":
+            raise UpstreamError(401, "bad key")
+        if model == "bad-request":
+            raise UpstreamError(400, "invalid")
+        return {"served_by": model}
+
+    async def scenario():
+        failover = Failover()
+        response = await failover.call(["a", "b", "c"], send)
+        try:
+            await failover.call(["bad-request", "c"], send)
+        except UpstreamError as e:
+            client_error = e
+        try:
+            await failover.call(["a", "b"], send)
+        except UpstreamError as e:
+            exhausted = e
+        return failover, response, client_error, exhausted
+
+    failover, response, client_error, exhausted = asyncio.run(scenario())
+    assert response == {"served_by": "c"}
+    assert tried == ["a", "b", "c", "bad-request", "a", "b"]
+    assert client_error.status_code == 400 and exhausted.status_code == 401
+    stats = failover.stats()
+    assert stats["served_by_depth"] == {"2": 1} and stats["failed_over"] == 1
+    assert stats["exhausted"] == 1 and stats["backend_failures"] == {"a": 2, "b": 2}
+
+
+def test_stream_retries_only_before_content():
+    streams = {
+        # Fails after a role-only chunk: nothing the client can see yet
+        "a": lambda: _stream([make_chunk(role="assistant")], ConnectionError("reset")),
+        "b": lambda: _stream([make_chunk(role="assistant"), make_chunk("hello"), make_chunk(None, "stop")]),
+        "late": lambda: _stream([make_chunk("partial")], ConnectionError("reset")),
+    }
+
+    async def open_stream(model):
+        return streams[model]()
+
+    async def scenario():
+        failover = Failover()
+        stream = await failover.stream(["a", "b"], open_stream)
+        chunks = [chunk async for chunk in stream]
+        # Once content has been read, a failure reaches the consumer
+        late = await failover.stream(["late", "b"], open_stream)
+        seen = []
+        try:
+            async for chunk in late:
+                seen.append(chunk.choices[0].delta.content)
+        except ConnectionError:
+            seen.append("error")
+        return failover, chunks, seen
+
+    failover, chunks, seen = asyncio.run(scenario())
+    assert [chunk.choices[0].delta.content for chunk in chunks] == [None, "hello", None]
+    assert chunks[-1].choices[0].finish_reason == "stop"
+    assert seen == ["partial", "error"]
+    assert failover.stats()["served_by_depth"] == {"0": 1, "1": 1}
+
+
+def test_endpoint_fails_over_across_providers():
+    """A sonnet request whose Azure backend fails is served by OpenAI, streamed or not."""
+    calls = []
+
+    async def fake_acompletion(**kwargs):
+        calls.append(kwargs["model"])
+        if kwargs["model"].startswith("azure/"):
+            raise UpstreamError(503, "unavailable", "azure")
+        if kwargs.get("stream"):
+            return _stream([make_chunk("from "), make_chunk(kwargs["model"]), make_chunk(None, "stop")])
+        return {
+            "id": "chatcmpl-failover",
+            "choices": [{"message": {"role": "assistant", "content": f"from {kwargs['model']}"},
+                         "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 5, "completion_tokens": 2},
+        }
+
+    body = {"model": "claude-sonnet-4", "max_tokens": 50, "messages": [{"role": "user", "content": "Hi"}]}
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://proxy") as client:
+            plain = await client.post("/v1/messages", json=body)
+            streamed = await client.post("/v1/messages", json={**body, "stream": True})
+            return plain, streamed
+
+    original = (server.litellm.acompletion, server.failover, registry._router, registry.health)
+    server.litellm.acompletion = fake_acompletion
+    server.failover = Failover()
+    registry._router = _router(fallbacks={"sonnet": CHAIN})
+    registry.health = {}
+    try:
+        plain, streamed = asyncio.run(scenario())
+        stats = server.failover.stats()
+    finally:
+        server.litellm.acompletion, server.failover, registry._router, registry.health = original
+
+    assert plain.status_code == 200
+    assert plain.json()["content"][0]["text"] == "from openai/gpt-4.1"
+    assert streamed.status_code == 200
+    assert "openai/gpt-4.1" in streamed.text and "message_stop" in streamed.text
+    assert calls == ["azure/gpt-4.1", "openai/gpt-4.1"] * 2
+    assert stats["served_by_depth"] == {"1": 2} and stats["backend_failures"] == {"azure/gpt-4.1": 2}
+
+
+if __name__ == "__main__":
+    print("🧪 Testing cross-provider failover...")
+    test_fallback_chains_resolve_through_the_router()
+    test_call_moves_on_for_backend_failures_only()
+    test_stream_retries_only_before_content()
+    test_endpoint_fails_over_across_providers()
+    print("✅ ALL TESTS PASSED!")
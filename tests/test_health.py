@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Test health scoring and circuit breakers, against a fault-injecting mock upstream.
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+import server
+from providers.azure import AzureOpenAIProvider
+from providers.engine import UpstreamError
+from providers.health import BreakerConfig, CircuitOpenError, HealthTracker, is_backend_failure
+from providers.pool import Endpoint, EndpointPool
+from providers.registry import registry
+from tests.mock_upstream import BackgroundServer, create_mock_app
+
+CONFIG = BreakerConfig(window=60, min_requests=4, error_rate=0.5, consecutive_failures=3, cooldown=10)
+
+
+def test_breaker_opens_probes_and_closes():
+    tracker = HealthTracker("mock", CONFIG)
+    for now in (1, 2):
+        assert tracker.try_acquire(now)
+        tracker.record(False, now=now)
+    assert tracker.state(2) == "closed"
+    tracker.record(False, now=3)
+    assert tracker.state(3) == "open" and not tracker.try_acquire(5)
+    assert tracker.retry_in(5) == 8
+
+    # After the cooldown a single probe goes through
+    assert tracker.try_acquire(13) and tracker.state(13) == "half_open"
+    assert not tracker.try_acquire(13)
+    tracker.record(False, now=14)
+    assert tracker.state(14) == "open" and tracker.times_opened == 2
+
+    assert tracker.try_acquire(24)
+    tracker.record(True, 0.2, now=24)
+    assert tracker.state(24) == "closed" and tracker.try_acquire(25)
+    snapshot = tracker.snapshot(25)
+    assert snapshot["state"] == "closed" and snapshot["rejected"] == 2
+    assert (snapshot["successes"], snapshot["failures"]) == (1, 4)
+
+
+def test_error_rate_window_and_neutral_outcomes():
+    tracker = HealthTracker("mock", CONFIG)
+    # Alternating failures never hit 3 in a row, but trip at a 50% error rate
+    tracker.record(True, 0.1, now=1)
+    tracker.record(False, now=2)
+    tracker.record(True, 0.3, now=3)
+    assert tracker.state(3) == "closed"
+    tracker.record(False, now=4)
+    assert tracker.state(4) == "open"
+
+    # Old outcomes leave the window; neutral ones never enter it
+    tracker = HealthTracker("mock", CONFIG)
+    for now in range(1, 4):
+        tracker.record(True, now / 10, now=now)
+    tracker.record(None, now=4)
+    snapshot = tracker.snapshot(5)
+    assert snapshot["requests_in_window"] == 3 and snapshot["error_rate"] == 0.0
+    assert snapshot["latency_ms"] == {"p50": 200.0, "p95": 300.0, "p99": 300.0}
+    assert tracker.snapshot(62)["requests_in_window"] == 2
+
+
+def test_failure_classification():
+    assert is_backend_failure(UpstreamError(503, "unavailable"))
+    assert is_backend_failure(UpstreamError(429, "rate limited"))
+    assert is_backend_failure(httpx.ConnectTimeout("timed out"))
+    assert not is_backend_failure(UpstreamError(400, "bad request"))
+    assert not is_backend_failure(asyncio.CancelledError())
+
+
+def test_open_breaker_fails_fast_and_hides_provider():
+    """Once the provider's breaker opens, calls raise CircuitOpenError without reaching upstream."""
+    calls = []
+
+    async def failing_acompletion(**kwargs):
+        calls.append(1)
+        raise UpstreamError(503, "unavailable", "openai")
+
+    async def scenario():
+        errors = []
+        for _ in range(5):
+            try:
+                await server.call_upstream({"model": "openai/gpt-4.1", "messages": [], "stream": False})
+            except Exception as e:
+                errors.append(e)
+        return errors
+
+    original = (server.litellm.acompletion, registry.health, registry.breaker_config)
+    server.litellm.acompletion = failing_acompletion
+    registry.health, registry.breaker_config = {}, CONFIG
+    try:
+        errors = asyncio.run(scenario())
+        openai = registry.get_provider("openai")
+        healthy = registry.is_healthy(openai)
+        report = registry.health_report()["openai"]
+    finally:
+        server.litellm.acompletion, registry.health, registry.breaker_config = original
+
+    assert len(calls) == 3
+    assert [type(e) for e in errors] == [UpstreamError] * 3 + [CircuitOpenError] * 2
+    assert errors[-1].status_code == 503
+    assert not healthy
+    assert report["healthy"] is False and report["state"] == "open" and report["rejected"] == 2
+
+
+def _pooled_provider(mocks):
+    provider = AzureOpenAIProvider()
+    provider.upstream_engine = "httpx"
+    provider.endpoint_pool = EndpointPool(
+        [Endpoint(f"mock{i}", mock.url, api_key="mock-key") for i, mock in enumerate(mocks)]
+    )
+    return provider
+
+
+def test_pool_skips_a_failing_endpoint_and_recovers():
+    """Traffic leaves an endpoint that returns 503s, and returns after a successful probe."""
+    apps = [create_mock_app(ttft=0.005, inter_token_delay=0.001, num_tokens=4) for _ in range(2)]
+    apps[1].state.failure_rate = 1.0
+    mocks = [BackgroundServer(app).start() for app in apps]
+    provider = _pooled_provider(mocks)
+    config = CONFIG._replace(cooldown=0.3)
+
+    async def one(i):
+        request = {"model": "azure/gpt-4o", "messages": [{"role": "user", "content": "Hi"}], "stream": i % 2 == 0}
+        try:
+            response = await server.call_upstream(request)
+            if request["stream"]:
+                return [chunk async for chunk in response][-1].choices[0].finish_reason
+            return response["choices"][0]["finish_reason"]
+        except UpstreamError as e:
+            return e.status_code
+
+    async def scenario():
+        try:
+            first = [await one(i) for i in range(12)]
+            apps[1].state.failure_rate = 0.0
+            await asyncio.sleep(0.35)
+            second = [await one(i) for i in range(6)]
+            return first, second
+        finally:
+            await provider.aclose()
+
+    original_provider = registry.get_provider("azure")
+    original_health = (registry.health, registry.breaker_config)
+    registry.register_provider(provider)
+    registry.health, registry.breaker_config = {}, config
+    try:
+        first, second = asyncio.run(scenario())
+        report = registry.health_report()["azure"]
+    finally:
+        registry.register_provider(original_provider)
+        registry.health, registry.breaker_config = original_health
+        for mock in mocks:
+            mock.stop()
+
+    # The failing endpoint gets three requests before its breaker opens
+    assert first.count(503) == 3 and first.count("stop") == 9
+    assert apps[1].state.failures_injected == 3
+    assert second == ["stop"] * 6 and apps[1].state.requests_served >= 2
+    assert report["healthy"] is True
+    assert report["endpoints"]["mock1"]["state"] == "closed"
+    assert report["endpoints"]["mock1"]["times_opened"] == 1
+    assert all(endpoint.outstanding == 0 for endpoint in provider.endpoint_pool.endpoints)
+
+
+def test_admin_health_endpoint():
+    async def scenario():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://proxy") as client:
+            before = await client.get("/admin/health")
+            reset = await client.post("/admin/health/reset", params={"provider": "openai"})
+            unknown = await client.post("/admin/health/reset", params={"provider": "nope"})
+            return before, reset, unknown
+
+    original = (registry.health, registry.breaker_config)
+    registry.health, registry.breaker_config = {}, CONFIG
+    tracker = registry.health_for("openai")
+    for _ in range(3):
+        tracker.record(False, now=time.monotonic())
+    try:
+        before, reset, unknown = asyncio.run(scenario())
+    finally:
+        registry.health, registry.breaker_config = original
+
+    assert before.status_code == 200 and before.json()["openai"]["state"] == "open"
+    assert reset.json()["openai"]["state"] == "closed" and reset.json()["openai"]["healthy"]
+    assert unknown.status_code == 404
+
+
+if __name__ == "__main__":
+    print("🧪 Testing health scoring and circuit breakers...")
+    test_breaker_opens_probes_and_closes()
+    test_error_rate_window_and_neutral_outcomes()
+    test_failure_classification()
+    test_open_breaker_fails_fast_and_hides_provider()
+    test_pool_skips_a_failing_endpoint_and_recovers()
+    test_admin_health_endpoint()
+    print("✅ ALL TESTS PASSED!")
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Test hedged upstream calls.
+"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+import server
+from proxy.hedging import Hedger
+from tests.helpers import make_chunk
+
+
+def test_delay_follows_the_latency_percentile():
+    hedger = Hedger(["small"], percentile=90, min_delay=0.05, max_delay=1.0, min_samples=10)
+    assert hedger.delay("small") == 1.0
+    hedger._classes["small"].samples.extend(i / 100 for i in range(1, 21))
+    assert hedger.delay("small") == 0.18
+    hedger._classes["small"].samples.extend([0.01] * 500)
+    assert hedger.delay("small") == 0.05
+    assert hedger.hedges("small") and not hedger.hedges("big")
+
+
+def test_slow_call_is_hedged_and_the_loser_cancelled():
+    cancelled = []
+
+    def make(name, delay):
+        async def call():
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                cancelled.append(name)
+                raise
+            return name
+        return call
+
+    async def scenario():
+        hedger = Hedger(["small"], max_delay=0.02, budget=1.0)
+        slow = await hedger.call("small", make("primary", 0.5), make("hedge", 0.01))
+        fast = await hedger.call("small", make("primary", 0.001), make("hedge", 0.01))
+        return hedger, slow, fast
+
+    hedger, slow, fast = asyncio.run(scenario())
+    assert (slow, fast) == ("hedge", "primary")
+    assert cancelled == ["primary"]
+    stats = hedger.stats()["small"]
+    assert (stats["requests"], stats["hedges_fired"], stats["hedges_won"]) == (2, 1, 1)
+
+
+def test_budget_caps_the_hedge_rate():
+    async def slow():
+        await asyncio.sleep(0.02)
+        return "primary"
+
+    async def hedge():
+        return "hedge"
+
+    async def scenario():
+        hedger = Hedger(["small"], max_delay=0.005, budget=0.25)
+        return hedger, [await hedger.call("small", slow, hedge) for _ in range(8)]
+
+    hedger, results = asyncio.run(scenario())
+    assert results.count("hedge") == 2
+    stats = hedger.stats()["small"]
+    assert (stats["hedges_fired"], stats["budget_denied"]) == (2, 6)
+
+
+def test_hedged_stream_and_failed_calls():
+    closed = []
+
+    async def stream(name, first_delay):
+        try:
+            await asyncio.sleep(first_delay)
+            yield make_chunk(name)
+            yield make_chunk(None, "stop")
+        finally:
+            closed.append(name)
+
+    def opener(name, first_delay):
+        async def open_stream():
+            return stream(name, first_delay)
+        return open_stream
+
+    async def broken():
+        await asyncio.sleep(0.03)
+        raise ConnectionError("reset")
+
+    async def scenario():
+        hedger = Hedger(["small"], max_delay=0.02, budget=1.0)
+        winner = await hedger.stream("small", opener("primary", 0.5), opener("hedge", 0.01))
+        texts = [chunk.choices[0].delta.content async for chunk in winner]
+        # A hedge that fails leaves the slower primary to win
+        survivor = await hedger.call("small", lambda: asyncio.sleep(0.05, "primary"), broken)
+        return texts, survivor
+
+    texts, survivor = asyncio.run(scenario())
+    assert texts == ["hedge", None]
+    assert sorted(closed) == ["hedge", "primary"]
+    assert survivor == "primary"
+
+
+def test_call_cancelled_from_within_leaves_the_race_to_the_other():
+    async def cancelled():
+        await asyncio.sleep(0.03)
+        raise asyncio.CancelledError()
+
+    async def broken():
+        await asyncio.sleep(0.05)
+        raise ConnectionError("reset")
+
+    async def scenario():
+        hedger = Hedger(["small"], max_delay=0.02, budget=1.0)
+        survivor = await hedger.call("small", cancelled, lambda: asyncio.sleep(0.05, "hedge"))
+        try:
+            await hedger.call("small", cancelled, broken)
+        except ConnectionError as e:
+            return survivor, e
+
+    survivor, error = asyncio.run(scenario())
+    # The hedge's real error is reported, not the primary's cancellation
+    assert survivor == "hedge" and str(error) == "reset"
+
+
+def test_endpoint_hedges_the_small_model():
+    """A haiku request whose first upstream call stalls is answered by the hedge."""
+    calls = []
+
+    async def fake_acompletion(**kwargs):
+        calls.append(kwargs["model"])
+        await asyncio.sleep(1.0 if len(calls) == 1 else 0.01)
+        return {
+            "id": f"chatcmpl-{len(calls)}",
+            "choices": [{"message": {"role": "assistant", "content": f"call {len(calls)}"}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 5, "completion_tokens": 2},
+        }
+
+    body = {"model": "claude-3-haiku-20240307", "max_tokens": 50, "messages": [{"role": "user", "content": "Hi"}]}
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://proxy") as client:
+            return await client.post("/v1/messages", json=body)
+
+    original = (server.litellm.acompletion, server.hedger)
+    server.litellm.acompletion = fake_acompletion
+    server.hedger = Hedger(["small"], max_delay=0.05, budget=1.0)
+    try:
+        response = asyncio.run(scenario())
+        stats = server.hedger.stats()
+    finally:
+        server.litellm.acompletion, server.hedger = original
+
+    assert response.status_code == 200
+    assert response.json()["content"][0]["text"] == "call 2"
+    assert len(calls) == 2 and calls[0] == calls[1]
+    assert stats["small"]["hedges_won"] == 1
+
+
+if __name__ == "__main__":
+    print("🧪 Testing hedged requests...")
+    test_delay_follows_the_latency_percentile()
+    test_slow_call_is_hedged_and_the_loser_cancelled()
+    test_budget_caps_the_hedge_rate()
+    test_hedged_stream_and_failed_calls()
+    test_call_cancelled_from_within_leaves_the_race_to_the_other()
+    test_endpoint_hedges_the_small_model()
+    print("✅ ALL TESTS PASSED!")
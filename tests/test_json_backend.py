@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Test the pluggable JSON backend against the standard library.
+"""
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from proxy import json_backend
+
+SAMPLE = {
+    "model": "openai/gpt-4.1",
+    "messages": [{"role": "user", "content": "ünïcödé ✓ 🚀 \"quoted\" \\ \n"}],
+    "max_tokens": 1024,
+    "temperature": 0.5,
+    "stream": True,
+    "metadata": None,
+    "nested": {"list": [1, 2.5, False, None, {"k": []}]},
+}
+
+
+def _installed_backends():
+    names = []
+    for name in ("orjson", "msgspec", "json"):
+        backend = json_backend._select(name)
+        if backend[0] == name:
+            names.append(backend)
+    return names
+
+
+def test_every_installed_backend_round_trips():
+    """Each available backend parses str and bytes and serializes losslessly."""
+    for name, loads, dumpb, pretty, canonical in _installed_backends():
+        encoded = json.dumps(SAMPLE)
+        assert loads(encoded) == SAMPLE, name
+        assert loads(encoded.encode("utf-8")) == SAMPLE, name
+        assert json.loads(dumpb(SAMPLE, None)) == SAMPLE, name
+        assert json.loads(pretty(SAMPLE, None)) == SAMPLE, name
+        assert "\n  " in pretty(SAMPLE, None), name
+        # Canonical output ignores key order and matches across backends
+        reordered = dict(reversed(list(SAMPLE.items())))
+        assert canonical(reordered, None) == canonical(SAMPLE, None), name
+        assert canonical(SAMPLE, None) == json.dumps(SAMPLE, sort_keys=True, separators=(",", ":"),
+                                                     ensure_ascii=False).encode("utf-8"), name
+
+
+def test_errors_and_edge_cases():
+    """Invalid input is a ValueError; stdlib-only values still serialize."""
+    for name, loads, dumpb, _, _ in _installed_backends():
+        try:
+            loads('{"partial": ')
+            assert False, f"{name} accepted invalid JSON"
+        except ValueError:
+            pass
+        assert json.loads(dumpb({1: "int key", "big": 2 ** 70}, None)) == {"1": "int key", "big": 2 ** 70}, name
+        assert json.loads(dumpb({"obj": object}, str)) == {"obj": str(object)}, name
+
+
+def test_unknown_backend_falls_back_to_stdlib():
+    assert json_backend._select("no-such-backend")[0] == "json"
+    assert json_backend.dumps({"a": "b"}).replace(" ", "") == '{"a":"b"}'
+
+
+if __name__ == "__main__":
+    print(f"🧪 Testing JSON backend ({json_backend.BACKEND})...")
+    test_every_installed_backend_round_trips()
+    test_errors_and_edge_cases()
+    test_unknown_backend_falls_back_to_stdlib()
+    print("✅ ALL TESTS PASSED!")
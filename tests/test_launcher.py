@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Test the dev and prod launch profiles, and worker recycling under the prod profile.
+"""
+import os
+import socket
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import httpx
+
+from proxy.launcher import LaunchConfig
+
+
+def test_profiles():
+    dev = LaunchConfig("dev", workers=8, max_requests=100).uvicorn_options()
+    assert dev["reload"] is True and "workers" not in dev and "limit_max_requests" not in dev
+    assert dev["port"] == 8082 and dev["loop"] in ("uvloop", "asyncio") and dev["http"] in ("httptools", "h11")
+
+    prod = LaunchConfig("prod", workers=4, max_requests=1000, graceful_timeout=5).uvicorn_options()
+    assert "reload" not in prod and prod["workers"] == 4
+    assert prod["limit_max_requests"] == 1000 and prod["timeout_graceful_shutdown"] == 5
+    assert LaunchConfig("prod").workers == (os.cpu_count() or 1)
+
+    # A lone worker that exits after MAX_REQUESTS would take the server down with it
+    assert "limit_max_requests" not in LaunchConfig("prod", workers=1, max_requests=1000).uvicorn_options()
+
+    try:
+        LaunchConfig("staging")
+        assert False, "expected ValueError"
+    except ValueError:
+        pass
+
+
+def test_arguments_default_to_environment():
+    environ = dict(os.environ)
+    os.environ.update({"SERVER_PROFILE": "prod", "PORT": "9000", "WORKERS": "3", "MAX_REQUESTS": "500"})
+    try:
+        config = LaunchConfig.from_args(["--workers", "6"])
+    finally:
+        os.environ.clear()
+        os.environ.update(environ)
+    assert (config.profile, config.port, config.workers, config.max_requests) == ("prod", 9000, 6, 500)
+    assert "6 workers" in config.describe() and "after 500+0 requests" in config.describe()
+
+
+def test_workers_are_recycled_without_failing_requests():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    environment = {**os.environ, "FAST_START": "true", "PREWARM": "false", "LOG_LEVEL": "WARNING"}
+    process = subprocess.Popen(
+        [sys.executable, "-m", "proxy.launcher", "--profile", "prod", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", "2", "--max-requests", "10", "--graceful-timeout", "5"],
+        cwd=ROOT, env=environment, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}/"
+    try:
+        deadline = time.time() + 60
+        while True:
+            try:
+                httpx.get(url)
+                break
+            except httpx.TransportError:
+                assert time.time() < deadline and process.poll() is None, "launcher did not start"
+                time.sleep(0.05)
+        pids, retried = set(), 0
+        for _ in range(40):
+            # A connection accepted just as a worker stops can be closed unread; clients retry those
+            for attempt in range(3):
+                try:
+                    response = httpx.get(url, timeout=30)
+                    break
+                except httpx.TransportError:
+                    retried += 1
+            assert response.status_code == 200
+            pids.add(response.json()["worker_pid"])
+    finally:
+        process.terminate()
+        process.wait(30)
+    # Two workers serving 40 requests, each retired after 10
+    assert len(pids) >= 3 and retried <= 3, (pids, retried)
+
+
+if __name__ == "__main__":
+    print("🧪 Testing launcher...")
+    test_profiles()
+    test_arguments_default_to_environment()
+    test_workers_are_recycled_without_failing_requests()
+    print("✅ ALL TESTS PASSED!")
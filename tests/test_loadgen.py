@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Test the mock upstream's streaming patterns and fault injection, and the load generator.
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+import server
+from providers.openai import OpenAIProvider
+from providers.registry import registry
+from tests.loadgen import ProcessSampler, Result, build_requests, report, send
+from tests.mock_upstream import BackgroundServer, create_mock_app
+
+
+async def _post(app, path, body):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://mock") as client:
+        try:
+            response = await client.post(path, json=body)
+            return response.status_code, response.text
+        except ConnectionResetError:
+            return "cut", None
+
+
+def _chunks(text):
+    return [json.loads(line[6:]) for line in text.splitlines() if line.startswith("data: {")]
+
+
+def test_mock_streams_chunks_and_tool_calls():
+    body = {"model": "gpt-4.1", "stream": True, "tools": [{"type": "function", "function": {"name": "Read"}},
+                                                          {"type": "function", "function": {"name": "Edit"}}]}
+    for style in ("fragments", "whole", "interleaved"):
+        app = create_mock_app(ttft=0, inter_token_delay=0, num_tokens=7, chunk_tokens=3, tool_calls=2,
+                              tool_call_style=style, tool_args_chars=100, tool_args_chunk=10)
+        status, text = asyncio.run(_post(app, "/v1/chat/completions", body))
+        deltas = [chunk["choices"][0]["delta"] for chunk in _chunks(text)]
+        assert status == 200 and text.endswith("data: [DONE]\n\n")
+        assert [delta["content"].count("tok") for delta in deltas if "content" in delta] == [3, 3, 1]
+
+        calls = [delta["tool_calls"][0] for delta in deltas if "tool_calls" in delta]
+        assert [call["function"]["name"] for call in calls if "id" in call] == ["Read", "Edit"]
+        arguments = ["".join(call["function"]["arguments"] for call in calls if call["index"] == i) for i in (0, 1)]
+        assert [json.loads(argument)["path"] for argument in arguments] == ["/src/module_0.py", "/src/module_1.py"]
+        assert len(calls) == {"whole": 4}.get(style, 2 + 2 * 10)
+        if style == "interleaved":
+            assert [call["index"] for call in calls[:4]] == [0, 1, 0, 1]
+        assert _chunks(text)[-1]["choices"][0]["finish_reason"] == "tool_calls"
+
+    # Gemini's own API: text chunks, then the function calls whole with the finish reason
+    app = create_mock_app(ttft=0, inter_token_delay=0, num_tokens=4, chunk_tokens=2, tool_calls=1)
+    gemini_body = {"contents": [], "tools": [{"functionDeclarations": [{"name": "Bash"}]}]}
+    _, text = asyncio.run(_post(app, "/v1beta/models/gemini-2.0-flash:streamGenerateContent?alt=sse", gemini_body))
+    candidates = [chunk["candidates"][0] for chunk in _chunks(text)]
+    assert [candidate["content"]["parts"][0].get("text") for candidate in candidates] == ["tok tok ", "tok tok ", None]
+    assert candidates[-1]["content"]["parts"][0]["functionCall"]["name"] == "Bash"
+    assert candidates[-1]["finishReason"] == "STOP" and "usageMetadata" in _chunks(text)[-1]
+    status, text = asyncio.run(_post(app, "/v1beta/models/gemini-2.0-flash:generateContent", gemini_body))
+    assert status == 200 and json.loads(text)["candidates"][0]["content"]["parts"][0]["text"] == "tok " * 4
+
+
+def test_injected_faults_are_repeatable():
+    def outcomes(seed):
+        app = create_mock_app(ttft=0, inter_token_delay=0, num_tokens=4, failure_rate=0.3,
+                              midstream_failure_rate=0.3, seed=seed)
+
+        async def scenario():
+            return [(await _post(app, "/v1/chat/completions", {"stream": True}))[0] for _ in range(30)]
+
+        return asyncio.run(scenario()), app.state
+
+    first, state = outcomes(7)
+    assert first == outcomes(7)[0] and first != outcomes(8)[0]
+    assert first.count(503) == state.failures_injected > 0
+    assert first.count("cut") == state.midstream_failures > 0
+
+
+def test_load_generator_against_the_proxy():
+    """Claude Code shaped requests with tool calls, through the proxy and the direct engine to the mock."""
+    requests = build_requests(12, seed=3)
+    assert requests == build_requests(12, seed=3) and {name for name, _, _ in requests} <= {
+        "quota", "title", "turn", "agent", "long"}
+    # Keep the test quick: the shortest streaming and non-streaming shapes
+    requests = [next(r for r in requests if r[1]), next(r for r in requests if not r[1])]
+
+    mock_app = create_mock_app(ttft=0.01, inter_token_delay=0, num_tokens=8, chunk_tokens=4, tool_calls=2)
+    original_provider = registry.get_provider("openai")
+    original_base = os.environ.get("OPENAI_API_BASE")
+    with BackgroundServer(mock_app) as mock:
+        os.environ["OPENAI_API_BASE"] = f"{mock.url}/v1"
+        provider = OpenAIProvider()
+        provider.api_key = "mock-key"
+        provider.upstream_engine = "httpx"
+        registry.register_provider(provider)
+
+        async def scenario():
+            transport = httpx.ASGITransport(app=server.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://proxy") as client:
+                results = [await send(client, "/v1/messages", *request) for request in requests]
+                async with client.stream("POST", "/v1/messages", content=requests[0][2]) as response:
+                    events = [json.loads(line[5:]) async for line in response.aiter_lines()
+                              if line.startswith("data: {")]
+            await provider.aclose()
+            return results, events
+
+        try:
+            results, events = asyncio.run(scenario())
+        finally:
+            registry.register_provider(original_provider)
+            if original_base is None:
+                os.environ.pop("OPENAI_API_BASE", None)
+            else:
+                os.environ["OPENAI_API_BASE"] = original_base
+
+    streamed, plain = results
+    assert streamed.ok and plain.ok and streamed.ttft is not None and streamed.ttft <= streamed.latency
+    assert plain.ttft is None
+    tools = [event["content_block"] for event in events
+             if event["type"] == "content_block_start" and event["content_block"]["type"] == "tool_use"]
+    assert len(tools) == 2 and tools[0]["name"].startswith("tool_")
+    arguments = "".join(event["delta"]["partial_json"] for event in events
+                        if event["type"] == "content_block_delta" and event["index"] == 1)
+    assert json.loads(arguments)["path"] == "/src/module_0.py"
+    assert events[-2]["delta"]["stop_reason"] == "tool_use"
+
+
+def test_process_sampler_and_report():
+    with ProcessSampler(os.getpid(), interval=0.05) as sampler:
+        deadline = time.process_time() + 0.3
+        while time.process_time() < deadline:
+            pass
+    usage = sampler.report()
+    assert usage["cpu_seconds"] >= 0.25 and usage["cpu_percent"] > 20 and usage["rss_mb_peak"] >= usage["rss_mb"] > 0
+
+    results = [Result("turn", True, 200, 0.1, 1.0), Result("turn", True, 200, 0.2, 2.0),
+               Result("quota", True, 200, None, 0.5), Result("turn", False, 200, 0.1, 0.4),
+               Result("quota", False, 503, None, 0.1)]
+    summary = report(results, 2.0, usage)
+    assert summary["requests"] == 5 and summary["rps"] == 1.5
+    assert summary["errors"] == {"200": 1, "503": 1}
+    assert summary["latency_ms"]["p50"] == 1000.0 and summary["ttft_ms"]["p99"] == 200.0
+    assert summary["shapes"]["quota"] == {"requests": 1, "latency_ms": {"p50": 500.0, "p95": 500.0, "p99": 500.0},
+                                          "ttft_ms": None}
+    assert summary["proxy"] == usage
+
+
+if __name__ == "__main__":
+    print("🧪 Testing mock upstream and load generator...")
+    test_mock_streams_chunks_and_tool_calls()
+    test_injected_faults_are_repeatable()
+    test_load_generator_against_the_proxy()
+    test_process_sampler_and_report()
+    print("✅ ALL TESTS PASSED!")
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Test the queued logging pipeline.
+"""
+import io
+import json
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from proxy import logs
+from proxy.logs import LogPipeline
+
+
+class SlowStream(io.StringIO):
+    """A terminal that takes its time to take each write."""
+
+    def write(self, text):
+        time.sleep(0.05)
+        return super().write(text)
+
+
+def _logger(name, pipeline):
+    logger = logging.getLogger(name)
+    logger.propagate = False
+    logger.handlers = [pipeline.handler]
+    logger.setLevel(logging.DEBUG)
+    return logger
+
+
+def _run(pipeline, emit):
+    pipeline.start()
+    try:
+        emit()
+    finally:
+        pipeline.stop()
+    return pipeline.output.stream.getvalue()
+
+
+def test_text_format_and_request_lines():
+    pipeline = LogPipeline(stream=io.StringIO())
+    logger = _logger("test_logs.text", pipeline)
+    requests = _logger("anthropic_proxy.requests", pipeline)
+    original = logs.request_logger
+    logs.request_logger = requests
+    try:
+        output = _run(pipeline, lambda: (
+            logger.info("Routed %s to %s", "sonnet", "openai/gpt-4.1"),
+            logs.log_request("POST", "/v1/messages?beta=true", "claude-sonnet-4", "openai/gpt-4.1", 3, 2, 200),
+        ))
+    finally:
+        logs.request_logger = original
+        requests.handlers = []
+        requests.propagate = True
+    lines = output.splitlines()
+    assert lines[0].endswith(" - INFO - Routed sonnet to openai/gpt-4.1")
+    assert "POST /v1/messages" in lines[1] and "?beta" not in lines[1] and "200 OK" in lines[1]
+    assert "claude-sonnet-4" in lines[2] and "gpt-4.1" in lines[2] and "2 tools" in lines[2] and "3 messages" in lines[2]
+
+
+def test_json_format():
+    pipeline = LogPipeline(json_format=True, stream=io.StringIO())
+    logger = _logger("test_logs.json", pipeline)
+
+    def emit():
+        logger.warning("Backend %s failed", "azure")
+        try:
+            raise ValueError("bad")
+        except ValueError:
+            logger.exception("Conversion failed")
+        logger.info("Request", extra={"request": {"method": "POST", "status": 529}})
+
+    entries = [json.loads(line) for line in _run(pipeline, emit).splitlines()]
+    assert entries[0]["level"] == "WARNING" and entries[0]["message"] == "Backend azure failed"
+    assert entries[0]["logger"] == "test_logs.json" and entries[0]["time"].endswith("Z")
+    assert "ValueError: bad" in entries[1]["exception"]
+    assert entries[2]["request"] == {"method": "POST", "status": 529}
+
+
+def test_slow_output_does_not_block_callers_and_full_queue_drops():
+    pipeline = LogPipeline(queue_size=5, stream=SlowStream())
+    logger = _logger("test_logs.slow", pipeline)
+    pipeline.start()
+    try:
+        started = time.perf_counter()
+        for i in range(20):
+            logger.info("record %d", i)
+        elapsed = time.perf_counter() - started
+        dropped = pipeline.handler.dropped
+    finally:
+        pipeline.stop()
+    # Twenty writes take a second; queuing them takes next to nothing
+    assert elapsed < 0.05
+    assert dropped >= 10
+    written = pipeline.output.stream.getvalue().splitlines()
+    assert len(written) == 20 - dropped and written[0].endswith("record 0")
+
+
+def test_library_noise_is_filtered_and_levels_come_from_env():
+    pipeline = LogPipeline(stream=io.StringIO())
+    library = _logger("LiteLLM.test_logs", pipeline)
+    output = _run(pipeline, lambda: (
+        library.warning("selected model name for cost calculation: gpt-4.1"),
+        library.warning("Provider rate limited"),
+    ))
+    assert "cost calculation" not in output and "Provider rate limited" in output
+
+    environ = dict(os.environ)
+    os.environ.update({"LOG_LEVEL": "debug", "LOG_FORMAT": "JSON", "LOG_LIBRARY_LEVEL": "loud"})
+    try:
+        pipeline = LogPipeline.from_env(stream=io.StringIO())
+    finally:
+        os.environ.clear()
+        os.environ.update(environ)
+    assert (pipeline.level, pipeline.library_level, pipeline.json_format) == (logging.DEBUG, logging.WARNING, True)
+    assert pipeline.stats()["format"] == "json"
+
+
+if __name__ == "__main__":
+    print("🧪 Testing logging...")
+    test_text_format_and_request_lines()
+    test_json_format()
+    test_slow_output_does_not_block_callers_and_full_queue_drops()
+    test_library_noise_is_filtered_and_levels_come_from_env()
+    print("✅ ALL TESTS PASSED!")
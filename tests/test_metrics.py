@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Test the Prometheus metrics and the /metrics endpoint.
+"""
+import asyncio
+import os
+import re
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+import server
+from proxy.metrics import Counter, Histogram, Metrics
+from tests.helpers import make_chunk
+
+
+def _sample(text, name, **labels):
+    """The value of the first sample of name with these labels in exposition text, or None."""
+    for line in text.splitlines():
+        series, value = line.rsplit(" ", 1)
+        if series.split("{")[0] == name and all(f'{key}="{expected}"' in series for key, expected in labels.items()):
+            return float(value)
+    return None
+
+
+def test_exposition_format():
+    histogram = Histogram("stage_seconds", "Stages.", ("stage",), buckets=(0.1, 1.0))
+    histogram.observe(("parse",), 0.05)
+    histogram.observe(("parse",), 0.5)
+    histogram.observe(("parse",), 5)
+    counter = Counter("errors_total", "Errors.", ("status",))
+    counter.inc(('say "hi"\n',))
+    lines = histogram.render() + counter.render()
+    assert lines[:2] == ["# HELP stage_seconds Stages.", "# TYPE stage_seconds histogram"]
+    assert lines[2:7] == [
+        'stage_seconds_bucket{stage="parse",le="0.1"} 1',
+        'stage_seconds_bucket{stage="parse",le="1"} 2',
+        'stage_seconds_bucket{stage="parse",le="+Inf"} 3',
+        'stage_seconds_sum{stage="parse"} 5.55',
+        'stage_seconds_count{stage="parse"} 3',
+    ]
+    assert lines[-1] == 'errors_total{status="say \\"hi\\"\\n"} 1'
+
+
+def test_label_sets_are_capped():
+    counter = Counter("requests_total", "Requests.", ("model",), max_series=2)
+    for model in ("a", "b", "c", "d"):
+        counter.inc((model,))
+    assert counter.value(("a",)) == 1 and counter.value(("c",)) == 0
+    assert counter.value(("other",)) == 2
+
+
+def test_stream_processing_excludes_upstream_waits():
+    metrics = Metrics()
+    labels = ("sonnet", "openai/gpt-4.1", "openai")
+
+    async def upstream():
+        for i in range(3):
+            await asyncio.sleep(0.05)
+            yield i
+
+    async def convert(chunks):
+        async for chunk in chunks:
+            yield str(chunk).encode()
+
+    async def scenario():
+        timer = metrics.stream_timer(labels)
+        frames = [frame async for frame in timer.frames(convert(timer.upstream(upstream())))]
+        return frames, timer.waiting
+
+    frames, waiting = asyncio.run(scenario())
+    assert frames == [b"0", b"1", b"2"] and waiting >= 0.15
+    series = metrics.stage_seconds._series[("stream_processing",) + labels]
+    assert series[-1] == 1 and series[-2] < 0.05
+    assert metrics.active_streams.value() == 0
+
+
+def test_endpoint_reports_stages_tokens_and_errors():
+    async def fake_acompletion(**kwargs):
+        if kwargs.get("stream"):
+            async def stream():
+                yield make_chunk("Hel")
+                yield make_chunk("lo", "stop", SimpleNamespace(prompt_tokens=7, completion_tokens=2))
+            return stream()
+        return {"choices": [{"message": {"role": "assistant", "content": "hi"}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 5, "completion_tokens": 1}}
+
+    body = {"model": "openai/gpt-4.1", "max_tokens": 50, "messages": [{"role": "user", "content": "Hi"}]}
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://proxy") as client:
+            completion = await client.post("/v1/messages", json=body)
+            streamed = await client.post("/v1/messages", json={**body, "stream": True})
+            invalid = await client.post("/v1/messages", json={"model": "openai/gpt-4.1"})
+            scraped = await client.get("/metrics")
+            return completion, streamed, invalid, scraped
+
+    original = (server.litellm.acompletion, server.metrics)
+    server.litellm.acompletion = fake_acompletion
+    server.metrics = Metrics()
+    try:
+        completion, streamed, invalid, scraped = asyncio.run(scenario())
+    finally:
+        server.litellm.acompletion, server.metrics = original
+
+    assert completion.status_code == 200 and completion.json()["content"][0]["text"] == "hi"
+    assert "Hello" not in streamed.text and "Hel" in streamed.text
+    assert invalid.status_code == 422
+    assert scraped.headers["content-type"].startswith("text/plain")
+    text = scraped.text
+    labels = {"original_model": "openai/gpt-4.1", "model": "openai/gpt-4.1", "provider": "openai"}
+    for stage, count in [("parse", 2), ("convert", 2), ("upstream_total", 2), ("upstream_ttft", 1),
+                         ("stream_processing", 1), ("serialize", 1)]:
+        assert _sample(text, "anthropic_proxy_stage_seconds_count", stage=stage, **labels) == count, stage
+    assert _sample(text, "anthropic_proxy_tokens_total", direction="input", **labels) == 12
+    assert _sample(text, "anthropic_proxy_tokens_total", direction="output", **labels) == 3
+    assert _sample(text, "anthropic_proxy_errors_total", status="422") == 1
+    assert _sample(text, "anthropic_proxy_active_streams") == 0
+    assert re.search(r'anthropic_proxy_stage_seconds_bucket\{stage="parse",.*le="\+Inf"\} 2', text)
+
+
+def test_streamed_tokens_come_from_the_trailing_usage_chunk():
+    """OpenAI-style streams send the usage after the finish, where handle_streaming stops reading."""
+    async def fake_acompletion(**kwargs):
+        async def stream():
+            yield make_chunk("Hello")
+            yield make_chunk(None, "stop")
+            yield SimpleNamespace(usage=SimpleNamespace(prompt_tokens=9, completion_tokens=4), choices=[])
+        return stream()
+
+    body = {"model": "openai/gpt-4.1", "max_tokens": 50, "stream": True,
+            "messages": [{"role": "user", "content": "Hi"}]}
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://proxy") as client:
+            streamed = await client.post("/v1/messages", json=body)
+            return streamed, await client.get("/metrics")
+
+    original = (server.litellm.acompletion, server.metrics)
+    server.litellm.acompletion = fake_acompletion
+    server.metrics = Metrics()
+    try:
+        streamed, scraped = asyncio.run(scenario())
+    finally:
+        server.litellm.acompletion, server.metrics = original
+
+    assert "Hello" in streamed.text and '"stop_reason":"end_turn"' in streamed.text.replace(" ", "")
+    labels = {"original_model": "openai/gpt-4.1", "model": "openai/gpt-4.1", "provider": "openai"}
+    assert _sample(scraped.text, "anthropic_proxy_tokens_total", direction="input", **labels) == 9
+    assert _sample(scraped.text, "anthropic_proxy_tokens_total", direction="output", **labels) == 4
+
+
+if __name__ == "__main__":
+    print("🧪 Testing metrics...")
+    test_exposition_format()
+    test_label_sets_are_capped()
+    test_stream_processing_excludes_upstream_waits()
+    test_endpoint_reports_stages_tokens_and_errors()
+    test_streamed_tokens_come_from_the_trailing_usage_chunk()
+    print("✅ ALL TESTS PASSED!")
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Test priority classes and weighted fair queuing of admitted calls.
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+import server
+from proxy.admission import AdmissionController, OverloadedError
+from proxy.priority import FairQueue, Priority, PriorityClassifier
+
+INTERACTIVE = 4.0
+BACKGROUND = 1.0
+
+
+def test_classifier_precedence_and_flows():
+    classifier = PriorityClassifier()
+    assert classifier.classify({}, None, "big") == Priority("interactive", INTERACTIVE, "anonymous")
+    assert classifier.classify({}, None, "small").name == "background"
+    assert classifier.classify({}, None, "passthrough").name == "interactive"
+    # Metadata overrides the model class, the header overrides both; unknown values are ignored
+    assert classifier.classify({}, {"priority": "interactive"}, "small").name == "interactive"
+    headers = {"x-request-priority": "Background"}
+    assert classifier.classify(headers, {"priority": "interactive"}, "big").name == "background"
+    assert classifier.classify({"x-request-priority": "urgent"}, None, "small").name == "background"
+
+    assert classifier.classify({}, {"user_id": "alice"}, "big").flow == "user:alice"
+    by_key = classifier.classify({"x-api-key": "sk-secret"}, None, "big").flow
+    assert by_key.startswith("key:") and "secret" not in by_key
+    assert by_key == classifier.classify({"x-api-key": "sk-secret"}, {}, "small").flow
+
+
+def test_fair_queue_serves_flows_by_weight():
+    queue = FairQueue()
+    for i in range(10):
+        queue.push(("agent", i), "agent", BACKGROUND, 1)
+    for i in range(10):
+        queue.push(("user", i), "user", INTERACTIVE, 1)
+    order = [queue.pop()[0] for _ in range(10)]
+    assert order.count("user") == 8 and order.count("agent") == 2
+    # Within a flow, items keep their order
+    queue.push(("late", 0), "late", BACKGROUND, 1)
+    rest = [queue.pop() for _ in range(len(queue))]
+    assert [i for name, i in rest if name == "agent"] == list(range(2, 10))
+    assert ("late", 0) in rest[:6]
+
+
+def _admit_all(admission, limiters, calls):
+    """Queue calls (priority, label) at once on an empty bucket; return labels in admission order."""
+    async def scenario():
+        limiters[0].requests.take(limiters[0].requests.capacity, time.monotonic())
+        order = []
+
+        async def one(priority, label):
+            try:
+                await admission.admit(limiters, 1, priority)
+                order.append(label)
+            except OverloadedError:
+                order.append(f"shed {label}")
+
+        await asyncio.gather(*(one(priority, label) for priority, label in calls))
+        return order
+
+    return asyncio.run(scenario())
+
+
+def test_interactive_calls_overtake_a_runaway_agent():
+    """100 calls/s: a background agent's backlog of 20 does not hold up an interactive turn."""
+    admission = AdmissionController({"openai": {"rpm": 6000}}, timeout=5)
+    agent = Priority("background", BACKGROUND, "user:agent")
+    human = Priority("interactive", INTERACTIVE, "user:human")
+    calls = [(agent, f"agent {i}") for i in range(20)] + [(human, "human")]
+    order = _admit_all(admission, admission.limiters("openai"), calls)
+    assert order.index("human") <= 2
+    classes = admission.stats()["openai"]["classes"]
+    assert classes["background"]["admitted"] == 20 and classes["interactive"]["admitted"] == 1
+
+
+def test_users_of_one_class_share_the_queue():
+    admission = AdmissionController({"openai": {"rpm": 6000}}, timeout=5)
+    flood = [(Priority("interactive", INTERACTIVE, "user:a"), f"a{i}") for i in range(10)]
+    other = [(Priority("interactive", INTERACTIVE, "user:b"), f"b{i}") for i in range(2)]
+    order = _admit_all(admission, admission.limiters("openai"), flood + other)
+    assert order.index("b0") <= 2 and order.index("b1") <= 4
+
+
+def test_full_queue_sheds_background_work_first():
+    admission = AdmissionController({"openai": {"rpm": 6000}}, timeout=5, max_queue=3)
+    agent = Priority("background", BACKGROUND, "user:agent")
+    calls = [(agent, f"agent {i}") for i in range(3)] + [(Priority("interactive", INTERACTIVE, "user:human"), "human")]
+    order = _admit_all(admission, admission.limiters("openai"), calls)
+    assert order == ["shed agent 2", "human", "agent 0", "agent 1"]
+    stats = admission.stats()["openai"]
+    assert stats["classes"]["background"]["shed"] == 1 and stats["queued"] == 0
+
+
+def test_endpoint_classifies_requests():
+    async def fake_acompletion(**kwargs):
+        return {"choices": [{"message": {"role": "assistant", "content": "hi"}, "finish_reason": "stop"}]}
+
+    body = {"model": "claude-3-haiku-20240307", "max_tokens": 50, "metadata": {"user_id": "alice"},
+            "messages": [{"role": "user", "content": "Hi"}]}
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://proxy") as client:
+            await client.post("/v1/messages", json=body)
+            await client.post("/v1/messages", json=body, headers={"x-request-priority": "interactive"})
+
+    backend = server.registry.router.resolve("claude-3-haiku-20240307").model
+    provider = server.registry.get_provider_by_model(backend).name
+    original = (server.litellm.acompletion, server.admission)
+    server.litellm.acompletion = fake_acompletion
+    server.admission = AdmissionController({provider: {"rpm": 600}})
+    try:
+        asyncio.run(scenario())
+        classes = server.admission.stats()[provider]["classes"]
+    finally:
+        server.litellm.acompletion, server.admission = original
+
+    assert classes["background"]["admitted"] == 1 and classes["interactive"]["admitted"] == 1
+
+
+if __name__ == "__main__":
+    print("🧪 Testing priority scheduling...")
+    test_classifier_precedence_and_flows()
+    test_fair_queue_serves_flows_by_weight()
+    test_interactive_calls_overtake_a_runaway_agent()
+    test_users_of_one_class_share_the_queue()
+    test_full_queue_sheds_background_work_first()
+    test_endpoint_classifies_requests()
+    print("✅ ALL TESTS PASSED!")
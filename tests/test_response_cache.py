@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Test the exact-match response cache and its replay through the endpoints.
+"""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+
+import server
+from proxy.response_cache import MemoryStore, ResponseCache, SqliteStore, create_response_cache
+from tests.helpers import make_chunk
+
+PAYLOAD = {
+    "model": "openai/gpt-4.1-mini",
+    "messages": [{"role": "user", "content": "Write a title for this conversation"}],
+    "max_tokens": 50,
+    "temperature": 0,
+    "stream": False,
+}
+ENTRY = {"content": "A title", "tool_calls": [], "finish_reason": "stop",
+         "usage": {"prompt_tokens": 10, "completion_tokens": 2}}
+
+
+def test_key_ignores_stream_flag_api_key_and_key_order():
+    key = ResponseCache.key(PAYLOAD)
+    reordered = dict(reversed(list({**PAYLOAD, "stream": True, "api_key": "sk-other"}.items())))
+    assert ResponseCache.key(reordered) == key
+    assert ResponseCache.key({**PAYLOAD, "max_tokens": 51}) != key
+    assert ResponseCache.key({**PAYLOAD, "messages": [{"role": "user", "content": "Other"}]}) != key
+    assert ResponseCache.cacheable(PAYLOAD)
+    assert not ResponseCache.cacheable({**PAYLOAD, "temperature": 1.0})
+
+
+def test_stores_expire_and_evict_by_bytes():
+    """Both stores drop expired entries and the least recently used ones past the byte cap."""
+    with tempfile.TemporaryDirectory() as directory:
+        for store in (MemoryStore(max_bytes=250), SqliteStore(os.path.join(directory, "cache.sqlite3"), 250)):
+            store.put("expired", b"x" * 10, expires_at=100.0, now=0.0)
+            assert store.get("expired", now=99.0) == b"x" * 10
+            assert store.get("expired", now=100.0) is None
+
+            for now, name in enumerate(("a", "b", "c"), start=1):
+                store.put(name, name.encode() * 100, expires_at=1e12, now=now)
+                # Touch "a" so "b" is the least recently used
+                store.get("a", now=now + 0.5)
+            assert store.get("b", now=4.0) is None
+            assert store.get("a", now=4.0) == b"a" * 100 and store.get("c", now=4.0) == b"c" * 100
+            assert store.stats()["bytes"] <= 250 and store.stats()["evictions"] >= 1
+
+            # Entries larger than the whole cache are never stored
+            store.put("huge", b"h" * 1000, expires_at=1e12, now=1.0)
+            assert store.get("huge", now=1.0) is None
+
+
+def test_sqlite_store_survives_restart():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "cache.sqlite3")
+        key = ResponseCache.key(PAYLOAD)
+        asyncio.run(create_response_cache("sqlite", 60, 1 << 20, path).put(key, ENTRY))
+        reopened = create_response_cache("sqlite", 60, 1 << 20, path)
+        assert asyncio.run(reopened.get(key)) == ENTRY
+        assert create_response_cache("off", 60, 1 << 20, path) is None
+
+
+def _stream_chunks():
+    def tool_calls(**fields):
+        function = SimpleNamespace(name=fields.pop("name", None), arguments=fields.pop("arguments"))
+        return [SimpleNamespace(index=0, function=function, **fields)]
+
+    return [
+        make_chunk("Let me "),
+        make_chunk("check."),
+        make_chunk(tool_calls=tool_calls(id="call_1", name="Read", arguments='{"path"')),
+        make_chunk(tool_calls=tool_calls(id=None, arguments=': "a.py"}')),
+        make_chunk(finish_reason="tool_calls", usage=SimpleNamespace(prompt_tokens=12, completion_tokens=7)),
+    ]
+
+
+def test_streams_are_stored_with_the_trailing_usage():
+    """The usage chunk after the finish is read even when the consumer stops at the finish."""
+    async def upstream():
+        yield make_chunk("A title")
+        yield make_chunk(finish_reason="stop")
+        yield SimpleNamespace(usage=SimpleNamespace(prompt_tokens=12, completion_tokens=3), choices=[])
+
+    async def scenario():
+        cache = ResponseCache(MemoryStore(1 << 20))
+        recorded = cache.record_stream(upstream(), "key")
+        async for chunk in recorded:
+            if chunk.choices[0].finish_reason:
+                break
+        await recorded.aclose()
+        return await cache.get("key")
+
+    entry = asyncio.run(scenario())
+    assert entry["content"] == "A title" and entry["usage"] == {"prompt_tokens": 12, "completion_tokens": 3}
+
+
+def _events(body):
+    """Parsed SSE events, with consecutive deltas of a block merged and the message id dropped."""
+    events = []
+    for frame in body.split("\n\n"):
+        data = frame.rpartition("data: ")[2]
+        if not data or data == "[DONE]":
+            continue
+        event = json.loads(data)
+        if event["type"] == "message_start":
+            del event["message"]["id"]
+        previous = events[-1] if events else None
+        if (event["type"] == "content_block_delta" and previous and previous["type"] == "content_block_delta"
+                and previous["index"] == event["index"]):
+            for field in ("text", "partial_json"):
+                if field in event["delta"]:
+                    previous["delta"][field] += event["delta"][field]
+            continue
+        events.append(event)
+    return events
+
+
+def test_endpoint_answers_repeats_from_the_cache():
+    """Repeated temperature 0 requests skip upstream; streams replay the same events."""
+    calls = []
+
+    async def fake_acompletion(**kwargs):
+        calls.append(kwargs)
+        if not kwargs["stream"]:
+            return {"choices": [{"message": {"role": "assistant", "content": "A title"}, "finish_reason": "stop"}],
+                    "usage": {"prompt_tokens": 10, "completion_tokens": 2}}
+
+        async def stream():
+            for chunk in _stream_chunks():
+                yield chunk
+        return stream()
+
+    request = {"model": "openai/gpt-4.1-mini", "max_tokens": 50, "temperature": 0,
+               "messages": [{"role": "user", "content": "Write a title"}]}
+    original = (server.litellm.acompletion, server.response_cache)
+    server.litellm.acompletion = fake_acompletion
+    server.response_cache = ResponseCache(MemoryStore(1 << 20))
+    try:
+        client = TestClient(server.app)
+        first = client.post("/v1/messages", json=request).json()
+        second = client.post("/v1/messages", json=request).json()
+        assert len(calls) == 1
+        assert second["content"] == first["content"] == [{"type": "text", "text": "A title"}]
+        assert second["usage"] == first["usage"] and second["id"] != first["id"]
+
+        # A non-deterministic request always goes upstream
+        client.post("/v1/messages", json={**request, "temperature": 0.7})
+        assert len(calls) == 2
+
+        # A streaming request with another prompt is recorded, then replayed
+        streaming = {**request, "stream": True, "messages": [{"role": "user", "content": "Read a.py"}]}
+        upstream_body = client.post("/v1/messages", json=streaming).text
+        replayed_body = client.post("/v1/messages", json=streaming).text
+        assert len(calls) == 3
+        # The replay sends each block's deltas as one frame; otherwise the events are identical
+        assert _events(replayed_body) == _events(upstream_body)
+        assert _events(replayed_body)[-2]["delta"]["stop_reason"] == "tool_use"
+
+        # The streamed entry answers the same prompt without streaming too
+        cached = client.post("/v1/messages", json={**streaming, "stream": False}).json()
+        assert len(calls) == 3
+        # gpt-4.1-mini is not a Claude model, so the tool call is rendered as text
+        assert cached["content"][0]["text"].startswith("Let me check.\n\nTool usage:\nTool: Read")
+        assert cached["stop_reason"] == "tool_use" and cached["usage"]["output_tokens"] == 7
+        assert server.response_cache.stats()["hits"] == 3
+    finally:
+        server.litellm.acompletion, server.response_cache = original
+
+
+if __name__ == "__main__":
+    print("🧪 Testing the response cache...")
+    test_key_ignores_stream_flag_api_key_and_key_order()
+    test_stores_expire_and_evict_by_bytes()
+    test_sqlite_store_survives_restart()
+    test_streams_are_stored_with_the_trailing_usage()
+    test_endpoint_answers_repeats_from_the_cache()
+    print("✅ ALL TESTS PASSED!")
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Test the compiled model routing table.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+
+from providers.registry import registry
+from providers.routing import ModelRouter
+
+PREFIXES = {"openai": "openai", "gemini": "gemini", "azure": "azure", "anthropic": "anthropic"}
+OPENAI_MODELS = ["gpt-4o", "gpt-4.1", "gpt-4.1-mini"]
+GEMINI_MODELS = ["gemini-2.5-pro-preview-03-25", "gemini-2.0-flash"]
+
+
+def _router(preferred="openai", big="gpt-4.1", small="gpt-4.1-mini", azure_available=False, **kwargs):
+    return ModelRouter(PREFIXES, OPENAI_MODELS, GEMINI_MODELS, preferred, big, small, azure_available, **kwargs)
+
+
+def test_claude_models_follow_the_preferred_provider():
+    """haiku and sonnet names map to SMALL_MODEL and BIG_MODEL on the preferred provider."""
+    router = _router()
+    assert router.resolve("claude-3-haiku-20240307").model == "openai/gpt-4.1-mini"
+    assert router.resolve("anthropic/claude-3-5-sonnet-20241022").model == "openai/gpt-4.1"
+
+    azure = _router("azure", "big-deployment", "small-deployment", azure_available=True)
+    assert azure.resolve("Haiku").model == "azure/small-deployment"
+    # Azure is only used when it is configured
+    assert _router("azure", azure_available=False).resolve("sonnet").model == "openai/gpt-4.1"
+
+    google = _router("google", "gemini-2.5-pro-preview-03-25", "gemini-2.0-flash")
+    assert google.resolve("claude-sonnet-4").model == "gemini/gemini-2.5-pro-preview-03-25"
+    assert _router("google").resolve("claude-sonnet-4").model == "openai/gpt-4.1"
+
+
+def test_known_and_unknown_models():
+    """Known bare names get their prefix; everything else passes through."""
+    router = _router()
+    assert router.resolve("gemini-2.0-flash") == ("gemini/gemini-2.0-flash", "gemini", "known")
+    assert router.resolve("anthropic/gpt-4o") == ("openai/gpt-4o", "openai", "known")
+    assert router.resolve("openai/gpt-4o") == ("openai/gpt-4o", "openai", "passthrough")
+    assert router.resolve("azure/my-deployment") == ("azure/my-deployment", "azure", "passthrough")
+    assert router.resolve("claude-opus-4") == ("claude-opus-4", None, "passthrough")
+
+
+def test_unseen_names_are_memoized_up_to_the_cap():
+    router = _router(max_memoized=2)
+    for name in ("claude-a-haiku", "claude-b-haiku", "claude-c-haiku"):
+        assert router.resolve(name).rule == "small"
+    described = router.describe()
+    assert described["memoized"] == 2
+    assert "claude-a-haiku" in described["routes"] and "claude-c-haiku" not in described["routes"]
+
+
+def test_registry_and_routes_endpoint_share_the_table():
+    """ProviderRegistry.map_model and /v1/routes resolve through the same router."""
+    import server
+
+    mapped, provider = registry.map_model("claude-3-haiku-20240307")
+    assert mapped == registry.router.resolve("claude-3-haiku-20240307").model
+    assert provider is registry.get_provider(registry.router.resolve(mapped).provider)
+
+    client = TestClient(server.app)
+    single = client.get("/v1/routes", params={"model": "claude-3-haiku-20240307"}).json()
+    assert single["model"] == mapped and single["rule"] == "small"
+    table = client.get("/v1/routes").json()
+    assert table["routes"]["claude-3-haiku-20240307"]["model"] == mapped
+    request = server.MessagesRequest(model="claude-3-haiku-20240307", max_tokens=1,
+                                     messages=[{"role": "user", "content": "hi"}])
+    assert request.model == mapped
+
+
+def test_registry_keeps_prefixed_names():
+    """map_model leaves names with a provider prefix as they are, Claude names included."""
+    for name in ("openai/claude-3-haiku-20240307", "anthropic/claude-3-5-sonnet-20241022", "openai/gpt-4o"):
+        mapped, provider = registry.map_model(name)
+        assert mapped == name
+        assert provider is registry.get_provider_by_model(name)
+
+
+if __name__ == "__main__":
+    print("🧪 Testing model routing...")
+    test_claude_models_follow_the_preferred_provider()
+    test_known_and_unknown_models()
+    test_unseen_names_are_memoized_up_to_the_cap()
+    test_registry_and_routes_endpoint_share_the_table()
+    test_registry_keeps_prefixed_names()
+    print("✅ ALL TESTS PASSED!")
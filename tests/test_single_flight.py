@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Test single-flight coalescing of identical in-flight requests.
+"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+import server
+from proxy.single_flight import SingleFlight
+from tests.helpers import make_chunk
+
+
+def _chunks():
+    return [make_chunk("one "), make_chunk("two "), make_chunk("three"), make_chunk(None, "stop")]
+
+
+async def _slow_stream(chunks, delay=0.01):
+    for chunk in chunks:
+        await asyncio.sleep(delay)
+        yield chunk
+
+
+def test_concurrent_calls_share_one_upstream_call():
+    """Duplicates attach to the leader's call; errors reach every caller."""
+    calls = []
+
+    async def factory():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"id": "shared"}
+
+    async def failing():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        raise RuntimeError("upstream down")
+
+    async def scenario():
+        flight = SingleFlight()
+        results = await asyncio.gather(*(flight.call("k", factory) for _ in range(5)))
+        errors = await asyncio.gather(*(flight.call("k", failing) for _ in range(3)), return_exceptions=True)
+        return flight, results, errors
+
+    flight, results, errors = asyncio.run(scenario())
+    assert len(calls) == 2
+    assert all(result is results[0] for result in results)
+    assert all(isinstance(error, RuntimeError) for error in errors)
+    assert flight.stats() == {"upstream_calls": 2, "coalesced": 6, "coalesced_streams": 0, "in_flight": 0}
+
+
+def test_call_is_cancelled_only_when_every_caller_is_gone():
+    started = []
+
+    async def factory():
+        started.append(1)
+        await asyncio.sleep(0.1)
+        return "done"
+
+    async def scenario():
+        flight = SingleFlight()
+        leader = asyncio.ensure_future(flight.call("k", factory))
+        follower = asyncio.ensure_future(flight.call("k", factory))
+        await asyncio.sleep(0.01)
+        # The leader going away must not cancel the follower's call
+        leader.cancel()
+        assert await follower == "done"
+
+        first = asyncio.ensure_future(flight.call("k", factory))
+        await asyncio.sleep(0.01)
+        task = flight._calls["k"].task
+        first.cancel()
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        return task.cancelled(), flight
+
+    upstream_cancelled, flight = asyncio.run(scenario())
+    assert len(started) == 2
+    assert upstream_cancelled and flight.stats()["in_flight"] == 0
+
+
+def test_streams_fan_out_and_late_joiners_replay():
+    """Every subscriber sees the whole chunk sequence, however late it attached."""
+    opens = []
+
+    async def open_stream():
+        opens.append(1)
+        return _slow_stream(_chunks())
+
+    async def read(flight, delay=0.0):
+        await asyncio.sleep(delay)
+        stream = await flight.stream("k", open_stream)
+        return [chunk.choices[0].delta.content for chunk in [c async for c in stream]]
+
+    async def scenario():
+        flight = SingleFlight()
+        # The last reader attaches after two chunks have already been received
+        results = await asyncio.gather(read(flight), read(flight), read(flight, delay=0.025))
+        return flight, results
+
+    flight, results = asyncio.run(scenario())
+    assert len(opens) == 1
+    assert results == [["one ", "two ", "three", None]] * 3
+    assert flight.stats()["coalesced_streams"] == 2
+
+
+def test_stream_is_cancelled_when_unread_followers_are_dropped():
+    """A follower whose client left before reading does not keep the upstream call going."""
+    closed = []
+
+    async def endless():
+        try:
+            while True:
+                await asyncio.sleep(0.01)
+                yield make_chunk("more ")
+        finally:
+            closed.append(1)
+
+    async def open_stream():
+        return endless()
+
+    async def scenario():
+        flight = SingleFlight()
+        leader = await flight.stream("k", open_stream)
+        follower = await flight.stream("k", open_stream)
+        task = flight._streams["k"].task
+        assert (await leader.__anext__()).choices[0].delta.content == "more "
+        await leader.aclose()
+        assert not task.done()
+        # The follower's response never started
+        del follower
+        await asyncio.sleep(0.05)
+        return task.cancelled(), flight
+
+    upstream_cancelled, flight = asyncio.run(scenario())
+    assert upstream_cancelled and closed == [1] and flight.stats()["in_flight"] == 0
+
+
+def test_stream_open_errors_reach_every_caller():
+    async def open_stream():
+        await asyncio.sleep(0.02)
+        raise ConnectionError("refused")
+
+    async def scenario():
+        flight = SingleFlight()
+        return await asyncio.gather(*(flight.stream("k", open_stream) for _ in range(3)), return_exceptions=True)
+
+    errors = asyncio.run(scenario())
+    assert all(isinstance(error, ConnectionError) for error in errors)
+
+
+def test_endpoint_coalesces_concurrent_streams():
+    """Concurrent identical streaming requests get full, separate SSE responses from one upstream call."""
+    calls = []
+
+    async def fake_acompletion(**kwargs):
+        calls.append(kwargs)
+        await asyncio.sleep(0.02)
+        return _slow_stream(_chunks())
+
+    body = {"model": "openai/gpt-4.1", "max_tokens": 50, "stream": True,
+            "messages": [{"role": "user", "content": "Count to three"}]}
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://proxy") as client:
+            return await asyncio.gather(*(client.post("/v1/messages", json=body) for _ in range(4)))
+
+    original = (server.litellm.acompletion, server.single_flight)
+    server.litellm.acompletion = fake_acompletion
+    server.single_flight = SingleFlight()
+    try:
+        responses = asyncio.run(scenario())
+        stats = server.single_flight.stats()
+    finally:
+        server.litellm.acompletion, server.single_flight = original
+
+    assert len(calls) == 1
+    assert stats["coalesced_streams"] == 3
+    message_ids = set()
+    for response in responses:
+        assert response.status_code == 200
+        assert response.text.count("text_delta") == 3 and "message_stop" in response.text
+        message_ids.add(response.text.split('"id":', 1)[1].split(",", 1)[0])
+    # Each subscriber runs its own handle_streaming
+    assert len(message_ids) == 4
+
+
+if __name__ == "__main__":
+    print("🧪 Testing single-flight coalescing...")
+    test_concurrent_calls_share_one_upstream_call()
+    test_call_is_cancelled_only_when_every_caller_is_gone()
+    test_streams_fan_out_and_late_joiners_replay()
+    test_stream_is_cancelled_when_unread_followers_are_dropped()
+    test_stream_open_errors_reach_every_caller()
+    test_endpoint_coalesces_concurrent_streams()
+    print("✅ ALL TESTS PASSED!")
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Test that the precomputed SSE encoder produces the same events as json.dumps
+framing (byte for byte with the standard library JSON backend).
+"""
+import asyncio
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from proxy import json_backend, sse
+from tests.helpers import make_chunk
+
+SAMPLES = ["plain", "", "quote \" and backslash \\", "new\nline\ttab", "ünïcödé ✓ 🚀", "\u0000\u001f"]
+
+
+def _expected(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode("utf-8")
+
+
+def _assert_same_event(frame, expected):
+    """Same event and payload; identical bytes when the stdlib backend is in use."""
+    if json_backend.BACKEND == "json":
+        assert frame == expected
+    event, data = frame.split(b"\ndata: ", 1)
+    expected_event, expected_data = expected.split(b"\ndata: ", 1)
+    assert event == expected_event and data.endswith(b"\n\n")
+    assert json.loads(data) == json.loads(expected_data)
+
+
+def test_delta_frames_match_json_dumps():
+    """Text and tool argument deltas match the json.dumps frames."""
+    for index in (0, 3):
+        for text in SAMPLES:
+            _assert_same_event(sse.text_delta(index, text), _expected("content_block_delta", {
+                "type": "content_block_delta", "index": index, "delta": {"type": "text_delta", "text": text}
+            }))
+            _assert_same_event(sse.input_json_delta(index, text), _expected("content_block_delta", {
+                "type": "content_block_delta", "index": index,
+                "delta": {"type": "input_json_delta", "partial_json": text}
+            }))
+
+
+def test_fixed_frames():
+    """Constant frames and the message envelope frames are well formed."""
+    assert sse.PING == _expected("ping", {"type": "ping"})
+    assert sse.MESSAGE_STOP == _expected("message_stop", {"type": "message_stop"})
+    _assert_same_event(sse.content_block_stop(2),
+                       _expected("content_block_stop", {"type": "content_block_stop", "index": 2}))
+    delta = sse.message_delta("tool_use", 12)
+    payload = json.loads(delta.split(b"data: ", 1)[1])
+    assert payload == {"type": "message_delta", "delta": {"stop_reason": "tool_use", "stop_sequence": None},
+                       "usage": {"output_tokens": 12}}
+
+
+def test_handle_streaming_yields_bytes():
+    """handle_streaming emits bytes frames ending with [DONE]."""
+    import server
+
+    async def upstream():
+        yield make_chunk("Hi")
+        yield make_chunk(finish_reason="stop")
+
+    async def collect():
+        request = server.MessagesRequest(model="openai/gpt-4.1", max_tokens=5,
+                                         messages=[{"role": "user", "content": "hi"}])
+        return [frame async for frame in server.handle_streaming(upstream(), request)]
+
+    frames = asyncio.run(collect())
+    assert all(isinstance(frame, bytes) for frame in frames)
+    assert sse.text_delta(0, "Hi") in frames
+    assert frames[-1] == sse.DONE
+
+
+if __name__ == "__main__":
+    print("🧪 Testing SSE encoder...")
+    test_delta_frames_match_json_dumps()
+    test_fixed_frames()
+    test_handle_streaming_yields_bytes()
+    print("✅ ALL TESTS PASSED!")
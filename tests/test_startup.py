@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Test deferred imports, pre-warming and the startup report.
+"""
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from proxy.startup import ImportTimer, LazyModule, StartupReport
+
+
+def test_lazy_module_imports_on_first_use():
+    sys.modules.pop("colorsys", None)
+    report = StartupReport(fast_start=True)
+    colorsys = LazyModule("colorsys", report)
+    assert "colorsys" not in sys.modules and not colorsys.loaded
+    assert report.deferred["colorsys"] == {"loaded": False}
+
+    assert colorsys.rgb_to_hsv(1.0, 0.0, 0.0) == (0.0, 1.0, 1.0)
+    entry = report.deferred["colorsys"]
+    assert entry["loaded"] and entry["trigger"] == "first use" and entry["modules"] >= 1
+
+    # Patching through the proxy patches the module
+    original = colorsys.rgb_to_hsv
+    colorsys.rgb_to_hsv = lambda *args: "patched"
+    try:
+        assert sys.modules["colorsys"].rgb_to_hsv() == "patched"
+    finally:
+        colorsys.rgb_to_hsv = original
+    assert asyncio.run(colorsys.load_async()) is sys.modules["colorsys"]
+
+
+def test_import_timer_splits_self_and_cumulative_time():
+    with tempfile.TemporaryDirectory() as directory:
+        os.mkdir(os.path.join(directory, "slowpkg"))
+        for name, source in {
+            "__init__.py": "",
+            "outer.py": "import time\nfrom . import inner\ntime.sleep(0.02)\n",
+            "inner.py": "import time\ntime.sleep(0.05)\n",
+        }.items():
+            with open(os.path.join(directory, "slowpkg", name), "w") as f:
+                f.write(source)
+        sys.path.insert(0, directory)
+        timer = ImportTimer()
+        timer.start()
+        try:
+            import slowpkg.outer  # noqa: F401
+        finally:
+            timer.stop()
+            sys.path.remove(directory)
+            for name in ("slowpkg", "slowpkg.outer", "slowpkg.inner"):
+                sys.modules.pop(name, None)
+
+    own, cumulative = timer.times["slowpkg.outer"]
+    assert cumulative >= 0.07 and 0.02 <= own < 0.05
+    assert timer.times["slowpkg.inner"][1] >= 0.05
+    assert timer.slowest(1)[0]["module"] == "slowpkg.outer"
+
+
+def test_prewarm_runs_steps_in_order_and_reports_failures():
+    ran = []
+    report = StartupReport(fast_start=True)
+    asyncio.run(report.run_prewarm([("one", lambda: ran.append(1)), ("two", lambda: ran.append(2))]))
+    assert ran == [1, 2] and report.stats()["prewarm"]["state"] == "done"
+
+    def fail():
+        raise RuntimeError("no tokenizer")
+
+    report = StartupReport(fast_start=True)
+    asyncio.run(report.run_prewarm([("tokenizer", fail), ("never", lambda: ran.append(3))]))
+    assert ran == [1, 2] and report.prewarm_state == "failed at tokenizer: no tokenizer"
+
+    # Without fast start everything is loaded already, so there is nothing to warm
+    report = StartupReport(fast_start=False, prewarm=True)
+    asyncio.run(report.run_prewarm([("one", lambda: ran.append(4))]))
+    assert ran == [1, 2] and report.stats()["prewarm"]["state"] == "off"
+
+
+def test_fast_start_defers_litellm_until_first_use():
+    script = textwrap.dedent("""
+        import asyncio, sys
+        import httpx
+        import server
+
+        assert "litellm" not in sys.modules
+
+        async def scenario():
+            transport = httpx.ASGITransport(app=server.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://proxy") as client:
+                before = (await client.get("/")).json()["startup"]
+                counted = await client.post("/v1/messages/count_tokens", json={
+                    "model": "openai/gpt-4.1", "messages": [{"role": "user", "content": "Hello there"}]})
+                after = (await client.get("/")).json()["startup"]
+                return before, counted, after
+
+        before, counted, after = asyncio.run(scenario())
+        assert before["fast_start"] and before["deferred"] == {"litellm": {"loaded": False}}, before
+        assert set(before["phases_ms"]) == {"imports", "setup"}, before
+        assert counted.status_code == 200 and counted.json()["input_tokens"] > 0
+        assert after["deferred"]["litellm"]["loaded"] and after["deferred"]["litellm"]["trigger"] == "first use"
+        assert after["rss_mb"] > 0
+        print("ok")
+    """)
+    environment = {**os.environ, "FAST_START": "true", "PREWARM": "false",
+                   "LITELLM_LOCAL_MODEL_COST_MAP": "True", "LOG_LEVEL": "WARNING"}
+    result = subprocess.run([sys.executable, "-c", script], cwd=ROOT, env=environment,
+                            capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0 and result.stdout.strip() == "ok", result.stderr
+
+
+if __name__ == "__main__":
+    print("🧪 Testing startup...")
+    test_lazy_module_imports_on_first_use()
+    test_import_timer_splits_self_and_cumulative_time()
+    test_prewarm_runs_steps_in_order_and_reports_failures()
+    test_fast_start_defers_litellm_until_first_use()
+    print("✅ ALL TESTS PASSED!")
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Test the direct httpx upstream engine against the mock upstream.
+"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from providers.azure import AzureOpenAIProvider
+from providers.engine import EngineConfig, HttpxEngine, UpstreamError, build_openai_body
+from providers.openai import OpenAIProvider
+from tests.mock_upstream import BackgroundServer, create_mock_app
+
+
+def test_build_openai_body():
+    """LiteLLM-only keys are dropped and Anthropic blocks become OpenAI parts."""
+    body = build_openai_body({
+        "model": "azure/my-deployment",
+        "api_key": "secret",
+        "api_base": "https://example",
+        "top_k": 5,
+        "stream": True,
+        "tool_choice": "any",
+        "messages": [{"role": "assistant", "content": [
+            {"type": "text", "text": "Let me check"},
+            {"type": "tool_use", "id": "toolu_1", "name": "calculator", "input": {"expression": "2+2"}},
+            {"type": "image", "source": {"type": "base64", "media_type": "image/png", "data": "AAAA"}}
+        ]}]
+    })
+    assert body["model"] == "my-deployment"
+    assert not {"api_key", "api_base", "top_k"} & set(body)
+    assert body["tool_choice"] == "required"
+    assert body["stream_options"] == {"include_usage": True}
+    parts = body["messages"][0]["content"]
+    assert parts[0] == {"type": "text", "text": "Let me check"}
+    assert "calculator" in parts[1]["text"]
+    assert parts[2]["image_url"]["url"] == "data:image/png;base64,AAAA"
+
+
+def test_engine_reuses_connections():
+    """Sequential streaming and non-streaming calls should share one pooled connection."""
+    mock_app = create_mock_app(ttft=0, inter_token_delay=0, num_tokens=4)
+    with BackgroundServer(mock_app) as mock:
+        os.environ["OPENAI_API_BASE"] = f"{mock.url}/v1"
+        provider = OpenAIProvider()
+        provider.api_key = "mock-key"
+
+        async def scenario():
+            engine = HttpxEngine(provider, EngineConfig(max_keepalive_connections=4))
+            request = {"model": "openai/gpt-4.1", "messages": [{"role": "user", "content": "Hi"}]}
+            try:
+                response = await engine.acompletion({**request, "stream": False})
+                chunks = [chunk async for chunk in await engine.acompletion({**request, "stream": True})]
+                await engine.acompletion({**request, "stream": False})
+            finally:
+                await engine.aclose()
+            return response, chunks
+
+        try:
+            response, chunks = asyncio.run(scenario())
+        finally:
+            del os.environ["OPENAI_API_BASE"]
+
+    assert response["choices"][0]["message"]["content"] == "tok " * 4
+    assert chunks[0].choices[0].delta.content == "tok "
+    assert chunks[-1].choices[0].finish_reason == "stop"
+    assert len(mock_app.state.connections) == 1
+
+
+def test_azure_deployment_url_and_errors():
+    """Azure requests go to the deployment URL; error statuses raise UpstreamError."""
+    provider = AzureOpenAIProvider()
+    provider.endpoint = "https://example.openai.azure.com/"
+    provider.api_key = "azure-key"
+    url, headers = provider.get_direct_endpoint("my-deployment")
+    assert url == (
+        "https://example.openai.azure.com/openai/deployments/my-deployment/chat/completions"
+        f"?api-version={provider.api_version}"
+    )
+    assert headers == {"api-key": "azure-key"}
+
+    with BackgroundServer(create_mock_app()) as mock:
+        provider = OpenAIProvider()
+        provider.get_direct_endpoint = lambda model, endpoint=None: (f"{mock.url}/missing", {})
+
+        async def scenario():
+            engine = HttpxEngine(provider)
+            try:
+                await engine.acompletion({"model": "openai/gpt-4.1", "messages": []})
+            finally:
+                await engine.aclose()
+
+        try:
+            asyncio.run(scenario())
+            raise AssertionError("expected UpstreamError")
+        except UpstreamError as e:
+            assert e.status_code == 404
+
+
+if __name__ == "__main__":
+    print("🧪 Testing direct httpx upstream engine...")
+    test_build_openai_body()
+    test_engine_reuses_connections()
+    test_azure_deployment_url_and_errors()
+    print("✅ ALL TESTS PASSED!")